@@ -23,16 +23,22 @@ for f in "${ZIP_FILES[@]}"; do
   echo "  - $f"
 done
 
+CHECKSUMS_FILE="$GENRELEASES_DIR/SHA256SUMS"
+if [[ ! -f "$CHECKSUMS_FILE" ]]; then
+  echo "ERROR: Checksum manifest not found: $CHECKSUMS_FILE" >&2
+  exit 1
+fi
+
 # Verify release notes file exists
 if [[ ! -f "$NOTES_FILE" ]]; then
   echo "ERROR: Release notes file not found: $NOTES_FILE" >&2
   exit 1
 fi
 
-# Create the release with all ZIP files
+# Create the release with all ZIP files and their checksum manifest
 gh release create "$NEW_VERSION" \
   --title "Refactor Kit $NEW_VERSION" \
   --notes-file "$NOTES_FILE" \
-  "${ZIP_FILES[@]}"
+  "${ZIP_FILES[@]}" "$CHECKSUMS_FILE"
 
 echo "Release $NEW_VERSION created successfully with ${#ZIP_FILES[@]} template(s)"
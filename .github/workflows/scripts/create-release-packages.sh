@@ -79,5 +79,26 @@ for agent in "${!AGENT_FOLDERS[@]}"; do
   build_variant "$agent"
 done
 
+# Combined archive: the shared .refactor/ tree once plus every agent's commands. The CLI
+# reads its central directory and extracts only the members of the selected agents.
+build_combined() {
+  local base_dir="$GENRELEASES_DIR/refactor-kit-all-package"
+
+  echo "Building combined package..."
+  mkdir -p "$base_dir"
+  for agent in "${!AGENT_FOLDERS[@]}"; do
+    cp -R "$GENRELEASES_DIR/refactor-kit-${agent}-package/." "$base_dir/"
+  done
+
+  ( cd "$base_dir" && zip -r "../refactor-kit-template-all-${NEW_VERSION}.zip" . )
+  echo "Created $GENRELEASES_DIR/refactor-kit-template-all-${NEW_VERSION}.zip"
+}
+
+build_combined
+
+# Publish checksums so the CLI can verify archives while downloading them
+( cd "$GENRELEASES_DIR" && sha256sum refactor-kit-template-*-"${NEW_VERSION}".zip > SHA256SUMS )
+echo "Created $GENRELEASES_DIR/SHA256SUMS"
+
 echo "Archives in $GENRELEASES_DIR:"
 ls -1 "$GENRELEASES_DIR"/refactor-kit-template-*-"${NEW_VERSION}".zip
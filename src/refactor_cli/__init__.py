@@ -1,18 +1,34 @@
 """Refactor CLI - A tool for Refactoring-Driven Development (RDD)."""
 
+import abc
+import asyncio
+import atexit
+import contextlib
+import hashlib
+import importlib.util
 import json
 import os
+import re
+import shlex
 import shutil
+import signal
 import ssl
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
 import zipfile
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import UTC, datetime
 from importlib.metadata import PackageNotFoundError, version
-from pathlib import Path
+from pathlib import Path, PurePosixPath, PureWindowsPath
 
 import httpx
+import platformdirs
 import readchar
 import truststore
 import typer
@@ -26,25 +42,221 @@ from rich.text import Text
 from rich.tree import Tree
 from typer.core import TyperGroup
 
+from .context import DEFAULT_CONTEXT_BUDGET
+
 try:
     __version__ = version("refactor-cli")
 except PackageNotFoundError:
     __version__ = "0.0.0-dev"
 
-# Lazy-initialized HTTP client to avoid creating connections at import time
-_http_client: httpx.Client | None = None
+# Shared HTTP clients, one per TLS mode, created lazily so importing the CLI opens no connections.
+# A single pool lets the release lookup, the checksum manifest and the asset download (including the
+# redirect to the release asset host) reuse warm keep-alive connections.
+_http_clients: dict[bool, httpx.Client] = {}
+
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
+
+def _http2_available() -> bool:
+    """Return True when the optional h2 package is installed, enabling HTTP/2."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _new_verify(skip_tls: bool) -> ssl.SSLContext | bool:
+    """Return the httpx verify setting for a TLS mode."""
+    return False if skip_tls else truststore.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
 
 
 def _get_http_client(skip_tls: bool = False) -> httpx.Client:
-    """Get or create an HTTP client with configurable TLS verification."""
-    global _http_client
-    if skip_tls:
-        # Always create a new client when TLS verification is skipped
-        return httpx.Client(verify=False)
-    if _http_client is None:
-        ssl_ctx = truststore.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        _http_client = httpx.Client(verify=ssl_ctx)
-    return _http_client
+    """Get the shared, pooled HTTP client for the requested TLS verification mode."""
+    client = _http_clients.get(skip_tls)
+    if client is None or client.is_closed:
+        client = httpx.Client(verify=_new_verify(skip_tls), http2=_http2_available(), limits=HTTP_POOL_LIMITS)
+        _http_clients[skip_tls] = client
+    return client
+
+
+# Maximum number of requests the download engine keeps in flight at once
+DOWNLOAD_CONCURRENCY = 8
+
+
+def _download_error_message(response: httpx.Response, url: str, debug: bool) -> str:
+    """Describe a failed download response, including the start of the body in debug mode."""
+    error_msg = _format_rate_limit_error(response.status_code, response.headers, url)
+    if debug:
+        try:
+            error_body = response.text[:400]
+        except UnicodeDecodeError:
+            error_body = repr(response.content[:400])
+        error_msg += f"\n\n[dim]Response body (truncated 400):[/dim]\n{error_body}"
+    return error_msg
+
+
+class DownloadEngine:
+    """Run template HTTP requests concurrently on a private asyncio event loop.
+
+    Sync callers hand coroutines to run() or gather(); the loop lives in a daemon thread so
+    its httpx.AsyncClient connections stay warm between calls. At most max_concurrency
+    requests are in flight at once. Requests made with a shared pooled client go through its
+    AsyncClient counterpart on the engine loop; any other sync client (such as an injected
+    one) is driven from worker threads under the same limit. file:// URLs are read from disk,
+    so local mirrors go through the same calls.
+    """
+
+    def __init__(self, max_concurrency: int = DOWNLOAD_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._async_clients: dict[bool, httpx.AsyncClient] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._thread = threading.Thread(target=self._loop.run_forever, name="refactor-download", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and return its result (or raise its exception)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def gather(self, coros) -> list:
+        """Run several coroutines concurrently and return their results in order."""
+
+        async def _gather():
+            return await asyncio.gather(*coros)
+
+        return self.run(_gather())
+
+    def _async_client_for(self, client) -> httpx.AsyncClient | None:
+        if isinstance(client, httpx.AsyncClient):
+            return client
+        for skip_tls, shared in _http_clients.items():
+            if client is shared:
+                async_client = self._async_clients.get(skip_tls)
+                if async_client is None or async_client.is_closed:
+                    async_client = httpx.AsyncClient(
+                        verify=_new_verify(skip_tls), http2=_http2_available(), limits=HTTP_POOL_LIMITS
+                    )
+                    self._async_clients[skip_tls] = async_client
+                return async_client
+        return None
+
+    async def get(self, client, url: str, **kwargs) -> httpx.Response:
+        """GET url with the given client, waiting for a free concurrency slot."""
+        local = _local_path(url)
+        if local is not None:
+            return await asyncio.to_thread(self._get_local, url, local)
+        async with self._semaphore:
+            async_client = self._async_client_for(client)
+            if async_client is not None:
+                return await async_client.get(url, **kwargs)
+            return await asyncio.to_thread(client.get, url, **kwargs)
+
+    async def download(self, client, url: str, dest: Path, *, debug: bool = False, on_chunk=None, **kwargs) -> str:
+        """Stream url into dest and return the SHA-256 of the bytes written.
+
+        Raises RuntimeError when the server does not answer 200. on_chunk, if given, is
+        called with the size of every chunk written.
+        """
+        local = _local_path(url)
+        if local is not None:
+            return await asyncio.to_thread(self._copy_local, local, dest, on_chunk)
+        async with self._semaphore:
+            async_client = self._async_client_for(client)
+            if async_client is None:
+                return await asyncio.to_thread(
+                    self._download_sync, client, url, dest, debug=debug, on_chunk=on_chunk, request_kwargs=kwargs
+                )
+
+            hasher = hashlib.sha256()
+            async with async_client.stream("GET", url, **kwargs) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise RuntimeError(_download_error_message(response, url, debug))
+                # Local chunk writes are short; only the open is moved off the loop
+                f = await asyncio.to_thread(dest.open, "wb")
+                try:
+                    async for chunk in response.aiter_bytes(chunk_size=8192):
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        if on_chunk is not None:
+                            on_chunk(len(chunk))
+                finally:
+                    f.close()
+            return hasher.hexdigest()
+
+    @staticmethod
+    def _get_local(url: str, path: Path) -> httpx.Response:
+        request = httpx.Request("GET", url)
+        try:
+            return httpx.Response(200, content=path.read_bytes(), request=request)
+        except OSError:
+            return httpx.Response(404, request=request)
+
+    @staticmethod
+    def _copy_local(source: Path, dest: Path, on_chunk) -> str:
+        if not source.is_file():
+            raise RuntimeError(f"{source} does not exist")
+        hasher = hashlib.sha256()
+        with open(source, "rb") as src, open(dest, "wb") as f:
+            while chunk := src.read(1024 * 1024):
+                f.write(chunk)
+                hasher.update(chunk)
+                if on_chunk is not None:
+                    on_chunk(len(chunk))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _download_sync(client, url: str, dest: Path, *, debug: bool, on_chunk, request_kwargs: dict) -> str:
+        hasher = hashlib.sha256()
+        with client.stream("GET", url, **request_kwargs) as response:
+            if response.status_code != 200:
+                raise RuntimeError(_download_error_message(response, url, debug))
+            with open(dest, "wb") as f:
+                for chunk in response.iter_bytes(chunk_size=8192):
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    if on_chunk is not None:
+                        on_chunk(len(chunk))
+        return hasher.hexdigest()
+
+    def close(self) -> None:
+        """Close the engine's AsyncClients and stop its event loop."""
+        with self._lock:
+            loop, thread, self._loop = self._loop, self._thread, None
+        if loop is None:
+            # Clients are only created on the loop, so without one there is nothing to close
+            self._async_clients.clear()
+            return
+
+        async def _aclose():
+            while self._async_clients:
+                _, client = self._async_clients.popitem()
+                await client.aclose()
+
+        asyncio.run_coroutine_threadsafe(_aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+_download_engine = DownloadEngine()
+
+
+def close_http_clients() -> None:
+    """Close every shared HTTP client, including the download engine's, and drop pooled connections."""
+    _download_engine.close()
+    while _http_clients:
+        _, client = _http_clients.popitem()
+        client.close()
+
+
+atexit.register(close_http_clients)
 
 
 def _github_token(cli_token: str | None = None) -> str | None:
@@ -137,6 +349,86 @@ def debug_print(message: str) -> None:
         console.print(f"[dim][DEBUG][/dim] {message}")
 
 
+# Output modes: "rich" renders panels, trees and live displays; "json" writes one JSON
+# object per line to stdout (human diagnostics go to stderr); "plain" writes one text line per event
+OUTPUT_MODES = ("rich", "json", "plain")
+# String fields of an event are cut to this many characters so one event stays one small write
+EVENT_FIELD_LIMIT = 500
+
+
+class EventEmitter:
+    """Write machine-readable progress events and measure what writing them costs."""
+
+    def __init__(self, mode: str = "rich", stream=None):
+        self.mode = mode
+        self.stream = stream
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._origin = time.perf_counter()
+
+    @property
+    def machine(self) -> bool:
+        return self.mode != "rich"
+
+    def emit(self, event: str, **fields) -> None:
+        """Write one event; a no-op in rich mode."""
+        if self.mode == "rich":
+            return
+        start = time.perf_counter_ns()
+        for name, value in fields.items():
+            if isinstance(value, str) and len(value) > EVENT_FIELD_LIMIT:
+                fields[name] = value[: EVENT_FIELD_LIMIT - 1] + "…"
+        if self.mode == "json":
+            record = {"event": event, "t": round(time.perf_counter() - self._origin, 4), **fields}
+            line = json.dumps(record, separators=(",", ":"), default=str)
+        else:
+            parts = [f"{name}={value}" for name, value in fields.items() if value not in (None, "")]
+            line = " ".join([event, *parts])
+        stream = self.stream or sys.stdout
+        stream.write(line + "\n")
+        stream.flush()
+        elapsed = time.perf_counter_ns() - start
+        self.count += 1
+        self.total_ns += elapsed
+        self.max_ns = max(self.max_ns, elapsed)
+
+    def stats(self) -> dict:
+        """Return the number of events written and their mean and worst cost in microseconds."""
+        return {
+            "events": self.count,
+            "overhead_us_mean": round(self.total_ns / self.count / 1000, 2) if self.count else 0.0,
+            "overhead_us_max": round(self.max_ns / 1000, 2),
+        }
+
+
+_events = EventEmitter()
+_console_no_color = console.no_color
+
+
+def set_output_mode(mode: str) -> None:
+    """Switch between rich rendering and the machine-readable json/plain modes.
+
+    In json mode stdout carries only events, so the console is pointed at stderr; in both
+    machine modes colour is disabled.
+    """
+    global _events
+    _events = EventEmitter(mode)
+    console.file = sys.stderr if mode == "json" else None
+    console.no_color = _console_no_color or mode != "rich"
+
+
+def _use_json_mode(ctx: typer.Context) -> None:
+    """Make a command's own --json flag mean the same as ``refactor --json``: NDJSON events on stdout."""
+    if _events.mode == "json":
+        return
+    if _events.machine:
+        console.print("[red]Error:[/red] --json and --plain cannot be combined")
+        raise typer.Exit(1)
+    set_output_mode("json")
+    ctx.call_on_close(lambda: _events.emit("stats", **_events.stats()))
+
+
 # Agent configuration - single source of truth for all agent metadata
 AGENT_CONFIG = {
     "claude": {
@@ -171,15 +463,31 @@ class StepTracker:
 
     def __init__(self, title: str):
         self.title = title
-        self.steps = []  # list of dicts: {key, label, status, detail}
+        # list of dicts: {key, label, status, detail, started, finished, metrics}
+        # started/finished are monotonic seconds since the tracker was created
+        self.steps = []
         self._refresh_cb = None
+        self._origin = time.perf_counter()
+        self.created_at = datetime.now(UTC)
 
     def attach_refresh(self, refresh_callback):
         self._refresh_cb = refresh_callback
 
+    @staticmethod
+    def _new_step(key: str, label: str, status: str, detail: str) -> dict:
+        return {
+            "key": key,
+            "label": label,
+            "status": status,
+            "detail": detail,
+            "started": None,
+            "finished": None,
+            "metrics": {},
+        }
+
     def add(self, key: str, label: str):
         if key not in [s["key"] for s in self.steps]:
-            self.steps.append({"key": key, "label": label, "status": "pending", "detail": ""})
+            self.steps.append(self._new_step(key, label, "pending", ""))
             self._maybe_refresh()
 
     def start(self, key: str, detail: str = ""):
@@ -194,17 +502,109 @@ class StepTracker:
     def skip(self, key: str, detail: str = ""):
         self._update(key, status="skipped", detail=detail)
 
-    def _update(self, key: str, status: str, detail: str):
+    def record(self, key: str, **metrics: int):
+        """Add counters such as bytes=... or files=... to a step's timing record."""
         for s in self.steps:
             if s["key"] == key:
-                s["status"] = status
-                if detail:
-                    s["detail"] = detail
-                self._maybe_refresh()
+                for name, value in metrics.items():
+                    s["metrics"][name] = s["metrics"].get(name, 0) + value
                 return
-        self.steps.append({"key": key, "label": key, "status": status, "detail": detail})
+
+    def _update(self, key: str, status: str, detail: str):
+        step = next((s for s in self.steps if s["key"] == key), None)
+        if step is None:
+            step = self._new_step(key, key, status, detail)
+            self.steps.append(step)
+        step["status"] = status
+        if detail:
+            step["detail"] = detail
+        now = time.perf_counter() - self._origin
+        if step["started"] is None:
+            step["started"] = now
+        if status != "running":
+            step["finished"] = now
+        _events.emit(
+            "step",
+            tracker=self.title,
+            key=key,
+            label=step["label"],
+            status=status,
+            detail=step["detail"],
+            elapsed_ms=round((now - step["started"]) * 1000, 3),
+        )
         self._maybe_refresh()
 
+    def timings(self) -> list[dict]:
+        """Return the timing record of every step that has started, in step order.
+
+        Each record has key, label, status, detail, start_ms and duration_ms (steps still
+        running are measured up to now) plus the counters added with record().
+        """
+        now = time.perf_counter() - self._origin
+        records = []
+        for s in self.steps:
+            if s["started"] is None:
+                continue
+            finished = s["finished"] if s["finished"] is not None else now
+            records.append(
+                {
+                    "key": s["key"],
+                    "label": s["label"],
+                    "status": s["status"],
+                    "detail": s["detail"],
+                    "start_ms": round(s["started"] * 1000, 3),
+                    "duration_ms": round((finished - s["started"]) * 1000, 3),
+                    **s["metrics"],
+                }
+            )
+        return records
+
+    def chrome_trace(self, **metadata) -> dict:
+        """Return the step timings as a Chrome trace-event document (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": self.title}}]
+        for record in self.timings():
+            args = {k: v for k, v in record.items() if k not in {"label", "start_ms", "duration_ms"}}
+            events.append(
+                {
+                    "name": record["label"],
+                    "cat": record["key"],
+                    "ph": "X",
+                    "ts": round(record["start_ms"] * 1000),
+                    "dur": round(record["duration_ms"] * 1000),
+                    "pid": pid,
+                    "tid": 0,
+                    "args": args,
+                }
+            )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"title": self.title, "started_at": self.created_at.isoformat(), **metadata},
+        }
+
+    def summary_table(self) -> Table:
+        """Return a compact table of step durations, transferred bytes and file counts."""
+        records = self.timings()
+        total_ms = sum(r["duration_ms"] for r in records) or 1.0
+        table = Table(title=f"{self.title} timings", show_edge=False, pad_edge=False)
+        table.add_column("Step", style="cyan")
+        table.add_column("Status")
+        table.add_column("Time", justify="right")
+        table.add_column("Share", justify="right")
+        table.add_column("Bytes", justify="right")
+        table.add_column("Files", justify="right")
+        for r in records:
+            table.add_row(
+                r["key"],
+                r["status"],
+                f"{r['duration_ms']:.1f} ms",
+                f"{r['duration_ms'] / total_ms:.0%}",
+                f"{r['bytes']:,}" if "bytes" in r else "",
+                f"{r['files']:,}" if "files" in r else "",
+            )
+        return table
+
     def _maybe_refresh(self):
         if self._refresh_cb:
             try:
@@ -318,7 +718,9 @@ def select_with_arrows(options: dict, prompt_text: str = "Select an option", def
 
 
 def show_banner():
-    """Display the ASCII art banner."""
+    """Display the ASCII art banner (skipped in machine output modes)."""
+    if _events.machine:
+        return
     banner_lines = BANNER.strip().split("\n")
     colors = ["bright_yellow", "yellow", "bright_red", "red", "bright_magenta", "magenta"]
 
@@ -351,8 +753,24 @@ app = typer.Typer(
 
 
 @app.callback()
-def callback(ctx: typer.Context):
+def callback(
+    ctx: typer.Context,
+    json_output: bool = typer.Option(
+        False, "--json", help="Machine mode: emit newline-delimited JSON events on stdout instead of rich output"
+    ),
+    plain_output: bool = typer.Option(False, "--plain", help="Machine mode: emit one plain text line per event"),
+):
     """Show banner when no subcommand is provided."""
+    if json_output and plain_output:
+        console.print("[red]Error:[/red] --json and --plain cannot be combined")
+        raise typer.Exit(1)
+    mode = "json" if json_output else "plain" if plain_output else os.environ.get("REFACTOR_OUTPUT", "rich")
+    if mode not in OUTPUT_MODES:
+        console.print(f"[red]Error:[/red] Invalid REFACTOR_OUTPUT '{mode}'. Choose from: {', '.join(OUTPUT_MODES)}")
+        raise typer.Exit(1)
+    set_output_mode(mode)
+    if _events.machine:
+        ctx.call_on_close(lambda: _events.emit("stats", **_events.stats()))
     if ctx.invoked_subcommand is None and "--help" not in sys.argv and "-h" not in sys.argv:
         show_banner()
         console.print(Align.center("[dim]Run 'refactor --help' for usage information[/dim]"))
@@ -377,6 +795,165 @@ def check_tool(tool: str, install_url: str | None = None, tracker: StepTracker |
     return False
 
 
+# Seconds a single tool probe (including its --version call) may take
+TOOL_PROBE_TIMEOUT = 5.0
+# Seconds a cached probe result stays valid while PATH and the binary are unchanged
+TOOL_PROBE_CACHE_TTL = 600
+TOOL_PROBE_CACHE_NAME = "tool-probes.json"
+
+
+def _binary_mtime(path: str | None) -> float | None:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def probe_tool(tool: str, timeout: float = TOOL_PROBE_TIMEOUT) -> dict:
+    """Locate a tool on PATH and capture the first line of its --version output.
+
+    Returns {tool, found, path, version, error, mtime}; a tool that is found but does not
+    answer --version within timeout is still reported as found, with the error set.
+    """
+    result = {"tool": tool, "found": False, "path": None, "version": None, "error": None, "mtime": None}
+    path = shutil.which(tool)
+    if not path:
+        return result
+    result.update(found=True, path=path, mtime=_binary_mtime(path))
+    # A new session lets a timeout kill the whole process group, including children holding the pipes
+    try:
+        proc = subprocess.Popen(  # noqa: S603
+            [path, "--version"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=os.name != "nt",
+        )
+    except OSError as e:
+        result["error"] = str(e)
+        return result
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if os.name != "nt":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+        proc.communicate()
+        result["error"] = f"--version timed out after {timeout:g}s"
+        return result
+    output = (stdout or stderr or "").strip()
+    result["version"] = output.splitlines()[0].strip() if output else None
+    if proc.returncode != 0 and result["version"] is None:
+        result["error"] = f"--version exited with status {proc.returncode}"
+    return result
+
+
+def _probe_cache_key() -> str:
+    return hashlib.sha256(os.environ.get("PATH", "").encode()).hexdigest()
+
+
+def _probe_is_fresh(entry: dict, now: float, ttl: float) -> bool:
+    """Return True when a cached probe is within its TTL and its binary has not changed since.
+
+    A cached miss is only reused while the tool is still missing, so installing it shows up at once.
+    """
+    if now - entry.get("probed_at", 0) >= ttl:
+        return False
+    if entry.get("found"):
+        return _binary_mtime(entry.get("path")) == entry.get("mtime")
+    return shutil.which(entry["tool"]) is None
+
+
+def probe_tools(
+    tools: list[str], *, timeout: float = TOOL_PROBE_TIMEOUT, use_cache: bool = True, ttl: float = TOOL_PROBE_CACHE_TTL
+) -> dict[str, dict]:
+    """Probe several tools concurrently, reusing cached results while PATH and the binaries are unchanged.
+
+    Returns {tool: probe_tool() result} with an added "cached" flag. The cache lives in the
+    CLI cache directory and is keyed on the PATH value; an entry is reused for ttl seconds
+    unless the binary's mtime changed, or the tool was missing and has since been installed.
+    """
+    cache_path = _cache_dir() / TOOL_PROBE_CACHE_NAME
+    key = _probe_cache_key()
+    cache = _read_json_file(cache_path) if use_cache else {}
+    cached_entries = cache.get("entries", {}) if cache.get("path_key") == key else {}
+    now = time.time()
+
+    results = {}
+    stale = []
+    for tool in tools:
+        entry = cached_entries.get(tool)
+        if entry is not None and _probe_is_fresh(entry, now, ttl):
+            results[tool] = {**entry, "cached": True}
+        else:
+            stale.append(tool)
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+            for tool, probed in zip(stale, pool.map(lambda t: probe_tool(t, timeout), stale), strict=True):
+                results[tool] = {**probed, "probed_at": now, "cached": False}
+        if use_cache:
+            entries = {**cached_entries, **{t: {k: v for k, v in results[t].items() if k != "cached"} for t in stale}}
+            try:
+                _write_json_atomic(cache_path, {"path_key": key, "entries": entries})
+            except OSError as e:
+                debug_print(f"Could not update {cache_path}: {e}")
+    return {tool: results[tool] for tool in tools}
+
+
+def _is_git_dir(path: Path) -> bool:
+    """Return True if path looks like a git directory (a worktree's gitdir has commondir instead of objects)."""
+    return (path / "HEAD").is_file() and ((path / "objects").is_dir() or (path / "commondir").is_file())
+
+
+def _ceiling_dirs() -> set[Path]:
+    ceilings = os.environ.get("GIT_CEILING_DIRECTORIES", "")
+    return {Path(entry).resolve() for entry in ceilings.split(os.pathsep) if entry}
+
+
+def find_git_dir(path: Path | None = None) -> Path | None:
+    """Return the git directory that governs path, or None, without running git.
+
+    GIT_DIR wins when set. Otherwise path and its parents are searched for .git, stopping at
+    GIT_CEILING_DIRECTORIES; a .git file (linked worktrees, submodules) is followed through
+    its "gitdir:" line. Safe to call from any thread since it never changes the process cwd.
+    """
+    if path is None:
+        path = Path.cwd()
+
+    env_git_dir = os.environ.get("GIT_DIR")
+    if env_git_dir:
+        git_dir = Path(env_git_dir)
+        if not git_dir.is_absolute():
+            git_dir = Path.cwd() / git_dir
+        return git_dir if _is_git_dir(git_dir) else None
+
+    ceilings = _ceiling_dirs()
+    current = path.resolve()
+    while True:
+        dot_git = current / ".git"
+        if dot_git.is_dir() and _is_git_dir(dot_git):
+            return dot_git
+        if dot_git.is_file():
+            try:
+                content = dot_git.read_text(encoding="utf-8").strip()
+            except OSError:
+                content = ""
+            if content.startswith("gitdir:"):
+                git_dir = Path(content.removeprefix("gitdir:").strip())
+                if not git_dir.is_absolute():
+                    git_dir = current / git_dir
+                if _is_git_dir(git_dir):
+                    return git_dir.resolve()
+        if current.parent == current or current.parent in ceilings:
+            return None
+        current = current.parent
+
+
 def is_git_repo(path: Path | None = None) -> bool:
     """Check if the specified path is inside a git repository."""
     if path is None:
@@ -385,37 +962,101 @@ def is_git_repo(path: Path | None = None) -> bool:
     if not path.is_dir():
         return False
 
-    try:
-        result = subprocess.run(
-            ["git", "rev-parse", "--is-inside-work-tree"],
-            capture_output=True,
-            cwd=path,
-        )
-        return result.returncode == 0
-    except FileNotFoundError:
-        return False
+    return find_git_dir(path) is not None
+
+
+def _run_git(args: list[str], cwd: Path, stdin: bytes | None = None) -> subprocess.CompletedProcess:
+    """Run git with cwd scoped to the call, leaving the process working directory alone."""
+    return subprocess.run(["git", *args], cwd=cwd, input=stdin, capture_output=True, check=False)  # noqa: S603
 
 
-def init_git_repo(project_path: Path, quiet: bool = False) -> tuple[bool, str | None]:
-    """Initialize a git repository in the specified path."""
-    original_cwd = Path.cwd()
+def _git_error(args: list[str], result: subprocess.CompletedProcess) -> str:
+    error_msg = f"Command: git {' '.join(args)}\nExit code: {result.returncode}"
+    stderr = result.stderr.decode(errors="replace").strip() if result.stderr else ""
+    if stderr:
+        error_msg += f"\nError: {stderr}"
+    return error_msg
+
+
+def init_git_repo(
+    project_path: Path, quiet: bool = False, commit_files: list[str] | None = None
+) -> tuple[bool, str | None]:
+    """Initialize a git repository in the specified path.
+
+    When commit_files is given, those project-relative files are recorded as the initial
+    commit with commit_git_snapshot().
+    """
+    if not quiet:
+        console.print("[cyan]Initializing git repository...[/cyan]")
     try:
-        os.chdir(project_path)
+        result = _run_git(["init"], project_path)
+    except FileNotFoundError as e:
+        return False, f"Command: git init\nError: {e}"
+    if result.returncode != 0:
         if not quiet:
-            console.print("[cyan]Initializing git repository...[/cyan]")
-        result = subprocess.run(["git", "init"], capture_output=True, text=True)
+            console.print("[red]Error initializing git repository[/red]")
+        return False, _git_error(["init"], result)
+    if not quiet:
+        console.print("[green]✓[/green] Git repository initialized")
+    if commit_files:
+        return commit_git_snapshot(project_path, commit_files)
+    return True, None
+
+
+def _fast_import_path(path: str) -> bytes:
+    """Quote a path for a fast-import M command when it contains characters that need escaping."""
+    if not any(c in path for c in '"\\\n'):
+        return path.encode()
+    escaped = path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'.encode()
+
+
+def commit_git_snapshot(
+    project_path: Path, files: list[str], message: str = "Initial commit from Refactor Kit template"
+) -> tuple[bool, str | None]:
+    """Commit files (relative to project_path) onto the current branch of a fresh repository.
+
+    All blobs, the tree, the commit and the branch ref are written by a single git fast-import
+    call instead of an add/commit per file; git read-tree then loads the commit into the index
+    so the working tree shows as clean.
+    """
+    git_dir = find_git_dir(project_path)
+    if git_dir is None:
+        return False, f"{project_path} is not a git repository"
+    head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+    if not head.startswith("ref: "):
+        return False, "HEAD is detached; refusing to create the initial commit"
+    branch_ref = head.removeprefix("ref: ")
+
+    ident = _run_git(["var", "GIT_COMMITTER_IDENT"], project_path)
+    if ident.returncode != 0:
+        return False, _git_error(["var", "GIT_COMMITTER_IDENT"], ident) + (
+            "\nSet git config user.name and user.email to create the initial commit."
+        )
+    committer = ident.stdout.decode().strip()
+    message_bytes = message.encode() + b"\n"
+
+    stream = bytearray()
+    stream += f"commit {branch_ref}\ncommitter {committer}\n".encode()
+    stream += f"data {len(message_bytes)}\n".encode() + message_bytes
+    for rel in sorted(files):
+        file_path = project_path / rel
+        if file_path.is_symlink():
+            mode, data = "120000", os.readlink(file_path).encode()
+        elif file_path.is_file():
+            mode = "100755" if os.access(file_path, os.X_OK) and os.name != "nt" else "100644"
+            data = file_path.read_bytes()
+        else:
+            continue
+        stream += f"M {mode} inline ".encode() + _fast_import_path(Path(rel).as_posix()) + b"\n"
+        stream += f"data {len(data)}\n".encode() + data + b"\n"
+    stream += b"done\n"
+
+    for args, stdin in ((["fast-import", "--quiet", "--done"], bytes(stream)), (["read-tree", "HEAD"], None)):
+        result = _run_git(args, project_path, stdin)
         if result.returncode != 0:
-            error_msg = f"Command: git init\nExit code: {result.returncode}"
-            if result.stderr:
-                error_msg += f"\nError: {result.stderr.strip()}"
-            if not quiet:
-                console.print("[red]Error initializing git repository[/red]")
-            return False, error_msg
-        if not quiet:
-            console.print("[green]✓[/green] Git repository initialized")
-        return True, None
-    finally:
-        os.chdir(original_cwd)
+            return False, _git_error(args, result)
+    return True, None
 
 
 def handle_vscode_settings(
@@ -432,6 +1073,7 @@ def handle_vscode_settings(
             new_settings = json.load(f)
 
         if dest_file.exists():
+            _unshare_file(dest_file)
             merged = merge_json_files(dest_file, new_settings, verbose=verbose and not tracker)
             with open(dest_file, "w", encoding="utf-8") as f:
                 json.dump(merged, f, indent=4)
@@ -477,28 +1119,319 @@ def merge_json_files(existing_path: Path, new_content: dict, verbose: bool = Fal
     return merged
 
 
-def _merge_item_to_dest(item: Path, dest_path: Path, verbose: bool, tracker: "StepTracker | None") -> None:
-    """Copy or merge a single item (file or directory) to the destination."""
-    if item.is_dir():
-        if dest_path.exists():
-            if verbose and not tracker:
-                console.print(f"[yellow]Merging directory:[/yellow] {item.name}")
-            for sub_item in item.rglob("*"):
-                if not sub_item.is_file():
-                    continue
-                rel_path = sub_item.relative_to(item)
-                dest_file = dest_path / rel_path
-                dest_file.parent.mkdir(parents=True, exist_ok=True)
-                if dest_file.name == "settings.json" and dest_file.parent.name == ".vscode":
-                    handle_vscode_settings(sub_item, dest_file, rel_path, verbose, tracker)
-                else:
-                    shutil.copy2(sub_item, dest_file)
+def _file_sha256(path: Path) -> str:
+    """Return the hex SHA-256 digest of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# How template files are placed into projects: full copies, copy-on-write clones, or hardlinks
+# to the shared template tree; auto clones where the filesystem supports it and copies otherwise
+LINK_MODES = ("copy", "reflink", "hardlink", "auto")
+# ioctl(2) request that clones a file's extents on Linux (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+
+def _clone_file(src: Path, dst: Path) -> bool:
+    """Make dst a copy-on-write clone of src (FICLONE); returns False if the filesystem cannot."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def _copy_file_range(src: Path, dst: Path) -> None:
+    """Copy src to dst in the kernel with copy_file_range(2), which may share extents; plain copy elsewhere."""
+    if not hasattr(os, "copy_file_range"):
+        shutil.copyfile(src, dst)
+        return
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst)
+
+
+def place_file(src: Path, dst: Path, link_mode: str = "copy") -> str:
+    """Write src to dst according to link_mode and return how it was placed: reflink, hardlink or copy.
+
+    An existing dst is unlinked first, so a file hardlinked to the shared template tree is replaced
+    instead of being written through. "reflink" raises OSError when the filesystem cannot clone;
+    "hardlink" falls back to a copy across filesystems.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode '{link_mode}'. Choose from: {', '.join(LINK_MODES)}")
+    if dst.is_file() or dst.is_symlink():
+        dst.unlink()
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+        except OSError:
+            pass
         else:
-            shutil.copytree(item, dest_path)
-    else:
-        if dest_path.exists() and verbose and not tracker:
-            console.print(f"[yellow]Overwriting file:[/yellow] {item.name}")
-        shutil.copy2(item, dest_path)
+            return "hardlink"
+    if link_mode in ("reflink", "auto"):
+        if _clone_file(src, dst):
+            shutil.copystat(src, dst)
+            dst.chmod(dst.stat().st_mode | 0o200)
+            return "reflink"
+        if link_mode == "reflink":
+            dst.unlink(missing_ok=True)
+            raise OSError(f"Filesystem does not support reflinks: {dst.parent}")
+    _copy_file_range(src, dst)
+    shutil.copystat(src, dst)
+    dst.chmod(dst.stat().st_mode | 0o200)
+    return "copy"
+
+
+def _unshare_file(path: Path) -> None:
+    """Give a file that is hardlinked elsewhere its own private, writable copy before editing it in place."""
+    if path.is_file() and path.stat().st_nlink > 1:
+        private = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(path, private)
+        os.replace(private, path)
+
+
+def _is_vscode_settings(path: Path) -> bool:
+    return path.name == "settings.json" and path.parent.name == ".vscode"
+
+
+def _settings_merge_is_noop(sub_item: Path, dest_file: Path) -> bool:
+    """Return True if deep-merging sub_item into dest_file would leave dest_file unchanged."""
+    try:
+        with open(sub_item, encoding="utf-8") as f:
+            new_settings = json.load(f)
+        with open(dest_file, encoding="utf-8") as f:
+            existing_settings = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return merge_json_files(dest_file, new_settings) == existing_settings
+
+
+# Plan actions in display order; init merges use new/changed/settings-merge/identical,
+# upgrades add update/merged/kept/removed
+PLAN_ACTION_STYLES = {
+    "new": "green",
+    "changed": "yellow",
+    "update": "yellow",
+    "merged": "cyan",
+    "settings-merge": "cyan",
+    "kept": "magenta",
+    "removed": "red",
+    "identical": "dim",
+}
+
+
+def build_merge_plan(source_dir: Path, project_path: Path) -> list[dict]:
+    """Classify every incoming template entry against the destination tree.
+
+    Each entry is a dict with keys ``path`` (relative), ``source``, ``action`` and
+    ``sha256`` (None for directories). Actions:
+    - new: destination does not exist yet
+    - identical: destination already holds the same bytes, nothing to write
+    - changed: destination exists with different content and will be overwritten
+    - settings-merge: .vscode/settings.json that gets deep-merged into the existing file
+    """
+    plan = []
+    for sub_item in sorted(source_dir.rglob("*")):
+        rel_path = sub_item.relative_to(source_dir)
+        dest_file = project_path / rel_path
+        if sub_item.is_dir():
+            if not dest_file.exists():
+                plan.append({"path": rel_path, "source": sub_item, "action": "new", "sha256": None})
+            continue
+        incoming = _file_sha256(sub_item)
+        if not dest_file.exists():
+            action = "new"
+        elif _is_vscode_settings(dest_file):
+            action = "identical" if _settings_merge_is_noop(sub_item, dest_file) else "settings-merge"
+        elif (
+            dest_file.is_file()
+            and dest_file.stat().st_size == sub_item.stat().st_size
+            and _file_sha256(dest_file) == incoming
+        ):
+            action = "identical"
+        else:
+            action = "changed"
+        plan.append({"path": rel_path, "source": sub_item, "action": action, "sha256": incoming})
+    return plan
+
+
+def summarize_merge_plan(plan: list[dict]) -> str:
+    """Return a compact 'N new, N changed, ...' summary of a merge plan."""
+    counts = dict.fromkeys(PLAN_ACTION_STYLES, 0)
+    for entry in plan:
+        counts[entry["action"]] += 1
+    return ", ".join(f"{count} {action}" for action, count in counts.items() if count) or "nothing to merge"
+
+
+def apply_merge_plan(
+    plan: list[dict],
+    project_path: Path,
+    verbose: bool = False,
+    tracker: "StepTracker | None" = None,
+    link_mode: str = "copy",
+) -> dict[str, int]:
+    """Write the entries of a merge plan, skipping those that are already identical on disk.
+
+    New and changed files are placed with place_file according to link_mode. Returns how many
+    files were placed per method, e.g. {"hardlink": 12}.
+    """
+    placed = {}
+    for entry in plan:
+        action = entry["action"]
+        if action in ("identical", "kept"):
+            continue
+        dest_file = project_path / entry["path"]
+        if action == "removed":
+            dest_file.unlink(missing_ok=True)
+            continue
+        if entry["source"].is_dir():
+            dest_file.mkdir(parents=True, exist_ok=True)
+            continue
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        if action == "settings-merge":
+            handle_vscode_settings(entry["source"], dest_file, entry["path"], verbose, tracker)
+            continue
+        if action == "merged":
+            dest_file.unlink(missing_ok=True)
+            dest_file.write_bytes(entry["content"])
+            continue
+        if action in ("changed", "update") and verbose and not tracker:
+            console.print(f"[yellow]Overwriting file:[/yellow] {entry['path']}")
+        method = place_file(entry["source"], dest_file, link_mode)
+        placed[method] = placed.get(method, 0) + 1
+    return placed
+
+
+def print_merge_plan(plan: list[dict], title: str = "Merge Plan") -> None:
+    """Print a merge plan as a table; identical entries are only counted."""
+    show_detail = any(entry.get("detail") for entry in plan)
+    table = Table(show_header=True, header_style="bold", box=None, padding=(0, 2))
+    table.add_column("Action")
+    table.add_column("Path")
+    if show_detail:
+        table.add_column("Detail", style="dim")
+    for entry in plan:
+        action = entry["action"]
+        if action == "identical":
+            continue
+        style = PLAN_ACTION_STYLES[action]
+        suffix = "/" if entry["sha256"] is None and entry["action"] == "new" else ""
+        row = [f"[{style}]{action}[/{style}]", f"{entry['path']}{suffix}"]
+        if show_detail:
+            row.append(entry.get("detail", ""))
+        table.add_row(*row)
+    console.print(Panel(table, title=title, border_style="cyan", padding=(1, 2)))
+    console.print(f"[dim]{summarize_merge_plan(plan)}[/dim]")
+
+
+# Bytes copied per read when streaming an archive member to disk
+ZIP_EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+
+def _safe_member_path(dest: Path, name: str) -> Path:
+    """Return where an archive member should be written, rejecting names that escape dest (zip-slip)."""
+    normalized = name.replace("\\", "/")
+    pure = PurePosixPath(normalized)
+    if pure.is_absolute() or PureWindowsPath(name).drive or ".." in pure.parts:
+        raise ValueError(f"Unsafe path in archive: {name!r}")
+    target = dest.joinpath(*[part for part in pure.parts if part not in {"", "."}])
+    if not target.resolve().is_relative_to(dest.resolve()):
+        raise ValueError(f"Unsafe path in archive: {name!r}")
+    return target
+
+
+def extract_zip(
+    zip_ref: zipfile.ZipFile,
+    dest: Path,
+    *,
+    select: Callable[[str], bool] | None = None,
+    max_workers: int | None = None,
+) -> list[Path]:
+    """Extract an archive into dest, decompressing members in parallel; returns the files written.
+
+    Every member name from the central directory is validated before anything is written,
+    so an archive with a path that escapes dest (zip-slip) raises ValueError and extracts
+    nothing. Directories are created in one pass up front, then files are inflated on a
+    thread pool (zlib releases the GIL) and streamed to disk in bounded chunks. When select
+    is given, only members whose names it accepts are read.
+    """
+    members = []
+    directories = set()
+    for info in zip_ref.infolist():
+        if select is not None and not select(info.filename):
+            continue
+        target = _safe_member_path(dest, info.filename)
+        if info.is_dir():
+            directories.add(target)
+        else:
+            members.append((info, target))
+            directories.add(target.parent)
+
+    for directory in sorted(directories):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    # ZipFile reference-counts member handles without a lock, so opening and closing them is
+    # serialized; the reads themselves are locked by zipfile and inflation runs in parallel
+    handle_lock = threading.Lock()
+
+    def extract_member(member: tuple[zipfile.ZipInfo, Path]) -> Path:
+        info, target = member
+        with handle_lock:
+            src = zip_ref.open(info)
+        try:
+            with open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, ZIP_EXTRACT_CHUNK_SIZE)
+        finally:
+            with handle_lock:
+                src.close()
+        return target
+
+    if len(members) <= 1:
+        return [extract_member(member) for member in members]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(extract_member, members))
+
+
+def template_member_filter(agents: Iterable[str]) -> Callable[[str], bool]:
+    """Return a select callback for extract_zip that keeps the files of the given agents.
+
+    Members under another agent's command folder are skipped, as are directory entries that
+    only lead to one; everything else, such as the shared .refactor/ tree, is kept. This is
+    what lets a single agent be extracted from the combined all-agents archive.
+    """
+    agents = set(agents)
+    selected = [cfg["folder"] for key, cfg in AGENT_CONFIG.items() if key in agents]
+    excluded = [cfg["folder"] for key, cfg in AGENT_CONFIG.items() if key not in agents]
+
+    def select(name: str) -> bool:
+        name = name.removeprefix("./")
+        for folder in excluded:
+            if name.startswith(folder):
+                return False
+            if name.endswith("/") and folder.startswith(name) and not any(f.startswith(name) for f in selected):
+                return False
+        return True
+
+    return select
 
 
 def _get_source_dir_from_extracted(
@@ -516,12 +1449,22 @@ def _get_source_dir_from_extracted(
 
 
 def _extract_and_merge_to_current_dir(
-    zip_ref: zipfile.ZipFile, project_path: Path, verbose: bool, tracker: "StepTracker | None"
-) -> None:
-    """Extract ZIP to temp directory and merge contents into current directory."""
+    zip_ref: zipfile.ZipFile,
+    project_path: Path,
+    verbose: bool,
+    tracker: "StepTracker | None",
+    dry_run: bool = False,
+    *,
+    select: Callable[[str], bool] | None = None,
+) -> list[dict]:
+    """Extract ZIP to temp directory and merge contents into current directory.
+
+    Only entries that differ from what is already on disk are written. With dry_run,
+    the merge plan is computed and returned without touching project_path.
+    """
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = Path(temp_dir)
-        zip_ref.extractall(temp_path)
+        extract_zip(zip_ref, temp_path, select=select)
 
         extracted_items = list(temp_path.iterdir())
         if tracker:
@@ -531,20 +1474,50 @@ def _extract_and_merge_to_current_dir(
             console.print(f"[cyan]Extracted {len(extracted_items)} items to temp location[/cyan]")
 
         source_dir = _get_source_dir_from_extracted(extracted_items, temp_path, verbose, tracker)
+        return _merge_source_into_project(source_dir, project_path, verbose, tracker, dry_run)
 
-        for item in source_dir.iterdir():
-            dest_path = project_path / item.name
-            _merge_item_to_dest(item, dest_path, verbose, tracker)
 
-        if verbose and not tracker:
-            console.print("[cyan]Template files merged into current directory[/cyan]")
+def _merge_source_into_project(
+    source_dir: Path,
+    project_path: Path,
+    verbose: bool,
+    tracker: "StepTracker | None",
+    dry_run: bool,
+    *,
+    link_mode: str = "copy",
+) -> list[dict]:
+    """Plan the merge of a template tree into project_path and apply it unless dry_run."""
+    if tracker:
+        tracker.add("merge-plan", "Compute merge plan")
+        tracker.start("merge-plan")
+    plan = build_merge_plan(source_dir, project_path)
+    if tracker:
+        tracker.complete("merge-plan", summarize_merge_plan(plan))
+        tracker.record("merge-plan", files=len(plan))
+    elif verbose:
+        console.print(f"[cyan]Merge plan:[/cyan] {summarize_merge_plan(plan)}")
+
+    if dry_run:
+        return plan
+
+    apply_merge_plan(plan, project_path, verbose, tracker, link_mode)
+
+    if verbose and not tracker:
+        console.print("[cyan]Template files merged into current directory[/cyan]")
+
+    return plan
 
 
 def _extract_to_new_directory(
-    zip_ref: zipfile.ZipFile, project_path: Path, verbose: bool, tracker: "StepTracker | None"
+    zip_ref: zipfile.ZipFile,
+    project_path: Path,
+    verbose: bool,
+    tracker: "StepTracker | None",
+    *,
+    select: Callable[[str], bool] | None = None,
 ) -> None:
     """Extract ZIP directly to project path and flatten if needed."""
-    zip_ref.extractall(project_path)
+    extract_zip(zip_ref, project_path, select=select)
 
     extracted_items = list(project_path.iterdir())
     if tracker:
@@ -571,33 +1544,266 @@ def _extract_to_new_directory(
             console.print("[cyan]Flattened nested directory structure[/cyan]")
 
 
-def download_template_from_github(
-    ai_assistant: str,
-    download_dir: Path,
-    *,
-    verbose: bool = True,
-    show_progress: bool = True,
-    http_client: httpx.Client = None,
-    debug: bool = False,
-    github_token: str | None = None,
-) -> tuple[Path, dict]:
-    """Download the template ZIP from GitHub Releases."""
-    repo_owner = "sasaron"
-    repo_name = "refactor-kit"
-    if http_client is None:
-        http_client = _get_http_client()
+TEMPLATE_SOURCES = ("auto", "bundled", "release")
 
-    if verbose:
-        console.print("[cyan]Fetching latest release information...[/cyan]")
-    api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/releases/latest"
 
+def _bundled_templates_dir() -> Path | None:
+    """Return the templates shipped with the CLI: package data in a wheel, the repo checkout otherwise."""
+    packaged = Path(__file__).parent / "templates"
+    if (packaged / "commands").is_dir():
+        return packaged
+    checkout = Path(__file__).resolve().parents[2] / "templates"
+    if (checkout / "commands").is_dir():
+        return checkout
+    return None
+
+
+def _parse_version_tag(tag: str) -> tuple[int, ...] | None:
+    """Parse 'v1.2.3' (or '1.2.3-dev') into a comparable tuple, or None if it is not a version."""
+    match = re.match(r"v?(\d+(?:\.\d+)*)", tag.strip())
+    return tuple(int(part) for part in match.group(1).split(".")) if match else None
+
+
+def render_agent_package(ai_assistant: str, dest: Path, templates_dir: Path | None = None) -> list[Path]:
+    """Render an agent's template layout into dest, the same layout as the release ZIPs.
+
+    Creates .refactor/{memory,templates,refactorings}, copies templates/*.md into
+    .refactor/templates and writes each templates/commands/<name>.md to the agent's
+    folder from AGENT_CONFIG as refactor.<name>.md. Returns the written files relative to dest.
+    """
+    if ai_assistant not in AGENT_CONFIG:
+        raise ValueError(f"Unknown AI assistant '{ai_assistant}'")
+    templates_dir = templates_dir or _bundled_templates_dir()
+    if templates_dir is None:
+        raise FileNotFoundError("Bundled templates are not available in this installation")
+
+    refactor_dir = dest / ".refactor"
+    for sub in ("memory", "templates", "refactorings"):
+        (refactor_dir / sub).mkdir(parents=True, exist_ok=True)
+    commands_dir = dest / AGENT_CONFIG[ai_assistant]["folder"]
+    commands_dir.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    for template in sorted(templates_dir.glob("*.md")):
+        shutil.copyfile(template, refactor_dir / "templates" / template.name)
+        written.append(Path(".refactor", "templates", template.name))
+    for command in sorted((templates_dir / "commands").glob("*.md")):
+        target = commands_dir / f"refactor.{command.name}"
+        shutil.copyfile(command, target)
+        written.append(target.relative_to(dest))
+    return written
+
+
+# Checksum manifest published next to the template ZIPs in each release (sha256sum format)
+CHECKSUM_MANIFEST_NAME = "SHA256SUMS"
+# Asset key of the release archive that holds the shared tree plus every agent's commands
+COMBINED_TEMPLATE_KEY = "all"
+
+
+def _cache_dir() -> Path:
+    """Return the CLI cache directory ($REFACTOR_CACHE_DIR, else the user cache directory)."""
+    override = os.getenv("REFACTOR_CACHE_DIR", "").strip()
+    return Path(override) if override else Path(platformdirs.user_cache_dir("refactor-cli"))
+
+
+def _template_cache_dir() -> Path:
+    """Return the directory holding verified template archives, named by their SHA-256 digest."""
+    return _cache_dir() / "templates"
+
+
+def shared_template_tree(key: str, populate: Callable[[Path], object]) -> Path:
+    """Return the read-only template tree cached under key, calling populate(dir) to build it on first use.
+
+    Projects scaffolded with a link mode other than copy are placed from these trees, so
+    bulk inits on one filesystem share a single copy of the template bytes. A tree is built
+    in a private directory and renamed into place, so concurrent inits never see a partial
+    tree. Its files are made read-only because hardlinked projects share their inodes, and its
+    shell scripts get their execute bits here, since a later chmod in one project would change
+    the mode of every project linked to the same file.
+    """
+    tree = _cache_dir() / "trees" / key
+    if tree.is_dir():
+        return tree
+    tree.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=tree.parent))
+    try:
+        populate(staging)
+        for path in staging.rglob("*"):
+            if path.is_file():
+                mode = path.stat().st_mode & ~0o222
+                path.chmod(_executable_mode(mode) if _is_posix_script(path) else mode)
+        try:
+            staging.rename(tree)
+        except OSError:
+            # Another process published the same tree first
+            if not tree.is_dir():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return tree
+
+
+def _release_template_tree(zip_path: Path, archive_sha256: str, ai_assistant: str) -> Path:
+    """Return the shared tree of an agent's files from a verified release archive."""
+
+    def populate(staging: Path) -> None:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            extract_zip(zip_ref, staging, select=template_member_filter([ai_assistant]))
+
+    tree = shared_template_tree(f"{archive_sha256}-{ai_assistant}", populate)
+    return _get_source_dir_from_extracted(list(tree.iterdir()), tree, False, None)
+
+
+def _bundled_template_tree(ai_assistant: str) -> Path:
+    """Return the shared tree of an agent's bundled templates, keyed by their content."""
+    templates_dir = _bundled_templates_dir()
+    if templates_dir is None:
+        raise FileNotFoundError("Bundled templates are not available in this installation")
+    digest = hashlib.sha256(json.dumps(_hash_tree(templates_dir), sort_keys=True).encode()).hexdigest()
+    return shared_template_tree(
+        f"bundled-{digest}-{ai_assistant}", lambda staging: render_agent_package(ai_assistant, staging, templates_dir)
+    )
+
+
+def _place_template_tree(
+    source_dir: Path,
+    project_path: Path,
+    is_current_dir: bool,
+    link_mode: str,
+    *,
+    verbose: bool,
+    tracker: "StepTracker | None",
+) -> list[dict]:
+    """Place a shared template tree into project_path with link_mode, merging into existing content."""
+    if is_current_dir:
+        return _merge_source_into_project(source_dir, project_path, verbose, tracker, False, link_mode=link_mode)
+    project_path.mkdir(parents=True)
+    plan = build_merge_plan(source_dir, project_path)
+    placed = apply_merge_plan(plan, project_path, verbose, tracker, link_mode)
+    if verbose and not tracker:
+        console.print(f"[cyan]Placed template files:[/cyan] {placed or 'none'}")
+    return plan
+
+
+def _parse_checksum_manifest(text: str) -> dict[str, str]:
+    """Parse sha256sum output ('<hex>  <name>' or '<hex> *<name>') into {name: hex}."""
+    checksums = {}
+    for line in text.splitlines():
+        parts = line.strip().split(maxsplit=1)
+        if len(parts) != 2 or len(parts[0]) != 64:
+            continue
+        checksums[parts[1].lstrip("*").strip()] = parts[0].lower()
+    return checksums
+
+
+# Release sources are tried in this order unless REFACTOR_RELEASE_SOURCES or the config file says otherwise
+RELEASE_SOURCES_ENV = "REFACTOR_RELEASE_SOURCES"
+DEFAULT_RELEASE_SOURCES = ("github",)
+GITHUB_REPO = "sasaron/refactor-kit"
+# Release metadata file served by mirrors, in the GitHub releases API format
+MIRROR_INDEX_NAME = "latest.json"
+RELEASE_CACHE_INDEX_NAME = "releases.json"
+SOURCE_STATS_NAME = "source-stats.json"
+# Tag -> asset index of every release metadata fetched so far, so pinned releases need no lookup
+RELEASE_INDEX_NAME = "release-index.json"
+# GitHub API call budget shared by every CLI process on the host, and the lock that guards it
+RATE_BUDGET_NAME = "github-rate-budget.json"
+RATE_BUDGET_LOCK_NAME = "github-rate-budget.lock"
+# Longest a CLI run waits for the shared budget before failing (REFACTOR_RATE_LIMIT_MAX_WAIT overrides)
+RATE_BUDGET_MAX_WAIT = 300.0
+# Once fewer than this share of the hourly limit is left, calls are spaced evenly until the reset
+RATE_BUDGET_PACE_FRACTION = 0.2
+
+
+def _state_dir() -> Path:
+    """Return the directory for runtime state such as release source stats ($REFACTOR_STATE_DIR overrides)."""
+    override = os.getenv("REFACTOR_STATE_DIR", "").strip()
+    return Path(override) if override else Path(platformdirs.user_state_dir("refactor-cli"))
+
+
+def _config_path() -> Path:
+    """Return the CLI config file ($REFACTOR_CONFIG, else config.json in the user config directory)."""
+    override = os.getenv("REFACTOR_CONFIG", "").strip()
+    return Path(override) if override else Path(platformdirs.user_config_dir("refactor-cli")) / "config.json"
+
+
+def _local_path(url: str) -> Path | None:
+    """Return the filesystem path of a file:// URL, or None for any other scheme."""
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme != "file":
+        return None
+    return Path(urllib.request.url2pathname(parsed.path))
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _read_json_file(path: Path) -> dict:
     try:
-        response = http_client.get(
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class ReleaseSource(abc.ABC):
+    """A place release metadata and its template archives can be fetched from.
+
+    latest_release() and release(tag) return metadata in the GitHub releases API format:
+    {"tag_name": ..., "assets": [{"name", "size", "browser_download_url", "digest" (optional)}]}.
+    Subclasses must implement both; one that does not cannot be constructed.
+    """
+
+    kind = ""
+    # Mirrors are expected to be close; a short connect timeout lets the next source take over quickly
+    timeout = httpx.Timeout(10.0, connect=3.0)
+
+    def __init__(self, spec: str):
+        self.spec = spec
+
+    @abc.abstractmethod
+    async def latest_release(self, http_client, *, debug: bool, github_token: str | None) -> dict:
+        """Return the metadata of the newest release this source offers, raising RuntimeError if it has none."""
+
+    @abc.abstractmethod
+    async def release(self, tag: str, http_client, *, debug: bool, github_token: str | None) -> dict:
+        """Return the metadata of the release tagged tag, raising RuntimeError if this source does not offer it."""
+
+
+class GitHubReleaseSource(ReleaseSource):
+    """The GitHub releases API of a repository (sasaron/refactor-kit unless given as github:OWNER/REPO)."""
+
+    kind = "github"
+    timeout = 30
+
+    def __init__(self, spec: str, repo: str = GITHUB_REPO):
+        super().__init__(spec)
+        self.repo = repo
+
+    async def latest_release(self, http_client, *, debug: bool, github_token: str | None) -> dict:
+        """Return the metadata of the repository's latest release."""
+        api_url = f"https://api.github.com/repos/{self.repo}/releases/latest"
+        return await self._get_release(api_url, http_client, debug=debug, github_token=github_token)
+
+    async def release(self, tag: str, http_client, *, debug: bool, github_token: str | None) -> dict:
+        """Return the metadata of a tagged release from the /releases/tags/ endpoint."""
+        api_url = f"https://api.github.com/repos/{self.repo}/releases/tags/{urllib.parse.quote(tag, safe='')}"
+        return await self._get_release(api_url, http_client, debug=debug, github_token=github_token)
+
+    async def _get_release(self, api_url: str, http_client, *, debug: bool, github_token: str | None) -> dict:
+        await asyncio.to_thread(reserve_github_api_call, github_token)
+        response = await _download_engine.get(
+            http_client,
             api_url,
-            timeout=30,
+            timeout=self.timeout,
             follow_redirects=True,
             headers=_github_auth_headers(github_token),
         )
+        await asyncio.to_thread(observe_github_rate_limit, github_token, response.headers)
         status = response.status_code
         if status != 200:
             error_msg = _format_rate_limit_error(status, response.headers, api_url)
@@ -605,129 +1811,1261 @@ def download_template_from_github(
                 error_msg += f"\n\n[dim]Response body (truncated 500):[/dim]\n{response.text[:500]}"
             raise RuntimeError(error_msg)
         try:
-            release_data = response.json()
+            return response.json()
         except ValueError as je:
             raise RuntimeError(f"Failed to parse release JSON: {je}\nRaw (truncated 400): {response.text[:400]}")
-    except Exception as e:
-        console.print("[red]Error fetching release information[/red]")
-        console.print(Panel(str(e), title="Fetch Error", border_style="red"))
-        raise typer.Exit(1)
 
-    assets = release_data.get("assets", [])
-    pattern = f"refactor-kit-template-{ai_assistant}"
-    matching_assets = [asset for asset in assets if pattern in asset["name"] and asset["name"].endswith(".zip")]
 
-    asset = matching_assets[0] if matching_assets else None
+class MirrorReleaseSource(ReleaseSource):
+    """An http(s):// or file:// directory serving latest.json next to the release assets.
 
-    if asset is None:
-        console.print(
-            f"[red]No matching release asset found[/red] for [bold]{ai_assistant}[/bold] (expected pattern: [bold]{pattern}[/bold])"
-        )
-        asset_names = [a.get("name", "?") for a in assets]
-        console.print(Panel("\n".join(asset_names) or "(no assets)", title="Available Assets", border_style="yellow"))
-        raise typer.Exit(1)
+    Asset URLs in latest.json may be relative to the mirror, and assets without a URL are
+    looked up by name next to latest.json. A file:// directory without latest.json is indexed
+    from the newest template archives it contains.
+    """
 
-    download_url = asset["browser_download_url"]
-    filename = asset["name"]
-    file_size = asset["size"]
+    kind = "mirror"
 
-    if verbose:
-        console.print(f"[cyan]Found template:[/cyan] {filename}")
-        console.print(f"[cyan]Size:[/cyan] {file_size:,} bytes")
-        console.print(f"[cyan]Release:[/cyan] {release_data['tag_name']}")
+    def __init__(self, spec: str):
+        super().__init__(spec)
+        self.base_url = spec.rstrip("/") + "/"
 
-    zip_path = download_dir / filename
-    if verbose:
-        console.print("[cyan]Downloading template...[/cyan]")
+    async def latest_release(self, http_client, *, debug: bool, github_token: str | None) -> dict:  # noqa: ARG002
+        """Return the release described by the mirror's latest.json."""
+        directory = _local_path(self.base_url)
+        if directory is not None and not (directory / MIRROR_INDEX_NAME).exists():
+            return _index_release_directory(directory)
+        return await self._read_index(http_client, MIRROR_INDEX_NAME)
 
+    async def release(self, tag: str, http_client, *, debug: bool, github_token: str | None) -> dict:  # noqa: ARG002
+        """Return the release described by <tag>.json, or by latest.json when that is the requested tag."""
+        directory = _local_path(self.base_url)
+        if directory is not None and not (directory / MIRROR_INDEX_NAME).exists():
+            return _index_release_directory(directory, tag)
+        try:
+            return await self._read_index(http_client, f"{tag}.json")
+        except RuntimeError as e:
+            release_data = await self._read_index(http_client, MIRROR_INDEX_NAME)
+            if release_data.get("tag_name") != tag:
+                raise RuntimeError(f"{self.spec} does not offer release {tag}") from e
+            return release_data
+
+    async def _read_index(self, http_client, name: str) -> dict:
+        index_url = urllib.parse.urljoin(self.base_url, name)
+        response = await _download_engine.get(http_client, index_url, timeout=self.timeout, follow_redirects=True)
+        if response.status_code != 200:
+            raise RuntimeError(f"{index_url} returned HTTP {response.status_code}")
+        try:
+            release_data = response.json()
+        except ValueError as je:
+            raise RuntimeError(f"Failed to parse {index_url}: {je}")
+        assets = []
+        for asset in release_data.get("assets", []):
+            url = urllib.parse.urljoin(self.base_url, asset.get("browser_download_url") or asset["name"])
+            assets.append({**asset, "browser_download_url": url, "size": asset.get("size", 0)})
+        return {**release_data, "assets": assets}
+
+
+def _index_release_directory(directory: Path, tag: str | None = None) -> dict:
+    """Build release metadata for the template archives of tag (the newest by default) in a local directory."""
+    tagged = {}
+    for archive in directory.glob("refactor-kit-template-*.zip"):
+        match = re.search(r"-(v\d+(?:\.\d+)*)\.zip$", archive.name)
+        if match:
+            tagged.setdefault(match.group(1), []).append(archive)
+    if not tagged:
+        raise RuntimeError(f"No template archives found in {directory}")
+    if tag is None:
+        tag = max(tagged, key=_parse_version_tag)
+    elif tag not in tagged:
+        raise RuntimeError(f"No {tag} template archives found in {directory}")
+    files = sorted(tagged[tag])
+    if (directory / CHECKSUM_MANIFEST_NAME).is_file():
+        files.append(directory / CHECKSUM_MANIFEST_NAME)
+    assets = [{"name": f.name, "size": f.stat().st_size, "browser_download_url": f.resolve().as_uri()} for f in files]
+    return {"tag_name": tag, "assets": assets}
+
+
+class CacheReleaseSource(ReleaseSource):
+    """The newest release whose archives were already downloaded and verified into the template cache."""
+
+    kind = "cache"
+
+    async def latest_release(self, http_client, *, debug: bool, github_token: str | None) -> dict:  # noqa: ARG002
+        """Return the newest cached release, listing only the archives that are still in the cache."""
+        cache_dir = _template_cache_dir()
+        index = _read_json_file(cache_dir / RELEASE_CACHE_INDEX_NAME)
+        for tag in sorted(index, key=lambda t: _parse_version_tag(t) or (), reverse=True):
+            assets = self._cached_assets(index[tag])
+            if assets:
+                return {"tag_name": tag, "assets": assets}
+        raise RuntimeError(f"No cached releases in {cache_dir}")
+
+    async def release(self, tag: str, http_client, *, debug: bool, github_token: str | None) -> dict:  # noqa: ARG002
+        """Return the cached archives of a tagged release."""
+        cache_dir = _template_cache_dir()
+        assets = self._cached_assets(_read_json_file(cache_dir / RELEASE_CACHE_INDEX_NAME).get(tag, {}))
+        if not assets:
+            raise RuntimeError(f"Release {tag} is not in {cache_dir}")
+        return {"tag_name": tag, "assets": assets}
+
+    @staticmethod
+    def _cached_assets(entries: dict) -> list[dict]:
+        cache_dir = _template_cache_dir()
+        return [
+            {
+                "name": name,
+                "size": entry["size"],
+                "digest": f"sha256:{entry['sha256']}",
+                "browser_download_url": (cache_dir / f"{entry['sha256']}.zip").as_uri(),
+            }
+            for name, entry in entries.items()
+            if (cache_dir / f"{entry['sha256']}.zip").is_file()
+        ]
+
+
+def _record_cached_release(tag: str, name: str, sha256: str, size: int) -> None:
+    """Remember which release asset a cached archive belongs to, for the cache release source."""
+    index_path = _template_cache_dir() / RELEASE_CACHE_INDEX_NAME
+    index = _read_json_file(index_path)
+    index.setdefault(tag, {})[name] = {"sha256": sha256, "size": size}
     try:
-        with http_client.stream(
-            "GET",
-            download_url,
-            timeout=60,
-            follow_redirects=True,
-            headers=_github_auth_headers(github_token),
-        ) as response:
-            if response.status_code != 200:
-                error_msg = _format_rate_limit_error(response.status_code, response.headers, download_url)
-                if debug:
-                    try:
-                        error_body = response.text[:400]
-                    except UnicodeDecodeError:
-                        error_body = repr(response.content[:400])
-                    error_msg += f"\n\n[dim]Response body (truncated 400):[/dim]\n{error_body}"
-                raise RuntimeError(error_msg)
-            total_size = int(response.headers.get("content-length", 0))
-            with open(zip_path, "wb") as f:
-                if total_size == 0:
-                    f.writelines(response.iter_bytes(chunk_size=8192))
-                elif show_progress:
-                    with Progress(
-                        SpinnerColumn(),
-                        TextColumn("[progress.description]{task.description}"),
-                        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-                        console=console,
-                    ) as progress:
-                        task = progress.add_task("Downloading...", total=total_size)
-                        downloaded = 0
-                        for chunk in response.iter_bytes(chunk_size=8192):
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            progress.update(task, completed=downloaded)
-                else:
-                    for chunk in response.iter_bytes(chunk_size=8192):
-                        f.write(chunk)
-    except Exception as e:
-        console.print("[red]Error downloading template[/red]")
-        detail = str(e)
-        if zip_path.exists():
-            zip_path.unlink()
-        console.print(Panel(detail, title="Download Error", border_style="red"))
-        raise typer.Exit(1)
+        _write_json_atomic(index_path, index)
+    except OSError as e:
+        debug_print(f"Could not update {index_path}: {e}")
+
+
+def normalize_release_tag(tag: str) -> str:
+    """Return a release tag in the repository's vX.Y.Z form ("1.2.3" becomes "v1.2.3")."""
+    tag = tag.strip()
+    return f"v{tag}" if tag[:1].isdigit() else tag
+
+
+def read_release_index() -> dict[str, dict]:
+    """Return the persisted tag -> {"source", "assets"} index of release metadata seen so far."""
+    return _read_json_file(_state_dir() / RELEASE_INDEX_NAME)
+
+
+def _record_release_index(release_data: dict) -> None:
+    """Add a release's asset names, sizes, URLs and digests to the release index."""
+    tag = release_data.get("tag_name")
+    if not tag:
+        return
+    index_path = _state_dir() / RELEASE_INDEX_NAME
+    index = _read_json_file(index_path)
+    fields = ("name", "size", "browser_download_url", "digest")
+    index[tag] = {
+        "source": release_data.get("source", "github"),
+        "assets": [{key: asset[key] for key in fields if asset.get(key)} for asset in release_data.get("assets", [])],
+    }
+    try:
+        _write_json_atomic(index_path, index)
+    except OSError as e:
+        debug_print(f"Could not update {index_path}: {e}")
+
+
+def _indexed_release(tag: str) -> dict | None:
+    """Return a release's metadata from the release index, or None if it was never fetched.
+
+    Assets that were downloaded and verified before gain their digest from the template
+    cache, so a pinned init of a cached release makes no request at all.
+    """
+    entry = read_release_index().get(tag)
+    if not isinstance(entry, dict) or not entry.get("assets"):
+        return None
+    cached = _read_json_file(_template_cache_dir() / RELEASE_CACHE_INDEX_NAME).get(tag, {})
+    assets = []
+    for indexed in entry["assets"]:
+        asset = {"size": 0, **indexed}
+        if not asset.get("digest") and asset["name"] in cached:
+            asset["digest"] = f"sha256:{cached[asset['name']]['sha256']}"
+        assets.append(asset)
+    return {"tag_name": tag, "assets": assets, "source": entry.get("source", "github"), "indexed": True}
+
+
+def parse_release_source(spec: str) -> ReleaseSource:
+    """Build a release source from its spec: github, github:OWNER/REPO, cache, or an http(s):// or file:// URL."""
+    spec = spec.strip()
+    if spec == "github":
+        return GitHubReleaseSource(spec)
+    if spec.startswith("github:") and "/" in spec:
+        return GitHubReleaseSource(spec, spec.split(":", 1)[1])
+    if spec == "cache":
+        return CacheReleaseSource(spec)
+    if spec.startswith(("http://", "https://", "file://")):
+        return MirrorReleaseSource(spec)
+    raise ValueError(
+        f"Unknown release source '{spec}'. Use github, github:OWNER/REPO, cache, or an http(s):// or file:// URL"
+    )
+
+
+def configured_release_sources() -> list[ReleaseSource]:
+    """Return the release sources in priority order.
+
+    REFACTOR_RELEASE_SOURCES (comma-separated specs) takes precedence over the
+    "release_sources" list in the config file; without either, only GitHub is used.
+    """
+    env_specs = os.getenv(RELEASE_SOURCES_ENV, "").strip()
+    if env_specs:
+        specs = [spec for spec in env_specs.split(",") if spec.strip()]
+    else:
+        config_path = _config_path()
+        config = {}
+        if config_path.is_file():
+            try:
+                config = json.loads(config_path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                raise ValueError(f"Invalid config file {config_path}: {e}") from e
+        specs = config.get("release_sources") or list(DEFAULT_RELEASE_SOURCES)
+    return [parse_release_source(spec) for spec in specs]
+
+
+def read_source_stats() -> dict[str, dict]:
+    """Return the recorded latency stats of every release source, keyed by spec."""
+    return _read_json_file(_state_dir() / SOURCE_STATS_NAME)
+
+
+def _record_source_latency(spec: str, elapsed_ms: float, error: Exception | None = None) -> None:
+    """Record one release lookup against a source; successful lookups update a moving average latency."""
+    stats_path = _state_dir() / SOURCE_STATS_NAME
+    stats = _read_json_file(stats_path)
+    entry = stats.setdefault(spec, {"attempts": 0, "failures": 0, "avg_ms": None, "last_ms": None, "last_error": None})
+    entry["attempts"] += 1
+    entry["last_ms"] = round(elapsed_ms, 1)
+    if error is not None:
+        entry["failures"] += 1
+        entry["last_error"] = str(error).splitlines()[0][:200] if str(error) else type(error).__name__
+    else:
+        avg = entry["avg_ms"]
+        entry["avg_ms"] = round(elapsed_ms if avg is None else 0.8 * avg + 0.2 * elapsed_ms, 1)
+    try:
+        _write_json_atomic(stats_path, stats)
+    except OSError as e:
+        debug_print(f"Could not update {stats_path}: {e}")
+
+
+@contextlib.contextmanager
+def _state_file_lock(name: str):
+    """Hold an exclusive lock on a file in the state directory, shared by every CLI process on the host."""
+    lock_path = _state_dir() / name
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _rate_budget_key(github_token: str | None) -> str:
+    """Return the budget bucket for a token: GitHub limits each token, and anonymous calls per host."""
+    token = _github_token(github_token)
+    return f"token-{hashlib.sha256(token.encode()).hexdigest()[:16]}" if token else "anonymous"
+
+
+def read_rate_budget() -> dict[str, dict]:
+    """Return the shared GitHub API budget: {bucket: {"limit", "remaining", "reset", "last_call"}}."""
+    return _read_json_file(_state_dir() / RATE_BUDGET_NAME)
+
+
+def _rate_budget_wait(entry: dict | None, now: float) -> float:
+    """Return how long the next API call has to wait under a budget entry (0 to go ahead now)."""
+    if not entry or now >= entry["reset"]:
+        return 0.0
+    remaining = entry["remaining"]
+    if remaining <= 0:
+        return entry["reset"] - now + 1
+    if remaining > entry["limit"] * RATE_BUDGET_PACE_FRACTION:
+        return 0.0
+    last_call = entry.get("last_call", now)
+    return max(0.0, last_call + (entry["reset"] - last_call) / remaining - now)
+
+
+def reserve_github_api_call(
+    github_token: str | None, *, max_wait: float | None = None, sleep: Callable[[float], None] = time.sleep
+) -> float:
+    """Take one GitHub API call from the budget shared by every CLI process on this host.
+
+    The budget is seeded from the X-RateLimit headers GitHub returns (observe_github_rate_limit)
+    and decremented under a file lock for each call, so concurrent runs queue for the reset
+    instead of all hitting the limit; near the limit, calls are paced evenly over the rest of
+    the window. Returns the seconds waited; raises RuntimeError if the wait would exceed
+    max_wait (REFACTOR_RATE_LIMIT_MAX_WAIT, 300 seconds by default).
+    """
+    if max_wait is None:
+        try:
+            max_wait = float(os.getenv("REFACTOR_RATE_LIMIT_MAX_WAIT", RATE_BUDGET_MAX_WAIT))
+        except ValueError:
+            max_wait = RATE_BUDGET_MAX_WAIT
+    key = _rate_budget_key(github_token)
+    budget_path = _state_dir() / RATE_BUDGET_NAME
+    waited = 0.0
+    while True:
+        try:
+            with _state_file_lock(RATE_BUDGET_LOCK_NAME):
+                budget = _read_json_file(budget_path)
+                entry = budget.get(key)
+                now = time.time()
+                wait = _rate_budget_wait(entry, now)
+                if wait <= 0:
+                    if entry and now < entry["reset"]:
+                        entry["remaining"] -= 1
+                        entry["last_call"] = now
+                        _write_json_atomic(budget_path, budget)
+                    return waited
+        except OSError as e:
+            # An unwritable state directory costs the coordination, not the API call
+            debug_print(f"Shared GitHub API budget unavailable: {e}")
+            return waited
+        if waited + wait > max_wait:
+            reset_at = datetime.fromtimestamp(entry["reset"], tz=UTC).astimezone().strftime("%H:%M:%S")
+            raise RuntimeError(
+                f"GitHub API budget for this host is exhausted ({entry['remaining']} of {entry['limit']} calls left, "
+                f"resets at {reset_at}); waiting {wait:.0f}s would exceed the {max_wait:.0f}s limit. "
+                "Use --github-token or GH_TOKEN/GITHUB_TOKEN for a higher limit."
+            )
+        # Wake up periodically: another process may observe a reset before the local clock reaches it
+        step = min(wait, 5.0)
+        debug_print(f"Waiting {step:.1f}s for the shared GitHub API budget")
+        sleep(step)
+        waited += step
+
+
+def observe_github_rate_limit(github_token: str | None, headers) -> None:
+    """Update the shared GitHub API budget from a response's X-RateLimit (or Retry-After) headers."""
+    try:
+        info = _parse_rate_limit_headers(headers)
+        remaining = int(info["remaining"]) if "remaining" in info else None
+        limit = int(info["limit"]) if "limit" in info else None
+    except ValueError:
+        return
+    now = time.time()
+    if "retry_after_seconds" in info:
+        remaining, reset = 0, now + info["retry_after_seconds"]
+    elif remaining is not None and "reset_epoch" in info:
+        reset = info["reset_epoch"]
+    else:
+        return
+    key = _rate_budget_key(github_token)
+    budget_path = _state_dir() / RATE_BUDGET_NAME
+    try:
+        with _state_file_lock(RATE_BUDGET_LOCK_NAME):
+            budget = _read_json_file(budget_path)
+            entry = budget.get(key) or {}
+            # Calls granted to other processes may still be in flight, so within one window trust the lower count
+            if entry.get("reset") == reset:
+                remaining = min(remaining, entry["remaining"])
+            budget[key] = {
+                "limit": limit or entry.get("limit") or remaining,
+                "remaining": remaining,
+                "reset": reset,
+                "last_call": entry.get("last_call", now),
+            }
+            _write_json_atomic(budget_path, budget)
+    except OSError as e:
+        debug_print(f"Could not update {budget_path}: {e}")
+
+
+def _sends_github_token(release_data: dict) -> bool:
+    """Return True when release assets come from GitHub, so the token may be sent with their requests."""
+    return parse_release_source(release_data.get("source", "github")).kind == "github"
+
+
+async def _fetch_checksum_manifest(manifest: dict, http_client, github_token: str | None) -> dict[str, str]:
+    """Fetch and parse a release's checksum manifest asset."""
+    manifest_url = manifest["browser_download_url"]
+    response = await _download_engine.get(
+        http_client,
+        manifest_url,
+        timeout=30,
+        follow_redirects=True,
+        headers=_github_auth_headers(github_token),
+    )
+    if response.status_code != 200:
+        raise RuntimeError(_format_rate_limit_error(response.status_code, response.headers, manifest_url))
+    return _parse_checksum_manifest(response.text)
+
+
+async def _expected_asset_sha256(
+    asset: dict, assets: list[dict], http_client, github_token: str | None, checksums: asyncio.Future | None = None
+) -> tuple[str | None, str | None]:
+    """Return (expected SHA-256, where it came from) for a release asset, or (None, None) if none is published.
+
+    The GitHub asset digest is preferred since it needs no extra request; otherwise the
+    release's checksum manifest is used, awaiting checksums when it is already being fetched
+    for other assets. A manifest that exists but cannot be read or does not list the asset is
+    an error rather than a silent downgrade to unverified.
+    """
+    digest = asset.get("digest") or ""
+    if digest.startswith("sha256:"):
+        return digest.split(":", 1)[1].lower(), "GitHub asset digest"
+
+    manifest = next((a for a in assets if a.get("name") == CHECKSUM_MANIFEST_NAME), None)
+    if manifest is None:
+        return None, None
+
+    if checksums is None:
+        parsed = await _fetch_checksum_manifest(manifest, http_client, github_token)
+    else:
+        parsed = await checksums
+    if asset["name"] not in parsed:
+        raise RuntimeError(f"{asset['name']} is not listed in {CHECKSUM_MANIFEST_NAME}")
+    return parsed[asset["name"]], CHECKSUM_MANIFEST_NAME
+
+
+def fetch_latest_release(
+    http_client: httpx.Client,
+    *,
+    debug: bool = False,
+    github_token: str | None = None,
+    sources: list["ReleaseSource"] | None = None,
+) -> dict:
+    """Fetch the latest release metadata, trying each release source in priority order.
+
+    sources defaults to configured_release_sources(). The first source that answers wins;
+    a failing source is skipped immediately and only when all of them fail is RuntimeError
+    raised, listing every error. Each attempt's latency is recorded in the source stats, and
+    the returned metadata gains a "source" key naming the source that answered.
+    """
+    return _query_release_sources(
+        sources, lambda source: source.latest_release(http_client, debug=debug, github_token=github_token)
+    )
+
+
+def fetch_release(
+    tag: str,
+    http_client: httpx.Client,
+    *,
+    debug: bool = False,
+    github_token: str | None = None,
+    sources: list["ReleaseSource"] | None = None,
+    use_index: bool = True,
+) -> dict:
+    """Fetch the metadata of a pinned release.
+
+    A tag already in the release index is answered from it with no request, since published
+    releases do not change; the metadata then has "indexed": True. Otherwise the sources are
+    tried in priority order like fetch_latest_release, and the answer is added to the index.
+    """
+    tag = normalize_release_tag(tag)
+    if use_index:
+        release_data = _indexed_release(tag)
+        if release_data is not None:
+            return release_data
+    return _query_release_sources(
+        sources, lambda source: source.release(tag, http_client, debug=debug, github_token=github_token)
+    )
+
+
+def _query_release_sources(sources: list["ReleaseSource"] | None, query: Callable) -> dict:
+    """Run query(source) against each release source in turn and return the first answer.
+
+    Every attempt's latency is recorded in the source stats; the answer gains a "source" key
+    and is added to the release index.
+    """
+    if sources is None:
+        sources = configured_release_sources()
+    errors = []
+    for source in sources:
+        start = time.perf_counter()
+        try:
+            release_data = _download_engine.run(query(source))
+        except Exception as e:
+            _record_source_latency(source.spec, (time.perf_counter() - start) * 1000, error=e)
+            debug_print(f"Release source {source.spec} failed: {e}")
+            errors.append((source.spec, e))
+            continue
+        _record_source_latency(source.spec, (time.perf_counter() - start) * 1000)
+        release_data["source"] = source.spec
+        _record_release_index(release_data)
+        return release_data
+    if len(errors) == 1:
+        raise RuntimeError(str(errors[0][1]))
+    raise RuntimeError("\n".join(f"{spec}: {error}" for spec, error in errors))
+
+
+class _AssetFetchError(RuntimeError):
+    """A template asset could not be fetched or verified; heading and title describe the failed stage."""
+
+    def __init__(self, heading: str, title: str, detail: str):
+        super().__init__(detail)
+        self.heading = heading
+        self.title = title
+
+
+def _find_template_asset(assets: list[dict], ai_assistant: str) -> dict | None:
+    """Return the release asset holding the template ZIP for an agent, if any.
+
+    The agent's own archive is preferred; releases that only publish the combined
+    all-agents archive fall back to it, and extraction then selects the agent's members.
+    """
+    for key in (ai_assistant, COMBINED_TEMPLATE_KEY):
+        pattern = f"refactor-kit-template-{key}"
+        asset = next((a for a in assets if pattern in a["name"] and a["name"].endswith(".zip")), None)
+        if asset is not None:
+            return asset
+    return None
+
+
+async def _fetch_template_asset(
+    asset: dict,
+    release_data: dict,
+    download_dir: Path,
+    *,
+    http_client,
+    github_token: str | None,
+    debug: bool,
+    use_cache: bool,
+    verbose: bool = False,
+    checksums: asyncio.Future | None = None,
+    progress: Progress | None = None,
+) -> tuple[Path, dict]:
+    """Resolve the checksum of a template asset, then serve it from the cache or download and verify it."""
+    if not _sends_github_token(release_data):
+        github_token = None
+    assets = release_data.get("assets", [])
+    filename = asset["name"]
+    file_size = asset["size"]
+    download_url = asset["browser_download_url"]
+
+    try:
+        expected_sha256, checksum_source = await _expected_asset_sha256(
+            asset, assets, http_client, github_token, checksums
+        )
+    except Exception as e:
+        raise _AssetFetchError("Error fetching template checksum", "Checksum Error", str(e)) from e
+
+    metadata = {
+        "filename": filename,
+        "size": file_size,
+        "release": release_data["tag_name"],
+        "source": release_data.get("source", "github"),
+        "asset_url": download_url,
+        "sha256": expected_sha256,
+        "verified": expected_sha256 is not None,
+        "cached": False,
+        "downloaded_bytes": 0,
+    }
+
+    cache_dir = _template_cache_dir() if use_cache and expected_sha256 else None
+    if cache_dir is not None:
+        cached_path = cache_dir / f"{expected_sha256}.zip"
+        if cached_path.is_file() and cached_path.stat().st_size == file_size:
+            if verbose:
+                console.print(f"[cyan]Using cached template:[/cyan] {cached_path}")
+            metadata["cached"] = True
+            return cached_path, metadata
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            debug_print(f"Template cache unavailable ({e}), downloading to {download_dir}")
+            cache_dir = None
+
+    # Verified downloads stream straight into the cache directory so storing them is a rename
+    if cache_dir is not None:
+        zip_path = cache_dir / f".{expected_sha256}.{os.getpid()}.{threading.get_ident()}.part"
+    else:
+        zip_path = download_dir / filename
+    if verbose:
+        console.print("[cyan]Downloading template...[/cyan]")
+
+    on_chunk = None
+    if progress is not None and file_size:
+        task = progress.add_task(f"Downloading {filename}...", total=file_size)
+
+        def on_chunk(size: int) -> None:
+            progress.advance(task, size)
+
+    try:
+        actual_sha256 = await _download_engine.download(
+            http_client,
+            download_url,
+            zip_path,
+            debug=debug,
+            on_chunk=on_chunk,
+            timeout=60,
+            follow_redirects=True,
+            headers=_github_auth_headers(github_token),
+        )
+    except Exception as e:
+        zip_path.unlink(missing_ok=True)
+        raise _AssetFetchError("Error downloading template", "Download Error", str(e)) from e
+
+    if expected_sha256 and actual_sha256 != expected_sha256:
+        zip_path.unlink(missing_ok=True)
+        raise _AssetFetchError(
+            "Downloaded template failed integrity verification",
+            "Checksum Mismatch",
+            f"{filename}\nExpected: {expected_sha256} ({checksum_source})\nActual:   {actual_sha256}",
+        )
+    metadata["sha256"] = actual_sha256
+    metadata["downloaded_bytes"] = zip_path.stat().st_size
+
+    if cache_dir is not None:
+        cached_path = cache_dir / f"{actual_sha256}.zip"
+        os.replace(zip_path, cached_path)
+        zip_path = cached_path
+        metadata["cached"] = True
+        _record_cached_release(release_data["tag_name"], filename, actual_sha256, file_size)
 
     if verbose:
         console.print(f"Downloaded: {filename}")
+        if metadata["verified"]:
+            console.print(f"[cyan]Verified SHA-256:[/cyan] {actual_sha256} ({checksum_source})")
 
-    metadata = {"filename": filename, "size": file_size, "release": release_data["tag_name"], "asset_url": download_url}
     return zip_path, metadata
 
 
-def download_and_extract_template(
-    project_path: Path,
+def _download_progress() -> Progress:
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+        console=console,
+    )
+
+
+def download_template_from_github(
     ai_assistant: str,
-    is_current_dir: bool = False,
+    download_dir: Path,
     *,
     verbose: bool = True,
-    tracker: StepTracker | None = None,
+    show_progress: bool = True,
     http_client: httpx.Client = None,
     debug: bool = False,
     github_token: str | None = None,
-) -> Path:
-    """Download the latest release and extract it to create a new project."""
-    current_dir = Path.cwd()
+    use_cache: bool = True,
+    release_data: dict | None = None,
+) -> tuple[Path, dict]:
+    """Download the template ZIP from GitHub Releases.
+
+    The SHA-256 of the archive is computed while it streams to disk and checked against
+    the published checksum before the archive is returned. Verified archives are kept in
+    the template cache under their digest, so later downloads of the same asset are served
+    from disk; in that case metadata["cached"] is True and the caller must not delete the file.
+    Pass release_data to reuse release metadata that was already fetched.
+    """
+    if http_client is None:
+        http_client = _get_http_client()
+
+    if release_data is None:
+        if verbose:
+            console.print("[cyan]Fetching latest release information...[/cyan]")
+        try:
+            release_data = fetch_latest_release(http_client, debug=debug, github_token=github_token)
+        except Exception as e:
+            console.print("[red]Error fetching release information[/red]")
+            console.print(Panel(str(e), title="Fetch Error", border_style="red"))
+            raise typer.Exit(1)
+
+    assets = release_data.get("assets", [])
+    asset = _find_template_asset(assets, ai_assistant)
+
+    if asset is None:
+        pattern = f"refactor-kit-template-{ai_assistant}"
+        combined = f"refactor-kit-template-{COMBINED_TEMPLATE_KEY}"
+        console.print(
+            f"[red]No matching release asset found[/red] for [bold]{ai_assistant}[/bold] (expected pattern: [bold]{pattern}[/bold] or [bold]{combined}[/bold])"
+        )
+        asset_names = [a.get("name", "?") for a in assets]
+        console.print(Panel("\n".join(asset_names) or "(no assets)", title="Available Assets", border_style="yellow"))
+        raise typer.Exit(1)
+
+    if verbose:
+        console.print(f"[cyan]Found template:[/cyan] {asset['name']}")
+        console.print(f"[cyan]Size:[/cyan] {asset['size']:,} bytes")
+        console.print(f"[cyan]Release:[/cyan] {release_data['tag_name']}")
+
+    fetch_kwargs = {
+        "http_client": http_client,
+        "github_token": github_token,
+        "debug": debug,
+        "use_cache": use_cache,
+        "verbose": verbose,
+    }
+    try:
+        if show_progress:
+            with _download_progress() as progress:
+                return _download_engine.run(
+                    _fetch_template_asset(asset, release_data, download_dir, progress=progress, **fetch_kwargs)
+                )
+        return _download_engine.run(_fetch_template_asset(asset, release_data, download_dir, **fetch_kwargs))
+    except _AssetFetchError as e:
+        console.print(f"[red]{e.heading}[/red]")
+        console.print(Panel(str(e), title=e.title, border_style="red"))
+        raise typer.Exit(1)
+
+
+def download_release_assets(
+    ai_assistants: list[str],
+    download_dir: Path,
+    *,
+    http_client: httpx.Client | None = None,
+    github_token: str | None = None,
+    release_data: dict | None = None,
+    use_cache: bool = True,
+    show_progress: bool = False,
+    debug: bool = False,
+) -> dict[str, tuple[Path, dict]]:
+    """Download and verify the template archives of several agents concurrently.
+
+    The release metadata and the checksum manifest are fetched once and shared, and the
+    asset downloads run in parallel on the download engine, so the whole batch takes about
+    as long as its slowest archive. Agents served by the same asset, such as the combined
+    all-agents archive, share one download. Returns {agent: (zip_path, metadata)} with the
+    same metadata as download_template_from_github; raises RuntimeError on the first failure.
+    """
+    if http_client is None:
+        http_client = _get_http_client()
+    if release_data is None:
+        release_data = fetch_latest_release(http_client, debug=debug, github_token=github_token)
+
+    assets = release_data.get("assets", [])
+    # One combined archive is cheaper than an archive per agent once several are requested
+    combined = _find_template_asset(assets, COMBINED_TEMPLATE_KEY) if len(set(ai_assistants)) > 1 else None
+    selected = {}
+    for ai in ai_assistants:
+        asset = combined or _find_template_asset(assets, ai)
+        if asset is None:
+            raise RuntimeError(f"No release asset found for {ai} in {release_data.get('tag_name', 'release')}")
+        selected[ai] = asset
+    unique_assets = {asset["name"]: asset for asset in selected.values()}
+
+    if not _sends_github_token(release_data):
+        github_token = None
+    manifest = next((a for a in assets if a.get("name") == CHECKSUM_MANIFEST_NAME), None)
+    needs_manifest = manifest is not None and any(
+        not (a.get("digest") or "").startswith("sha256:") for a in unique_assets.values()
+    )
+
+    async def _fetch_all(progress: Progress | None) -> list[tuple[Path, dict]]:
+        checksums = None
+        if needs_manifest:
+            checksums = asyncio.ensure_future(_fetch_checksum_manifest(manifest, http_client, github_token))
+        try:
+            return await asyncio.gather(
+                *(
+                    _fetch_template_asset(
+                        asset,
+                        release_data,
+                        download_dir,
+                        http_client=http_client,
+                        github_token=github_token,
+                        debug=debug,
+                        use_cache=use_cache,
+                        checksums=checksums,
+                        progress=progress,
+                    )
+                    for asset in unique_assets.values()
+                )
+            )
+        finally:
+            if checksums is not None and not checksums.done():
+                checksums.cancel()
+
+    if show_progress:
+        with _download_progress() as progress:
+            results = _download_engine.run(_fetch_all(progress))
+    else:
+        results = _download_engine.run(_fetch_all(None))
+    by_name = dict(zip(unique_assets, results, strict=True))
+    return {ai: by_name[asset["name"]] for ai, asset in selected.items()}
+
+
+# Portable bundle of a release's template archives, for machines without network access
+BUNDLE_FORMAT = 1
+BUNDLE_MANIFEST_NAME = "bundle.json"
+_SHA256_HEX_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def export_template_bundle(
+    output: Path,
+    release_data: dict,
+    ai_assistants: list[str],
+    *,
+    http_client: httpx.Client | None = None,
+    github_token: str | None = None,
+    show_progress: bool = False,
+    debug: bool = False,
+) -> dict:
+    """Download the template archives of a release for several agents into one self-describing bundle.
+
+    The archives are fetched concurrently with download_release_assets (verified ones are
+    served from or added to the template cache) and stored uncompressed in a ZIP next to
+    bundle.json, which lists the release, which archive serves each agent and every
+    archive's size and SHA-256, plus a SHA256SUMS file. Returns the bundle.json content.
+    """
+    with tempfile.TemporaryDirectory() as download_dir:
+        results = download_release_assets(
+            ai_assistants,
+            Path(download_dir),
+            http_client=http_client,
+            github_token=github_token,
+            release_data=release_data,
+            show_progress=show_progress,
+            debug=debug,
+        )
+        archives = {}
+        for zip_path, meta in results.values():
+            archives[meta["filename"]] = (zip_path, meta)
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "tag_name": release_data["tag_name"],
+            "source": release_data.get("source", "github"),
+            "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "agents": {ai: meta["filename"] for ai, (_, meta) in results.items()},
+            "assets": [
+                {"name": name, "size": zip_path.stat().st_size, "sha256": meta["sha256"], "verified": meta["verified"]}
+                for name, (zip_path, meta) in sorted(archives.items())
+            ],
+        }
+        checksums = "".join(f"{asset['sha256']}  {asset['name']}\n" for asset in manifest["assets"])
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        partial = output.with_name(f".{output.name}.{os.getpid()}.part")
+        try:
+            # Template archives are already deflated; storing them keeps export and import at copy speed
+            with zipfile.ZipFile(partial, "w", zipfile.ZIP_STORED) as bundle:
+                bundle.writestr(BUNDLE_MANIFEST_NAME, json.dumps(manifest, indent=2) + "\n")
+                bundle.writestr(CHECKSUM_MANIFEST_NAME, checksums)
+                for name, (zip_path, _) in sorted(archives.items()):
+                    bundle.write(zip_path, f"assets/{name}")
+            os.replace(partial, output)
+        finally:
+            partial.unlink(missing_ok=True)
+    return manifest
+
+
+def _bundle_asset_problem(asset) -> str | None:
+    """Return what is wrong with one asset entry of bundle.json, or None.
+
+    The name and checksum become cache file names, so they must be plain names that cannot
+    point outside the cache directory.
+    """
+    if not isinstance(asset, dict):
+        return f"asset {asset!r} is not an object"
+    name, sha256, size = asset.get("name"), asset.get("sha256"), asset.get("size")
+    if not isinstance(name, str) or not name or "/" in name or "\\" in name or ".." in name:
+        return f"invalid asset name {name!r}"
+    if not isinstance(sha256, str) or not _SHA256_HEX_RE.fullmatch(sha256):
+        return f"invalid SHA-256 {sha256!r} for {name}"
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        return f"invalid size {size!r} for {name}"
+    return None
+
+
+def _bundle_manifest_problem(manifest) -> str | None:
+    """Return what is wrong with a parsed bundle.json, or None if import_template_bundle can trust it."""
+    if not isinstance(manifest, dict):
+        return "not an object"
+    if manifest.get("format") != BUNDLE_FORMAT:
+        return f"unsupported format {manifest.get('format')!r}"
+    if not isinstance(manifest.get("tag_name"), str) or not manifest["tag_name"]:
+        return "no release tag"
+    if not isinstance(manifest.get("assets"), list):
+        return "no asset list"
+    return next(filter(None, map(_bundle_asset_problem, manifest["assets"])), None)
+
+
+def import_template_bundle(bundle_path: Path) -> dict:
+    """Load a bundle written by export_template_bundle into the local template store.
+
+    Every archive is checked against the SHA-256 in bundle.json while it is copied into the
+    template cache, and the release is added to the cache index and the release index as a
+    "cache" release. Later inits (pinned with --release, or with the cache release source)
+    then resolve the release and its archives locally. Raises ValueError for a bundle that
+    is malformed or fails verification. Returns the bundle.json content.
+    """
+    cache_dir = _template_cache_dir()
+    with zipfile.ZipFile(bundle_path, "r") as bundle:
+        try:
+            manifest = json.loads(bundle.read(BUNDLE_MANIFEST_NAME))
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{bundle_path} is not a template bundle: {e}") from e
+        problem = _bundle_manifest_problem(manifest)
+        if problem:
+            raise ValueError(f"{bundle_path} has an invalid bundle.json: {problem}")
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        assets = []
+        for asset in manifest["assets"]:
+            expected = asset["sha256"]
+            cached_path = cache_dir / f"{expected}.zip"
+            if not (cached_path.is_file() and cached_path.stat().st_size == asset["size"]):
+                partial = cache_dir / f".{expected}.{os.getpid()}.part"
+                digest = hashlib.sha256()
+                try:
+                    with bundle.open(f"assets/{asset['name']}") as src, open(partial, "wb") as dst:
+                        for chunk in iter(lambda src=src: src.read(ZIP_EXTRACT_CHUNK_SIZE), b""):
+                            digest.update(chunk)
+                            dst.write(chunk)
+                    if digest.hexdigest() != expected:
+                        raise ValueError(f"{asset['name']} in {bundle_path} does not match its SHA-256")
+                    os.replace(partial, cached_path)
+                except KeyError as e:
+                    raise ValueError(f"{asset['name']} is missing from {bundle_path}") from e
+                finally:
+                    partial.unlink(missing_ok=True)
+            _record_cached_release(manifest["tag_name"], asset["name"], expected, asset["size"])
+            assets.append(
+                {
+                    "name": asset["name"],
+                    "size": asset["size"],
+                    "digest": f"sha256:{expected}",
+                    "browser_download_url": cached_path.as_uri(),
+                }
+            )
+    _record_release_index({"tag_name": manifest["tag_name"], "source": "cache", "assets": assets})
+    return manifest
+
+
+def _prefer_cache_release_source() -> list[str]:
+    """Put the cache release source first in the config file, keeping the others as fallbacks; returns the new list."""
+    config_path = _config_path()
+    config = _read_json_file(config_path)
+    specs = [spec for spec in config.get("release_sources") or DEFAULT_RELEASE_SOURCES if spec.strip() != "cache"]
+    config["release_sources"] = ["cache", *specs]
+    _write_json_atomic(config_path, config)
+    return config["release_sources"]
+
+
+def _select_template_release(
+    template_source: str,
+    *,
+    verbose: bool,
+    tracker: StepTracker | None,
+    http_client: httpx.Client | None,
+    debug: bool,
+    github_token: str | None,
+    release_tag: str | None = None,
+) -> dict | None:
+    """Decide where templates come from: returns release metadata to download, or None to use bundled templates.
+
+    "bundled" never touches the network. "auto" looks up the latest release and only downloads
+    it when it is newer than the templates shipped with the CLI, falling back to the bundled
+    copy when the lookup fails. "release" always downloads the latest release. A release_tag
+    pins that release instead of the latest one; see _select_pinned_release.
+    """
+    if template_source not in TEMPLATE_SOURCES:
+        raise ValueError(f"Unknown template source '{template_source}'. Choose from: {', '.join(TEMPLATE_SOURCES)}")
+    if release_tag:
+        return _select_pinned_release(
+            normalize_release_tag(release_tag),
+            template_source,
+            verbose=verbose,
+            tracker=tracker,
+            http_client=http_client,
+            debug=debug,
+            github_token=github_token,
+        )
+    bundled_version = f"v{__version__}"
+    has_bundled = _bundled_templates_dir() is not None
+
+    if template_source == "bundled":
+        if not has_bundled:
+            console.print("[red]Bundled templates are not available in this installation[/red]")
+            raise typer.Exit(1)
+        if tracker:
+            tracker.complete("fetch", f"bundled templates {bundled_version}")
+        return None
 
     if tracker:
-        tracker.start("fetch", "contacting GitHub API")
+        tracker.start("fetch", "resolving latest release")
+    elif verbose:
+        console.print("[cyan]Fetching latest release information...[/cyan]")
+    try:
+        release_data = fetch_latest_release(http_client or _get_http_client(), debug=debug, github_token=github_token)
+    except Exception as e:
+        if template_source == "auto" and has_bundled:
+            debug_print(f"Release lookup failed, using bundled templates: {e}")
+            if tracker:
+                tracker.complete("fetch", f"offline, bundled templates {bundled_version}")
+            elif verbose:
+                console.print(f"[yellow]Release lookup failed, using bundled templates {bundled_version}[/yellow]")
+            return None
+        if tracker:
+            tracker.error("fetch", "release lookup failed")
+        console.print("[red]Error fetching release information[/red]")
+        console.print(Panel(str(e), title="Fetch Error", border_style="red"))
+        raise typer.Exit(1)
+
+    if template_source == "auto" and has_bundled:
+        latest = _parse_version_tag(release_data.get("tag_name", ""))
+        bundled = _parse_version_tag(__version__)
+        if latest is not None and bundled is not None and bundled >= latest:
+            if tracker:
+                tracker.complete("fetch", f"bundled templates {bundled_version} (latest {release_data['tag_name']})")
+            elif verbose:
+                console.print(f"[cyan]Bundled templates are current ({bundled_version}), skipping download[/cyan]")
+            return None
+    if tracker:
+        tracker.complete(
+            "fetch", f"release {release_data.get('tag_name', '?')} from {release_data.get('source', 'github')}"
+        )
+    return release_data
+
+
+def _select_pinned_release(
+    tag: str,
+    template_source: str,
+    *,
+    verbose: bool,
+    tracker: StepTracker | None,
+    http_client: httpx.Client | None,
+    debug: bool,
+    github_token: str | None,
+) -> dict | None:
+    """Resolve a pinned release: the bundled templates when they are that version, else its release metadata.
+
+    Tags already in the release index resolve without a request. There is no fallback to
+    other templates: a pinned release that cannot be resolved is an error.
+    """
+    bundled_version = f"v{__version__}"
+    if template_source != "release" and tag == bundled_version and _bundled_templates_dir() is not None:
+        if tracker:
+            tracker.complete("fetch", f"bundled templates {bundled_version} (pinned)")
+        return None
+    if template_source == "bundled":
+        console.print(f"[red]Error:[/red] Bundled templates are {bundled_version}, not the pinned release {tag}")
+        raise typer.Exit(1)
+
+    if tracker:
+        tracker.start("fetch", f"resolving {tag}")
+    elif verbose:
+        console.print(f"[cyan]Resolving release {tag}...[/cyan]")
+    try:
+        release_data = fetch_release(tag, http_client or _get_http_client(), debug=debug, github_token=github_token)
+    except Exception as e:
+        if tracker:
+            tracker.error("fetch", f"release {tag} not found")
+        console.print(f"[red]Error resolving release {tag}[/red]")
+        console.print(Panel(str(e), title="Fetch Error", border_style="red"))
+        raise typer.Exit(1)
+    if tracker:
+        origin = "release index" if release_data.get("indexed") else release_data.get("source", "github")
+        tracker.complete("fetch", f"release {tag} (pinned) from {origin}")
+    return release_data
+
+
+def _scaffold_from_bundled(
+    project_path: Path,
+    ai_assistant: str,
+    is_current_dir: bool,
+    *,
+    verbose: bool,
+    tracker: StepTracker | None,
+    dry_run: bool = False,
+    link_mode: str = "copy",
+) -> list[dict]:
+    """Render the bundled templates into project_path (merging when it already has content).
+
+    With a link_mode other than copy, files are placed from the shared bundled template tree.
+    Returns the merge plan when merging into an existing directory or for dry_run, otherwise [].
+    """
+    if tracker:
+        tracker.skip("download", "bundled with CLI")
+        tracker.add("extract", "Extract template")
+        tracker.start("extract", "rendering bundled templates")
+    elif verbose:
+        console.print("Rendering bundled templates...")
+
+    plan = []
+    try:
+        if link_mode != "copy" and not dry_run:
+            plan = _place_template_tree(
+                _bundled_template_tree(ai_assistant),
+                project_path,
+                is_current_dir,
+                link_mode,
+                verbose=verbose,
+                tracker=tracker,
+            )
+            written = [entry for entry in plan if entry["sha256"]]
+            if not is_current_dir:
+                plan = []
+        elif is_current_dir or dry_run:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                written = render_agent_package(ai_assistant, Path(temp_dir))
+                plan = _merge_source_into_project(Path(temp_dir), project_path, verbose, tracker, dry_run)
+        else:
+            project_path.mkdir(parents=True)
+            written = render_agent_package(ai_assistant, project_path)
+    except Exception as e:
+        if tracker:
+            tracker.error("extract", str(e))
+        elif verbose:
+            console.print(f"[red]Error rendering templates:[/red] {e}")
+        if not is_current_dir and not dry_run and project_path.exists():
+            shutil.rmtree(project_path)
+        raise typer.Exit(1)
+
+    if tracker:
+        tracker.skip("zip-list", "no archive")
+        tracker.complete("extracted-summary", f"{len(written)} files rendered")
+        tracker.record("extract", files=len(written))
+        tracker.complete("extract", "dry run" if dry_run else "bundled templates")
+        tracker.skip("cleanup", "nothing to clean up")
+    elif verbose:
+        console.print(f"[cyan]Rendered {len(written)} template files[/cyan]")
+    return plan
+
+
+def _fetch_template_archive(
+    ai_assistant: str,
+    *,
+    verbose: bool,
+    tracker: StepTracker | None,
+    http_client: httpx.Client | None,
+    debug: bool,
+    github_token: str | None,
+    release_data: dict | None = None,
+) -> tuple[Path, dict]:
+    """Download the template archive into the working directory, reporting progress on the tracker."""
+    if release_data is None:
+        if tracker:
+            tracker.start("fetch", "resolving latest release")
+        try:
+            release_data = fetch_latest_release(
+                http_client or _get_http_client(), debug=debug, github_token=github_token
+            )
+        except Exception as e:
+            if tracker:
+                tracker.error("fetch", "release lookup failed")
+            console.print("[red]Error fetching release information[/red]")
+            console.print(Panel(str(e), title="Fetch Error", border_style="red"))
+            raise typer.Exit(1)
+        if tracker:
+            tracker.complete(
+                "fetch", f"release {release_data.get('tag_name', '?')} from {release_data.get('source', 'github')}"
+            )
+
+    if tracker:
+        tracker.add("download", "Download template")
+        tracker.start("download")
     try:
         zip_path, meta = download_template_from_github(
             ai_assistant,
-            current_dir,
+            Path.cwd(),
             verbose=verbose and tracker is None,
             show_progress=(tracker is None),
             http_client=http_client,
             debug=debug,
             github_token=github_token,
+            release_data=release_data,
         )
         if tracker:
-            tracker.complete("fetch", f"release {meta['release']} ({meta['size']:,} bytes)")
-            tracker.add("download", "Download template")
-            tracker.complete("download", meta["filename"])
+            state = "cached" if meta["cached"] else "verified" if meta["verified"] else "unverified"
+            tracker.record("download", bytes=meta["downloaded_bytes"])
+            tracker.complete(
+                "download", f"{meta['filename']} ({meta['size']:,} bytes), sha256 {meta['sha256'][:12]} {state}"
+            )
     except Exception as e:
         if tracker:
-            tracker.error("fetch", str(e))
+            tracker.error("download", str(e))
         elif verbose:
             console.print(f"[red]Error downloading template:[/red] {e}")
         raise
+    return zip_path, meta
+
+
+def preview_template_merge(
+    project_path: Path,
+    ai_assistant: str,
+    *,
+    verbose: bool = True,
+    tracker: StepTracker | None = None,
+    http_client: httpx.Client = None,
+    debug: bool = False,
+    github_token: str | None = None,
+    template_source: str = "release",
+    release_tag: str | None = None,
+) -> list[dict]:
+    """Compute the merge plan of the selected templates against project_path without writing to it."""
+    fetch_kwargs = {"verbose": verbose, "tracker": tracker, "http_client": http_client, "debug": debug}
+    release_data = _select_template_release(
+        template_source, github_token=github_token, release_tag=release_tag, **fetch_kwargs
+    )
+    if release_data is None:
+        return _scaffold_from_bundled(project_path, ai_assistant, True, verbose=verbose, tracker=tracker, dry_run=True)
+    zip_path, meta = _fetch_template_archive(
+        ai_assistant, github_token=github_token, release_data=release_data, **fetch_kwargs
+    )
+
+    if tracker:
+        tracker.add("extract", "Extract template")
+        tracker.start("extract")
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            plan = _extract_and_merge_to_current_dir(
+                zip_ref, project_path, verbose, tracker, dry_run=True, select=template_member_filter([ai_assistant])
+            )
+    except Exception as e:
+        if tracker:
+            tracker.error("extract", str(e))
+        elif verbose:
+            console.print(f"[red]Error extracting template:[/red] {e}")
+        raise typer.Exit(1)
+    else:
+        if tracker:
+            tracker.complete("extract", "dry run")
+    finally:
+        if zip_path.exists() and not meta["cached"]:
+            zip_path.unlink()
+
+    return plan
+
+
+def download_and_extract_template(
+    project_path: Path,
+    ai_assistant: str,
+    is_current_dir: bool = False,
+    *,
+    verbose: bool = True,
+    tracker: StepTracker | None = None,
+    http_client: httpx.Client = None,
+    debug: bool = False,
+    github_token: str | None = None,
+    template_source: str = "release",
+    link_mode: str = "copy",
+    release_tag: str | None = None,
+) -> Path:
+    """Download the latest release and extract it to create a new project.
+
+    When the bundled templates are at least as new as the latest release (or template_source
+    is "bundled"), the project is rendered locally instead, with no download or archive.
+    With a link_mode other than copy, template files are reflinked or hardlinked from a
+    shared tree in the cache instead of being written out for every project. release_tag
+    pins a release (vX.Y.Z) instead of the latest one.
+    """
+    fetch_kwargs = {"verbose": verbose, "tracker": tracker, "http_client": http_client, "debug": debug}
+    release_data = _select_template_release(
+        template_source, github_token=github_token, release_tag=release_tag, **fetch_kwargs
+    )
+    if release_data is None:
+        plan = _scaffold_from_bundled(
+            project_path, ai_assistant, is_current_dir, verbose=verbose, tracker=tracker, link_mode=link_mode
+        )
+        files = _manifest_files_from_plan(plan) if is_current_dir else _hash_tree(project_path)
+        _record_install_manifest(
+            project_path, files, tracker, agent=ai_assistant, release=f"v{__version__}", source="bundled"
+        )
+        return project_path
+    zip_path, meta = _fetch_template_archive(
+        ai_assistant, github_token=github_token, release_data=release_data, **fetch_kwargs
+    )
 
     if tracker:
         tracker.add("extract", "Extract template")
@@ -736,21 +3074,38 @@ def download_and_extract_template(
         console.print("Extracting template...")
 
     try:
-        if not is_current_dir:
-            project_path.mkdir(parents=True)
-
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_contents = zip_ref.namelist()
+        # Only verified archives kept in the cache get a shared tree; others are extracted as before
+        if link_mode != "copy" and meta["cached"]:
+            source_dir = _release_template_tree(zip_path, meta["sha256"], ai_assistant)
+            plan = _place_template_tree(
+                source_dir, project_path, is_current_dir, link_mode, verbose=verbose, tracker=tracker
+            )
+            files = _manifest_files_from_plan(plan)
             if tracker:
-                tracker.start("zip-list")
-                tracker.complete("zip-list", f"{len(zip_contents)} entries")
-            elif verbose:
-                console.print(f"[cyan]ZIP contains {len(zip_contents)} items[/cyan]")
-
-            if is_current_dir:
-                _extract_and_merge_to_current_dir(zip_ref, project_path, verbose, tracker)
-            else:
-                _extract_to_new_directory(zip_ref, project_path, verbose, tracker)
+                tracker.skip("zip-list", "shared template tree")
+                tracker.complete("extracted-summary", f"{len(files)} files placed ({link_mode})")
+                tracker.record("extract", files=len(files))
+        else:
+            if not is_current_dir:
+                project_path.mkdir(parents=True)
+
+            # Combined archives hold every agent; only this agent's members and the shared tree are read
+            select = template_member_filter([ai_assistant])
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                zip_contents = [name for name in zip_ref.namelist() if select(name)]
+                if tracker:
+                    tracker.start("zip-list")
+                    tracker.complete("zip-list", f"{len(zip_contents)} entries")
+                    tracker.record("extract", files=sum(not name.endswith("/") for name in zip_contents))
+                elif verbose:
+                    console.print(f"[cyan]ZIP contains {len(zip_contents)} items[/cyan]")
+
+                if is_current_dir:
+                    plan = _extract_and_merge_to_current_dir(zip_ref, project_path, verbose, tracker, select=select)
+                    files = _manifest_files_from_plan(plan)
+                else:
+                    _extract_to_new_directory(zip_ref, project_path, verbose, tracker, select=select)
+                    files = _hash_tree(project_path)
 
     except Exception as e:
         if tracker:
@@ -770,55 +3125,337 @@ def download_and_extract_template(
         if tracker:
             tracker.add("cleanup", "Remove temporary archive")
 
-        if zip_path.exists():
+        if meta["cached"]:
+            if tracker:
+                tracker.complete("cleanup", "archive kept in template cache")
+        elif zip_path.exists():
             zip_path.unlink()
             if tracker:
                 tracker.complete("cleanup")
             elif verbose:
                 console.print(f"Cleaned up: {zip_path.name}")
 
+    _record_install_manifest(
+        project_path,
+        files,
+        tracker,
+        agent=ai_assistant,
+        release=meta["release"],
+        source="release",
+        archive_sha256=meta["sha256"],
+    )
     return project_path
 
 
+MANIFEST_PATH = Path(".refactor") / "manifest.json"
+
+
+def _hash_tree(root: Path) -> dict[str, str]:
+    """Return {posix relative path: sha256} for every file under root, except the manifest itself."""
+    return {
+        path.relative_to(root).as_posix(): _file_sha256(path)
+        for path in sorted(root.rglob("*"))
+        if path.is_file() and path.relative_to(root) != MANIFEST_PATH
+    }
+
+
+def _manifest_files_from_plan(plan: list[dict], previous: dict | None = None) -> dict[str, str]:
+    """Return the template files of a merge or upgrade plan as {posix path: sha256}.
+
+    Merged settings files, removed files and user files that merely sit at a template path
+    are not owned by the template and are left out. A file an upgrade kept is still based on
+    the release it was installed from, so it keeps the hash recorded in the previous manifest
+    rather than the incoming one; otherwise the next upgrade would merge against the wrong base.
+    """
+    recorded = previous["files"] if previous else {}
+    files = {}
+    for entry in plan:
+        key = entry["path"].as_posix()
+        if (
+            not entry["sha256"]
+            or entry["action"] in ("settings-merge", "removed")
+            or entry.get("untracked")
+            or _is_vscode_settings(entry["path"])
+        ):
+            continue
+        files[key] = recorded[key] if entry["action"] == "kept" and key in recorded else entry["sha256"]
+    return files
+
+
+def _kept_file_bases(plan: list[dict], previous: dict) -> dict[str, dict]:
+    """Return {posix path: release, source and archive} of the template each kept file is still based on."""
+    bases = previous.get("bases") or {}
+    since = {key: previous.get(key) for key in ("release", "source", "archive_sha256")}
+    return {
+        entry["path"].as_posix(): bases.get(entry["path"].as_posix(), since)
+        for entry in plan
+        if entry["action"] == "kept" and not entry.get("untracked") and entry["path"].as_posix() in previous["files"]
+    }
+
+
+def write_install_manifest(
+    project_path: Path,
+    files: dict[str, str],
+    *,
+    agent: str,
+    release: str,
+    source: str,
+    archive_sha256: str | None = None,
+    bases: dict[str, dict] | None = None,
+) -> Path:
+    """Record the installed template files and their hashes in .refactor/manifest.json.
+
+    bases maps the files that are still based on an older template (kept by an upgrade) to
+    that template's release, source and archive.
+    """
+    manifest = {
+        "version": 1,
+        "agent": agent,
+        "release": release,
+        "source": source,
+        "archive_sha256": archive_sha256,
+        "installed_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "files": dict(sorted(files.items())),
+    }
+    if bases:
+        manifest["bases"] = dict(sorted(bases.items()))
+    manifest_path = project_path / MANIFEST_PATH
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest_path
+
+
+def read_install_manifest(project_path: Path) -> dict | None:
+    """Return the project's install manifest, or None if it is missing or unreadable."""
+    try:
+        with open(project_path / MANIFEST_PATH, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        return None
+    return manifest
+
+
+def _installed_template_files(project_path: Path) -> list[str]:
+    """Return the files Refactor Kit installed in project_path, including the manifest itself."""
+    manifest = read_install_manifest(project_path)
+    if manifest is None:
+        return []
+    return [*manifest["files"], MANIFEST_PATH.as_posix()]
+
+
+def _record_install_manifest(project_path: Path, files: dict[str, str], tracker: StepTracker | None, **fields) -> None:
+    """Write the install manifest, reporting (but not failing on) write errors."""
+    if tracker:
+        tracker.add("manifest", "Record installed files")
+        tracker.start("manifest")
+    try:
+        write_install_manifest(project_path, files, **fields)
+    except OSError as e:
+        if tracker:
+            tracker.error("manifest", str(e))
+        else:
+            console.print(f"[yellow]Could not write {MANIFEST_PATH}:[/yellow] {e}")
+        return
+    if tracker:
+        tracker.complete("manifest", f"{len(files)} files")
+        tracker.record("manifest", files=len(files))
+
+
+def _three_way_merge(current: Path, base: Path, incoming: Path) -> bytes | None:
+    """Merge upstream changes into a locally modified file with git merge-file.
+
+    Returns the merged bytes, or None when git is unavailable or the changes conflict.
+    """
+    if shutil.which("git") is None:
+        return None
+    try:
+        result = subprocess.run(  # noqa: S603 - fixed git argv, paths are never shell-interpreted
+            ["git", "merge-file", "-p", str(current), str(base), str(incoming)],
+            capture_output=True,
+        )
+    except OSError:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def build_upgrade_plan(
+    source_dir: Path,
+    project_path: Path,
+    manifest: dict,
+    base_dir: Path | None = None,
+    force: bool = False,
+    base_dirs: dict[str, Path | None] | None = None,
+) -> list[dict]:
+    """Classify a newer template tree against an installed project using its manifest.
+
+    Files still matching their recorded hash are updated; locally modified files are
+    three-way merged when the previous template (base_dir) is available and the merge
+    is clean, and kept otherwise (or overwritten with force). Unmodified files that the
+    new release dropped are removed. base_dirs gives the template tree of files that an
+    earlier upgrade kept, which are based on an older template than base_dir.
+    """
+    base_dirs = base_dirs or {}
+    recorded = manifest.get("files", {})
+    plan = []
+    incoming_paths = set()
+    for sub_item in sorted(source_dir.rglob("*")):
+        if not sub_item.is_file():
+            continue
+        rel_path = sub_item.relative_to(source_dir)
+        key = rel_path.as_posix()
+        incoming_paths.add(key)
+        dest_file = project_path / rel_path
+        base_hash = recorded.get(key)
+        entry = {"path": rel_path, "source": sub_item, "sha256": _file_sha256(sub_item), "detail": ""}
+
+        if not dest_file.exists():
+            if base_hash is None:
+                entry["action"] = "new"
+            else:
+                entry["action"], entry["detail"] = "kept", "deleted locally"
+        elif _is_vscode_settings(dest_file):
+            entry["action"] = "identical" if _settings_merge_is_noop(sub_item, dest_file) else "settings-merge"
+        else:
+            current = _file_sha256(dest_file)
+            if current == entry["sha256"]:
+                entry["action"] = "identical"
+            elif current == base_hash:
+                entry["action"] = "update"
+            elif force:
+                entry["action"], entry["detail"] = "update", "overwriting local changes"
+            elif base_hash is None:
+                entry["action"], entry["detail"], entry["untracked"] = "kept", "not installed by Refactor Kit", True
+            else:
+                file_base_dir = base_dirs.get(key, base_dir)
+                base_file = file_base_dir / rel_path if file_base_dir else None
+                merged = _three_way_merge(dest_file, base_file, sub_item) if base_file and base_file.is_file() else None
+                if merged is not None:
+                    entry["action"], entry["content"], entry["detail"] = "merged", merged, "local changes preserved"
+                elif base_file and base_file.is_file():
+                    entry["action"], entry["detail"] = "kept", "locally modified, merge conflicts"
+                else:
+                    entry["action"], entry["detail"] = "kept", "locally modified"
+        plan.append(entry)
+
+    for key, base_hash in sorted(recorded.items()):
+        if key in incoming_paths:
+            continue
+        dest_file = project_path / key
+        if dest_file.is_file() and _file_sha256(dest_file) == base_hash:
+            plan.append(
+                {
+                    "path": Path(key),
+                    "source": None,
+                    "action": "removed",
+                    "sha256": base_hash,
+                    "detail": "not in release",
+                }
+            )
+    return plan
+
+
+def _materialize_upgrade_base(manifest: dict, dest: Path) -> Path | None:
+    """Recreate the template tree a project was installed from, for three-way merges.
+
+    Bundled installs are re-rendered while this CLI still ships that version; release installs
+    are read from the template cache. Returns None when the base is not available locally.
+    """
+    agent = manifest.get("agent")
+    if manifest.get("source") == "bundled":
+        if manifest.get("release") != f"v{__version__}" or agent not in AGENT_CONFIG:
+            return None
+        if _bundled_templates_dir() is None:
+            return None
+        render_agent_package(agent, dest)
+        return dest
+    archive_sha256 = manifest.get("archive_sha256")
+    cached_path = _template_cache_dir() / f"{archive_sha256}.zip" if archive_sha256 else None
+    if cached_path is None or not cached_path.is_file():
+        return None
+    select = template_member_filter([agent]) if agent in AGENT_CONFIG else None
+    with zipfile.ZipFile(cached_path, "r") as zip_ref:
+        extract_zip(zip_ref, dest, select=select)
+    return _get_source_dir_from_extracted(list(dest.iterdir()), dest, False, None)
+
+
+def _materialize_kept_bases(manifest: dict, dest: Path) -> dict[str, Path | None]:
+    """Recreate the older template trees of the files an earlier upgrade kept; returns {posix path: tree}."""
+    trees: dict[tuple, Path | None] = {}
+    base_dirs = {}
+    for key, base in (manifest.get("bases") or {}).items():
+        identity = (base.get("release"), base.get("source"), base.get("archive_sha256"))
+        if identity not in trees:
+            tree_root = dest / str(len(trees))
+            tree_root.mkdir(parents=True)
+            trees[identity] = _materialize_upgrade_base({**manifest, **base}, tree_root)
+        base_dirs[key] = trees[identity]
+    return base_dirs
+
+
+def _export_trace(tracker: StepTracker, path: Path, **metadata) -> None:
+    """Write the tracker's step timings to path as Chrome trace JSON and print the timing summary."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(tracker.chrome_trace(**metadata), indent=2) + "\n", encoding="utf-8")
+    except OSError as e:
+        console.print(f"[yellow]Could not write trace to {path}:[/yellow] {e}")
+        return
+    if _events.machine:
+        _events.emit("trace", path=str(path), steps=len(tracker.timings()))
+        return
+    console.print()
+    console.print(tracker.summary_table())
+    console.print(f"[dim]Trace written to {path} (open in chrome://tracing or ui.perfetto.dev)[/dim]")
+
+
+def _is_posix_script(path: Path) -> bool:
+    """Return True for a regular .sh file that starts with a shebang."""
+    if path.suffix != ".sh" or path.is_symlink() or not path.is_file():
+        return False
+    try:
+        with path.open("rb") as f:
+            return f.read(2) == b"#!"
+    except OSError:
+        return False
+
+
+def _executable_mode(mode: int) -> int:
+    """Return mode with an execute bit for the owner and for everyone who may read it."""
+    return mode | 0o100 | ((mode & 0o444) >> 2)
+
+
 def ensure_executable_scripts(project_path: Path, tracker: StepTracker | None = None) -> None:
-    """Ensure POSIX .sh scripts under .refactor/scripts have execute bits."""
+    """Ensure POSIX .sh scripts under .refactor/scripts have execute bits.
+
+    A script still hardlinked to a shared template tree from before those trees carried execute
+    bits is unshared first, so the chmod does not reach the other projects linked to it.
+    """
     if os.name == "nt":
         return
     scripts_root = project_path / ".refactor" / "scripts"
     if not scripts_root.is_dir():
         return
+    if tracker:
+        tracker.add("chmod", "Set script permissions recursively")
+        tracker.start("chmod")
     failures: list[str] = []
     updated = 0
     for script in scripts_root.rglob("*.sh"):
         try:
-            if script.is_symlink() or not script.is_file():
-                continue
-            try:
-                with script.open("rb") as f:
-                    if f.read(2) != b"#!":
-                        continue
-            except Exception:
-                continue
-            st = script.stat()
-            mode = st.st_mode
-            if mode & 0o111:
+            if not _is_posix_script(script) or script.stat().st_mode & 0o111:
                 continue
-            new_mode = mode
-            if mode & 0o400:
-                new_mode |= 0o100
-            if mode & 0o040:
-                new_mode |= 0o010
-            if mode & 0o004:
-                new_mode |= 0o001
-            if not (new_mode & 0o100):
-                new_mode |= 0o100
-            os.chmod(script, new_mode)
+            _unshare_file(script)
+            os.chmod(script, _executable_mode(script.stat().st_mode))
             updated += 1
         except Exception as e:
             failures.append(f"{script.relative_to(scripts_root)}: {e}")
     if tracker:
         detail = f"{updated} updated" + (f", {len(failures)} failed" if failures else "")
-        tracker.add("chmod", "Set script permissions recursively")
+        tracker.record("chmod", files=updated)
         (tracker.error if failures else tracker.complete)("chmod", detail)
     else:
         if updated:
@@ -830,32 +3467,62 @@ def ensure_executable_scripts(project_path: Path, tracker: StepTracker | None =
 
 
 @app.command()
-def check():
+def check(
+    ctx: typer.Context,
+    json_output: bool = typer.Option(False, "--json", help="Same as refactor --json: emit the result as a JSON event"),
+    refresh: bool = typer.Option(False, "--refresh", help="Ignore cached probe results"),
+    timeout: float = typer.Option(TOOL_PROBE_TIMEOUT, "--timeout", help="Seconds each tool probe may take"),
+):
     """Check for installed tools (git, AI agents, etc.)."""
+    if json_output:
+        _use_json_mode(ctx)
+    cli_agents = [key for key, config in AGENT_CONFIG.items() if config["requires_cli"]]
+    probes = probe_tools(["git", *cli_agents], timeout=timeout, use_cache=not refresh)
+    python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    python_ok = sys.version_info >= (3, 11)
+
+    payload = {
+        "python": {"version": python_version, "ok": python_ok},
+        "tools": {
+            tool: {k: probe[k] for k in ("found", "path", "version", "error", "cached")}
+            for tool, probe in probes.items()
+        },
+    }
+    if _events.machine:
+        _events.emit("result", command="check", ok=python_ok, **payload)
+        return
+
     show_banner()
     console.print("[bold]Checking for installed tools...[/bold]\n")
 
     tracker = StepTracker("Check Available Tools")
 
+    def report(key: str, label: str) -> bool:
+        probe = probes[key]
+        tracker.add(key, label)
+        if not probe["found"]:
+            tracker.error(key, "not found")
+        else:
+            tracker.complete(key, probe["version"] or probe["error"] or "available")
+        return probe["found"]
+
     # Check git
-    tracker.add("git", "Git version control")
-    git_ok = check_tool("git", tracker=tracker)
+    git_ok = report("git", "Git version control")
 
     # Check Python
     tracker.add("python", "Python runtime")
-    python_ok = sys.version_info >= (3, 11)
     if python_ok:
-        tracker.complete("python", f"v{sys.version_info.major}.{sys.version_info.minor}")
+        tracker.complete("python", f"v{python_version}")
     else:
-        tracker.error("python", f"v{sys.version_info.major}.{sys.version_info.minor} (3.11+ required)")
+        tracker.error("python", f"v{python_version} (3.11+ required)")
 
     # Check AI agents
     agent_results = {}
     for agent_key, config in AGENT_CONFIG.items():
-        tracker.add(agent_key, config["name"])
         if config["requires_cli"]:
-            agent_results[agent_key] = check_tool(agent_key, tracker=tracker)
+            agent_results[agent_key] = report(agent_key, config["name"])
         else:
+            tracker.add(agent_key, config["name"])
             tracker.skip(agent_key, "IDE-based, no CLI check")
             agent_results[agent_key] = False
 
@@ -893,6 +3560,33 @@ def init(
     github_token: str = typer.Option(
         None, "--github-token", help="GitHub token for API requests (or set GH_TOKEN/GITHUB_TOKEN env var)"
     ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Show which files would be added or changed without writing anything"
+    ),
+    template_source: str = typer.Option(
+        "auto",
+        "--template-source",
+        help="Where templates come from: auto (bundled unless a newer release exists), bundled, release",
+    ),
+    initial_commit: bool = typer.Option(
+        False, "--initial-commit", help="Commit the scaffolded template files when a new git repository is created"
+    ),
+    release: str | None = typer.Option(
+        None,
+        "--release",
+        help="Pin the template release (vX.Y.Z) instead of resolving the latest one; indexed tags need no API call",
+    ),
+    link_mode: str = typer.Option(
+        "copy",
+        "--link-mode",
+        help="How template files are placed: copy, reflink, hardlink (read-only, shared with the template cache), auto",
+    ),
+    trace: Path | None = typer.Option(
+        None,
+        "--trace",
+        dir_okay=False,
+        help="Write per-step timings to this file as Chrome trace JSON and print a timing summary",
+    ),
 ):
     """Initialize a new Refactor Kit project from the latest template."""
     global _debug_mode
@@ -919,6 +3613,16 @@ def init(
         )
         raise typer.Exit(1)
 
+    if template_source not in TEMPLATE_SOURCES:
+        console.print(
+            f"[red]Error:[/red] Invalid template source '{template_source}'. Choose from: {', '.join(TEMPLATE_SOURCES)}"
+        )
+        raise typer.Exit(1)
+
+    if link_mode not in LINK_MODES:
+        console.print(f"[red]Error:[/red] Invalid link mode '{link_mode}'. Choose from: {', '.join(LINK_MODES)}")
+        raise typer.Exit(1)
+
     # Determine target directory
     debug_print(f"here={here}, project_name={project_name}")
     if here:
@@ -932,8 +3636,13 @@ def init(
             console.print(
                 "[yellow]Template files will be merged with existing content and may overwrite existing files[/yellow]"
             )
-            if force:
+            if dry_run:
+                console.print("[cyan]--dry-run supplied: computing merge plan only, no files will be written[/cyan]")
+            elif force:
                 console.print("[cyan]--force supplied: skipping confirmation and proceeding with merge[/cyan]")
+            elif _events.machine:
+                console.print("[red]Error:[/red] Machine output mode cannot prompt; pass --force or --dry-run")
+                raise typer.Exit(1)
             else:
                 response = typer.confirm("Do you want to continue?")
                 if not response:
@@ -966,7 +3675,8 @@ def init(
     if not here:
         setup_lines.append(f"{'Target Path':<15} [dim]{target_dir}[/dim]")
 
-    console.print(Panel("\n".join(setup_lines), border_style="cyan", padding=(1, 2)))
+    if not _events.machine:
+        console.print(Panel("\n".join(setup_lines), border_style="cyan", padding=(1, 2)))
 
     # Check for git
     should_init_git = False
@@ -984,6 +3694,9 @@ def init(
             )
             raise typer.Exit(1)
         selected_ai = ai_assistant
+    elif _events.machine:
+        console.print("[red]Error:[/red] Machine output mode cannot prompt; pass --ai")
+        raise typer.Exit(1)
     else:
         ai_choices = {key: config["name"] for key, config in AGENT_CONFIG.items()}
         selected_ai = select_with_arrows(ai_choices, "Choose your AI assistant:", "claude")
@@ -1031,35 +3744,73 @@ def init(
         tracker.add(key, label)
 
     git_error_message = None
-
-    with Live(tracker.render(), console=console, refresh_per_second=8, transient=True) as live:
-        tracker.attach_refresh(lambda: live.update(tracker.render()))
+    merge_plan = None
+    trace_metadata = {
+        "command": "init",
+        "cli_version": __version__,
+        "ai": selected_ai,
+        "template_source": template_source,
+        "dry_run": dry_run,
+    }
+
+    # Machine modes report each step as an event instead of redrawing a live tree
+    live_display = (
+        contextlib.nullcontext()
+        if _events.machine
+        else Live(tracker.render(), console=console, refresh_per_second=8, transient=True)
+    )
+    with live_display as live:
+        if live is not None:
+            tracker.attach_refresh(lambda: live.update(tracker.render()))
 
         try:
-            ssl_verify = False if skip_tls else truststore.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            with httpx.Client(verify=ssl_verify) as local_client:
+            http_client = _get_http_client(skip_tls)
+            if dry_run:
+                merge_plan = preview_template_merge(
+                    target_dir,
+                    selected_ai,
+                    verbose=False,
+                    tracker=tracker,
+                    http_client=http_client,
+                    debug=debug,
+                    github_token=github_token,
+                    template_source=template_source,
+                    release_tag=release,
+                )
+            else:
                 download_and_extract_template(
                     target_dir,
                     selected_ai,
                     here,
                     verbose=False,
                     tracker=tracker,
-                    http_client=local_client,
+                    http_client=http_client,
                     debug=debug,
                     github_token=github_token,
+                    template_source=template_source,
+                    link_mode=link_mode,
+                    release_tag=release,
                 )
 
                 ensure_executable_scripts(target_dir, tracker=tracker)
 
             # Initialize git
-            if not no_git:
+            if dry_run:
+                for key in ("chmod", "cleanup", "git"):
+                    tracker.skip(key, "dry run")
+            elif not no_git:
                 tracker.start("git")
                 if is_git_repo(target_dir):
                     tracker.complete("git", "existing repo detected")
                 elif should_init_git:
-                    success, error_msg = init_git_repo(target_dir, quiet=True)
+                    commit_files = _installed_template_files(target_dir) if initial_commit else None
+                    success, error_msg = init_git_repo(target_dir, quiet=True, commit_files=commit_files)
                     if success:
-                        tracker.complete("git", "initialized")
+                        tracker.record("git", files=len(commit_files or []))
+                        tracker.complete(
+                            "git",
+                            f"initialized, committed {len(commit_files)} files" if commit_files else "initialized",
+                        )
                     else:
                         tracker.error("git", "init failed")
                         git_error_message = error_msg
@@ -1068,11 +3819,13 @@ def init(
             else:
                 tracker.skip("git", "--no-git flag")
 
-            tracker.complete("final", "project ready")
+            tracker.complete("final", "dry run, nothing written" if dry_run else "project ready")
 
         except Exception as e:
             tracker.error("final", str(e))
-            console.print(Panel(f"Initialization failed: {e}", title="Failure", border_style="red"))
+            _events.emit("result", command="init", ok=False, project=str(target_dir), error=str(e))
+            if not _events.machine:
+                console.print(Panel(f"Initialization failed: {e}", title="Failure", border_style="red"))
             if debug:
                 env_pairs = [
                     ("Python", sys.version.split()[0]),
@@ -1082,12 +3835,39 @@ def init(
                 label_width = max(len(k) for k, _ in env_pairs)
                 env_lines = [f"{k.ljust(label_width)} → [bright_black]{v}[/bright_black]" for k, v in env_pairs]
                 console.print(Panel("\n".join(env_lines), title="Debug Environment", border_style="magenta"))
-            if not here and target_dir.exists():
+            if not here and not dry_run and target_dir.exists():
                 shutil.rmtree(target_dir)
+            if trace:
+                if live is not None:
+                    live.stop()
+                _export_trace(tracker, trace, **trace_metadata)
             raise typer.Exit(1)
 
+    if trace:
+        _export_trace(tracker, trace, **trace_metadata)
+
+    if _events.machine:
+        _events.emit(
+            "result",
+            command="init",
+            ok=True,
+            project=str(target_dir),
+            ai=selected_ai,
+            dry_run=dry_run,
+            plan=merge_plan,
+            git_error=git_error_message,
+        )
+        return
+
     # Print final tree
     console.print(tracker.render())
+
+    if merge_plan is not None:
+        console.print()
+        print_merge_plan(merge_plan)
+        console.print("\n[bold green]Dry run complete.[/bold green] No files were written.")
+        return
+
     console.print("\n[bold green]Project ready.[/bold green]")
 
     # Show git error details if initialization failed
@@ -1153,11 +3933,800 @@ def init(
     console.print(enhancements_panel)
 
 
+@app.command()
+def upgrade(
+    template_source: str = typer.Option(
+        "auto",
+        "--template-source",
+        help="Where newer templates come from: auto (newest of bundled and latest release), bundled, release",
+    ),
+    force: bool = typer.Option(False, "--force", help="Overwrite locally modified template files"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Show what would change without writing anything"),
+    skip_tls: bool = typer.Option(False, "--skip-tls", help="Skip SSL/TLS verification (not recommended)"),
+    debug: bool = typer.Option(False, "--debug", help="Show verbose diagnostic output for troubleshooting"),
+    github_token: str = typer.Option(
+        None, "--github-token", help="GitHub token for API requests (or set GH_TOKEN/GITHUB_TOKEN env var)"
+    ),
+):
+    """Upgrade the templates and agent commands of the current project to a newer release."""
+    global _debug_mode
+    _debug_mode = debug
+
+    show_banner()
+
+    project_path = Path.cwd()
+    manifest = read_install_manifest(project_path)
+    if manifest is None:
+        console.print(
+            Panel(
+                f"No readable [cyan]{MANIFEST_PATH.as_posix()}[/cyan] found in {project_path}\n"
+                "Projects created before manifests existed can adopt one with "
+                "[cyan]refactor init --here --force[/cyan].",
+                title="[red]Not a Refactor Kit Project[/red]",
+                border_style="red",
+                padding=(1, 2),
+            )
+        )
+        raise typer.Exit(1)
+    if template_source not in TEMPLATE_SOURCES:
+        console.print(
+            f"[red]Error:[/red] Invalid template source '{template_source}'. Choose from: {', '.join(TEMPLATE_SOURCES)}"
+        )
+        raise typer.Exit(1)
+    agent = manifest.get("agent")
+    if agent not in AGENT_CONFIG:
+        console.print(f"[red]Error:[/red] Manifest names an unknown AI assistant '{agent}'")
+        raise typer.Exit(1)
+
+    tracker = StepTracker("Upgrade Refactor Kit Project")
+    tracker.add("manifest-read", "Read install manifest")
+    tracker.complete("manifest-read", f"{manifest.get('release', '?')} ({len(manifest['files'])} files)")
+    tracker.add("fetch", "Resolve newer templates")
+
+    http_client = _get_http_client(skip_tls)
+    release_data = _select_template_release(
+        template_source, verbose=False, tracker=tracker, http_client=http_client, debug=debug, github_token=github_token
+    )
+    target_release = release_data["tag_name"] if release_data else f"v{__version__}"
+    installed = _parse_version_tag(manifest.get("release", ""))
+    target = _parse_version_tag(target_release)
+    if installed is not None and target is not None and target <= installed:
+        if _events.machine:
+            _events.emit("result", command="upgrade", ok=True, release=manifest["release"], up_to_date=True)
+            return
+        console.print(tracker.render())
+        console.print(f"\n[bold green]Already up to date[/bold green] ({manifest['release']}).")
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        new_dir = temp_path / "new"
+        base_root = temp_path / "base"
+        new_dir.mkdir()
+        base_root.mkdir()
+
+        archive_sha256 = None
+        tracker.add("download", "Download template")
+        if release_data is None:
+            tracker.skip("download", "bundled with CLI")
+            render_agent_package(agent, new_dir)
+            source_dir = new_dir
+        else:
+            zip_path, meta = download_template_from_github(
+                agent,
+                temp_path,
+                verbose=False,
+                show_progress=False,
+                http_client=http_client,
+                debug=debug,
+                github_token=github_token,
+                release_data=release_data,
+            )
+            archive_sha256 = meta["sha256"]
+            tracker.complete("download", meta["filename"])
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                extract_zip(zip_ref, new_dir, select=template_member_filter([agent]))
+            source_dir = _get_source_dir_from_extracted(list(new_dir.iterdir()), new_dir, False, None)
+
+        base_dir = _materialize_upgrade_base(manifest, base_root)
+        base_dirs = _materialize_kept_bases(manifest, temp_path / "kept")
+        tracker.add("plan", "Compare with installed files")
+        plan = build_upgrade_plan(source_dir, project_path, manifest, base_dir, force=force, base_dirs=base_dirs)
+        tracker.complete("plan", summarize_merge_plan(plan))
+
+        tracker.add("apply", "Apply changes")
+        if dry_run:
+            tracker.skip("apply", "dry run")
+        else:
+            apply_merge_plan(plan, project_path)
+            tracker.complete("apply", f"{target_release}")
+            _record_install_manifest(
+                project_path,
+                _manifest_files_from_plan(plan, manifest),
+                tracker,
+                agent=agent,
+                release=target_release,
+                source="release" if release_data else "bundled",
+                archive_sha256=archive_sha256,
+                bases=_kept_file_bases(plan, manifest),
+            )
+            ensure_executable_scripts(project_path, tracker=tracker)
+
+    if _events.machine:
+        _events.emit(
+            "result",
+            command="upgrade",
+            ok=True,
+            release=target_release,
+            previous=manifest.get("release"),
+            dry_run=dry_run,
+            plan=plan,
+        )
+        return
+    console.print(tracker.render())
+    console.print()
+    print_merge_plan(plan, title=f"Upgrade {manifest.get('release', '?')} → {target_release}")
+    if dry_run:
+        console.print("\n[bold green]Dry run complete.[/bold green] No files were written.")
+    else:
+        console.print(f"\n[bold green]Upgraded to {target_release}.[/bold green]")
+    if any(entry["action"] == "kept" for entry in plan):
+        console.print("[dim]Files marked 'kept' were left as they are; use --force to overwrite them.[/dim]")
+
+
+@app.command()
+def sources(
+    probe: bool = typer.Option(False, "--probe", help="Look up the latest release from every source now"),
+    skip_tls: bool = typer.Option(False, "--skip-tls", help="Skip SSL/TLS verification (not recommended)"),
+    github_token: str = typer.Option(
+        None, "--github-token", help="GitHub token to use for API requests (or set GH_TOKEN or GITHUB_TOKEN)"
+    ),
+):
+    """Show the release sources in priority order with their recorded latency."""
+    show_banner()
+    try:
+        configured = configured_release_sources()
+    except ValueError as e:
+        console.print(Panel(str(e), title="Invalid Release Sources", border_style="red"))
+        raise typer.Exit(1)
+
+    latest = {}
+    if probe:
+        http_client = _get_http_client(skip_tls)
+        for source in configured:
+            try:
+                latest[source.spec] = fetch_latest_release(http_client, github_token=github_token, sources=[source])[
+                    "tag_name"
+                ]
+            except Exception:
+                latest[source.spec] = None
+
+    stats = read_source_stats()
+    if _events.machine:
+        rows = [
+            {"spec": source.spec, "kind": source.kind, **stats.get(source.spec, {}), "latest": latest.get(source.spec)}
+            for source in configured
+        ]
+        budget = read_rate_budget().get(_rate_budget_key(github_token))
+        _events.emit("result", command="sources", ok=True, sources=rows, github_budget=budget)
+        return
+    table = Table(title="Release Sources", show_lines=False)
+    table.add_column("#", justify="right", style="dim")
+    table.add_column("Source", style="cyan")
+    table.add_column("Kind")
+    table.add_column("Avg", justify="right")
+    table.add_column("Last", justify="right")
+    table.add_column("Failures", justify="right")
+    if probe:
+        table.add_column("Latest")
+    for position, source in enumerate(configured, 1):
+        entry = stats.get(source.spec, {})
+        avg_ms = entry.get("avg_ms")
+        last_ms = entry.get("last_ms")
+        row = [
+            str(position),
+            source.spec,
+            source.kind,
+            f"{avg_ms:.0f} ms" if avg_ms is not None else "-",
+            f"{last_ms:.0f} ms" if last_ms is not None else "-",
+            f"{entry.get('failures', 0)}/{entry.get('attempts', 0)}",
+        ]
+        if probe:
+            tag = latest.get(source.spec)
+            row.append(tag or f"[red]failed[/red] [dim]{entry.get('last_error') or ''}[/dim]")
+        table.add_row(*row)
+    console.print(table)
+    budget = read_rate_budget().get(_rate_budget_key(github_token))
+    if budget and budget["reset"] > time.time():
+        reset_at = datetime.fromtimestamp(budget["reset"], tz=UTC).astimezone().strftime("%H:%M:%S")
+        console.print(
+            f"GitHub API budget shared on this host: {budget['remaining']}/{budget['limit']} calls left, resets at {reset_at}"
+        )
+    console.print(
+        f"[dim]Configure with {RELEASE_SOURCES_ENV} (comma-separated) or release_sources in {_config_path()}[/dim]"
+    )
+
+
+bundle_app = typer.Typer(
+    name="bundle",
+    help="Export and import template bundles for machines without network access",
+    no_args_is_help=True,
+)
+app.add_typer(bundle_app)
+
+
+@bundle_app.command("export")
+def bundle_export(
+    output: Path | None = typer.Argument(None, help="Bundle file to write (default: refactor-kit-bundle-<tag>.zip)"),
+    release: str | None = typer.Option(None, "--release", help="Release to bundle (vX.Y.Z); defaults to the latest"),
+    ai_assistants: str | None = typer.Option(
+        None, "--ai", help=f"Comma-separated agents to include (default: all of {', '.join(AGENT_CONFIG)})"
+    ),
+    skip_tls: bool = typer.Option(False, "--skip-tls", help="Skip SSL/TLS verification (not recommended)"),
+    debug: bool = typer.Option(False, "--debug", help="Show verbose diagnostic output for troubleshooting"),
+    github_token: str = typer.Option(
+        None, "--github-token", help="GitHub token for API requests (or set GH_TOKEN/GITHUB_TOKEN env var)"
+    ),
+):
+    """Download every agent's template archive of a release into one bundle with checksums."""
+    show_banner()
+    agents = [ai.strip() for ai in ai_assistants.split(",") if ai.strip()] if ai_assistants else list(AGENT_CONFIG)
+    unknown = [ai for ai in agents if ai not in AGENT_CONFIG]
+    if unknown:
+        console.print(f"[red]Error:[/red] Unknown AI assistant(s): {', '.join(unknown)}")
+        raise typer.Exit(1)
+
+    http_client = _get_http_client(skip_tls)
+    try:
+        if release:
+            release_data = fetch_release(release, http_client, debug=debug, github_token=github_token)
+        else:
+            release_data = fetch_latest_release(http_client, debug=debug, github_token=github_token)
+        output = output or Path.cwd() / f"refactor-kit-bundle-{release_data['tag_name']}.zip"
+        manifest = export_template_bundle(
+            output,
+            release_data,
+            agents,
+            http_client=http_client,
+            github_token=github_token,
+            show_progress=not _events.machine,
+            debug=debug,
+        )
+    except Exception as e:
+        _events.emit("result", command="bundle export", ok=False, error=str(e))
+        console.print(Panel(str(e), title="Bundle Export Failed", border_style="red"))
+        raise typer.Exit(1)
+
+    if _events.machine:
+        _events.emit("result", command="bundle export", ok=True, path=str(output), **manifest)
+        return
+
+    table = Table(show_header=True, header_style="bold", box=None, padding=(0, 2))
+    table.add_column("Archive", style="cyan")
+    table.add_column("Size", justify="right")
+    table.add_column("SHA-256", style="dim")
+    for asset in manifest["assets"]:
+        table.add_row(asset["name"], f"{asset['size']:,}", asset["sha256"][:16])
+    console.print(Panel(table, title=f"Bundle {manifest['tag_name']}", border_style="cyan", padding=(1, 2)))
+    console.print(f"[green]Wrote[/green] {output} ({len(manifest['agents'])} agents)")
+
+
+@bundle_app.command("import")
+def bundle_import(
+    bundle: Path = typer.Argument(..., exists=True, dir_okay=False, help="Bundle file written by 'bundle export'"),
+    prefer_cache: bool = typer.Option(
+        True,
+        "--prefer-cache/--keep-sources",
+        help="Put the cache release source first in the config file so later inits resolve locally",
+    ),
+):
+    """Load a template bundle into the local template store for offline inits."""
+    show_banner()
+    try:
+        manifest = import_template_bundle(bundle)
+        sources = _prefer_cache_release_source() if prefer_cache else None
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        _events.emit("result", command="bundle import", ok=False, error=str(e))
+        console.print(Panel(str(e), title="Bundle Import Failed", border_style="red"))
+        raise typer.Exit(1)
+    tag = manifest["tag_name"]
+    if _events.machine:
+        _events.emit("result", command="bundle import", ok=True, release_sources=sources, **manifest)
+        return
+    console.print(
+        f"[green]Imported[/green] {tag}: {len(manifest['assets'])} archive(s) for {', '.join(manifest['agents'])}"
+    )
+    if sources:
+        console.print(f"[dim]Release sources in {_config_path()}: {', '.join(sources)}[/dim]")
+    else:
+        console.print(f"[dim]Use 'refactor init --release {tag}' to init from the bundle without network access[/dim]")
+
+
+def _project_index(root: Path):
+    """Return a refreshed ProjectIndex for root, reusing and updating its persisted copy in the cache.
+
+    The persisted copy holds each file's stat, imports and metrics, so only files changed since
+    the last run are parsed again.
+    """
+    from .analysis import ProjectIndex
+
+    resolved = root.resolve()
+    key = hashlib.sha256(str(resolved).encode("utf-8")).hexdigest()[:16]
+    index = ProjectIndex(resolved, cache_file=_cache_dir() / "index" / f"{key}.json")
+    if index.refresh():
+        index.save()
+    return index
+
+
+def _format_delta(value, delta: int) -> str:
+    if value is None:
+        return "-"
+    return f"{value} ({delta:+d})" if delta else str(value)
+
+
+@app.command()
+def analyze(
+    ctx: typer.Context,
+    path: Path = typer.Argument(Path(), help="Project root to analyze"),
+    top: int = typer.Option(20, "--top", help="Show this many modules, most complex first (0 for all)"),
+    since: str | None = typer.Option(
+        None, "--since", help="Only analyze files changed since this git ref (and their dependents), as deltas"
+    ),
+    hops: int = typer.Option(1, "--hops", help="With --since, levels of importers of changed files to include"),
+    profile: str | None = typer.Option(
+        None,
+        "--profile",
+        help="Rank hot and complex code: a Python command to sample (e.g. 'pytest -q'), or a pstats/speedscope file",
+    ),
+    interval: float = typer.Option(0.005, "--interval", help="With --profile CMD, seconds between stack samples"),
+    import_cost: str | None = typer.Option(
+        None, "--import-cost", help="Measure what importing this module costs and find lazy-import candidates"
+    ),
+    python: str | None = typer.Option(
+        None,
+        "--python",
+        help="Interpreter for --profile and --import-cost (default: the project's .venv, if any)",
+    ),
+    smells: bool = typer.Option(False, "--smells", help="List code smells, worst first, instead of metrics"),
+    rules: bool = typer.Option(
+        False, "--rules", help="List the active smell rules, their thresholds and time spent in each"
+    ),
+    severity: str | None = typer.Option(
+        None, "--severity", help="With --smells, only show smells at least this severe (high, medium, low)"
+    ),
+    dead_code: bool = typer.Option(
+        False, "--dead-code", help="List modules, functions, classes and methods nothing in the project uses"
+    ),
+    confidence: str | None = typer.Option(
+        None, "--confidence", help="With --dead-code, only show findings at least this sure (high, medium, low)"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Same as refactor --json: emit the report as a JSON event"),
+):
+    """Report size, complexity and import fan-in/fan-out of every Python module."""
+    if json_output:
+        _use_json_mode(ctx)
+    index = _project_index(path)
+    if since is not None:
+        _analyze_since(index, since, hops=hops)
+    elif profile is not None:
+        _analyze_profile(index, profile, top=top, interval=interval, python=python)
+    elif import_cost is not None:
+        _analyze_import_cost(index, import_cost, top=top, python=python)
+    elif dead_code:
+        _analyze_dead_code(index, top=top, confidence=confidence)
+    elif smells or rules:
+        for warning in index.rule_warnings:
+            if _events.machine:
+                typer.echo(f"Warning: {warning}", err=True)
+            else:
+                console.print(f"[yellow]Warning:[/yellow] {warning}")
+        if rules:
+            _analyze_rules(index)
+        else:
+            _analyze_smells(index, top=top, severity=severity)
+    else:
+        _analyze_metrics(index, top=top)
+
+
+def _analyze_metrics(index, *, top: int) -> None:
+    report = sorted(index.analyze(), key=lambda entry: (-entry.get("complexity", 0), entry["path"]))
+    if top:
+        report = report[:top]
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), modules=report)
+        return
+
+    show_banner()
+    table = Table(title=f"{len(index.modules)} modules in {index.root}")
+    table.add_column("Module", style="cyan")
+    for column in ("LOC", "Functions", "Complexity", "Max", "Fan-in", "Fan-out"):
+        table.add_column(column, justify="right")
+    for entry in report:
+        if entry["error"]:
+            table.add_row(entry["module"], f"[red]{entry['error']}[/red]", "", "", "", "", "")
+            continue
+        table.add_row(
+            entry["module"],
+            *(str(entry[key]) for key in ("loc", "functions", "complexity", "max_complexity", "fan_in", "fan_out")),
+        )
+    console.print(table)
+
+
+def _analyze_since(index, ref: str, *, hops: int) -> None:
+    from .analysis import diff_analysis
+
+    try:
+        report = diff_analysis(index, ref, hops=hops)
+    except ValueError as e:
+        _events.emit("result", command="analyze", ok=False, error=str(e))
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), **report)
+        return
+
+    show_banner()
+    table = Table(
+        title=f"{len(report['modules'])} of {report['indexed']} modules, changes since {ref} ({report['base'][:10]})"
+    )
+    table.add_column("Module", style="cyan", no_wrap=True)
+    table.add_column("Status")
+    columns = ("loc", "complexity", "max_complexity", "fan_in", "fan_out")
+    for column in ("LOC", "Complexity", "Max", "Fan-in", "Fan-out", "Smells"):
+        table.add_column(column, justify="right", no_wrap=True)
+    introduced = []
+    for entry in report["modules"]:
+        current = entry["metrics"] or {}
+        added, removed = entry["smells"]["added"], entry["smells"]["removed"]
+        introduced += [(entry["path"], finding) for finding in added]
+        changes = []
+        if added:
+            changes.append(f"+{len(added)}")
+        if removed:
+            changes.append(f"-{len(removed)}")
+        table.add_row(
+            entry["module"],
+            entry["status"],
+            *(_format_delta(current.get(key), entry["delta"][key]) for key in columns),
+            " ".join(changes),
+        )
+    table.add_row(
+        "[bold]Total[/bold]",
+        "",
+        *(f"{report['totals'][key]:+d}" if report["totals"].get(key) else "" for key in columns),
+        ", ".join(f"{count:+d} {level}" for level, count in report["totals"]["smells"].items() if count),
+    )
+    console.print(table)
+    if introduced:
+        console.print("\n[bold]New smells[/bold]")
+        for path, finding in introduced:
+            style = SEVERITY_STYLES.get(finding["severity"], "")
+            console.print(
+                f"  [{style}]{finding['severity']}[/{style}] [cyan]{path}:{finding['line']}[/cyan] "
+                f"[bold]{finding['rule']}[/bold] {finding['message']}"
+            )
+
+
+SEVERITY_STYLES = {"high": "red", "medium": "yellow", "low": "dim"}
+
+
+def _analyze_smells(index, *, top: int, severity: str | None) -> None:
+    from .smells import SEVERITIES
+
+    try:
+        found = index.smells(severity=severity)
+    except ValueError as e:
+        _events.emit("result", command="analyze", ok=False, error=str(e))
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+    counts = {level: sum(1 for f in found if f["severity"] == level) for level in SEVERITIES}
+    report = found[:top] if top else found
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), counts=counts, smells=report)
+        return
+
+    show_banner()
+    if not found:
+        console.print("[green]No smells found[/green]")
+        return
+    summary = ", ".join(f"{count} {level}" for level, count in counts.items() if count)
+    table = Table(title=f"{len(found)} smells in {index.root} ({summary})")
+    table.add_column("Severity", no_wrap=True)
+    table.add_column("Location", style="cyan", no_wrap=True)
+    table.add_column("Smell")
+    for finding in report:
+        style = SEVERITY_STYLES.get(finding["severity"], "")
+        table.add_row(
+            f"[{style}]{finding['severity']}[/{style}]",
+            f"{finding['path']}:{finding['line']}",
+            f"[bold]{finding['rule']}[/bold]\n{finding['message']}",
+        )
+    console.print(table)
+
+
+def _analyze_dead_code(index, *, top: int, confidence: str | None) -> None:
+    from .analysis import CONFIDENCES
+
+    try:
+        found = index.dead_code(confidence=confidence)
+    except ValueError as e:
+        _events.emit("result", command="analyze", ok=False, error=str(e))
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+    counts = {level: sum(1 for f in found if f["confidence"] == level) for level in CONFIDENCES}
+    report = found[:top] if top else found
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), counts=counts, dead_code=report)
+        return
+
+    show_banner()
+    if not found:
+        console.print("[green]No dead code found[/green]")
+        return
+    summary = ", ".join(f"{count} {level}" for level, count in counts.items() if count)
+    table = Table(title=f"{len(found)} unused definitions in {index.root} ({summary} confidence)")
+    table.add_column("Confidence", no_wrap=True)
+    table.add_column("Location", style="cyan", no_wrap=True)
+    table.add_column("Unused")
+    for entry in report:
+        style = SEVERITY_STYLES.get(entry["confidence"], "")
+        table.add_row(
+            f"[{style}]{entry['confidence']}[/{style}]",
+            f"{entry['path']}:{entry['line']}",
+            f"[bold]{entry['kind']} {entry['name']}[/bold]\n{entry['reason']}",
+        )
+    console.print(table)
+
+
+def _analyze_rules(index) -> None:
+    report = index.rules()
+    stats = index.scanner.stats()
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), files=stats["files"], rules=report)
+        return
+
+    show_banner()
+    table = Table(title=f"{len(report)} smell rules, {stats['files']} files scanned in {stats['scan_ms']:.1f} ms")
+    table.add_column("Rule", style="cyan", no_wrap=True)
+    table.add_column("Severity", no_wrap=True)
+    table.add_column("Options")
+    table.add_column("Calls", justify="right", no_wrap=True)
+    table.add_column("ms", justify="right", no_wrap=True)
+    for rule in report:
+        style = SEVERITY_STYLES.get(rule["severity"], "")
+        table.add_row(
+            rule["name"],
+            f"[{style}]{rule['severity']}[/{style}]",
+            ", ".join(f"{key}={value}" for key, value in rule["options"].items()),
+            str(rule["calls"]),
+            f"{rule['ms']:.1f}",
+        )
+    console.print(table)
+    if not stats["files"]:
+        console.print("[dim]No file changed since the last run, so no rule ran; timings cover scanned files only[/dim]")
+
+
+def _project_python(root: Path) -> str:
+    """Return the interpreter of root's virtualenv, or the one running refactor when it has none."""
+    for venv in (".venv", "venv"):
+        for candidate in (root / venv / "bin" / "python", root / venv / "Scripts" / "python.exe"):
+            if candidate.is_file():
+                return str(candidate)
+    return sys.executable
+
+
+def _sample_command(root: Path, command: str, *, interval: float, python: str | None, quiet: bool) -> dict:
+    """Run command under the sampling profiler in root and return its per-function times.
+
+    The sampler runs as a script under the project's interpreter so the command sees the
+    project's own environment. With quiet, the command's output goes to stderr.
+    """
+    from . import profiling
+
+    argv = shlex.split(command)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "profile.json"
+        args = [python or _project_python(root), profiling.__file__, "--output", str(output)]
+        args += ["--interval", str(interval), "--", *argv]
+        try:
+            proc = subprocess.run(args, cwd=root, check=False, capture_output=quiet, text=True)  # noqa: S603
+        except OSError as e:
+            raise ValueError(f"Cannot run {args[0]}: {e}") from e
+        if quiet and (proc.stdout or proc.stderr):
+            typer.echo(proc.stdout + proc.stderr, err=True, nl=False)
+        if not output.is_file():
+            raise ValueError(f"'{command}' exited with status {proc.returncode} before a profile was written")
+        if proc.returncode and quiet:
+            typer.echo(f"Warning: '{command}' exited with status {proc.returncode}", err=True)
+        elif proc.returncode:
+            console.print(f"[yellow]Warning:[/yellow] '{command}' exited with status {proc.returncode}")
+        return profiling.load_speedscope(output)
+
+
+def _analyze_profile(index, profile: str, *, top: int, interval: float, python: str | None) -> None:
+    from .analysis import profile_report
+    from .profiling import load_profile
+
+    try:
+        if Path(profile).is_file():
+            functions = load_profile(Path(profile))
+        else:
+            functions = _sample_command(index.root, profile, interval=interval, python=python, quiet=_events.machine)
+    except (OSError, ValueError) as e:
+        _events.emit("result", command="analyze", ok=False, error=str(e))
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+    report = {"profile": profile, **profile_report(index, functions, limit=top)}
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), **report)
+        return
+
+    show_banner()
+    if not report["functions"]:
+        console.print(f"[yellow]No samples in project code[/yellow] ({report['total_s']:.3f}s profiled)")
+        return
+    table = Table(
+        title=f"Hot and complex code: {report['project_pct']:.1f}% of {report['total_s']:.3f}s in the project"
+    )
+    table.add_column("Function", style="cyan", no_wrap=True)
+    for column in ("Self", "Self %", "Cum %", "Complexity", "Score"):
+        table.add_column(column, justify="right", no_wrap=True)
+    for entry in report["functions"]:
+        table.add_row(
+            f"{entry['module']}:{entry['function']}",
+            f"{entry['self_s']:.3f}s",
+            f"{entry['self_pct']:.1f}",
+            f"{entry['cumulative_pct']:.1f}",
+            str(entry["complexity"]),
+            f"{entry['score']:.0f}",
+        )
+    console.print(table)
+
+    modules = Table(title="By module")
+    modules.add_column("Module", style="cyan", no_wrap=True)
+    for column in ("Self", "Self %", "Cum %", "Complexity", "Score"):
+        modules.add_column(column, justify="right", no_wrap=True)
+    for entry in report["modules"]:
+        modules.add_row(
+            entry["module"],
+            f"{entry['self_s']:.3f}s",
+            f"{entry['self_pct']:.1f}",
+            f"{entry['cumulative_pct']:.1f}",
+            str(entry["complexity"]),
+            f"{entry['score']:.0f}",
+        )
+    console.print(modules)
+
+
+def _analyze_import_cost(index, module: str, *, top: int, python: str | None) -> None:
+    from .analysis import import_cost_report
+    from .profiling import import_times
+
+    interpreter = python or _project_python(index.root)
+    try:
+        roots = import_times(interpreter, module, cwd=index.root)
+    except ValueError as e:
+        _events.emit("result", command="analyze", ok=False, error=str(e))
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+    report = {"python": interpreter, **import_cost_report(index, module, roots, limit=top)}
+    if _events.machine:
+        _events.emit("result", command="analyze", ok=True, root=str(index.root), **report)
+        return
+
+    show_banner()
+    table = Table(
+        title=f"import {module}: {report['total_us'] / 1000:.1f} ms, {report['loaded']} modules"
+        f" ({report['project_us'] / 1000:.1f} ms in project code)"
+    )
+    table.add_column("Module", style="cyan", no_wrap=True)
+    table.add_column("Imported by", no_wrap=True)
+    for column in ("Self ms", "Cumulative ms"):
+        table.add_column(column, justify="right", no_wrap=True)
+    for entry in report["imports"]:
+        style = "" if entry["project"] else "dim"
+        table.add_row(
+            f"[{style}]{entry['module']}[/{style}]" if style else entry["module"],
+            entry["importer"] or "-",
+            f"{entry['self_us'] / 1000:.1f}",
+            f"{entry['cumulative_us'] / 1000:.1f}",
+        )
+    console.print(table)
+
+    if not report["lazy_candidates"]:
+        console.print("[dim]No lazy-import candidates[/dim]")
+        return
+    console.print("[bold]Lazy-import candidates[/bold] (heavy imports used only inside a few functions):")
+    for entry in report["lazy_candidates"]:
+        console.print(
+            f"  {entry['path']}:{entry['line']} [cyan]{entry['module']}[/cyan]"
+            f" {entry['cumulative_us'] / 1000:.1f} ms ({entry['share_pct']:.0f}%), used in {', '.join(entry['used_in'])}"
+        )
+
+
+@app.command("context")
+def context_command(
+    target: str = typer.Argument(..., help="Module name or file path the agent is about to analyze"),
+    budget: int = typer.Option(
+        DEFAULT_CONTEXT_BUDGET, "--budget", help="Maximum size of the pack in (approximate) tokens"
+    ),
+    root: Path = typer.Option(Path(), "--root", help="Project root"),
+    output: Path | None = typer.Option(None, "--output", "-o", help="Write the Markdown pack to this file"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Rebuild the pack even if a cached one is current"),
+):
+    """Pack a module's code, dependency signatures, call sites and tests into a token-budgeted Markdown bundle."""
+    from .context import context_pack
+
+    index = _project_index(root)
+    try:
+        pack = context_pack(index, target, budget, cache_dir=None if no_cache else _cache_dir() / "context")
+    except KeyError:
+        console.print(f"[red]Error:[/red] No Python module '{target}' under {index.root}")
+        raise typer.Exit(1)
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1)
+
+    summary = (
+        f"~{pack['tokens']}/{budget} tokens, {pack['snippets']} snippets"
+        f" ({pack['omitted']} left out){', cached' if pack['cached'] else ''}"
+    )
+    if _events.machine:
+        _events.emit("result", command="context", ok=True, **pack)
+        return
+    if output:
+        output.write_text(pack["markdown"], encoding="utf-8")
+        console.print(f"[green]Wrote[/green] {output}: {summary}")
+        return
+    typer.echo(pack["markdown"], nl=False)
+    typer.echo(summary, err=True)
+
+
+@app.command()
+def serve(
+    path: Path = typer.Argument(Path(), help="Project root to keep indexed"),
+    socket_path: Path | None = typer.Option(
+        None, "--socket", help="Listen on this Unix socket instead of reading requests from stdin"
+    ),
+):
+    """Run a JSON-RPC analysis daemon that keeps the project's ASTs, import graph and metrics warm."""
+    from .server import AnalysisServer, serve_stdio, serve_unix_socket
+
+    start = time.perf_counter()
+    index = _project_index(path)
+    server = AnalysisServer(index, context_cache_dir=_cache_dir() / "context")
+    # stdout carries the protocol in stdio mode, so status goes to stderr
+    typer.echo(f"Indexed {len(index.modules)} modules in {(time.perf_counter() - start) * 1000:.0f} ms", err=True)
+    if socket_path is None:
+        serve_stdio(server)
+        return
+    try:
+        typer.echo(f"Listening on {socket_path}", err=True)
+        serve_unix_socket(server, socket_path)
+    except OSError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
 @app.command()
 def version():
     """Show the version of Refactor CLI."""
     import platform
 
+    if _events.machine:
+        _events.emit(
+            "result",
+            command="version",
+            ok=True,
+            cli_version=__version__,
+            python=platform.python_version(),
+            platform=platform.system(),
+            architecture=platform.machine(),
+        )
+        return
+
     show_banner()
 
     info_table = Table(show_header=False, box=None, padding=(0, 2))
@@ -1183,7 +4752,10 @@ def version():
 
 def main():
     """Main entry point for the CLI."""
-    app()
+    try:
+        app()
+    finally:
+        close_http_clients()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1127 @@
+"""Static analysis of a Python project: parsed modules, the import graph, metrics and git history.
+
+A ProjectIndex parses every module once and keeps the trees, imports and metrics in memory.
+refresh() re-parses only the files whose size or mtime changed, so a long-lived process
+(``refactor serve``) answers repeated queries without re-reading the project.
+"""
+
+import ast
+import json
+import os
+import re
+import subprocess
+import tomllib
+from collections import Counter
+from pathlib import Path, PurePosixPath
+
+from .smells import (
+    SEVERITIES,
+    Rule,
+    Scanner,
+    configure_rules,
+    decision_points,
+    dotted_name,
+    load_config,
+    rank,
+    rules_fingerprint,
+)
+
+# Directories never worth indexing: VCS metadata, virtualenvs, caches and build output
+EXCLUDED_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "env",
+        "node_modules",
+        "__pycache__",
+        "build",
+        "dist",
+        ".tox",
+        ".nox",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        "site-packages",
+    }
+)
+# Commits read from git log to compute per-file churn for hotspots
+HISTORY_LIMIT = 1000
+# Bump when the persisted index layout or the metrics change so stale caches are ignored
+INDEX_FORMAT = 4
+
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def iter_python_files(root: Path):
+    """Yield the relative POSIX path and stat result of every .py file under root."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDED_DIRS and not d.startswith("."))
+        rel_dir = PurePosixPath(Path(dirpath).relative_to(root).as_posix())
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                try:
+                    st = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                yield (rel_dir / filename).as_posix(), st
+
+
+def module_name(rel_path: str) -> str:
+    """Return the dotted module name of a project-relative path (src/ layouts are unwrapped)."""
+    parts = list(PurePosixPath(rel_path).with_suffix("").parts)
+    if len(parts) > 1 and parts[0] == "src":
+        parts = parts[1:]
+    if len(parts) > 1 and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def is_test_module(rel_path: str) -> bool:
+    """Return True for test modules (test_*.py, *_test.py, or anything under a tests/ directory)."""
+    path = PurePosixPath(rel_path)
+    return (
+        path.name.startswith("test_")
+        or path.stem.endswith("_test")
+        or any(part in {"tests", "test"} for part in path.parts[:-1])
+    )
+
+
+def function_complexity(node: ast.AST) -> int:
+    """Return the cyclomatic complexity of one function body, not counting nested functions or classes."""
+    complexity = 1
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        if isinstance(child, _SCOPE_NODES):
+            continue
+        complexity += decision_points(child)
+        stack.extend(ast.iter_child_nodes(child))
+    return complexity
+
+
+def module_metrics(tree: ast.Module, source: str) -> dict:
+    """Return size and complexity metrics of a parsed module (see ``smells.Scanner.scan``)."""
+    return Scanner().scan(tree, source)[0]
+
+
+def from_import_module(node: ast.ImportFrom, name: str, *, is_package: bool) -> str:
+    """Return the absolute module a ``from ... import`` statement in module name imports from."""
+    if not node.level:
+        return node.module or ""
+    package = name.split(".") if is_package else name.split(".")[:-1]
+    base = package[: len(package) - node.level + 1] if node.level <= len(package) + 1 else []
+    return ".".join([*base, *([node.module] if node.module else [])])
+
+
+def imported_names(tree: ast.Module, name: str, *, is_package: bool) -> set[str]:
+    """Return every dotted name a module imports, with relative imports made absolute.
+
+    ``from a import b`` yields both ``a`` and ``a.b`` since b may be a submodule; the index
+    keeps whichever of them is a module of the project.
+    """
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            prefix = from_import_module(node, name, is_package=is_package)
+            if prefix:
+                names.add(prefix)
+            names.update(f"{prefix}.{alias.name}" if prefix else alias.name for alias in node.names)
+    return names
+
+
+def resolve_imports(imports, name: str, known) -> set[str]:
+    """Map imported dotted names to the modules in known they refer to (longest matching prefix)."""
+    targets = set()
+    for imported in imports:
+        parts = imported.split(".")
+        while parts and ".".join(parts) not in known:
+            parts.pop()
+        if parts and ".".join(parts) != name:
+            targets.add(".".join(parts))
+    return targets
+
+
+def reverse_edges(graph: dict[str, set[str]]) -> dict[str, set[str]]:
+    """Return module -> modules that import it, for an import graph."""
+    reverse: dict[str, set[str]] = {name: set() for name in graph}
+    for name, targets in graph.items():
+        for target in targets:
+            reverse.setdefault(target, set()).add(name)
+    return reverse
+
+
+def reachable(edges: dict[str, set[str]], names, *, hops: int | None = None) -> set[str]:
+    """Return the nodes reached from names within ``hops`` steps (unbounded when None), excluding names."""
+    found: set[str] = set()
+    frontier = set(names)
+    depth = 0
+    while frontier and (hops is None or depth < hops):
+        frontier = {nxt for name in frontier for nxt in edges.get(name, ())} - found - set(names)
+        found |= frontier
+        depth += 1
+    return found
+
+
+# How sure dead_code() is that nothing uses a definition, most sure first
+CONFIDENCES = ("high", "medium", "low")
+# Decorators that change how a function is called but do not register it anywhere
+_PLAIN_DECORATORS = frozenset(
+    {"property", "cached_property", "staticmethod", "classmethod", "setter", "getter", "deleter", "cache", "lru_cache"}
+)
+# Definitions that declare an interface rather than code anything calls
+_INTERFACE_DECORATORS = frozenset({"abstractmethod", "overload"})
+_REFLECTION_CALLS = frozenset({"getattr", "hasattr", "setattr", "delattr"})
+# "pkg.mod", "pkg.mod.func" or "pkg.mod:func", as in entry points, mock.patch targets and import_module
+_QUALIFIED_STRING_RE = re.compile(r"[A-Za-z_]\w*(?:[.:][A-Za-z_]\w*)+")
+
+
+def _decorator_names(node: ast.AST) -> list[str]:
+    names = []
+    for decorator in getattr(node, "decorator_list", []):
+        target = decorator.func if isinstance(decorator, ast.Call) else decorator
+        names.append((dotted_name(target) or "").rpartition(".")[2])
+    return names
+
+
+def _definition(node: ast.AST, name: str, kind: str, *, override: bool = False) -> dict | None:
+    decorators = _decorator_names(node)
+    if _INTERFACE_DECORATORS.intersection(decorators):
+        return None
+    return {
+        "name": name,
+        "kind": kind,
+        "line": node.lineno,
+        "decorated": any(d not in _PLAIN_DECORATORS for d in decorators),
+        "override": override,
+    }
+
+
+def _is_main_guard(node: ast.AST) -> bool:
+    test = getattr(node, "test", None)
+    return (
+        isinstance(node, ast.If)
+        and isinstance(test, ast.Compare)
+        and isinstance(test.left, ast.Name)
+        and test.left.id == "__name__"
+        and any(isinstance(c, ast.Constant) and c.value == "__main__" for c in test.comparators)
+    )
+
+
+def _string_list(node: ast.AST | None) -> list[str]:
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [elt.value for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+    return []
+
+
+def module_symbols(tree: ast.Module, name: str, *, is_package: bool) -> dict:
+    """Return what module name defines and what it refers to, for ProjectIndex.dead_code().
+
+    defs are the module's functions and classes and the methods of its classes. refs are the
+    qualified names it imports or loads through an import or one of its own definitions
+    (``from .pricing import total`` then ``total()`` is ``shop.pricing.total``); a
+    definition's uses of itself, and a method's uses of its class, are left out. dynamic holds dotted strings such as
+    ``"shop.cart:checkout"``, attrs the attribute names it loads (constant ``getattr`` names
+    included) and strings its other identifier-like string constants, since either may reach
+    a definition the index cannot resolve. exports is ``__all__``; main is True when the
+    module has an ``if __name__ == "__main__":`` block.
+    """
+    bindings: dict[str, str] = {}
+    refs: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                refs.add(alias.name)
+                if alias.asname:
+                    bindings[alias.asname] = alias.name
+                else:
+                    head = alias.name.partition(".")[0]
+                    bindings[head] = head
+        elif isinstance(node, ast.ImportFrom):
+            module = from_import_module(node, name, is_package=is_package)
+            refs.add(module)
+            for alias in node.names:
+                if alias.name != "*":
+                    refs.add(f"{module}.{alias.name}" if module else alias.name)
+                    bindings[alias.asname or alias.name] = f"{module}.{alias.name}" if module else alias.name
+
+    defs, exports, main = [], [], False
+    owners: list[tuple[ast.AST, str, str | None]] = []
+    for node in _module_level_statements(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            bindings[node.name] = f"{name}.{node.name}"
+            defs.append(_definition(node, node.name, kind))
+            owners.append((node, f"{name}.{node.name}", None))
+            if kind == "class":
+                for child in node.body:
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        qualname = f"{node.name}.{child.name}"
+                        defs.append(_definition(child, qualname, "method", override=bool(node.bases)))
+                        owners.append((child, f"{name}.{node.name}", child.name))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(t, ast.Name) and t.id == "__all__" for t in targets):
+                exports += _string_list(node.value)
+        main = main or _is_main_guard(node)
+
+    # Every node is visited once, as part of the innermost definition it belongs to
+    owner_of = {id(node): (qualified, method) for node, qualified, method in owners}
+    attrs: set[str] = set()
+    strings: set[str] = set()
+    dynamic: set[str] = set()
+    stack: list[tuple[ast.AST, str | None, str | None]] = [(tree, None, None)]
+    while stack:
+        node, owner, method = stack.pop()
+        owner, method = owner_of.get(id(node), (owner, method))
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            continue  # docstrings
+        if isinstance(node, (ast.Name, ast.Attribute)) and isinstance(node.ctx, ast.Load):
+            if isinstance(node, ast.Attribute) and node.attr != method:
+                attrs.add(node.attr)
+            dotted = dotted_name(node)
+            head, _, rest = (dotted or "").partition(".")
+            if head in bindings:
+                qualified = f"{bindings[head]}.{rest}" if rest else bindings[head]
+                if owner is None or (qualified != owner and not qualified.startswith(f"{owner}.")):
+                    refs.add(qualified)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _REFLECTION_CALLS:
+            if len(node.args) > 1 and isinstance(node.args[1], ast.Constant) and isinstance(node.args[1].value, str):
+                attrs.add(node.args[1].value)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            if _QUALIFIED_STRING_RE.fullmatch(node.value):
+                dynamic.add(node.value.replace(":", "."))
+            elif node.value.isidentifier():
+                strings.add(node.value)
+        stack.extend((child, owner, method) for child in ast.iter_child_nodes(node))
+    return {
+        "defs": [d for d in defs if d is not None],
+        "refs": sorted(refs),
+        "dynamic": sorted(dynamic),
+        "attrs": sorted(attrs),
+        "strings": sorted(strings),
+        "exports": exports,
+        "main": main,
+    }
+
+
+def entry_point_refs(root: Path) -> set[str]:
+    """Return the objects pyproject.toml's scripts and entry points name, as dotted names."""
+    try:
+        data = tomllib.loads((Path(root) / "pyproject.toml").read_text(encoding="utf-8"))
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError):
+        return set()
+    project = data.get("project", {})
+    tables = [project.get("scripts", {}), project.get("gui-scripts", {}), *project.get("entry-points", {}).values()]
+    tables.append(data.get("tool", {}).get("poetry", {}).get("scripts", {}))
+    refs = set()
+    for table in tables:
+        for value in table.values() if isinstance(table, dict) else ():
+            if isinstance(value, str):
+                refs.add(value.partition("[")[0].strip().replace(":", "."))
+    return refs
+
+
+def _prefixes(names) -> set[str]:
+    """Return names and every dotted prefix of them: a use of ``a.b.c`` also uses ``a.b`` and ``a``."""
+    found = set()
+    for qualified in names:
+        parts = qualified.split(".")
+        found.update(".".join(parts[:i]) for i in range(1, len(parts) + 1))
+    return found
+
+
+def _git(root: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=root, capture_output=True, text=True)  # noqa: S603 - fixed git argv
+
+
+def git_merge_base(root: Path, ref: str) -> str:
+    """Return the commit where HEAD branched from ref; raises ValueError for an unknown ref."""
+    result = _git(root, "merge-base", ref, "HEAD")
+    if result.returncode != 0:
+        raise ValueError(f"Cannot find a merge base with '{ref}': {result.stderr.strip() or 'not a git repository'}")
+    return result.stdout.strip()
+
+
+def git_changed_files(root: Path, base: str) -> list[str]:
+    """Return the files under root that differ from base, including uncommitted and untracked ones."""
+    diff = _git(root, "diff", "--name-only", "--no-renames", "--relative", base, "--", ".")
+    untracked = _git(root, "ls-files", "--others", "--exclude-standard", "--", ".")
+    return sorted({line for line in (diff.stdout + untracked.stdout).splitlines() if line})
+
+
+def git_show(root: Path, rev: str, rel_path: str) -> str | None:
+    """Return the content of rel_path (relative to root) at rev, or None if it did not exist."""
+    result = _git(root, "show", f"{rev}:./{rel_path}")
+    return result.stdout if result.returncode == 0 else None
+
+
+def _git_head(root: Path) -> str | None:
+    """Return the commit checked out in root's repository, or None outside git."""
+    result = _git(root, "rev-parse", "HEAD")
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def git_churn(root: Path, *, limit: int = HISTORY_LIMIT) -> dict[str, int]:
+    """Return how many of the last ``limit`` commits touched each file, relative to root."""
+    result = _git(root, "log", f"-n{limit}", "--format=", "--name-only", "--no-renames", "--relative", "--", ".")
+    churn: dict[str, int] = {}
+    if result.returncode != 0:
+        return churn
+    for line in result.stdout.splitlines():
+        if line:
+            churn[line] = churn.get(line, 0) + 1
+    return churn
+
+
+class UnknownTargetError(KeyError):
+    """A module name or path that is not part of the indexed project."""
+
+
+class ProjectIndex:
+    """In-memory index of a project's Python modules, kept current by refresh()."""
+
+    def __init__(self, root: Path, *, cache_file: Path | None = None, rules: list[Rule] | None = None):
+        self.root = Path(root).resolve()
+        # Smell rules come from the project's [tool.refactor.smells] configuration unless given
+        self.rule_warnings: list[str] = []
+        if rules is None:
+            config, self.rule_warnings = load_config(self.root)
+            rules, warnings = configure_rules(config)
+            self.rule_warnings += warnings
+        self.scanner = Scanner(rules)
+        self._rules_key = rules_fingerprint(rules)
+        # module name -> {name, path, mtime_ns, size, tree, source, imports, metrics, smells, symbols, error}
+        # tree and source stay None for records restored from cache_file until parsed() needs them
+        self.modules: dict[str, dict] = {}
+        self.cache_file = cache_file
+        self._by_path: dict[str, str] = {}
+        self._graph: dict[str, set[str]] | None = None
+        self._reverse: dict[str, set[str]] | None = None
+        # Every reference of every module, merged once per generation for dead_code()
+        self._references: tuple[set[str], set[str], set[str], set[str]] | None = None
+        self._history: tuple[str | None, dict[str, int]] | None = None
+        # Bumped whenever a module changes so callers can key their own caches on it
+        self.generation = 0
+        if cache_file:
+            self._restore()
+
+    def _restore(self) -> None:
+        try:
+            data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if (
+            data.get("format") != INDEX_FORMAT
+            or data.get("root") != str(self.root)
+            or data.get("rules") != self._rules_key
+        ):
+            return
+        for rel_path, entry in data.get("files", {}).items():
+            name = module_name(rel_path)
+            self._by_path[rel_path] = name
+            self.modules[name] = {
+                **entry,
+                "name": name,
+                "path": rel_path,
+                "tree": None,
+                "source": None,
+                "imports": set(entry["imports"]),
+            }
+
+    def save(self) -> None:
+        """Persist paths, stats, imports and metrics to cache_file so the next process skips parsing."""
+        if not self.cache_file:
+            return
+        files = {
+            record["path"]: {
+                "mtime_ns": record["mtime_ns"],
+                "size": record["size"],
+                "imports": sorted(record["imports"]),
+                "metrics": record["metrics"],
+                "smells": record["smells"],
+                "symbols": record["symbols"],
+                "error": record["error"],
+            }
+            for record in self.modules.values()
+        }
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_file.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps({"format": INDEX_FORMAT, "root": str(self.root), "rules": self._rules_key, "files": files}),
+                encoding="utf-8",
+            )
+            tmp.replace(self.cache_file)
+        except OSError:
+            pass
+
+    def refresh(self) -> list[str]:
+        """Re-parse added or modified files and drop deleted ones; return the changed paths."""
+        changed = []
+        seen = set()
+        for rel_path, st in iter_python_files(self.root):
+            seen.add(rel_path)
+            name = self._by_path.get(rel_path)
+            record = self.modules.get(name) if name else None
+            if record and record["mtime_ns"] == st.st_mtime_ns and record["size"] == st.st_size:
+                continue
+            self._load(rel_path, st)
+            changed.append(rel_path)
+        for rel_path in set(self._by_path) - seen:
+            self.modules.pop(self._by_path.pop(rel_path), None)
+            changed.append(rel_path)
+        if changed:
+            self._graph = self._reverse = self._references = None
+            self.generation += 1
+        return sorted(changed)
+
+    def _load(self, rel_path: str, st: os.stat_result) -> None:
+        name = module_name(rel_path)
+        record = {
+            "name": name,
+            "path": rel_path,
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "tree": None,
+            "source": None,
+            "imports": set(),
+            "metrics": None,
+            "smells": [],
+            "symbols": None,
+            "error": None,
+        }
+        try:
+            source = (self.root / rel_path).read_text(encoding="utf-8", errors="replace")
+            tree = ast.parse(source, filename=rel_path)
+        except (OSError, SyntaxError, ValueError) as e:
+            record["error"] = str(e)
+        else:
+            record["source"] = source
+            record["tree"] = tree
+            is_package = rel_path.endswith("__init__.py")
+            record["imports"] = imported_names(tree, name, is_package=is_package)
+            record["metrics"], record["smells"] = self.scanner.scan(tree, source)
+            record["symbols"] = module_symbols(tree, name, is_package=is_package)
+        self._by_path[rel_path] = name
+        self.modules[name] = record
+
+    def parsed(self, name: str) -> dict:
+        """Return the record of module name with its source and tree loaded."""
+        record = self.modules[name]
+        if record["tree"] is None and record["error"] is None:
+            try:
+                record["source"] = (self.root / record["path"]).read_text(encoding="utf-8", errors="replace")
+                record["tree"] = ast.parse(record["source"], filename=record["path"])
+            except (OSError, SyntaxError, ValueError) as e:
+                record["error"] = str(e)
+        return record
+
+    def resolve(self, target: str) -> str:
+        """Return the module name for a module name or a project-relative/absolute file path.
+
+        Raises UnknownTargetError (a KeyError) when target is not a module of the project.
+        """
+        if target in self.modules:
+            return target
+        path = Path(target)
+        if path.is_absolute():
+            try:
+                path = path.resolve().relative_to(self.root)
+            except ValueError:
+                raise UnknownTargetError(target) from None
+        rel_path = path.as_posix().removeprefix("./")
+        if rel_path in self._by_path:
+            return self._by_path[rel_path]
+        for candidate in (f"{rel_path}.py", f"{rel_path}/__init__.py"):
+            if candidate in self._by_path:
+                return self._by_path[candidate]
+        raise UnknownTargetError(target)
+
+    def graph(self) -> dict[str, set[str]]:
+        """Return module -> project modules it imports (external imports are left out)."""
+        if self._graph is None:
+            self._graph = {
+                name: resolve_imports(record["imports"], name, self.modules) for name, record in self.modules.items()
+            }
+        return self._graph
+
+    def reverse_graph(self) -> dict[str, set[str]]:
+        """Return module -> project modules that import it."""
+        if self._reverse is None:
+            self._reverse = reverse_edges(self.graph())
+        return self._reverse
+
+    def dependents(self, names, *, hops: int | None = None) -> set[str]:
+        """Return the modules that import any of names, directly or within ``hops`` levels."""
+        return reachable(self.reverse_graph(), names, hops=hops)
+
+    def analyze(self, targets=None) -> list[dict]:
+        """Return path, module, metrics and fan-in/fan-out of the given (default: all) modules."""
+        names = [self.resolve(t) for t in targets] if targets else sorted(self.modules)
+        graph, reverse = self.graph(), self.reverse_graph()
+        report = []
+        for name in names:
+            record = self.modules[name]
+            entry = {"module": name, "path": record["path"], "error": record["error"]}
+            if record["metrics"] is not None:
+                entry.update(record["metrics"], fan_out=len(graph[name]), fan_in=len(reverse[name]))
+            report.append(entry)
+        return report
+
+    def deps(self, target: str) -> dict:
+        """Return the project modules target imports and the modules that import it."""
+        name = self.resolve(target)
+        return {
+            "module": name,
+            "path": self.modules[name]["path"],
+            "imports": sorted(self.graph()[name]),
+            "imported_by": sorted(self.reverse_graph()[name]),
+        }
+
+    def churn(self) -> dict[str, int]:
+        """Return per-file commit counts, recomputed only when HEAD moves."""
+        head = _git_head(self.root)
+        if self._history is None or self._history[0] != head:
+            self._history = (head, git_churn(self.root) if head else {})
+        return self._history[1]
+
+    def hotspots(self, limit: int = 10) -> list[dict]:
+        """Rank modules by churn x complexity: code that is both complicated and often changed."""
+        churn = self.churn()
+        ranked = []
+        for name, record in self.modules.items():
+            metrics = record["metrics"]
+            commits = churn.get(record["path"], 0)
+            if metrics is None or not commits:
+                continue
+            ranked.append(
+                {
+                    "module": name,
+                    "path": record["path"],
+                    "churn": commits,
+                    "complexity": metrics["complexity"],
+                    "loc": metrics["loc"],
+                    "score": commits * max(metrics["complexity"], 1),
+                }
+            )
+        ranked.sort(key=lambda entry: (-entry["score"], entry["path"]))
+        return ranked[:limit]
+
+    def smells(self, targets=None, *, severity: str | None = None, limit: int | None = None) -> list[dict]:
+        """Return the smells found in the given (default: all) modules, worst first.
+
+        severity keeps only findings at least that severe.
+        """
+        names = [self.resolve(t) for t in targets] if targets else sorted(self.modules)
+        found = [
+            {"module": name, "path": self.modules[name]["path"], **finding}
+            for name in names
+            for finding in self.modules[name]["smells"]
+        ]
+        if severity is not None:
+            if severity not in SEVERITIES:
+                raise ValueError(f"Unknown severity {severity!r}; expected one of {', '.join(SEVERITIES)}")
+            keep = SEVERITIES[: SEVERITIES.index(severity) + 1]
+            found = [finding for finding in found if finding["severity"] in keep]
+        ranked = rank(found)
+        return ranked[:limit] if limit else ranked
+
+    def rules(self) -> list[dict]:
+        """Return every active smell rule with its thresholds and the time it took in this process."""
+        timings = self.scanner.stats()["rules"]
+        return [
+            {
+                "name": rule.name,
+                "category": rule.category,
+                "severity": rule.severity,
+                "options": rule.options,
+                "source": type(rule).__module__,
+                "description": rule.description,
+                **timings[rule.name],
+            }
+            for rule in self.scanner.rules
+        ]
+
+    def references(self) -> tuple[set[str], set[str], set[str], set[str]]:
+        """Return the qualified names, dynamic (string) names, attribute names and strings the project uses.
+
+        Qualified and dynamic names include their dotted prefixes, and dynamic names include
+        the scripts and entry points of pyproject.toml.
+        """
+        if self._references is None:
+            refs, dynamic, attrs, strings = set(), set(entry_point_refs(self.root)), set(), set()
+            for record in self.modules.values():
+                symbols = record["symbols"]
+                if symbols:
+                    refs.update(symbols["refs"])
+                    dynamic.update(symbols["dynamic"])
+                    attrs.update(symbols["attrs"])
+                    strings.update(symbols["strings"])
+            self._references = (_prefixes(refs), _prefixes(dynamic), attrs, strings)
+        return self._references
+
+    def _unused_module(self, name: str, record: dict, dynamic: set[str], strings: set[str]) -> dict | None:
+        path = PurePosixPath(record["path"])
+        if (
+            self.reverse_graph()[name]
+            or name in dynamic
+            or is_test_module(record["path"])
+            or path.stem in {"__init__", "__main__", "conftest", "setup"}
+        ):
+            return None
+        if record["symbols"]["main"] or name.rpartition(".")[0] not in self.modules:
+            confidence, reason = "low", "no module imports it, but it looks like a script"
+        elif not all(part.isidentifier() for part in name.split(".")):
+            confidence, reason = "low", "no import statement can name it, so it is loaded dynamically or unused"
+        elif path.stem in strings:
+            confidence, reason = "medium", "no module imports it, but its name appears in a string"
+        else:
+            confidence, reason = "high", "no module imports it"
+        return {"name": name, "kind": "module", "line": 1, "confidence": confidence, "reason": reason}
+
+    def _unused_definition(self, name: str, record: dict, definition: dict, references: tuple) -> dict | None:
+        refs, dynamic, attrs, strings = references
+        qualified = f"{name}.{definition['name']}"
+        bare = definition["name"].rpartition(".")[2]
+        top = definition["name"].partition(".")[0]
+        path = record["path"]
+        if (
+            qualified in refs
+            or qualified in dynamic
+            or (bare.startswith("__") and bare.endswith("__"))
+            or top in record["symbols"]["exports"]
+            or (definition["kind"] == "method" and bare in attrs)
+            or (
+                (is_test_module(path) or path.endswith("conftest.py"))
+                and (top.lower().startswith("test") or bare.startswith(("pytest_", "setUp", "tearDown")))
+            )
+        ):
+            return None
+        if definition["decorated"]:
+            confidence, reason = "low", "no references, but a decorator may register it"
+        elif definition["override"]:
+            confidence, reason = "low", "no references, but it may override a base class method"
+        elif bare in strings or bare in attrs:
+            confidence, reason = "medium", "no references, but its name appears as an attribute or string"
+        elif path.endswith("__init__.py") and not bare.startswith("_"):
+            confidence, reason = "medium", "no references, but it is public in a package's __init__"
+        else:
+            confidence, reason = "high", "no references"
+        return {key: definition[key] for key in ("name", "kind", "line")} | {"confidence": confidence, "reason": reason}
+
+    def dead_code(self, targets=None, *, confidence: str | None = None, limit: int | None = None) -> list[dict]:
+        """Return the modules, functions, classes and methods nothing in the project uses, surest first.
+
+        The project is taken to be the whole program: only its own modules, its __all__ lists
+        and its pyproject.toml entry points count as uses. confidence keeps only findings at
+        least that sure. An unused module's definitions are not reported separately.
+        """
+        if confidence is not None and confidence not in CONFIDENCES:
+            raise ValueError(f"Unknown confidence {confidence!r}; expected one of {', '.join(CONFIDENCES)}")
+        names = [self.resolve(t) for t in targets] if targets else sorted(self.modules)
+        references = self.references()
+        keep = CONFIDENCES[: CONFIDENCES.index(confidence) + 1] if confidence else CONFIDENCES
+        found = []
+        for name in names:
+            record = self.modules[name]
+            if record["symbols"] is None:
+                continue
+            module = self._unused_module(name, record, references[1], references[3])
+            unused = (
+                [module]
+                if module
+                else [self._unused_definition(name, record, d, references) for d in record["symbols"]["defs"]]
+            )
+            found += [
+                {"module": name, "path": record["path"], **entry}
+                for entry in unused
+                if entry and entry["confidence"] in keep
+            ]
+        found.sort(key=lambda entry: (CONFIDENCES.index(entry["confidence"]), entry["path"], entry["line"]))
+        return found[:limit] if limit else found
+
+    def affected_tests(self, targets) -> list[str]:
+        """Return the test files that import any of targets directly or transitively."""
+        names = {self.resolve(t) for t in targets}
+        affected = names | self.dependents(names)
+        return sorted(self.modules[name]["path"] for name in affected if is_test_module(self.modules[name]["path"]))
+
+
+# Metrics compared against the base in diff_analysis
+DELTA_METRICS = ("loc", "functions", "classes", "complexity", "max_complexity", "fan_in", "fan_out")
+# The deltas that add up across modules into a total for the change
+TOTAL_METRICS = ("loc", "functions", "classes", "complexity")
+
+
+def _base_state(root: Path, base: str, rel_path: str, scanner: Scanner) -> dict | None:
+    """Return the imports, metrics and smells of rel_path at base, or None if it did not exist there."""
+    source = git_show(root, base, rel_path)
+    if source is None:
+        return None
+    name = module_name(rel_path)
+    try:
+        tree = ast.parse(source, filename=rel_path)
+    except (SyntaxError, ValueError):
+        return {"imports": set(), "metrics": None, "smells": []}
+    metrics, smells = scanner.scan(tree, source)
+    return {
+        "imports": imported_names(tree, name, is_package=rel_path.endswith("__init__.py")),
+        "metrics": metrics,
+        "smells": smells,
+    }
+
+
+def smell_delta(old: list[dict], new: list[dict]) -> dict[str, list[dict]]:
+    """Return the findings new adds to old and the ones it removes, worst first.
+
+    Findings are matched on rule, function and message, not line, so code that only moved
+    within the file is neither added nor removed.
+    """
+
+    def key(finding: dict) -> tuple:
+        return finding["rule"], finding["function"], finding["message"]
+
+    unmatched = Counter(key(finding) for finding in old)
+    added = []
+    for finding in new:
+        if unmatched[key(finding)]:
+            unmatched[key(finding)] -= 1
+        else:
+            added.append(finding)
+    removed = []
+    for finding in old:
+        if unmatched[key(finding)]:
+            unmatched[key(finding)] -= 1
+            removed.append(finding)
+    return {"added": rank(added), "removed": rank(removed)}
+
+
+def diff_analysis(index: ProjectIndex, ref: str, *, hops: int = 1) -> dict:
+    """Analyze only the modules changed since ref and their dependents, as deltas against the base.
+
+    The base is the merge base of ref and HEAD. The changed set includes uncommitted and
+    untracked files. It is widened by ``hops`` levels of importers, in the current import
+    graph and in the base one, so importers of deleted modules are covered too. Only the
+    changed files are parsed at the base, and scanned for smells with the index's rules;
+    every other module's base metrics are its current ones, with fan-in and fan-out taken
+    from the base graph.
+    """
+    base = git_merge_base(index.root, ref)
+    changed = [p for p in git_changed_files(index.root, base) if p.endswith(".py")]
+    before = {module_name(p): _base_state(index.root, base, p, index.scanner) for p in changed}
+    status = {}
+    for rel_path in changed:
+        name = module_name(rel_path)
+        if name in index.modules:
+            status[name] = "modified" if before[name] is not None else "added"
+        elif before[name] is not None and not (index.root / rel_path).exists():
+            status[name] = "deleted"
+
+    graph, reverse = index.graph(), index.reverse_graph()
+    base_names = {n for n in index.modules if status.get(n) != "added"} | {
+        n for n, st in status.items() if st == "deleted"
+    }
+    base_graph = {
+        name: resolve_imports(
+            before[name]["imports"] if status.get(name) in {"modified", "deleted"} else index.modules[name]["imports"],
+            name,
+            base_names,
+        )
+        for name in base_names
+    }
+    base_reverse = reverse_edges(base_graph)
+    affected = reachable(reverse, [n for n in status if n in index.modules], hops=hops) | reachable(
+        base_reverse, [n for n in status if n in base_names], hops=hops
+    )
+
+    modules = []
+    totals = dict.fromkeys(TOTAL_METRICS, 0)
+    smell_totals = dict.fromkeys(SEVERITIES, 0)
+    for name in sorted(set(status) | affected):
+        record = index.modules.get(name)
+        current = old = None
+        if record is not None and record["metrics"] is not None:
+            current = {**record["metrics"], "fan_in": len(reverse[name]), "fan_out": len(graph[name])}
+        old_metrics = (
+            before[name]["metrics"] if status.get(name) in {"modified", "deleted"} else (record or {}).get("metrics")
+        )
+        if name in base_names and old_metrics is not None:
+            old = {**old_metrics, "fan_in": len(base_reverse[name]), "fan_out": len(base_graph[name])}
+        delta = {key: (current or {}).get(key, 0) - (old or {}).get(key, 0) for key in DELTA_METRICS}
+        for key in TOTAL_METRICS:
+            totals[key] += delta[key]
+        current_smells = record["smells"] if record else []
+        if status.get(name) in {"modified", "deleted"}:
+            old_smells = before[name]["smells"]
+        else:
+            old_smells = [] if status.get(name) == "added" else current_smells
+        smells = smell_delta(old_smells, current_smells)
+        for finding in smells["added"]:
+            smell_totals[finding["severity"]] += 1
+        for finding in smells["removed"]:
+            smell_totals[finding["severity"]] -= 1
+        modules.append(
+            {
+                "module": name,
+                "path": record["path"] if record else next(p for p in changed if module_name(p) == name),
+                "status": status.get(name, "dependent"),
+                "metrics": current,
+                "delta": delta,
+                "smells": smells,
+            }
+        )
+    return {
+        "ref": ref,
+        "base": base,
+        "hops": hops,
+        "changed": changed,
+        "indexed": len(index.modules),
+        "modules": modules,
+        "totals": {**totals, "smells": smell_totals},
+    }
+
+
+def function_table(tree: ast.Module) -> dict[int, tuple[str, int]]:
+    """Return first line -> (qualified name, complexity) of every function in a module.
+
+    Decorated functions are listed under both their ``def`` line and their first decorator
+    line, since profilers report either depending on the Python version.
+    """
+    table: dict[int, tuple[str, int]] = {}
+    stack: list[tuple[ast.AST, str]] = [(tree, "")]
+    while stack:
+        parent, prefix = stack.pop()
+        for node in ast.iter_child_nodes(parent):
+            if isinstance(node, _SCOPE_NODES):
+                qualname = f"{prefix}{node.name}"
+                if not isinstance(node, ast.ClassDef):
+                    entry = (qualname, function_complexity(node))
+                    table[node.lineno] = entry
+                    for decorator in node.decorator_list:
+                        table.setdefault(decorator.lineno, entry)
+                    qualname += ".<locals>"
+                stack.append((node, f"{qualname}."))
+            else:
+                stack.append((node, prefix))
+    return table
+
+
+def _share(seconds: float, total: float) -> float:
+    return round(100 * seconds / total, 2) if total else 0.0
+
+
+def profile_report(index: ProjectIndex, functions: dict, *, limit: int = 20) -> dict:
+    """Join profiled times with static complexity and rank project code by hot x complex.
+
+    functions maps (file, first line, function name) to self and cumulative seconds, as
+    returned by the loaders in ``profiling``. Frames outside the project are counted in the
+    total but not ranked. A function's score is its share of self time (in percent) times its
+    cyclomatic complexity; a module's is its share times its total complexity, so code that
+    is both slow and complicated comes first.
+    """
+    total = sum(times["self"] for times in functions.values())
+    ranked, per_module = [], {}
+    tables: dict[str, dict[int, tuple[str, int]]] = {}
+    for (filename, line, function), times in functions.items():
+        if not filename.endswith(".py"):
+            continue
+        try:
+            name = index.resolve(str(Path(index.root, filename)))
+        except UnknownTargetError:
+            continue
+        if name not in tables:
+            record = index.parsed(name)
+            tables[name] = function_table(record["tree"]) if record["tree"] is not None else {}
+        qualname, complexity = tables[name].get(line, (function, 1))
+        ranked.append(
+            {
+                "module": name,
+                "path": index.modules[name]["path"],
+                "function": qualname,
+                "line": line,
+                "self_s": round(times["self"], 6),
+                "cumulative_s": round(times["cumulative"], 6),
+                "self_pct": _share(times["self"], total),
+                "cumulative_pct": _share(times["cumulative"], total),
+                "complexity": complexity,
+                "score": round(_share(times["self"], total) * complexity, 2),
+            }
+        )
+        module = per_module.setdefault(name, {"self": 0.0, "cumulative": 0.0})
+        module["self"] += times["self"]
+        # A module's cumulative time is that of its outermost function: nested calls overlap
+        module["cumulative"] = max(module["cumulative"], times["cumulative"])
+
+    modules = []
+    for name, times in per_module.items():
+        metrics = index.modules[name]["metrics"] or {}
+        complexity = metrics.get("complexity", 0)
+        modules.append(
+            {
+                "module": name,
+                "path": index.modules[name]["path"],
+                "self_s": round(times["self"], 6),
+                "cumulative_s": round(times["cumulative"], 6),
+                "self_pct": _share(times["self"], total),
+                "cumulative_pct": _share(times["cumulative"], total),
+                "complexity": complexity,
+                "max_complexity": metrics.get("max_complexity", 0),
+                "score": round(_share(times["self"], total) * max(complexity, 1), 2),
+            }
+        )
+    ranked.sort(key=lambda entry: (-entry["score"], -entry["self_s"], entry["path"], entry["line"]))
+    modules.sort(key=lambda entry: (-entry["score"], -entry["self_s"], entry["path"]))
+    project = sum(entry["self_s"] for entry in modules)
+    return {
+        "total_s": round(total, 6),
+        "project_s": round(project, 6),
+        "project_pct": _share(project, total),
+        "functions": ranked[:limit] if limit else ranked,
+        "modules": modules[:limit] if limit else modules,
+    }
+
+
+# A module-level import is a lazy-import candidate when it costs at least this many microseconds...
+LAZY_IMPORT_MIN_US = 5000
+# ...and the names it binds are used in at most this many functions and never at import time
+LAZY_IMPORT_MAX_USES = 2
+
+
+def _module_level_statements(tree: ast.Module):
+    """Yield the statements that run at import time, looking inside if/try/with but not defs."""
+    stack = list(reversed(tree.body))
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)):
+            for field in ("body", "orelse", "finalbody"):
+                stack.extend(reversed(getattr(node, field, [])))
+            for handler in getattr(node, "handlers", []):
+                stack.extend(reversed(handler.body))
+
+
+def import_bindings(tree: ast.Module, name: str, imported: str, *, is_package: bool) -> tuple[int | None, set[str]]:
+    """Return the line of the first module-level statement in module name that imports imported, and its names.
+
+    Importing a submodule (``import a.b``, ``from a.b import c``) also loads its parents, so
+    the statement counts as importing each of them.
+    """
+    for node in _module_level_statements(tree):
+        names = set()
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == imported or alias.name.startswith(f"{imported}."):
+                    names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ImportFrom):
+            module = from_import_module(node, name, is_package=is_package)
+            for alias in node.names:
+                if imported in {module, f"{module}.{alias.name}"} or module.startswith(f"{imported}."):
+                    names.add(alias.asname or alias.name)
+        if names:
+            return node.lineno, names - {"*"}
+    return None, set()
+
+
+def name_uses(tree: ast.Module, names: set[str]) -> tuple[set[str], bool]:
+    """Return the top-level functions (or methods) that load any of names, and whether import-time code does.
+
+    Decorators, default values and annotations run when their def runs, so they count in the
+    enclosing scope; a class body runs at import time.
+    """
+    functions, at_import = set(), False
+    stack: list[tuple[ast.AST, str | None, str]] = [(tree, None, "")]
+    while stack:
+        node, scope, prefix = stack.pop()
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in names:
+            if scope is None:
+                at_import = True
+            else:
+                functions.add(scope)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            outer = [*getattr(node, "decorator_list", []), *node.args.defaults, *filter(None, node.args.kw_defaults)]
+            outer += [arg.annotation for arg in ast.walk(node.args) if isinstance(arg, ast.arg) and arg.annotation]
+            outer += [node.returns] if getattr(node, "returns", None) else []
+            stack.extend((child, scope, prefix) for child in outer)
+            inner = scope or f"{prefix}{getattr(node, 'name', '<lambda>')}"
+            body = node.body if isinstance(node.body, list) else [node.body]
+            stack.extend((child, inner, prefix) for child in body)
+        elif isinstance(node, ast.ClassDef):
+            stack.extend((child, scope, prefix) for child in [*node.decorator_list, *node.bases, *node.keywords])
+            stack.extend((child, scope, f"{prefix}{node.name}.") for child in node.body)
+        else:
+            stack.extend((child, scope, prefix) for child in ast.iter_child_nodes(node))
+    return functions, at_import
+
+
+def import_cost_report(index: ProjectIndex, module: str, roots: list[dict], *, limit: int = 20) -> dict:
+    """Attribute the measured cost of importing module to import edges and find lazy-import candidates.
+
+    roots is the ``-X importtime`` forest from ``profiling.import_times``. Each loaded module
+    is charged to the module that imported it first, the edge the interpreter reports it
+    under. A module-level import in a project module is a lazy-import candidate when it is
+    heavy, its names are used only inside a few functions, and no other loaded project module
+    imports it at module level too (otherwise deferring it would save nothing).
+    """
+    loaded = []
+    stack = [(node, None, 0) for node in reversed(roots)]
+    while stack:
+        node, importer, depth = stack.pop()
+        loaded.append(
+            {
+                "module": node["module"],
+                "importer": importer,
+                "self_us": node["self_us"],
+                "cumulative_us": node["cumulative_us"],
+                "depth": depth,
+                "project": node["module"] in index.modules,
+            }
+        )
+        stack.extend((child, node["module"], depth + 1) for child in reversed(node["children"]))
+    total = sum(node["cumulative_us"] for node in roots)
+    project_loaded = [entry["module"] for entry in loaded if entry["project"]]
+
+    def bindings(name: str, imported: str) -> tuple[int | None, set[str]]:
+        record = index.parsed(name)
+        if record["tree"] is None:
+            return None, set()
+        return import_bindings(record["tree"], name, imported, is_package=record["path"].endswith("__init__.py"))
+
+    candidates = []
+    for entry in loaded:
+        importer = entry["importer"]
+        if importer not in index.modules or entry["cumulative_us"] < LAZY_IMPORT_MIN_US:
+            continue
+        line, names = bindings(importer, entry["module"])
+        if line is None or not names:
+            continue
+        used_in, at_import = name_uses(index.parsed(importer)["tree"], names)
+        if at_import or len(used_in) > LAZY_IMPORT_MAX_USES:
+            continue
+        if any(other != importer and bindings(other, entry["module"])[0] for other in project_loaded):
+            continue
+        candidates.append(
+            {
+                "importer": importer,
+                "path": index.modules[importer]["path"],
+                "line": line,
+                "module": entry["module"],
+                "cumulative_us": entry["cumulative_us"],
+                "share_pct": _share(entry["cumulative_us"], total),
+                "used_in": sorted(used_in),
+            }
+        )
+    loaded.sort(key=lambda entry: (-entry["cumulative_us"], entry["module"]))
+    candidates.sort(key=lambda entry: (-entry["cumulative_us"], entry["path"], entry["line"]))
+    return {
+        "module": module,
+        "total_us": total,
+        "loaded": len(loaded),
+        "project_us": sum(entry["self_us"] for entry in loaded if entry["project"]),
+        "imports": loaded[:limit] if limit else loaded,
+        "lazy_candidates": candidates,
+    }
@@ -0,0 +1,308 @@
+"""Pack the code an agent needs to understand a module into a token budget.
+
+The pack ranks four kinds of snippets: the target's own code, the signatures of what
+it imports from the project, the call sites in modules that import it, and the tests
+that exercise it. The highest-value snippets that fit the budget are rendered as one
+Markdown document. Packs are cached on disk, keyed on the size and mtime of every file
+they draw from.
+"""
+
+import ast
+import copy
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from .analysis import ProjectIndex, from_import_module, is_test_module
+
+# Bump when the pack layout changes so cached packs are rebuilt
+CONTEXT_FORMAT = 1
+# Relative value of each snippet kind; within a kind, usage counts raise the score
+KIND_WEIGHTS = {"target": 1.0, "dependency": 0.7, "test": 0.5, "call_site": 0.4}
+SECTION_TITLES = {
+    "target": "Target",
+    "dependency": "Dependency signatures",
+    "call_site": "Call sites",
+    "test": "Tests",
+}
+# Token budget used when the caller does not give one
+DEFAULT_CONTEXT_BUDGET = 8000
+# Lines shown on each side of a call site
+CALL_SITE_CONTEXT = 2
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the BPE token count of text without a tokenizer.
+
+    Each punctuation character is one token and each identifier or number one token per
+    six characters, which tracks common code tokenizers closely enough for budgeting.
+    """
+    return sum(1 + (len(match) - 1) // 6 for match in _TOKEN_RE.findall(text))
+
+
+def _stub(node: ast.AST) -> ast.AST:
+    stub = copy.copy(node)
+    doc = ast.get_docstring(node)
+    body: list[ast.stmt] = [ast.Expr(ast.Constant(doc.strip().splitlines()[0]))] if doc else []
+    if isinstance(node, ast.ClassDef):
+        body += [
+            _stub(child)
+            for child in node.body
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+            and (not child.name.startswith("_") or child.name == "__init__")
+        ]
+    else:
+        body.append(ast.Expr(ast.Constant(...)))
+    stub.body = body or [ast.Expr(ast.Constant(...))]
+    return stub
+
+
+def signature(node: ast.AST) -> str:
+    """Return a def or class reduced to its signature, first docstring line and public method stubs."""
+    return ast.unparse(_stub(node))
+
+
+def _lines(record: dict, start: int, end: int) -> str:
+    return "\n".join(record["source"].splitlines()[start - 1 : end])
+
+
+def _node_start(node: ast.AST) -> int:
+    return min([node.lineno, *(d.lineno for d in getattr(node, "decorator_list", []))])
+
+
+def bound_names(record: dict, target: str) -> tuple[set[str], set[str]]:
+    """Return the names a module binds to target's members and to the target module itself."""
+    members, aliases = set(), set()
+    is_package = record["path"].endswith("__init__.py")
+    for node in ast.walk(record["tree"]):
+        if isinstance(node, ast.Import):
+            # "import a.b" binds "a", so only plain or aliased imports of target name it directly
+            aliases.update(
+                alias.asname or alias.name
+                for alias in node.names
+                if alias.name == target and (alias.asname or "." not in alias.name)
+            )
+        elif isinstance(node, ast.ImportFrom):
+            module = from_import_module(node, record["name"], is_package=is_package)
+            for alias in node.names:
+                if module == target:
+                    members.add(alias.asname or alias.name)
+                elif f"{module}.{alias.name}" == target:
+                    aliases.add(alias.asname or alias.name)
+    return members, aliases
+
+
+def usages(record: dict, members: set[str], aliases: set[str]) -> list[tuple[int, str]]:
+    """Return (line, name) for every load of a bound member or attribute of a module alias."""
+    found = []
+    for node in ast.walk(record["tree"]):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in members:
+            found.append((node.lineno, node.id))
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in aliases:
+            found.append((node.lineno, node.attr))
+    return sorted(found)
+
+
+def _snippet(
+    kind: str, record: dict, start: int, end: int, *, score: float, label: str = "", text: str | None = None, **extra
+) -> dict:
+    text = _lines(record, start, end) if text is None else text
+    return {
+        "kind": kind,
+        "path": record["path"],
+        "start": start,
+        "end": end,
+        "label": label,
+        "text": text,
+        "tokens": estimate_tokens(text),
+        "score": score,
+        **extra,
+    }
+
+
+def _target_snippets(record: dict, uses: dict[str, int]) -> list[dict]:
+    """Return the whole target module plus its parts, for when the whole does not fit."""
+    weight = KIND_WEIGHTS["target"]
+    total = len(record["source"].rstrip().splitlines())
+    snippets = [_snippet("target", record, 1, total, score=weight * 2, label="module", whole=True)]
+    # The module header is everything before the first def or class: docstring, imports, constants
+    header_end = 0
+    in_header = True
+    for node in record["tree"].body:
+        if isinstance(node, _DEFINITIONS):
+            in_header = False
+            start = _node_start(node)
+            score = weight * (1 + 0.1 * uses.get(node.name, 0))
+            snippets.append(
+                _snippet(
+                    "target", record, start, node.end_lineno, score=score, label=node.name, fallback=signature(node)
+                )
+            )
+        elif in_header:
+            header_end = node.end_lineno
+    if header_end:
+        snippets.append(_snippet("target", record, 1, header_end, score=weight * 1.5, label="module header"))
+    return snippets
+
+
+def _dependent_snippets(record: dict, found: list[tuple[int, str]]) -> list[dict]:
+    """Return a test module's test functions, or a module's call-site windows, that use the target."""
+    if is_test_module(record["path"]):
+        snippets = []
+        for node in ast.walk(record["tree"]):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+                hits = sum(1 for line, _ in found if node.lineno <= line <= node.end_lineno)
+                if hits:
+                    score = KIND_WEIGHTS["test"] * (1 + 0.05 * hits)
+                    snippets.append(
+                        _snippet("test", record, _node_start(node), node.end_lineno, score=score, label=node.name)
+                    )
+        return snippets
+
+    windows: list[list] = []
+    last_line = len(record["source"].splitlines())
+    for line, used in found:
+        start, end = max(1, line - CALL_SITE_CONTEXT), min(last_line, line + CALL_SITE_CONTEXT)
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], end)
+            windows[-1][2].add(used)
+            windows[-1][3] += 1
+        else:
+            windows.append([start, end, {used}, 1])
+    return [
+        _snippet(
+            "call_site",
+            record,
+            start,
+            end,
+            score=KIND_WEIGHTS["call_site"] * (1 + 0.05 * hits),
+            label=", ".join(sorted(names)),
+        )
+        for start, end, names, hits in windows
+    ]
+
+
+def collect_snippets(index: ProjectIndex, target: str) -> list[dict]:
+    """Return every candidate snippet for target, each with its kind, location, text, tokens and score."""
+    name = index.resolve(target)
+    record = index.parsed(name)
+    if record["tree"] is None:
+        raise ValueError(f"{record['path']} does not parse: {record['error']}")
+
+    snippets: list[dict] = []
+    # How often dependents and tests use each of target's top-level names
+    uses: dict[str, int] = {}
+    for importer in sorted(index.reverse_graph()[name]):
+        other = index.parsed(importer)
+        if other["tree"] is None:
+            continue
+        found = usages(other, *bound_names(other, name))
+        for _, used in found:
+            uses[used] = uses.get(used, 0) + 1
+        snippets.extend(_dependent_snippets(other, found))
+
+    snippets.extend(_target_snippets(record, uses))
+
+    for dependency in sorted(index.graph()[name]):
+        other = index.parsed(dependency)
+        if other["tree"] is None:
+            continue
+        used = {used for _, used in usages(record, *bound_names(record, dependency))}
+        snippets.extend(
+            _snippet(
+                "dependency",
+                other,
+                _node_start(node),
+                node.end_lineno,
+                score=KIND_WEIGHTS["dependency"],
+                label=node.name,
+                text=signature(node),
+            )
+            for node in other["tree"].body
+            if isinstance(node, _DEFINITIONS) and node.name in used
+        )
+    return snippets
+
+
+def _render_snippet(snippet: dict, text: str) -> str:
+    location = f"{snippet['path']}:{snippet['start']}-{snippet['end']}"
+    label = f" `{snippet['label']}`" if snippet["label"] and not snippet.get("whole") else ""
+    return f"`{location}`{label}\n```python\n{text}\n```\n"
+
+
+def pack(snippets: list[dict], budget: int, title: str) -> dict:
+    """Greedily take the highest-scoring snippets that fit budget tokens and render them as Markdown.
+
+    The whole target module is taken when it fits; otherwise its parts compete on their own,
+    and a part that does not fit falls back to its signature.
+    """
+    header = f"# Context: {title}\n"
+    headings = {kind: f"\n## {section}\n" for kind, section in SECTION_TITLES.items()}
+    # Reserve room for every section heading up front so the rendered pack never overshoots
+    used = estimate_tokens(header) + sum(estimate_tokens(h) for h in headings.values())
+    chosen: list[tuple[dict, str]] = []
+    omitted = 0
+    whole_taken = False
+    for snippet in sorted(snippets, key=lambda s: (-s["score"], s["tokens"], s["path"], s["start"])):
+        if whole_taken and snippet["kind"] == "target":
+            continue
+        for text in (snippet["text"], snippet.get("fallback")):
+            if text is None:
+                continue
+            cost = estimate_tokens(_render_snippet(snippet, text))
+            if used + cost <= budget:
+                chosen.append((snippet, text))
+                used += cost
+                whole_taken = whole_taken or bool(snippet.get("whole"))
+                break
+        else:
+            omitted += not snippet.get("whole")
+
+    markdown = header
+    for kind, heading in headings.items():
+        entries = sorted((c for c in chosen if c[0]["kind"] == kind), key=lambda c: (c[0]["path"], c[0]["start"]))
+        if entries:
+            markdown += heading + "\n".join(_render_snippet(s, text) for s, text in entries)
+    return {
+        "markdown": markdown,
+        "tokens": estimate_tokens(markdown),
+        "budget": budget,
+        "snippets": len(chosen),
+        "omitted": omitted,
+    }
+
+
+def _pack_key(index: ProjectIndex, name: str, budget: int) -> str:
+    """Return a digest of the target, the budget and the size and mtime of every file a pack draws from."""
+    related = {name} | index.graph()[name] | index.reverse_graph()[name]
+    files = sorted((index.modules[m]["path"], index.modules[m]["mtime_ns"], index.modules[m]["size"]) for m in related)
+    payload = json.dumps([CONTEXT_FORMAT, str(index.root), name, budget, files])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def context_pack(index: ProjectIndex, target: str, budget: int, *, cache_dir: Path | None = None) -> dict:
+    """Return the Markdown context pack for target within budget tokens, reusing a cached pack if current."""
+    if budget <= 0:
+        raise ValueError("Budget must be a positive number of tokens")
+    name = index.resolve(target)
+    cache_file = cache_dir / f"{_pack_key(index, name, budget)}.json" if cache_dir else None
+    if cache_file and cache_file.is_file():
+        try:
+            return {**json.loads(cache_file.read_text(encoding="utf-8")), "cached": True}
+        except (OSError, json.JSONDecodeError):
+            pass
+    record = index.modules[name]
+    result = {"module": name, **pack(collect_snippets(index, name), budget, f"{name} (`{record['path']}`)")}
+    if cache_file:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(result), encoding="utf-8")
+            tmp.replace(cache_file)
+        except OSError:
+            pass
+    return {**result, "cached": False}
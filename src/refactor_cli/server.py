@@ -0,0 +1,219 @@
+"""JSON-RPC 2.0 server that keeps a ProjectIndex warm between agent queries.
+
+Messages are newline-delimited JSON objects, read from stdio or from clients of a Unix
+socket. Queries are answered from memory; a background thread rescans the project every
+rescan_interval seconds and re-parses only the files whose size or mtime changed, and the
+refresh method rescans at once for clients that have just edited files.
+"""
+
+import inspect
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+from .analysis import ProjectIndex, UnknownTargetError
+from .context import DEFAULT_CONTEXT_BUDGET, context_pack
+
+JSONRPC_VERSION = "2.0"
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+# Seconds between background rescans of the project for changed files
+DEFAULT_RESCAN_INTERVAL = 1.0
+
+
+class InvalidParamsError(ValueError):
+    """Request params that do not fit the signature of the called method."""
+
+
+class AnalysisServer:
+    """Dispatch JSON-RPC requests to a shared ProjectIndex, one request at a time."""
+
+    def __init__(
+        self,
+        index: ProjectIndex,
+        *,
+        context_cache_dir: Path | None = None,
+        rescan_interval: float = DEFAULT_RESCAN_INTERVAL,
+    ):
+        self.index = index
+        self.context_cache_dir = context_cache_dir
+        self.rescan_interval = rescan_interval
+        self.started = time.monotonic()
+        self.stopping = threading.Event()
+        # method -> {"calls", "total_ms", "max_ms"}
+        self.latency: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._methods = {
+            "ping": lambda: "pong",
+            "analyze": self.index.analyze,
+            "deps": self.index.deps,
+            "hotspots": self.index.hotspots,
+            "smells": self.index.smells,
+            "dead_code": self.index.dead_code,
+            "affected_tests": self.index.affected_tests,
+            "context": self.context,
+            "refresh": self.refresh,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "root": str(self.index.root),
+            "modules": len(self.index.modules),
+            "generation": self.index.generation,
+            "uptime_s": round(time.monotonic() - self.started, 3),
+            "latency": self.latency,
+            "scan": self.index.scanner.stats(),
+        }
+
+    def context(self, target: str, budget: int = DEFAULT_CONTEXT_BUDGET) -> dict:
+        return context_pack(self.index, target, budget, cache_dir=self.context_cache_dir)
+
+    def refresh(self) -> list[str]:
+        """Rescan the project now; returns the paths that were re-parsed or dropped."""
+        return self.index.refresh()
+
+    def shutdown(self) -> str:
+        self.stopping.set()
+        return "bye"
+
+    def watch(self) -> threading.Thread:
+        """Rescan the project in a background thread every rescan_interval seconds until shutdown."""
+
+        def rescan():
+            while not self.stopping.wait(self.rescan_interval):
+                with self._lock:
+                    self.index.refresh()
+
+        thread = threading.Thread(target=rescan, name="refactor-rescan", daemon=True)
+        thread.start()
+        return thread
+
+    def call(self, method: str, params: dict | list) -> object:
+        """Run one method against the in-memory index.
+
+        Raises KeyError for unknown methods and InvalidParamsError when params do not bind to
+        the method's arguments; errors raised while running the method propagate unchanged.
+        """
+        handler = self._methods[method.replace("-", "_")]
+        signature = inspect.signature(handler)
+        try:
+            bound = signature.bind(**params) if isinstance(params, dict) else signature.bind(*params)
+        except TypeError as e:
+            raise InvalidParamsError(str(e)) from None
+        with self._lock:
+            start = time.perf_counter()
+            result = handler(*bound.args, **bound.kwargs)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            entry = self.latency.setdefault(method, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + elapsed_ms, 3)
+            entry["max_ms"] = round(max(entry["max_ms"], elapsed_ms), 3)
+        return result
+
+    def handle(self, request) -> dict | None:
+        """Answer one decoded request; notifications (no id) get no response."""
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        if isinstance(request.get("params", {}), dict | list):
+            response = self._dispatch(request)
+        else:
+            response = _error(request.get("id"), INVALID_PARAMS, "params must be an object or an array")
+        # Requests without an id are notifications and get no response, not even an error
+        return response if "id" in request else None
+
+    def _dispatch(self, request: dict) -> dict:
+        """Run a well-formed request and build its result or error response."""
+        request_id = request.get("id")
+        if request["method"].replace("-", "_") not in self._methods:
+            return _error(request_id, METHOD_NOT_FOUND, f"Method not found: {request['method']}")
+        try:
+            result = self.call(request["method"], request.get("params", {}))
+        except InvalidParamsError as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        except UnknownTargetError as e:
+            return _error(request_id, INVALID_PARAMS, f"Unknown module or path: {e.args[0]}")
+        except Exception as e:
+            return _error(request_id, INTERNAL_ERROR, str(e))
+        return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "result": result}
+
+    def handle_line(self, line: str) -> str | None:
+        """Answer one line of newline-delimited JSON-RPC, including batches."""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            return json.dumps(_error(None, PARSE_ERROR, f"Parse error: {e}"))
+        if isinstance(request, list):
+            responses = [r for r in (self.handle(item) for item in request) if r is not None]
+            return json.dumps(responses) if responses else None
+        response = self.handle(request)
+        return json.dumps(response) if response is not None else None
+
+
+def _error(request_id, code: int, message: str) -> dict:
+    return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "error": {"code": code, "message": message}}
+
+
+def serve_stdio(server: AnalysisServer, stdin=None, stdout=None) -> None:
+    """Answer requests line by line until stdin closes or shutdown is called."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    server.watch()
+    try:
+        for line in stdin:
+            if not line.strip():
+                continue
+            response = server.handle_line(line)
+            if response is not None:
+                stdout.write(response + "\n")
+                stdout.flush()
+            if server.stopping.is_set():
+                break
+    finally:
+        server.stopping.set()
+
+
+def serve_unix_socket(server: AnalysisServer, path: Path) -> None:
+    """Accept clients on a Unix socket, each sending newline-delimited requests."""
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        raise OSError("Unix sockets are not supported on this platform; use stdio")
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                response = server.handle_line(raw.decode("utf-8"))
+                if response is not None:
+                    self.wfile.write(response.encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                if server.stopping.is_set():
+                    threading.Thread(target=listener.shutdown, daemon=True).start()
+                    return
+
+    path = Path(path)
+    if path.is_socket():
+        path.unlink()
+    # Restrict the socket between bind and listen: no client can connect before listen()
+    listener = socketserver.ThreadingUnixStreamServer(str(path), Handler, bind_and_activate=False)
+    try:
+        listener.server_bind()
+        os.chmod(path, 0o600)
+        listener.server_activate()
+    except OSError:
+        listener.server_close()
+        raise
+    listener.daemon_threads = True
+    server.watch()
+    try:
+        listener.serve_forever()
+    finally:
+        server.stopping.set()
+        listener.server_close()
+        path.unlink(missing_ok=True)
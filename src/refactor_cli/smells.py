@@ -0,0 +1,818 @@
+"""Single-pass AST scanner: module metrics and code-smell rules in one traversal.
+
+The scanner walks a module once. On the way it counts the size and complexity metrics, and
+hands each node to the rules registered for its type together with a Scope that knows the
+enclosing function, class and loops and the names imports bound. Rules report findings
+with a severity, so the worst smells of a project rank first.
+"""
+
+import abc
+import ast
+import hashlib
+import json
+import re
+import time
+import tomllib
+from collections.abc import Iterable
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import ClassVar
+
+# Severity ranks, worst first
+SEVERITIES = ("high", "medium", "low")
+
+# Nodes that add a decision point to a function's cyclomatic complexity
+BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert, ast.match_case)
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)
+
+
+def decision_points(node: ast.AST) -> int:
+    """Return how much node adds to the cyclomatic complexity of the function containing it."""
+    if isinstance(node, BRANCH_NODES):
+        return 1
+    if isinstance(node, ast.BoolOp):
+        return len(node.values) - 1
+    if isinstance(node, ast.comprehension):
+        return 1 + len(node.ifs)
+    return 0
+
+
+def dotted_name(node: ast.AST) -> str | None:
+    """Return "a.b.c" for a chain of attribute loads on a name, or None for anything else."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+class _Frame:
+    """A function or class being scanned, with the loops open inside it."""
+
+    __slots__ = ("complexity", "loops", "node", "qualname", "state")
+
+    def __init__(self, node: ast.AST | None, qualname: str):
+        self.node = node
+        self.qualname = qualname
+        self.complexity = 1
+        self.loops: list[ast.AST] = []
+        self.state: dict[str, dict] = {}
+
+
+class Scope:
+    """What a rule can ask about the position of the node it is given."""
+
+    def __init__(self, frames: list[_Frame]):
+        self._frames = frames
+        self.parent: ast.AST | None = None
+        # Local names bound by imports -> the dotted names they stand for
+        self.imports: dict[str, str] = {}
+
+    @property
+    def function(self) -> ast.FunctionDef | ast.AsyncFunctionDef | None:
+        """The innermost enclosing function, or None at module or class level."""
+        node = self._frames[-1].node
+        return node if isinstance(node, _FUNCTIONS) else None
+
+    @property
+    def qualname(self) -> str:
+        """Qualified name of the innermost enclosing function or class ("" at module level)."""
+        return self._frames[-1].qualname
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self._frames[-1].node, ast.AsyncFunctionDef)
+
+    @property
+    def loops(self) -> list[ast.AST]:
+        """Loops enclosing the node within its function, outermost first; comprehensions count."""
+        return self._frames[-1].loops
+
+    @property
+    def loop(self) -> ast.AST | None:
+        loops = self._frames[-1].loops
+        return loops[-1] if loops else None
+
+    def state(self, key: str, *, module: bool = False) -> dict:
+        """Return a dict a rule can keep per function (or for the whole module) under key."""
+        frame = self._frames[0] if module else self._frames[-1]
+        return frame.state.setdefault(key, {})
+
+    def qualified_name(self, node: ast.AST) -> str | None:
+        """Return the dotted name node refers to, with import aliases expanded (``np.sum`` -> ``numpy.sum``)."""
+        name = dotted_name(node)
+        if name is None:
+            return None
+        head, _, rest = name.partition(".")
+        if head in self.imports:
+            head = self.imports[head]
+        return f"{head}.{rest}" if rest else head
+
+
+class Rule(abc.ABC):
+    """A code-smell detector.
+
+    The scanner calls visit() for every node whose type is in node_types, before the
+    node's children. visit() yields ``(node, message)`` or ``(node, message, severity)``
+    for each smell it finds; without a severity the rule's own is used. Thresholds live in
+    ``defaults`` and can be overridden per project, as can the severity. Bump ``version``
+    when a rule's results change so persisted findings are recomputed. A rule that does not
+    implement visit() is abstract and cannot be instantiated.
+    """
+
+    name = ""
+    category = ""
+    severity = "medium"
+    node_types: tuple[type, ...] = ()
+    description = ""
+    defaults: ClassVar[dict] = {}
+    version = 1
+
+    def __init__(self, **options):
+        severity = options.pop("severity", type(self).severity)
+        if severity not in SEVERITIES:
+            raise ValueError(f"{self.name}: unknown severity {severity!r}")
+        unknown = set(options) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"{self.name}: unknown option(s) {', '.join(sorted(unknown))}")
+        self.severity = severity
+        self.options = {**self.defaults, **options}
+
+    def escalated(self) -> str:
+        """Return the severity one level worse than this rule's, for findings far past a threshold."""
+        return SEVERITIES[max(SEVERITIES.index(self.severity) - 1, 0)]
+
+    @abc.abstractmethod
+    def visit(self, node: ast.AST, scope: Scope) -> Iterable[tuple]:
+        """Yield the smells found at node."""
+
+
+class Scanner:
+    """Walk a module once, computing its metrics and running every rule.
+
+    Rules are dispatched by node type, so adding a rule adds work only on the nodes it
+    asks for. The time spent in each rule is counted across every scan.
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self.rules = list(rules)
+        self._dispatch: dict[type, list[Rule]] = {}
+        for rule in self.rules:
+            for node_type in rule.node_types:
+                self._dispatch.setdefault(node_type, []).append(rule)
+        # rule name -> [calls, nanoseconds]
+        self._timings = {rule.name: [0, 0] for rule in self.rules}
+        self.files = 0
+        self.scan_ns = 0
+
+    def stats(self) -> dict:
+        """Return the files scanned, total scan time and per-rule calls and time, slowest rule first."""
+        rules = sorted(self._timings.items(), key=lambda item: -item[1][1])
+        return {
+            "files": self.files,
+            "scan_ms": round(self.scan_ns / 1e6, 3),
+            "rules": {name: {"calls": calls, "ms": round(ns / 1e6, 3)} for name, (calls, ns) in rules},
+        }
+
+    def scan(self, tree: ast.Module, source: str) -> tuple[dict, list[dict]]:
+        """Return the module's metrics and the smells the rules found, in line order.
+
+        loc counts lines that are neither blank nor comment-only; complexity is the sum over
+        functions and max_complexity the worst single function.
+        """
+        self._frames = [_Frame(None, "")]
+        self._scope = Scope(self._frames)
+        self._findings: list[dict] = []
+        self._functions = self._classes = self._complexity = self._worst = 0
+        start = time.perf_counter_ns()
+        self._visit(tree)
+        self.scan_ns += time.perf_counter_ns() - start
+        self.files += 1
+        loc = sum(1 for line in source.splitlines() if line.strip() and not line.lstrip().startswith("#"))
+        metrics = {
+            "lines": len(source.splitlines()),
+            "loc": loc,
+            "functions": self._functions,
+            "classes": self._classes,
+            "complexity": self._complexity,
+            "max_complexity": self._worst,
+        }
+        self._findings.sort(key=lambda finding: (finding["line"], finding["rule"]))
+        return metrics, self._findings
+
+    def _enter(self, node: ast.AST, parent: ast.AST | None) -> None:
+        scope = self._scope
+        frame = self._frames[-1]
+        if isinstance(frame.node, _FUNCTIONS):
+            frame.complexity += decision_points(node)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if isinstance(node, ast.Import):
+                    local = alias.asname or alias.name.split(".")[0]
+                    scope.imports[local] = alias.name if alias.asname else local
+                elif not node.level and node.module and alias.name != "*":
+                    scope.imports[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+        rules = self._dispatch.get(type(node))
+        if rules:
+            scope.parent = parent
+            for rule in rules:
+                start = time.perf_counter_ns()
+                results = list(rule.visit(node, scope) or ())
+                timing = self._timings[rule.name]
+                timing[0] += 1
+                timing[1] += time.perf_counter_ns() - start
+                for found in results:
+                    at, message = found[0], found[1]
+                    self._findings.append(
+                        {
+                            "rule": rule.name,
+                            "category": rule.category,
+                            "severity": found[2] if len(found) > 2 else rule.severity,
+                            "line": getattr(at, "lineno", 0),
+                            "function": scope.qualname or None,
+                            "message": message,
+                        }
+                    )
+
+    def _visit(self, node: ast.AST, parent: ast.AST | None = None) -> None:
+        self._enter(node, parent)
+        frames = self._frames
+        if isinstance(node, (*_FUNCTIONS, ast.ClassDef)):
+            prefix = frames[-1].qualname
+            if isinstance(frames[-1].node, _FUNCTIONS):
+                prefix += ".<locals>"
+            frames.append(_Frame(node, f"{prefix}.{node.name}" if prefix else node.name))
+            self._children(node)
+            frame = frames.pop()
+            if isinstance(node, ast.ClassDef):
+                self._classes += 1
+            else:
+                self._functions += 1
+                self._complexity += frame.complexity
+                self._worst = max(self._worst, frame.complexity)
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            self._visit(node.target, node)
+            self._visit(node.iter, node)
+            self._in_loop(node, node.body)
+            self._each(node.orelse, node)
+        elif isinstance(node, ast.While):
+            self._in_loop(node, [node.test, *node.body])
+            self._each(node.orelse, node)
+        elif isinstance(node, _COMPREHENSIONS):
+            # Only the first iterable is evaluated once, outside the implicit loop
+            first = node.generators[0]
+            self._enter(first, node)
+            self._visit(first.iter, first)
+            frames[-1].loops.append(node)
+            self._visit(first.target, first)
+            self._each(first.ifs, first)
+            self._each(node.generators[1:], node)
+            for field in ("elt", "key", "value"):
+                if hasattr(node, field):
+                    self._visit(getattr(node, field), node)
+            frames[-1].loops.pop()
+        else:
+            self._children(node)
+
+    def _children(self, node: ast.AST) -> None:
+        for child in ast.iter_child_nodes(node):
+            self._visit(child, node)
+
+    def _each(self, nodes: list, parent: ast.AST) -> None:
+        for child in nodes:
+            self._visit(child, parent)
+
+    def _in_loop(self, loop: ast.AST, nodes: list) -> None:
+        loops = self._frames[-1].loops
+        loops.append(loop)
+        self._each(nodes, loop)
+        loops.pop()
+
+
+def _loop_bound_names(loop: ast.AST) -> set[str]:
+    """Return the names a loop or comprehension may rebind on each iteration."""
+    nodes = [loop.target, *loop.body] if isinstance(loop, (ast.For, ast.AsyncFor)) else [loop]
+    return {
+        node.id
+        for root in nodes
+        for node in ast.walk(root)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)
+    }
+
+
+def _is_constant_str(node: ast.AST) -> bool:
+    return isinstance(node, ast.JoinedStr) or (isinstance(node, ast.Constant) and isinstance(node.value, str))
+
+
+def _assigned_names(node: ast.Assign | ast.AnnAssign) -> list[str]:
+    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+    return [target.id for target in targets if isinstance(target, ast.Name)]
+
+
+class _BindingRule(Rule):
+    """A rule that tracks which local and module-level names are currently bound to some kind of value."""
+
+    @abc.abstractmethod
+    def binds(self, value: ast.AST) -> bool:
+        """Return True when assigning value binds a name to the kind of value this rule tracks."""
+
+    def track(self, node: ast.Assign | ast.AnnAssign, scope: Scope) -> None:
+        bound = scope.state(self.name)
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        for target in targets:
+            if isinstance(target, ast.Name):
+                bound[target.id] = node.value is not None and self.binds(node.value)
+            else:
+                # Unpacking rebinds every name in the target to something else
+                bound.update(dict.fromkeys((n.id for n in ast.walk(target) if isinstance(n, ast.Name)), False))
+
+    def is_bound(self, name: str, scope: Scope) -> bool:
+        local = scope.state(self.name)
+        if name in local:
+            return local[name]
+        return scope.state(self.name, module=True).get(name, False)
+
+
+class ListMembershipInLoop(_BindingRule):
+    name = "list-membership-in-loop"
+    category = "performance"
+    severity = "high"
+    node_types = (ast.Assign, ast.AnnAssign, ast.Compare)
+    description = "`x in some_list` inside a loop scans the list every iteration: quadratic time"
+
+    def binds(self, value: ast.AST) -> bool:
+        if isinstance(value, (ast.List, ast.ListComp)):
+            return True
+        return isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id in {"list", "sorted"}
+
+    def visit(self, node, scope):
+        if not isinstance(node, ast.Compare):
+            self.track(node, scope)
+            return
+        if scope.loop is None:
+            return
+        for op, operand in zip(node.ops, node.comparators, strict=True):
+            if not isinstance(op, (ast.In, ast.NotIn)):
+                continue
+            if isinstance(operand, ast.Name) and self.is_bound(operand.id, scope):
+                yield node, f"'{operand.id}' is a list, so each `in` test in this loop scans it; use a set"
+            elif isinstance(operand, ast.ListComp) or (isinstance(operand, ast.Call) and self.binds(operand)):
+                yield node, "`in` test against a list built in the loop; build a set once before the loop"
+
+
+class StringConcatInLoop(_BindingRule):
+    name = "string-concat-in-loop"
+    category = "performance"
+    severity = "medium"
+    node_types = (ast.Assign, ast.AnnAssign, ast.AugAssign)
+    description = "Building a string with += in a loop copies it each time; join a list of parts instead"
+
+    def binds(self, value: ast.AST) -> bool:
+        if isinstance(value, ast.BinOp) and isinstance(value.op, ast.Add):
+            return self.binds(value.left) or self.binds(value.right)
+        return _is_constant_str(value)
+
+    def visit(self, node, scope):
+        in_loop = scope.loop is not None
+        if isinstance(node, ast.AugAssign):
+            target = node.target
+            if (
+                in_loop
+                and isinstance(node.op, ast.Add)
+                and isinstance(target, ast.Name)
+                and (self.is_bound(target.id, scope) or _is_constant_str(node.value))
+            ):
+                yield node, f"'{target.id} +=' in a loop copies the string every time; collect parts and ''.join() them"
+            return
+        value = node.value
+        names = _assigned_names(node)
+        if (
+            in_loop
+            and isinstance(value, ast.BinOp)
+            and isinstance(value.op, ast.Add)
+            and isinstance(value.left, ast.Name)
+            and value.left.id in names
+            and self.is_bound(value.left.id, scope)
+        ):
+            yield (
+                node,
+                f"'{value.left.id} = {value.left.id} + ...' in a loop copies the string every time; use ''.join()",
+            )
+            return
+        self.track(node, scope)
+
+
+_REGEX_FUNCTIONS = frozenset(
+    f"re.{name}" for name in ("compile", "match", "search", "fullmatch", "sub", "subn", "split", "findall", "finditer")
+)
+
+
+class RegexCompiledPerCall(Rule):
+    name = "regex-compiled-per-call"
+    category = "performance"
+    severity = "medium"
+    node_types = (ast.Call,)
+    description = "A constant regex compiled inside a function is compiled (or looked up in re's cache) on every call"
+
+    def visit(self, node, scope):
+        if scope.function is None or not node.args or not isinstance(node.args[0], ast.Constant):
+            return
+        function = scope.qualified_name(node.func)
+        if function not in _REGEX_FUNCTIONS:
+            return
+        if function == "re.compile":
+            yield (
+                node,
+                "re.compile() of a constant pattern runs on every call; compile it once at module level",
+                "high" if scope.loop is not None else "medium",
+            )
+        elif scope.loop is not None:
+            yield node, f"{function}() with a constant pattern in a loop; compile the pattern once outside it", "low"
+
+
+_BLOCKING_CALLS = frozenset(
+    {
+        "open",
+        "input",
+        "time.sleep",
+        "os.system",
+        "os.popen",
+        "os.wait",
+        "subprocess.run",
+        "subprocess.call",
+        "subprocess.check_call",
+        "subprocess.check_output",
+        "urllib.request.urlopen",
+        "socket.create_connection",
+        "shutil.copy",
+        "shutil.copyfile",
+        "shutil.copytree",
+        "shutil.rmtree",
+        "shutil.move",
+    }
+)
+_BLOCKING_PACKAGES = ("requests.", "httpx.", "urllib3.")
+_HTTP_METHODS = frozenset({"get", "post", "put", "patch", "delete", "head", "options", "request"})
+
+
+class BlockingIOInAsync(Rule):
+    name = "blocking-io-in-async"
+    category = "performance"
+    severity = "high"
+    node_types = (ast.Call,)
+    description = "Synchronous I/O inside async def stalls the event loop and every other task on it"
+
+    def visit(self, node, scope):
+        if not scope.is_async:
+            return
+        function = scope.qualified_name(node.func)
+        if function is None:
+            return
+        blocking = function in _BLOCKING_CALLS or (
+            function.startswith(_BLOCKING_PACKAGES) and function.rsplit(".", 1)[-1] in _HTTP_METHODS
+        )
+        if blocking:
+            message = f"{function}() blocks the event loop in async def {scope.function.name}"
+            yield node, f"{message}; use an async library or asyncio.to_thread()"
+
+
+class AttributeLookupInLoop(Rule):
+    name = "attribute-lookup-in-loop"
+    category = "performance"
+    severity = "low"
+    node_types = (ast.Attribute,)
+    description = "A loop-invariant attribute chain is looked up again on every iteration"
+
+    def visit(self, node, scope):
+        loop = scope.loop
+        if loop is None or not isinstance(node.ctx, ast.Load) or not isinstance(node.value, ast.Attribute):
+            return
+        # Report each chain once, at its outermost attribute
+        if isinstance(scope.parent, ast.Attribute) and scope.parent.value is node:
+            return
+        chain = dotted_name(node)
+        if chain is None:
+            return
+        # Per loop: the names it rebinds, and the chains already reported
+        bound, seen = scope.state(self.name).setdefault(id(loop), (_loop_bound_names(loop), set()))
+        if chain.split(".")[0] not in bound and chain not in seen:
+            seen.add(chain)
+            yield node, f"'{chain}' is looked up on every iteration; bind it to a local before the loop"
+
+
+_DB_METHODS = frozenset({"execute", "executescript", "query", "fetch", "fetchrow", "fetchval"})
+_ORM_METHODS = frozenset({"get", "filter", "exclude", "first", "count", "exists", "create", "update"})
+_CLIENT_NAME = re.compile(r"(session|client|http|api)$", re.IGNORECASE)
+
+
+class NPlusOneCalls(Rule):
+    name = "n-plus-one"
+    category = "performance"
+    severity = "high"
+    node_types = (ast.Call,)
+    description = "A database query or HTTP request per loop iteration (N+1); batch it or fetch everything at once"
+
+    def visit(self, node, scope):
+        if scope.loop is None:
+            return
+        function = scope.qualified_name(node.func) or ""
+        method = function.rsplit(".", 1)[-1]
+        receiver = (dotted_name(node.func.value) or "") if isinstance(node.func, ast.Attribute) else ""
+        http = (
+            function == "urllib.request.urlopen"
+            or (function.startswith(_BLOCKING_PACKAGES) and method in _HTTP_METHODS)
+            or (method in _HTTP_METHODS and _CLIENT_NAME.search(receiver.rsplit(".", 1)[-1]))
+        )
+        query = receiver and (method in _DB_METHODS or (method in _ORM_METHODS and ".objects" in f".{receiver}"))
+        if http:
+            kind = "HTTP request"
+        elif query:
+            kind = "query"
+        else:
+            return
+        call = f"{receiver}.{method}" if receiver else method
+        yield node, f"{call}() sends one {kind} per loop iteration (N+1); batch them or fetch everything at once"
+
+
+def _body_lines(node: ast.AST) -> int:
+    """Return the lines a def or class spans, from its first statement after the docstring."""
+    body = node.body
+    if len(body) > 1 and ast.get_docstring(node, clean=False) is not None:
+        body = body[1:]
+    return node.end_lineno - body[0].lineno + 1
+
+
+class LongMethod(Rule):
+    name = "long-method"
+    category = "bloaters"
+    severity = "medium"
+    node_types = _FUNCTIONS
+    description = "A function longer than max_lines lines (docstring excluded) is hard to read and test"
+    defaults: ClassVar[dict] = {"max_lines": 20}
+
+    def visit(self, node, _scope):
+        lines = _body_lines(node)
+        limit = self.options["max_lines"]
+        if lines > limit:
+            severity = self.escalated() if lines > 2 * limit else self.severity
+            yield node, f"{node.name}() is {lines} lines long (limit {limit}); extract smaller functions", severity
+
+
+class LargeClass(Rule):
+    name = "large-class"
+    category = "bloaters"
+    severity = "medium"
+    node_types = (ast.ClassDef,)
+    description = "A class longer than max_lines lines probably has more than one responsibility"
+    defaults: ClassVar[dict] = {"max_lines": 200}
+
+    def visit(self, node, _scope):
+        lines = _body_lines(node)
+        limit = self.options["max_lines"]
+        if lines > limit:
+            severity = self.escalated() if lines > 2 * limit else self.severity
+            yield node, f"class {node.name} is {lines} lines long (limit {limit}); split it up", severity
+
+
+class LongParameterList(Rule):
+    name = "long-parameter-list"
+    category = "bloaters"
+    severity = "low"
+    node_types = (*_FUNCTIONS, ast.Lambda)
+    description = "More than max_params parameters (self and cls excluded) suggests a missing parameter object"
+    defaults: ClassVar[dict] = {"max_params": 3}
+
+    def visit(self, node, _scope):
+        args = node.args
+        params = [*args.posonlyargs, *args.args, *args.kwonlyargs]
+        if params and params[0].arg in {"self", "cls"}:
+            params = params[1:]
+        limit = self.options["max_params"]
+        if len(params) > limit:
+            name = getattr(node, "name", "lambda")
+            severity = self.escalated() if len(params) > 2 * limit else self.severity
+            yield node, f"{name}() takes {len(params)} parameters (limit {limit}); group them into an object", severity
+
+
+def _switch_subject(test: ast.AST) -> str | None:
+    """Return what an if-test switches on: the left side of ``x == ...``/``x in ...`` or x of isinstance(x, ...)."""
+    if isinstance(test, ast.Compare) and isinstance(test.ops[0], (ast.Eq, ast.Is, ast.In)):
+        return ast.dump(test.left)
+    if (
+        isinstance(test, ast.Call)
+        and isinstance(test.func, ast.Name)
+        and test.func.id in {"isinstance", "type"}
+        and test.args
+    ):
+        return ast.dump(test.args[0])
+    return None
+
+
+class SwitchStatements(Rule):
+    name = "switch-statements"
+    category = "object-orientation-abusers"
+    severity = "low"
+    node_types = (ast.If, ast.Match)
+    description = "An if/elif chain or match with min_branches or more branches on one value; consider polymorphism"
+    defaults: ClassVar[dict] = {"min_branches": 4}
+
+    def visit(self, node, scope):
+        limit = self.options["min_branches"]
+        if isinstance(node, ast.Match):
+            if len(node.cases) >= limit:
+                yield node, f"match with {len(node.cases)} cases; consider polymorphism or a dispatch table"
+            return
+        # Count each chain once, from its first if
+        parent = scope.parent
+        if isinstance(parent, ast.If) and parent.orelse == [node]:
+            return
+        subjects = []
+        branch = node
+        while True:
+            subjects.append(_switch_subject(branch.test))
+            if len(branch.orelse) != 1 or not isinstance(branch.orelse[0], ast.If):
+                break
+            branch = branch.orelse[0]
+        if len(subjects) >= limit and subjects[0] is not None and len(set(subjects)) == 1:
+            yield node, f"if/elif chain of {len(subjects)} branches on one value; consider polymorphism or a dict"
+
+
+class MessageChains(Rule):
+    name = "message-chains"
+    category = "couplers"
+    severity = "low"
+    node_types = (ast.Attribute,)
+    description = "A chain of more than max_length attribute hops couples the caller to a whole object graph"
+    defaults: ClassVar[dict] = {"max_length": 4}
+
+    def visit(self, node, scope):
+        # The traversal reaches the outermost link of a chain first; its inner links are not reported again
+        inner = scope.state(self.name)
+        if inner.pop(id(node), False):
+            return
+        hops = 0
+        current = node
+        while isinstance(current, (ast.Attribute, ast.Call, ast.Subscript)):
+            if isinstance(current, ast.Attribute):
+                if current is not node:
+                    inner[id(current)] = True
+                hops += 1
+                current = current.value
+            else:
+                current = current.func if isinstance(current, ast.Call) else current.value
+        if isinstance(current, ast.Name) and current.id in {"self", "cls"}:
+            hops -= 1
+        limit = self.options["max_length"]
+        if hops > limit:
+            yield node, f"message chain of {hops} hops (limit {limit}); ask a nearer object to do the work"
+
+
+def _delegates(function: ast.AST) -> bool:
+    """Return True if a method's whole body forwards one call to an attribute of self."""
+    body = function.body[1:] if ast.get_docstring(function) is not None else function.body
+    if len(body) != 1 or not isinstance(body[0], (ast.Return, ast.Expr)) or body[0].value is None:
+        return False
+    call = body[0].value
+    if isinstance(call, ast.Await):
+        call = call.value
+    return (
+        isinstance(call, ast.Call)
+        and isinstance(call.func, ast.Attribute)
+        and isinstance(call.func.value, ast.Attribute)
+        and isinstance(call.func.value.value, ast.Name)
+        and call.func.value.value.id == "self"
+    )
+
+
+class MiddleMan(Rule):
+    name = "middle-man"
+    category = "couplers"
+    severity = "low"
+    node_types = (ast.ClassDef,)
+    description = "A class whose methods mostly just forward to another object adds indirection and little else"
+    defaults: ClassVar[dict] = {"min_methods": 3, "min_ratio": 0.5}
+
+    def visit(self, node, _scope):
+        methods = [
+            child
+            for child in node.body
+            if isinstance(child, _FUNCTIONS) and not (child.name.startswith("__") and child.name.endswith("__"))
+        ]
+        if len(methods) < self.options["min_methods"]:
+            return
+        delegating = sum(1 for method in methods if _delegates(method))
+        if delegating / len(methods) >= self.options["min_ratio"]:
+            yield node, f"class {node.name} forwards {delegating} of {len(methods)} methods to another object"
+
+
+PERFORMANCE_RULES = (
+    ListMembershipInLoop,
+    StringConcatInLoop,
+    RegexCompiledPerCall,
+    BlockingIOInAsync,
+    AttributeLookupInLoop,
+    NPlusOneCalls,
+)
+DESIGN_RULES = (LongMethod, LargeClass, LongParameterList, SwitchStatements, MessageChains, MiddleMan)
+BUILTIN_RULES = (*DESIGN_RULES, *PERFORMANCE_RULES)
+# Entry point group third-party packages register Rule subclasses (or lists of them) under
+ENTRY_POINT_GROUP = "refactor_cli.rules"
+
+
+def default_rules() -> list[Rule]:
+    """Return a fresh instance of every built-in rule with its default thresholds."""
+    return [rule() for rule in BUILTIN_RULES]
+
+
+def plugin_rules() -> tuple[list[type[Rule]], list[str]]:
+    """Load the rule classes installed packages register in the entry point group, and any load errors."""
+    rules, errors = [], []
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            loaded = entry_point.load()
+        except Exception as e:  # a broken plugin must not stop the analysis
+            errors.append(f"Cannot load rule plugin {entry_point.name}: {e}")
+            continue
+        for rule in loaded if isinstance(loaded, (list, tuple)) else [loaded]:
+            if not (isinstance(rule, type) and issubclass(rule, Rule) and rule.name and rule.node_types):
+                errors.append(f"Rule plugin {entry_point.name}: {rule!r} is not a Rule subclass with a name")
+            elif rule.__abstractmethods__:
+                missing = ", ".join(sorted(rule.__abstractmethods__))
+                errors.append(f"Rule plugin {entry_point.name}: {rule.__qualname__} does not implement {missing}")
+            else:
+                rules.append(rule)
+    return rules, errors
+
+
+def load_config(root: Path) -> tuple[dict, list[str]]:
+    """Return the ``[tool.refactor.smells]`` table of root's pyproject.toml, and any error reading it."""
+    path = Path(root) / "pyproject.toml"
+    if not path.is_file():
+        return {}, []
+    try:
+        data = tomllib.loads(path.read_text(encoding="utf-8"))
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        return {}, [f"Cannot read {path}: {e}"]
+    config = data.get("tool", {}).get("refactor", {}).get("smells", {})
+    return (config, []) if isinstance(config, dict) else ({}, [f"{path}: [tool.refactor.smells] must be a table"])
+
+
+def configure_rules(config: dict, *, plugins: bool = True) -> tuple[list[Rule], list[str]]:
+    """Instantiate the built-in and plugin rules with a project's configuration.
+
+    config holds ``disable`` (rule names to skip), ``plugins`` (false to ignore installed
+    plugins) and one table per rule name with threshold or severity overrides. Problems
+    are returned as warnings and the rule falls back to its defaults.
+    """
+    warnings = []
+    classes = list(BUILTIN_RULES)
+    if plugins and config.get("plugins", True):
+        loaded, errors = plugin_rules()
+        warnings += errors
+        taken = {rule.name for rule in classes}
+        for rule in loaded:
+            if rule.name in taken:
+                warnings.append(f"Rule plugin {rule.__module__}.{rule.__qualname__} reuses the name {rule.name}")
+            else:
+                taken.add(rule.name)
+                classes.append(rule)
+    names = {rule.name for rule in classes}
+    disabled = set(config.get("disable", []))
+    for key in (set(config) | disabled) - names - {"disable", "plugins"}:
+        warnings.append(f"Unknown smell rule in configuration: {key}")
+
+    rules = []
+    for cls in classes:
+        if cls.name in disabled:
+            continue
+        try:
+            rules.append(cls(**config.get(cls.name, {})))
+        except (TypeError, ValueError) as e:
+            warnings.append(f"{e}; using the defaults")
+            rules.append(cls())
+    return rules, warnings
+
+
+def rules_fingerprint(rules: Iterable[Rule]) -> str:
+    """Return a digest of the rules, their versions and options, to key persisted findings on."""
+    payload = [
+        [type(rule).__module__, type(rule).__qualname__, rule.version, rule.severity, rule.options] for rule in rules
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def scan_module(tree: ast.Module, source: str) -> tuple[dict, list[dict]]:
+    """Return the metrics and smells of a parsed module, found in one pass with the built-in rules."""
+    return Scanner(default_rules()).scan(tree, source)
+
+
+def rank(findings: Iterable[dict]) -> list[dict]:
+    """Sort findings worst first: by severity, then by location."""
+    order = {severity: i for i, severity in enumerate(SEVERITIES)}
+    return sorted(
+        findings, key=lambda f: (order.get(f["severity"], len(order)), f.get("path", ""), f["line"], f["rule"])
+    )
@@ -0,0 +1,13 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cli_state(tmp_path_factory, monkeypatch):
+    """Keep the template cache, runtime state and config out of the user's home directory."""
+    monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path_factory.mktemp("refactor-cache")))
+    monkeypatch.setenv("REFACTOR_STATE_DIR", str(tmp_path_factory.mktemp("refactor-state")))
+    monkeypatch.setenv("REFACTOR_CONFIG", str(tmp_path_factory.mktemp("refactor-config") / "config.json"))
+    monkeypatch.delenv("REFACTOR_RELEASE_SOURCES", raising=False)
+    monkeypatch.delenv("REFACTOR_OUTPUT", raising=False)
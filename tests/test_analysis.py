@@ -0,0 +1,360 @@
+"""Tests for the project analysis index."""
+
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the src directory to the path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from refactor_cli.analysis import (
+    ProjectIndex,
+    diff_analysis,
+    function_complexity,
+    imported_names,
+    is_test_module,
+    module_name,
+    module_symbols,
+)
+
+PROJECT = {
+    "src/shop/__init__.py": "",
+    "src/shop/cart.py": "from .pricing import total\n\n\ndef checkout(items):\n    return total(items)\n",
+    "src/shop/pricing.py": (
+        "import json\n\n\n"
+        "def total(items):\n"
+        "    result = 0\n"
+        "    for item in items:\n"
+        "        if item.price > 0 and item.qty:\n"
+        "            result += item.price * item.qty\n"
+        "    return result\n"
+    ),
+    "tests/test_cart.py": "from shop.cart import checkout\n\n\ndef test_checkout():\n    assert checkout([]) == 0\n",
+    "tests/test_other.py": "import json\n",
+}
+
+
+def make_project(root, files=PROJECT):
+    for rel_path, content in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return root
+
+
+def touch(path, content):
+    """Rewrite a file and move its mtime forward so the change is visible on coarse clocks."""
+    st = path.stat()
+    path.write_text(content)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def git_commit_all(root, message):
+    """Commit every file under root, creating the repository on first use."""
+
+    def git(*args):
+        subprocess.run(  # noqa: S603
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], cwd=root, check=True, capture_output=True
+        )
+
+    if not (root / ".git").exists():
+        git("init", "-q")
+    git("add", "-A")
+    git("commit", "-qm", message)
+
+
+class TestModuleHelpers:
+    """Tests for module naming, import extraction and complexity."""
+
+    @pytest.mark.parametrize(
+        ("rel_path", "expected"),
+        [
+            ("src/shop/__init__.py", "shop"),
+            ("src/shop/cart.py", "shop.cart"),
+            ("tests/test_cart.py", "tests.test_cart"),
+            ("setup.py", "setup"),
+        ],
+    )
+    def test_module_name(self, rel_path, expected):
+        assert module_name(rel_path) == expected
+
+    def test_is_test_module(self):
+        assert is_test_module("tests/helpers.py")
+        assert is_test_module("pkg/test_x.py")
+        assert is_test_module("pkg/x_test.py")
+        assert not is_test_module("pkg/testing.py")
+
+    def test_relative_imports_are_made_absolute(self):
+        import ast
+
+        tree = ast.parse("from . import a\nfrom ..b import c\nimport os.path\n")
+        names = imported_names(tree, "pkg.sub.mod", is_package=False)
+        assert {"pkg.sub", "pkg.sub.a", "pkg.b", "pkg.b.c", "os.path"} <= names
+
+    def test_function_complexity_counts_decisions(self):
+        import ast
+
+        tree = ast.parse(PROJECT["src/shop/pricing.py"])
+        # for + if + one extra boolean operand
+        assert function_complexity(tree.body[1]) == 4
+
+
+class TestProjectIndex:
+    """Tests for ProjectIndex queries and invalidation."""
+
+    def test_graph_and_queries(self, tmp_path):
+        """Test imports resolve to project modules and the queries follow them."""
+        index = ProjectIndex(make_project(tmp_path))
+        index.refresh()
+
+        assert index.graph()["shop.cart"] == {"shop.pricing"}
+        assert index.deps("src/shop/pricing.py") == {
+            "module": "shop.pricing",
+            "path": "src/shop/pricing.py",
+            "imports": [],
+            "imported_by": ["shop.cart"],
+        }
+        assert index.dependents({"shop.pricing"}) == {"shop.cart", "tests.test_cart"}
+        assert index.dependents({"shop.pricing"}, hops=1) == {"shop.cart"}
+        assert index.affected_tests(["shop.pricing"]) == ["tests/test_cart.py"]
+        (entry,) = index.analyze(["shop.pricing"])
+        assert entry["max_complexity"] == 4
+        assert entry["fan_in"] == 1
+        with pytest.raises(KeyError):
+            index.resolve("missing.py")
+
+    def test_refresh_reparses_only_changed_files(self, tmp_path):
+        """Test refresh picks up edits, additions and deletions and nothing else."""
+        index = ProjectIndex(make_project(tmp_path))
+        assert len(index.refresh()) == len(PROJECT)
+        generation = index.generation
+        assert index.refresh() == []
+        assert index.generation == generation
+
+        touch(tmp_path / "src/shop/cart.py", "def checkout(items):\n    return 0\n")
+        (tmp_path / "tests/test_other.py").unlink()
+        (tmp_path / "src/shop/tax.py").write_text("from shop import pricing\n")
+
+        assert index.refresh() == ["src/shop/cart.py", "src/shop/tax.py", "tests/test_other.py"]
+        assert index.generation == generation + 1
+        assert index.graph()["shop.cart"] == set()
+        assert index.reverse_graph()["shop.pricing"] == {"shop.tax"}
+        assert "tests.test_other" not in index.modules
+
+    def test_syntax_errors_are_reported(self, tmp_path):
+        """Test a module that does not parse is indexed with its error."""
+        index = ProjectIndex(make_project(tmp_path, {"broken.py": "def f(:\n"}))
+        index.refresh()
+        (entry,) = index.analyze()
+        assert entry["error"]
+        assert "loc" not in entry
+
+    def test_persisted_index_skips_parsing(self, tmp_path):
+        """Test a new process restores stats, imports and metrics and parses only on demand."""
+        make_project(tmp_path / "repo")
+        cache_file = tmp_path / "index.json"
+        first = ProjectIndex(tmp_path / "repo", cache_file=cache_file)
+        first.refresh()
+        first.save()
+
+        second = ProjectIndex(tmp_path / "repo", cache_file=cache_file)
+        assert second.refresh() == []
+        assert second.graph() == first.graph()
+        assert second.analyze() == first.analyze()
+        assert second.modules["shop.cart"]["tree"] is None
+        assert second.parsed("shop.cart")["tree"] is not None
+
+        touch(tmp_path / "repo/src/shop/cart.py", "import os\n")
+        assert second.refresh() == ["src/shop/cart.py"]
+
+    @pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+    def test_hotspots_rank_churn_times_complexity(self, tmp_path):
+        """Test hotspots use the git history of each file."""
+        make_project(tmp_path)
+        git_commit_all(tmp_path, "one")
+        (tmp_path / "src/shop/pricing.py").write_text(PROJECT["src/shop/pricing.py"] + "\n")
+        git_commit_all(tmp_path, "two")
+
+        index = ProjectIndex(tmp_path)
+        index.refresh()
+        hotspots = index.hotspots(limit=2)
+        assert hotspots[0]["path"] == "src/shop/pricing.py"
+        assert hotspots[0]["churn"] == 2
+        assert hotspots[0]["score"] == 8
+
+
+DEAD_CODE_PROJECT = {
+    "pyproject.toml": '[project.scripts]\nshop = "shop.cli:main"\n',
+    "src/shop/__init__.py": 'from .cart import Cart\n\n__all__ = ["Cart", "helper"]\n\n\ndef helper():\n    pass\n',
+    "src/shop/cart.py": (
+        "import functools\n\n\n"
+        "class Cart:\n"
+        "    def total(self):\n        return self._sum()\n\n"
+        "    def _sum(self):\n        return 0\n\n"
+        "    def unused(self):\n        return self.unused()\n\n"
+        "    @classmethod\n    def empty(cls):\n        return Cart()\n\n\n"
+        "def recurse(n):\n    return recurse(n - 1) if n else 0\n\n\n"
+        "@functools.cache\ndef cached():\n    pass\n\n\n"
+        "@app.route('/')\ndef index():\n    pass\n"
+    ),
+    "src/shop/cli.py": (
+        "from shop import Cart, plugins\n\n\n"
+        "def main():\n    handler = getattr(Cart(), 'empty')\n    return Cart().total(), handler\n\n\n"
+        "def legacy():\n    pass\n"
+    ),
+    "src/shop/plugins.py": "def hook():\n    pass\n\n\nNAMES = ['hook']\nPATH = 'shop.orphan:run'\n",
+    "src/shop/orphan.py": "def run():\n    pass\n",
+    "src/shop/unused.py": "def hook():\n    pass\n",
+    "scripts/tool.py": "def main():\n    pass\n",
+    "tests/test_cart.py": "from shop.cart import Cart\n\n\ndef test_total():\n    assert Cart().total() == 0\n",
+}
+
+
+class TestDeadCode:
+    """Tests for the symbol index and unused-code detection."""
+
+    def test_symbols_resolve_references_through_imports(self):
+        import ast
+
+        source = (
+            "import os.path as osp\nfrom . import util\nfrom .models import Order as O\n\n\n"
+            'def f():\n    "shop.docstring"\n    return osp.join(util.helper(), O.create(), f())\n\n\n'
+            "setattr(obj, 'name', 'shop.util:run')\n"
+        )
+        symbols = module_symbols(ast.parse(source), "shop.cart", is_package=False)
+        assert symbols["refs"] == [
+            "os.path",
+            "os.path.join",
+            "shop",
+            "shop.models",
+            "shop.models.Order",
+            "shop.models.Order.create",
+            "shop.util",
+            "shop.util.helper",
+        ]
+        assert symbols["dynamic"] == ["shop.util.run"]
+        assert set(symbols["attrs"]) == {"join", "helper", "create", "name"}
+        assert symbols["defs"] == [{"name": "f", "kind": "function", "line": 6, "decorated": False, "override": False}]
+
+    def test_unused_definitions_and_modules(self, tmp_path):
+        """Test exports, re-exports, entry points, getattr and dotted strings all count as uses."""
+        index = ProjectIndex(make_project(tmp_path, DEAD_CODE_PROJECT))
+        index.refresh()
+
+        found = {(entry["name"], entry["confidence"]) for entry in index.dead_code()}
+        assert found == {
+            ("Cart.unused", "high"),
+            ("recurse", "high"),
+            ("cached", "high"),
+            ("legacy", "high"),
+            ("shop.unused", "high"),
+            ("hook", "medium"),
+            ("index", "low"),
+            ("scripts.tool", "low"),
+        }
+        assert [entry["name"] for entry in index.dead_code(confidence="medium")][-1] == "hook"
+        assert [entry["kind"] for entry in index.dead_code(["src/shop/unused.py"])] == ["module"]
+        with pytest.raises(ValueError, match="Unknown confidence"):
+            index.dead_code(confidence="certain")
+
+    def test_references_follow_edits_and_the_persisted_index(self, tmp_path):
+        """Test a restored index answers without parsing, and an edit updates only that file's symbols."""
+        make_project(tmp_path / "repo", DEAD_CODE_PROJECT)
+        cache_file = tmp_path / "index.json"
+        first = ProjectIndex(tmp_path / "repo", cache_file=cache_file)
+        first.refresh()
+        first.save()
+
+        second = ProjectIndex(tmp_path / "repo", cache_file=cache_file)
+        assert second.refresh() == []
+        assert second.dead_code() == first.dead_code()
+        assert second.modules["shop.cli"]["tree"] is None
+
+        cli = tmp_path / "repo/src/shop/cli.py"
+        touch(cli, cli.read_text() + "\n\nfrom shop import unused\nlegacy()\n")
+        assert second.refresh() == ["src/shop/cli.py"]
+        assert {(entry["path"], entry["name"]) for entry in second.dead_code()} - {
+            (entry["path"], entry["name"]) for entry in first.dead_code()
+        } == {("src/shop/unused.py", "hook")}
+        assert "legacy" not in {entry["name"] for entry in second.dead_code()}
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+class TestDiffAnalysis:
+    """Tests for analysis scoped to the files changed since a git ref."""
+
+    @staticmethod
+    def _changed_project(tmp_path):
+        make_project(tmp_path)
+        git_commit_all(tmp_path, "base")
+        subprocess.run(["git", "branch", "base"], cwd=tmp_path, check=True)
+        pricing = tmp_path / "src/shop/pricing.py"
+        touch(pricing, pricing.read_text() + "\n\ndef discount(x):\n    return x / 2 if x else 0\n")
+        (tmp_path / "tests/test_other.py").unlink()
+        (tmp_path / "src/shop/report.py").write_text("from shop.cart import checkout\n")
+        index = ProjectIndex(tmp_path)
+        index.refresh()
+        return index
+
+    def test_slice_and_deltas(self, tmp_path):
+        """Test only changed modules and their importers are reported, with deltas against the base."""
+        report = diff_analysis(self._changed_project(tmp_path), "base", hops=1)
+
+        by_module = {m["module"]: m for m in report["modules"]}
+        assert {name: m["status"] for name, m in by_module.items()} == {
+            "shop.pricing": "modified",
+            "shop.report": "added",
+            "tests.test_other": "deleted",
+            "shop.cart": "dependent",
+        }
+        assert by_module["shop.pricing"]["delta"]["functions"] == 1
+        assert by_module["shop.pricing"]["delta"]["complexity"] == 2
+        assert by_module["shop.cart"]["delta"]["fan_in"] == 1
+        assert by_module["shop.cart"]["delta"]["loc"] == 0
+        assert by_module["tests.test_other"]["metrics"] is None
+        assert by_module["tests.test_other"]["delta"]["loc"] == -1
+        assert report["totals"]["functions"] == 1
+        assert report["changed"] == ["src/shop/pricing.py", "src/shop/report.py", "tests/test_other.py"]
+
+    def test_smell_deltas(self, tmp_path):
+        """Test smells are diffed against the base version, ignoring findings that only moved."""
+        concat = "def join(parts):\n    text = ''\n    for part in parts:\n        text += part\n    return text\n"
+        regex = "def match(items):\n    for item in items:\n        re.compile('x').match(item)\n"
+        make_project(tmp_path, {"a.py": f"import re\n\n\n{concat}\n\n{regex}", "b.py": "import a\n"})
+        git_commit_all(tmp_path, "base")
+        subprocess.run(["git", "branch", "base"], cwd=tmp_path, check=True)
+        membership = (
+            "def unique(xs):\n    seen = []\n    for x in xs:\n        if x not in seen:\n            seen.append(x)\n"
+        )
+        touch(tmp_path / "a.py", f"import re\n\n\n{membership}\n\n{regex}")
+        (tmp_path / "c.py").write_text(concat)
+        index = ProjectIndex(tmp_path)
+        index.refresh()
+
+        report = diff_analysis(index, "base")
+
+        by_module = {m["module"]: m for m in report["modules"]}
+        smells = by_module["a"]["smells"]
+        assert [(f["rule"], f["line"]) for f in smells["added"]] == [("list-membership-in-loop", 7)]
+        assert [f["rule"] for f in smells["removed"]] == ["string-concat-in-loop"]
+        assert by_module["b"]["smells"] == {"added": [], "removed": []}
+        assert [f["rule"] for f in by_module["c"]["smells"]["added"]] == ["string-concat-in-loop"]
+        assert report["totals"]["smells"] == {"high": 1, "medium": 0, "low": 0}
+
+    def test_hops_widen_the_slice(self, tmp_path):
+        index = self._changed_project(tmp_path)
+        assert {m["module"] for m in diff_analysis(index, "base", hops=0)["modules"]} == {
+            "shop.pricing",
+            "shop.report",
+            "tests.test_other",
+        }
+        assert "tests.test_cart" in {m["module"] for m in diff_analysis(index, "base", hops=2)["modules"]}
+
+    def test_unknown_ref(self, tmp_path):
+        index = self._changed_project(tmp_path)
+        with pytest.raises(ValueError, match="merge base"):
+            diff_analysis(index, "no-such-ref")
@@ -1,10 +1,13 @@
 """Tests for the Refactor CLI."""
 
+import json
 import sys
 from pathlib import Path
 from unittest.mock import patch
 
+import httpx
 import pytest
+import typer
 from typer.testing import CliRunner
 
 # Add the src directory to the path
@@ -12,35 +15,92 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 from refactor_cli import (
     AGENT_CONFIG,
+    EVENT_FIELD_LIMIT,
+    LINK_MODES,
+    TAGLINE,
+    DownloadEngine,
+    EventEmitter,
+    ReleaseSource,
     StepTracker,
     __version__,
+    _download_engine,
     _extract_and_merge_to_current_dir,
     _extract_to_new_directory,
+    _fetch_template_archive,
+    _find_template_asset,
     _format_rate_limit_error,
     _get_http_client,
     _get_source_dir_from_extracted,
     _github_auth_headers,
     _github_token,
-    _merge_item_to_dest,
+    _manifest_files_from_plan,
+    _parse_checksum_manifest,
     _parse_rate_limit_headers,
+    _parse_version_tag,
+    _select_template_release,
     app,
+    apply_merge_plan,
+    build_merge_plan,
+    build_upgrade_plan,
     check_tool,
+    close_http_clients,
+    configured_release_sources,
     debug_print,
     download_and_extract_template,
+    download_release_assets,
     download_template_from_github,
     ensure_executable_scripts,
+    export_template_bundle,
+    extract_zip,
+    fetch_latest_release,
+    fetch_release,
+    find_git_dir,
     get_key,
     handle_vscode_settings,
+    import_template_bundle,
     init_git_repo,
     is_git_repo,
+    main,
     merge_json_files,
+    normalize_release_tag,
+    observe_github_rate_limit,
+    parse_release_source,
+    place_file,
+    preview_template_merge,
+    probe_tool,
+    probe_tools,
+    read_install_manifest,
+    read_rate_budget,
+    read_release_index,
+    read_source_stats,
+    render_agent_package,
+    reserve_github_api_call,
     select_with_arrows,
+    set_output_mode,
     show_banner,
+    summarize_merge_plan,
+    template_member_filter,
+    write_install_manifest,
 )
 
 runner = CliRunner()
 
 
+@pytest.fixture(autouse=True)
+def restore_output_mode():
+    """A command's --json switches the process-wide output mode; put rich output back afterwards."""
+    yield
+    set_output_mode("rich")
+
+
+def json_result(stdout: str) -> dict:
+    """Return the result event of a --json run, checking stdout holds only JSON events ending with stats."""
+    events = [json.loads(line) for line in stdout.splitlines()]
+    assert events[-1]["event"] == "stats"
+    (result,) = (event for event in events if event["event"] == "result")
+    return result
+
+
 def mock_download_and_extract(project_path, ai_assistant, _is_current_dir=False, **_kwargs):
     """Mock function that creates the expected directory structure without downloading."""
     # Create the .refactor directory structure
@@ -85,6 +145,16 @@ class TestCheck:
         assert result.exit_code == 0
         assert "Check Available Tools" in result.stdout
 
+    def test_check_json(self):
+        """Test check --json emits the probe results as the same result event as refactor --json check."""
+        result = runner.invoke(app, ["check", "--json", "--refresh"])
+        assert result.exit_code == 0
+        payload = json_result(result.stdout)
+        assert payload["tools"]["git"]["found"] is True
+        assert payload["tools"]["git"]["version"].startswith("git version")
+        assert set(payload["tools"]) == {"git", "claude", "gemini"}
+        assert json_result(runner.invoke(app, ["--json", "check"]).stdout).keys() == payload.keys()
+
 
 class TestInit:
     """Tests for the init command."""
@@ -422,6 +492,125 @@ class TestGitUtils:
         assert success is True
 
 
+class TestGitDiscovery:
+    """Tests for subprocess-free git discovery and cwd-scoped git calls."""
+
+    @pytest.fixture(autouse=True)
+    def git_identity(self, monkeypatch):
+        """Give git a committer identity regardless of the machine's config."""
+        for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+            monkeypatch.setenv(f"{var}_NAME", "Test User")
+            monkeypatch.setenv(f"{var}_EMAIL", "test@example.com")
+        monkeypatch.delenv("GIT_DIR", raising=False)
+
+    def test_find_git_dir_walks_up(self, tmp_path):
+        """Test discovery from a nested directory finds the enclosing .git."""
+        import subprocess
+
+        subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+        nested = tmp_path / "a" / "b"
+        nested.mkdir(parents=True)
+        assert find_git_dir(nested) == (tmp_path / ".git").resolve()
+
+    def test_find_git_dir_follows_gitdir_file(self, tmp_path):
+        """Test a .git file, as used by linked worktrees, is followed to its git directory."""
+        gitdir = tmp_path / "main" / ".git" / "worktrees" / "wt"
+        gitdir.mkdir(parents=True)
+        (gitdir / "HEAD").write_text("ref: refs/heads/feature\n")
+        (gitdir / "commondir").write_text("../..\n")
+        worktree = tmp_path / "wt"
+        worktree.mkdir()
+        (worktree / ".git").write_text(f"gitdir: {gitdir}\n")
+        assert find_git_dir(worktree) == gitdir.resolve()
+        assert is_git_repo(worktree) is True
+
+    def test_git_dir_env(self, tmp_path, monkeypatch):
+        """Test GIT_DIR takes precedence over the directory walk."""
+        import subprocess
+
+        subprocess.run(["git", "init", "-q", "--bare", "repo.git"], cwd=tmp_path, check=True)
+        monkeypatch.setenv("GIT_DIR", str(tmp_path / "repo.git"))
+        (tmp_path / "elsewhere").mkdir()
+        assert find_git_dir(tmp_path / "elsewhere") == tmp_path / "repo.git"
+
+    def test_ceiling_directories_stop_walk(self, tmp_path, monkeypatch):
+        """Test the walk does not go above GIT_CEILING_DIRECTORIES."""
+        import subprocess
+
+        subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+        (tmp_path / "inner" / "deeper").mkdir(parents=True)
+        monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path / "inner"))
+        assert find_git_dir(tmp_path / "inner" / "deeper") is None
+
+    def test_is_git_repo_runs_no_subprocess(self, tmp_path):
+        """Test repository detection never spawns git."""
+        (tmp_path / ".git" / "objects").mkdir(parents=True)
+        (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+        with patch("subprocess.run", side_effect=AssertionError("git spawned")):
+            assert is_git_repo(tmp_path) is True
+
+    def test_parallel_init_without_chdir(self, tmp_path):
+        """Test several repositories can be initialized from worker threads without touching the cwd."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        projects = [tmp_path / f"p{i}" for i in range(6)]
+        for project in projects:
+            project.mkdir()
+            (project / "README.md").write_text(project.name)
+        with (
+            patch("os.chdir", side_effect=AssertionError("cwd changed")),
+            ThreadPoolExecutor(max_workers=6) as pool,
+        ):
+            results = list(pool.map(lambda p: init_git_repo(p, quiet=True, commit_files=["README.md"]), projects))
+        assert all(ok for ok, _error in results)
+        assert all((p / ".git").is_dir() for p in projects)
+
+    def test_initial_commit_snapshot(self, tmp_path):
+        """Test the initial commit contains the files with their modes and leaves a clean tree."""
+        import subprocess
+
+        (tmp_path / "scripts").mkdir()
+        script = tmp_path / "scripts" / "run.sh"
+        script.write_text("#!/bin/sh\necho hi\n")
+        script.chmod(0o755)
+        (tmp_path / 'odd "name" file.md').write_text("quoted")
+        (tmp_path / "untracked.txt").write_text("not part of the template")
+
+        ok, error = init_git_repo(tmp_path, quiet=True, commit_files=["scripts/run.sh", 'odd "name" file.md'])
+        assert ok, error
+
+        tree = subprocess.run(["git", "ls-tree", "-r", "HEAD"], cwd=tmp_path, capture_output=True, text=True).stdout
+        assert "100755 blob" in next(line for line in tree.splitlines() if line.endswith("scripts/run.sh"))
+        assert "odd" in tree
+        status = subprocess.run(["git", "status", "--porcelain"], cwd=tmp_path, capture_output=True, text=True).stdout
+        assert status.strip() == "?? untracked.txt"
+
+    def test_init_initial_commit_flag(self, tmp_path):
+        """Test init --initial-commit commits exactly the installed template files."""
+        import subprocess
+
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(
+                app,
+                [
+                    "init",
+                    "proj",
+                    "--ai",
+                    "claude",
+                    "--ignore-agent-tools",
+                    "--template-source",
+                    "bundled",
+                    "--initial-commit",
+                ],
+            )
+        assert result.exit_code == 0, result.stdout
+        project = tmp_path / "proj"
+        log = subprocess.run(["git", "log", "--oneline"], cwd=project, capture_output=True, text=True).stdout
+        assert len(log.splitlines()) == 1
+        status = subprocess.run(["git", "status", "--porcelain"], cwd=project, capture_output=True, text=True).stdout
+        assert status == ""
+
+
 class TestMergeJsonFiles:
     """Tests for JSON file merging."""
 
@@ -679,36 +868,61 @@ class TestFormatRateLimitError:
 
 
 class TestHttpClient:
-    """Tests for HTTP client creation."""
+    """Tests for the shared HTTP client manager."""
+
+    def setup_method(self):
+        """Start every test without pooled clients."""
+        close_http_clients()
+
+    def teardown_method(self):
+        """Close any client a test created."""
+        close_http_clients()
 
     def test_get_http_client_default(self):
         """Test getting default HTTP client."""
-        import refactor_cli
-
-        # Reset the global client
-        refactor_cli._http_client = None
         client = _get_http_client(skip_tls=False)
         assert client is not None
-        # Clean up
-        client.close()
-        refactor_cli._http_client = None
+        assert not client.is_closed
 
     def test_get_http_client_skip_tls(self):
-        """Test getting HTTP client with TLS verification skipped."""
-        client = _get_http_client(skip_tls=True)
-        assert client is not None
-        client.close()
+        """Test the TLS-skipping client is pooled separately from the verified one."""
+        insecure = _get_http_client(skip_tls=True)
+        assert insecure is _get_http_client(skip_tls=True)
+        assert insecure is not _get_http_client(skip_tls=False)
 
     def test_get_http_client_reuses_instance(self):
         """Test that HTTP client is reused."""
-        import refactor_cli
-
-        refactor_cli._http_client = None
         client1 = _get_http_client(skip_tls=False)
         client2 = _get_http_client(skip_tls=False)
         assert client1 is client2
+
+    def test_closed_client_is_recreated(self):
+        """Test a client closed elsewhere is replaced instead of reused."""
+        client1 = _get_http_client()
         client1.close()
-        refactor_cli._http_client = None
+        client2 = _get_http_client()
+        assert client2 is not client1
+        assert not client2.is_closed
+
+    def test_close_http_clients(self):
+        """Test shutdown closes every pooled client."""
+        clients = [_get_http_client(), _get_http_client(skip_tls=True)]
+        close_http_clients()
+        assert all(c.is_closed for c in clients)
+
+    def test_http2_follows_optional_dependency(self):
+        """Test HTTP/2 is only requested when h2 is importable."""
+        with patch("refactor_cli._http2_available", return_value=False), patch("httpx.Client") as mock_client:
+            _get_http_client()
+        assert mock_client.call_args.kwargs["http2"] is False
+        assert mock_client.call_args.kwargs["limits"] is not None
+
+    def test_main_closes_clients(self):
+        """Test the entry point closes pooled connections on exit."""
+        client = _get_http_client()
+        with patch("refactor_cli.app", side_effect=SystemExit(0)), pytest.raises(SystemExit):
+            main()
+        assert client.is_closed
 
 
 class TestCheckTool:
@@ -742,6 +956,92 @@ class TestCheckTool:
         assert tracker.steps[0]["status"] == "error"
 
 
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX shell scripts as fake tools")
+class TestProbeTools:
+    """Tests for concurrent, cached tool probing."""
+
+    @staticmethod
+    def _fake_tool(bin_dir, name, body="echo fake 1.0"):
+        bin_dir.mkdir(exist_ok=True)
+        script = bin_dir / name
+        script.write_text(f"#!/bin/sh\n{body}\n")
+        script.chmod(0o755)
+        return script
+
+    def test_probe_captures_version(self):
+        """Test a found tool reports its path and the first line of --version."""
+        probe = probe_tool("git")
+        assert probe["found"] is True
+        assert probe["version"].startswith("git version")
+
+    def test_probe_missing_tool(self):
+        """Test a missing tool is reported as not found."""
+        probe = probe_tool("nonexistent-tool-xyz123")
+        assert probe["found"] is False
+        assert probe["version"] is None
+
+    def test_probe_timeout(self, tmp_path, monkeypatch):
+        """Test a tool that hangs on --version is found but flagged as timed out."""
+        import time
+
+        self._fake_tool(tmp_path / "bin", "slowtool", "sleep 5")
+        monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:/usr/bin:/bin")
+        start = time.perf_counter()
+        probe = probe_tool("slowtool", timeout=0.2)
+        assert time.perf_counter() - start < 2
+        assert probe["found"] is True
+        assert "timed out" in probe["error"]
+
+    def test_probes_run_concurrently(self, tmp_path, monkeypatch):
+        """Test probes overlap: each fake tool waits until all three are running before it answers."""
+        started = tmp_path / "started"
+        started.mkdir()
+        barrier = (
+            f'touch "{started}/$(basename "$0")"; i=0\n'
+            f'while [ "$(ls "{started}" | wc -l)" -lt 3 ] && [ $i -lt 100 ]; do sleep 0.05; i=$((i+1)); done\n'
+            f'if [ "$(ls "{started}" | wc -l)" -ge 3 ]; then echo ok; else echo alone; fi'
+        )
+        for name in ("one", "two", "three"):
+            self._fake_tool(tmp_path / "bin", name, barrier)
+        monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:/usr/bin:/bin")
+        results = probe_tools(["one", "two", "three"], timeout=30, use_cache=False)
+        assert [r["version"] for r in results.values()] == ["ok", "ok", "ok"]
+
+    def test_cache_reused_until_binary_or_path_changes(self, tmp_path, monkeypatch):
+        """Test cached results are served until the binary's mtime or PATH changes."""
+        import os
+
+        counter = tmp_path / "calls"
+        script = self._fake_tool(tmp_path / "bin", "countme", f"echo x >> {counter}; echo v1")
+        monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:/usr/bin:/bin")
+
+        assert probe_tools(["countme"])["countme"]["cached"] is False
+        assert probe_tools(["countme"])["countme"]["cached"] is True
+        assert len(counter.read_text().splitlines()) == 1
+
+        os.utime(script, (script.stat().st_atime, script.stat().st_mtime + 10))
+        assert probe_tools(["countme"])["countme"]["cached"] is False
+
+        monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:/bin:/usr/bin")
+        assert probe_tools(["countme"])["countme"]["cached"] is False
+        assert probe_tools(["countme"], ttl=0)["countme"]["cached"] is False
+        assert len(counter.read_text().splitlines()) == 4
+
+    def test_cached_miss_rechecked_on_path(self, tmp_path, monkeypatch):
+        """Test a tool installed after a cached "not found" probe is picked up within the TTL."""
+        (tmp_path / "bin").mkdir()
+        monkeypatch.setenv("PATH", f"{tmp_path / 'bin'}:/usr/bin:/bin")
+
+        assert probe_tools(["latetool"])["latetool"]["found"] is False
+        assert probe_tools(["latetool"])["latetool"]["cached"] is True
+
+        self._fake_tool(tmp_path / "bin", "latetool")
+        probe = probe_tools(["latetool"])["latetool"]
+        assert probe["found"] is True
+        assert probe["cached"] is False
+        assert probe["version"] == "fake 1.0"
+
+
 class TestHandleVscodeSettings:
     """Tests for VSCode settings handling."""
 
@@ -886,6 +1186,218 @@ class TestShowBanner:
         show_banner()
 
 
+class TestMachineOutput:
+    """Tests for the global --json/--plain machine output modes."""
+
+    @pytest.fixture(autouse=True)
+    def _restore_rich(self):
+        yield
+        set_output_mode("rich")
+
+    @staticmethod
+    def _events(stdout):
+        return [json.loads(line) for line in stdout.splitlines()]
+
+    def test_init_json_emits_ndjson_events(self, tmp_path):
+        """Test init --json writes only JSON events: one per step transition, a result and overhead stats."""
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(
+                app,
+                [
+                    "--json",
+                    "init",
+                    "proj",
+                    "--ai",
+                    "claude",
+                    "--no-git",
+                    "--ignore-agent-tools",
+                    "--template-source",
+                    "bundled",
+                ],
+            )
+
+        assert result.exit_code == 0, result.stderr
+        events = self._events(result.stdout)
+        steps = [e for e in events if e["event"] == "step"]
+        assert {"tracker", "key", "label", "status", "detail", "elapsed_ms"} <= steps[0].keys()
+        assert ("final", "done") in [(e["key"], e["status"]) for e in steps]
+        assert events[-2]["event"] == "result"
+        assert events[-2]["ok"] is True
+        assert events[-2]["project"] == str(tmp_path / "proj")
+        assert events[-1]["event"] == "stats"
+        assert events[-1]["events"] == len(events) - 1
+        assert TAGLINE not in result.stdout + result.stderr
+        assert (tmp_path / "proj" / ".refactor").is_dir()
+
+    def test_plain_mode_writes_text_lines(self):
+        """Test --plain writes one key=value line per event."""
+        result = runner.invoke(app, ["--plain", "version"])
+
+        assert result.exit_code == 0
+        lines = result.stdout.splitlines()
+        assert lines[0].startswith("result command=version ok=True")
+        assert lines[-1].startswith("stats events=1")
+
+    def test_output_mode_from_environment(self, monkeypatch):
+        """Test REFACTOR_OUTPUT selects the mode and rejects unknown values."""
+        monkeypatch.setenv("REFACTOR_OUTPUT", "json")
+        assert self._events(runner.invoke(app, ["version"]).stdout)[0]["command"] == "version"
+
+        monkeypatch.setenv("REFACTOR_OUTPUT", "xml")
+        assert runner.invoke(app, ["version"]).exit_code == 1
+
+    def test_machine_mode_never_prompts(self, tmp_path):
+        """Test init without --ai fails instead of opening the arrow-key selector."""
+        with (
+            patch("pathlib.Path.cwd", return_value=tmp_path),
+            patch("refactor_cli.select_with_arrows") as select,
+        ):
+            result = runner.invoke(app, ["--json", "init", "proj", "--no-git"])
+
+        assert result.exit_code == 1
+        assert "pass --ai" in result.stderr
+        select.assert_not_called()
+
+    def test_emit_overhead_is_bounded(self):
+        """Test each event is one bounded write whose cost is measured."""
+        import io
+
+        stream = io.StringIO()
+        emitter = EventEmitter("json", stream)
+        for i in range(2000):
+            emitter.emit("step", tracker="t", key=f"k{i}", status="done", detail="x" * 2000)
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 2000
+        assert len(json.loads(lines[0])["detail"]) == EVENT_FIELD_LIMIT
+        stats = emitter.stats()
+        assert stats["events"] == 2000
+        assert 0 < stats["overhead_us_mean"] < 500
+
+    def test_rich_mode_emits_nothing(self):
+        """Test the default mode writes no events."""
+        import io
+
+        stream = io.StringIO()
+        EventEmitter("rich", stream).emit("step", key="k")
+        assert stream.getvalue() == ""
+
+
+class TestStepTrackerTimings:
+    """Tests for step timings and trace export."""
+
+    def test_started_step_is_timed(self):
+        """Test a step is timed from start() to complete()."""
+        import time
+
+        tracker = StepTracker("Test")
+        tracker.add("fetch", "Fetch")
+        tracker.start("fetch")
+        time.sleep(0.01)
+        tracker.complete("fetch", "ok")
+
+        (record,) = tracker.timings()
+        assert record["key"] == "fetch"
+        assert record["status"] == "done"
+        assert record["duration_ms"] >= 10
+
+    def test_pending_steps_are_not_timed(self):
+        """Test steps that never ran are left out and instant steps have zero duration."""
+        tracker = StepTracker("Test")
+        tracker.add("pending", "Pending")
+        tracker.add("skipped", "Skipped")
+        tracker.skip("skipped", "not needed")
+        records = tracker.timings()
+        assert [r["key"] for r in records] == ["skipped"]
+        assert records[0]["duration_ms"] == 0
+
+    def test_record_accumulates_metrics(self):
+        """Test counters recorded on a step are summed into its timing record."""
+        tracker = StepTracker("Test")
+        tracker.add("extract", "Extract")
+        tracker.start("extract")
+        tracker.record("extract", files=3)
+        tracker.record("extract", files=2, bytes=10)
+        tracker.complete("extract")
+        (record,) = tracker.timings()
+        assert record["files"] == 5
+        assert record["bytes"] == 10
+
+    def test_chrome_trace_format(self):
+        """Test the trace export uses complete events in microseconds."""
+        tracker = StepTracker("Init")
+        tracker.add("git", "Initialize git")
+        tracker.start("git")
+        tracker.complete("git", "initialized")
+
+        trace = tracker.chrome_trace(command="init")
+        events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        assert len(events) == 1
+        assert events[0]["name"] == "Initialize git"
+        assert events[0]["args"]["key"] == "git"
+        assert isinstance(events[0]["ts"], int)
+        assert isinstance(events[0]["dur"], int)
+        assert trace["otherData"]["command"] == "init"
+        json.dumps(trace)
+
+    def test_summary_table(self):
+        """Test the summary table has one row per timed step."""
+        tracker = StepTracker("Test")
+        for key in ("a", "b"):
+            tracker.add(key, key)
+            tracker.start(key)
+            tracker.complete(key)
+        assert tracker.summary_table().row_count == 2
+
+    def test_init_trace_export(self, tmp_path):
+        """Test init --trace writes a Chrome trace covering the init phases."""
+        trace_path = tmp_path / "trace" / "init.json"
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(
+                app,
+                [
+                    "init",
+                    "proj",
+                    "--ai",
+                    "claude",
+                    "--no-git",
+                    "--ignore-agent-tools",
+                    "--template-source",
+                    "bundled",
+                    "--trace",
+                    str(trace_path),
+                ],
+            )
+
+        assert result.exit_code == 0, result.stdout
+        assert "timings" in result.stdout
+        trace = json.loads(trace_path.read_text())
+        events = {e["cat"]: e for e in trace["traceEvents"] if e["ph"] == "X"}
+        assert {"fetch", "extract", "manifest", "git", "final"} <= set(events)
+        assert events["extract"]["args"]["files"] > 0
+        assert trace["otherData"]["ai"] == "claude"
+
+    def test_download_step_records_bytes(self, tmp_path):
+        """Test the download step is timed separately from the release lookup and records bytes."""
+        zip_content = TestTemplateIntegrity._zip_bytes()
+        tracker = StepTracker("Test")
+        for key in ("fetch", "download"):
+            tracker.add(key, key)
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            _fetch_template_archive(
+                "claude",
+                verbose=False,
+                tracker=tracker,
+                http_client=TestTemplateIntegrity._client(zip_content),
+                debug=False,
+                github_token=None,
+            )
+
+        records = {r["key"]: r for r in tracker.timings()}
+        assert records["fetch"]["status"] == "done"
+        assert records["download"]["bytes"] == len(zip_content)
+
+
 class TestStepTrackerRenderVariants:
     """Additional tests for StepTracker render with different states."""
 
@@ -991,60 +1503,236 @@ class TestRateLimitHeadersEdgeCases:
         assert "reset_time" not in result
 
 
-class TestMergeItemToDest:
-    """Tests for _merge_item_to_dest function."""
+class TestApplyMergePlanItems:
+    """Tests for copying single files and directories through build_merge_plan and apply_merge_plan."""
 
     def test_merge_file_to_dest(self, tmp_path):
-        """Test merging a single file."""
+        """Test a new file is copied."""
         src = tmp_path / "source"
         src.mkdir()
-        src_file = src / "test.txt"
-        src_file.write_text("source content")
-
+        (src / "test.txt").write_text("source content")
         dest = tmp_path / "dest"
         dest.mkdir()
-        dest_file = dest / "test.txt"
 
-        _merge_item_to_dest(src_file, dest_file, verbose=False, tracker=None)
-        assert dest_file.exists()
-        assert dest_file.read_text() == "source content"
+        apply_merge_plan(build_merge_plan(src, dest), dest)
+        assert (dest / "test.txt").read_text() == "source content"
 
     def test_merge_directory_to_dest_new(self, tmp_path):
-        """Test merging a directory to non-existing dest."""
-        src_dir = tmp_path / "source_dir"
-        src_dir.mkdir()
-        (src_dir / "file1.txt").write_text("content1")
-
-        dest_dir = tmp_path / "dest_dir"
+        """Test a directory missing from the destination is created with its files."""
+        src = tmp_path / "source"
+        (src / "sub").mkdir(parents=True)
+        (src / "sub" / "file1.txt").write_text("content1")
+        dest = tmp_path / "dest"
+        dest.mkdir()
 
-        _merge_item_to_dest(src_dir, dest_dir, verbose=False, tracker=None)
-        assert dest_dir.exists()
-        assert (dest_dir / "file1.txt").exists()
+        apply_merge_plan(build_merge_plan(src, dest), dest)
+        assert (dest / "sub" / "file1.txt").read_text() == "content1"
 
     def test_merge_directory_to_existing(self, tmp_path):
-        """Test merging directory to existing dest."""
-        src_dir = tmp_path / "source_dir"
-        src_dir.mkdir()
-        (src_dir / "new_file.txt").write_text("new content")
+        """Test merging into an existing directory keeps the files already there."""
+        src = tmp_path / "source"
+        (src / "sub").mkdir(parents=True)
+        (src / "sub" / "new_file.txt").write_text("new content")
+        dest = tmp_path / "dest"
+        (dest / "sub").mkdir(parents=True)
+        (dest / "sub" / "existing.txt").write_text("existing")
+
+        apply_merge_plan(build_merge_plan(src, dest), dest, verbose=True)
+        assert (dest / "sub" / "new_file.txt").read_text() == "new content"
+        assert (dest / "sub" / "existing.txt").read_text() == "existing"
+
+    def test_merge_file_overwrite(self, tmp_path):
+        """Test a changed file is overwritten."""
+        src = tmp_path / "source"
+        src.mkdir()
+        (src / "test.txt").write_text("new")
+        dest = tmp_path / "dest"
+        dest.mkdir()
+        (dest / "test.txt").write_text("old")
+
+        plan = build_merge_plan(src, dest)
+        assert plan[0]["action"] == "changed"
+        apply_merge_plan(plan, dest, verbose=True)
+        assert (dest / "test.txt").read_text() == "new"
+
+
+class TestMergePlan:
+    """Tests for merge plan computation and application."""
+
+    def _make_source(self, tmp_path):
+        src = tmp_path / "source"
+        (src / ".refactor" / "templates").mkdir(parents=True)
+        (src / ".refactor" / "refactorings").mkdir(parents=True)
+        (src / ".refactor" / "templates" / "same.md").write_text("same")
+        (src / ".refactor" / "templates" / "changed.md").write_text("new version")
+        (src / ".refactor" / "templates" / "added.md").write_text("added")
+        return src
+
+    def _make_dest(self, tmp_path):
+        dest = tmp_path / "dest"
+        (dest / ".refactor" / "templates").mkdir(parents=True)
+        (dest / ".refactor" / "templates" / "same.md").write_text("same")
+        (dest / ".refactor" / "templates" / "changed.md").write_text("old version")
+        return dest
+
+    def test_build_merge_plan_classifies_entries(self, tmp_path):
+        """Test that incoming files are classified as new, identical or changed."""
+        plan = build_merge_plan(self._make_source(tmp_path), self._make_dest(tmp_path))
+        actions = {str(e["path"]): e["action"] for e in plan}
+
+        assert actions[str(Path(".refactor/templates/same.md"))] == "identical"
+        assert actions[str(Path(".refactor/templates/changed.md"))] == "changed"
+        assert actions[str(Path(".refactor/templates/added.md"))] == "new"
+        assert actions[str(Path(".refactor/refactorings"))] == "new"
+        assert str(Path(".refactor")) not in actions
+
+    def test_build_merge_plan_records_sha256(self, tmp_path):
+        """Test that file entries carry the incoming SHA-256 digest."""
+        import hashlib
+
+        plan = build_merge_plan(self._make_source(tmp_path), tmp_path / "missing")
+        entry = next(e for e in plan if e["path"].name == "same.md")
+        assert entry["sha256"] == hashlib.sha256(b"same").hexdigest()
+
+    def test_build_merge_plan_settings_merge(self, tmp_path):
+        """Test .vscode/settings.json is classified as settings-merge or identical."""
+        import json
+
+        src = tmp_path / "source"
+        (src / ".vscode").mkdir(parents=True)
+        (src / ".vscode" / "settings.json").write_text(json.dumps({"a": 1}))
+        dest = tmp_path / "dest"
+        (dest / ".vscode").mkdir(parents=True)
+        dest_settings = dest / ".vscode" / "settings.json"
+
+        dest_settings.write_text(json.dumps({"b": 2}))
+        assert build_merge_plan(src, dest)[0]["action"] == "settings-merge"
+
+        dest_settings.write_text(json.dumps({"a": 1, "b": 2}))
+        assert build_merge_plan(src, dest)[0]["action"] == "identical"
+
+    def test_apply_merge_plan_skips_identical(self, tmp_path):
+        """Test that identical files are not rewritten."""
+        import os
+
+        dest = self._make_dest(tmp_path)
+        same = dest / ".refactor" / "templates" / "same.md"
+        os.utime(same, ns=(1_000_000_000, 1_000_000_000))
+
+        plan = build_merge_plan(self._make_source(tmp_path), dest)
+        apply_merge_plan(plan, dest)
+
+        assert same.stat().st_mtime_ns == 1_000_000_000
+        assert (dest / ".refactor" / "templates" / "changed.md").read_text() == "new version"
+        assert (dest / ".refactor" / "templates" / "added.md").read_text() == "added"
+        assert (dest / ".refactor" / "refactorings").is_dir()
+
+    def test_summarize_merge_plan(self, tmp_path):
+        """Test the compact plan summary."""
+        plan = build_merge_plan(self._make_source(tmp_path), self._make_dest(tmp_path))
+        assert summarize_merge_plan(plan) == "2 new, 1 changed, 1 identical"
+        assert summarize_merge_plan([]) == "nothing to merge"
+
+    def test_extract_and_merge_dry_run_writes_nothing(self, tmp_path):
+        """Test that dry_run returns the plan without touching the destination."""
+        import zipfile
 
-        dest_dir = tmp_path / "dest_dir"
+        zip_path = tmp_path / "test.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("file.txt", "content")
+
+        dest_dir = tmp_path / "dest"
         dest_dir.mkdir()
-        (dest_dir / "existing.txt").write_text("existing")
+        tracker = StepTracker("Test")
 
-        _merge_item_to_dest(src_dir, dest_dir, verbose=True, tracker=None)
-        assert (dest_dir / "new_file.txt").exists()
-        assert (dest_dir / "existing.txt").exists()
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            plan = _extract_and_merge_to_current_dir(zf, dest_dir, verbose=False, tracker=tracker, dry_run=True)
 
-    def test_merge_file_overwrite(self, tmp_path):
-        """Test overwriting existing file."""
-        src_file = tmp_path / "src.txt"
-        src_file.write_text("new")
+        assert [e["action"] for e in plan] == ["new"]
+        assert not (dest_dir / "file.txt").exists()
+        merge_step = next(s for s in tracker.steps if s["key"] == "merge-plan")
+        assert merge_step["detail"] == "1 new"
+
+    def test_preview_template_merge_leaves_project_untouched(self, tmp_path):
+        """Test preview_template_merge downloads, plans and cleans up without writing to the project."""
+        import io
+        import zipfile
+
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("existing.txt", "existing content")
+            zf.writestr(".refactor/templates/new.md", "# New")
+        zip_content = zip_buffer.getvalue()
+
+        release = {
+            "tag_name": "v1.0.0",
+            "assets": [
+                {
+                    "name": "refactor-kit-template-claude-v1.0.0.zip",
+                    "browser_download_url": "https://example.com/download.zip",
+                    "size": len(zip_content),
+                }
+            ],
+        }
+
+        class MockResponse:
+            status_code = 200
+
+            def __init__(self):
+                self.headers = {"content-length": str(len(zip_content))}
+
+            def json(self):
+                return release
+
+            def iter_bytes(self, chunk_size=8192):  # noqa: ARG002
+                yield zip_content
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+        class MockClient:
+            def get(self, _url, **_kwargs):
+                return MockResponse()
+
+            def stream(self, _method, _url, **_kwargs):
+                return MockResponse()
+
+        project = tmp_path / "project"
+        project.mkdir()
+        (project / "existing.txt").write_text("existing content")
+
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            plan = preview_template_merge(project, "claude", verbose=False, http_client=MockClient())
 
-        dest_file = tmp_path / "dest.txt"
-        dest_file.write_text("old")
+        actions = {e["path"].as_posix(): e["action"] for e in plan}
+        assert actions["existing.txt"] == "identical"
+        assert actions[".refactor/templates/new.md"] == "new"
+        assert not (project / ".refactor").exists()
+        assert not list(tmp_path.glob("*.zip"))
+
+    def test_init_dry_run_prints_plan(self, tmp_path):
+        """Test init --dry-run prints the merge plan and writes nothing."""
+        (tmp_path / "existing.txt").write_text("existing")
+        plan = [{"path": Path(".refactor/templates/a.md"), "source": None, "action": "new", "sha256": "x"}]
+
+        with (
+            patch("pathlib.Path.cwd", return_value=tmp_path),
+            patch("refactor_cli.preview_template_merge", return_value=plan) as mock_preview,
+            patch("refactor_cli.download_and_extract_template") as mock_extract,
+        ):
+            result = runner.invoke(
+                app, ["init", "--here", "--dry-run", "--ai", "claude", "--no-git", "--ignore-agent-tools"]
+            )
 
-        _merge_item_to_dest(src_file, dest_file, verbose=True, tracker=None)
-        assert dest_file.read_text() == "new"
+        assert result.exit_code == 0
+        assert mock_preview.called
+        assert not mock_extract.called
+        assert "Merge Plan" in result.stdout
+        assert "Dry run complete" in result.stdout
+        assert not (tmp_path / ".refactor").exists()
 
 
 class TestGetSourceDirFromExtracted:
@@ -1557,44 +2245,47 @@ class TestDownloadTemplateFromGitHub:
         assert any("Bearer test-token-123" in str(h) for h in captured_headers)
 
 
-class TestDownloadAndExtractTemplate:
-    """Tests for download_and_extract_template function."""
+class TestTemplateIntegrity:
+    """Tests for checksum verification and the digest-keyed template cache."""
 
-    def test_extract_to_new_project(self, tmp_path):
-        """Test extracting template to new project directory."""
+    @staticmethod
+    def _zip_bytes():
         import io
         import zipfile
 
-        # Create a mock ZIP with template structure
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr(".refactor/memory/.gitkeep", "")
             zf.writestr(".refactor/templates/test.md", "# Test")
-            zf.writestr(".claude/commands/refactor.start.md", "# Start")
-        zip_content = zip_buffer.getvalue()
-
-        mock_release_response = {
-            "tag_name": "v1.0.0",
-            "assets": [
-                {
-                    "name": "refactor-kit-template-claude-v1.0.0.zip",
-                    "browser_download_url": "https://example.com/download.zip",
-                    "size": len(zip_content),
-                }
-            ],
+            zf.writestr(".claude/commands/refactor.analyze.md", "# Analyze")
+        return zip_buffer.getvalue()
+
+    @staticmethod
+    def _client(zip_content, *, digest=None, manifest_text=None):
+        asset = {
+            "name": "refactor-kit-template-claude-v1.0.0.zip",
+            "browser_download_url": "https://example.com/download.zip",
+            "size": len(zip_content),
         }
+        if digest:
+            asset["digest"] = digest
+        assets = [asset]
+        if manifest_text is not None:
+            assets.append({"name": "SHA256SUMS", "browser_download_url": "https://example.com/SHA256SUMS", "size": 1})
+        release = {"tag_name": "v1.0.0", "assets": assets}
 
         class MockResponse:
             status_code = 200
 
-            def __init__(self):
+            def __init__(self, url=""):
                 self.headers = {"content-length": str(len(zip_content))}
+                self.text = manifest_text if url.endswith("SHA256SUMS") else ""
 
             def json(self):
-                return mock_release_response
+                return release
 
-            def iter_bytes(self, chunk_size=8192):  # noqa: ARG002
-                yield zip_content
+            def iter_bytes(self, chunk_size=8192):
+                for i in range(0, len(zip_content), chunk_size):
+                    yield zip_content[i : i + chunk_size]
 
             def __enter__(self):
                 return self
@@ -1603,59 +2294,1650 @@ class TestDownloadAndExtractTemplate:
                 pass
 
         class MockClient:
-            def get(self, _url, **_kwargs):
-                return MockResponse()
+            streams = 0
 
-            def stream(self, _method, _url, **_kwargs):
-                return MockResponse()
+            def get(self, url, **_kwargs):
+                return MockResponse(url)
 
-            def __enter__(self):
-                return self
+            def stream(self, _method, url, **_kwargs):
+                MockClient.streams += 1
+                return MockResponse(url)
 
-            def __exit__(self, *args):
-                pass
+        return MockClient()
 
-        project_path = tmp_path / "new-project"
+    def test_parse_checksum_manifest(self):
+        """Test parsing sha256sum output in text and binary mode."""
+        text = f"{'a' * 64}  one.zip\n{'B' * 64} *two.zip\nnot a checksum line\n"
+        assert _parse_checksum_manifest(text) == {"one.zip": "a" * 64, "two.zip": "b" * 64}
 
-        with patch("pathlib.Path.cwd", return_value=tmp_path):
-            result = download_and_extract_template(
-                project_path,
-                "claude",
-                is_current_dir=False,
-                verbose=False,
-                http_client=MockClient(),
-            )
+    def test_asset_digest_verified_and_cached(self, tmp_path, monkeypatch):
+        """Test a download matching the asset digest is stored in the cache and reused."""
+        import hashlib
 
-        assert result == project_path
-        assert (project_path / ".refactor" / "memory").exists()
-        assert (project_path / ".refactor" / "templates" / "test.md").exists()
-        assert (project_path / ".claude" / "commands" / "refactor.start.md").exists()
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        zip_content = self._zip_bytes()
+        sha = hashlib.sha256(zip_content).hexdigest()
+        client = self._client(zip_content, digest=f"sha256:{sha}")
 
-    def test_extract_to_current_dir_merges(self, tmp_path):
-        """Test extracting template to current directory merges with existing files."""
-        import io
-        import zipfile
+        zip_path, meta = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=client
+        )
+        assert meta["verified"] is True
+        assert meta["cached"] is True
+        assert meta["sha256"] == sha
+        assert zip_path == tmp_path / "cache" / "templates" / f"{sha}.zip"
+        assert zip_path.read_bytes() == zip_content
+        assert not list((tmp_path / "cache" / "templates").glob("*.part"))
+
+        zip_path2, meta2 = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=client
+        )
+        assert zip_path2 == zip_path
+        assert meta2["cached"] is True
+        assert type(client).streams == 1
 
-        # Create existing file in tmp_path
-        existing_file = tmp_path / "existing.txt"
-        existing_file.write_text("existing content")
+    def test_checksum_mismatch_rejected(self, tmp_path, monkeypatch):
+        """Test a download whose hash does not match is rejected and removed."""
+        import typer
 
-        # Create a mock ZIP with template structure
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr(".refactor/memory/.gitkeep", "")
-            zf.writestr("new-file.txt", "new content")
-        zip_content = zip_buffer.getvalue()
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        client = self._client(self._zip_bytes(), digest=f"sha256:{'0' * 64}")
 
-        mock_release_response = {
-            "tag_name": "v1.0.0",
-            "assets": [
-                {
-                    "name": "refactor-kit-template-claude-v1.0.0.zip",
-                    "browser_download_url": "https://example.com/download.zip",
-                    "size": len(zip_content),
-                }
-            ],
+        with pytest.raises(typer.Exit):
+            download_template_from_github("claude", tmp_path, verbose=False, show_progress=False, http_client=client)
+
+        assert not list((tmp_path / "cache" / "templates").iterdir())
+
+    def test_checksum_manifest_verified(self, tmp_path, monkeypatch):
+        """Test verification against a SHA256SUMS release asset."""
+        import hashlib
+
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        zip_content = self._zip_bytes()
+        sha = hashlib.sha256(zip_content).hexdigest()
+        client = self._client(zip_content, manifest_text=f"{sha}  refactor-kit-template-claude-v1.0.0.zip\n")
+
+        _zip_path, meta = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=client
+        )
+        assert meta["verified"] is True
+        assert meta["sha256"] == sha
+
+    def test_checksum_manifest_missing_entry_rejected(self, tmp_path, monkeypatch):
+        """Test a manifest that does not list the asset fails closed."""
+        import typer
+
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        client = self._client(self._zip_bytes(), manifest_text=f"{'a' * 64}  other.zip\n")
+
+        with pytest.raises(typer.Exit):
+            download_template_from_github("claude", tmp_path, verbose=False, show_progress=False, http_client=client)
+
+    def test_unverified_download_not_cached(self, tmp_path, monkeypatch):
+        """Test that archives without a published checksum are hashed but not cached."""
+        import hashlib
+
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        zip_content = self._zip_bytes()
+        zip_path, meta = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=self._client(zip_content)
+        )
+        assert meta["verified"] is False
+        assert meta["cached"] is False
+        assert meta["sha256"] == hashlib.sha256(zip_content).hexdigest()
+        assert zip_path.parent == tmp_path
+        assert not (tmp_path / "cache").exists()
+
+    def test_extract_keeps_cached_archive(self, tmp_path, monkeypatch):
+        """Test download_and_extract_template does not delete archives that live in the cache."""
+        import hashlib
+
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        zip_content = self._zip_bytes()
+        sha = hashlib.sha256(zip_content).hexdigest()
+        client = self._client(zip_content, digest=f"sha256:{sha}")
+
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            download_and_extract_template(tmp_path / "proj", "claude", verbose=False, http_client=client)
+
+        assert (tmp_path / "proj" / ".refactor" / "templates" / "test.md").exists()
+        assert (tmp_path / "cache" / "templates" / f"{sha}.zip").exists()
+
+
+class TestDownloadEngine:
+    """Tests for the asyncio download engine."""
+
+    @staticmethod
+    def _release(agents, payloads, with_manifest=True):
+        import hashlib
+
+        assets = [
+            {
+                "name": f"refactor-kit-template-{ai}-v1.0.0.zip",
+                "browser_download_url": f"https://example.com/{ai}.zip",
+                "size": len(payloads[ai]),
+            }
+            for ai in agents
+        ]
+        if with_manifest:
+            assets.append({"name": "SHA256SUMS", "browser_download_url": "https://example.com/SHA256SUMS", "size": 1})
+        manifest = "".join(
+            f"{hashlib.sha256(payloads[ai]).hexdigest()}  refactor-kit-template-{ai}-v1.0.0.zip\n" for ai in agents
+        )
+        return {"tag_name": "v1.0.0", "assets": assets}, manifest
+
+    def test_release_assets_download_concurrently(self, tmp_path, monkeypatch):
+        """Test several agent archives download in parallel, within the engine's limit, and share one manifest fetch."""
+        import asyncio
+
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        agents = ["claude", "gemini", "copilot", "cursor-agent"]
+        payloads = {ai: f"archive for {ai}".encode() for ai in agents}
+        release, manifest = self._release(agents, payloads)
+        manifest_requests = []
+        engine = DownloadEngine(max_concurrency=2)
+        # [current, peak] archive requests in flight; each waits until the limit is reached once
+        in_flight = [0, 0]
+        limit_reached = asyncio.Event()
+
+        async def handler(request):
+            name = request.url.path.lstrip("/")
+            if name == "SHA256SUMS":
+                manifest_requests.append(name)
+                return httpx.Response(200, text=manifest)
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+            if in_flight[0] >= engine.max_concurrency:
+                limit_reached.set()
+            try:
+                await asyncio.wait_for(limit_reached.wait(), timeout=5)
+            except TimeoutError:
+                pass
+            finally:
+                in_flight[0] -= 1
+            return httpx.Response(200, content=payloads[name.removesuffix(".zip")])
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            with patch("refactor_cli._download_engine", engine):
+                results = download_release_assets(agents, tmp_path, http_client=client, release_data=release)
+        finally:
+            engine.close()
+
+        assert in_flight[1] == engine.max_concurrency
+        assert manifest_requests == ["SHA256SUMS"]
+        for ai in agents:
+            zip_path, meta = results[ai]
+            assert meta["verified"] is True
+            assert meta["cached"] is True
+            assert zip_path.read_bytes() == payloads[ai]
+
+    def test_release_assets_checksum_mismatch(self, tmp_path, monkeypatch):
+        """Test a corrupted archive fails the batch and leaves nothing in the cache."""
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        payloads = {"claude": b"good"}
+        release, _manifest = self._release(["claude"], payloads)
+
+        def handler(request):
+            if request.url.path.endswith("SHA256SUMS"):
+                return httpx.Response(200, text=f"{'0' * 64}  refactor-kit-template-claude-v1.0.0.zip\n")
+            return httpx.Response(200, content=b"good")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with pytest.raises(RuntimeError, match="Expected"):
+            download_release_assets(["claude"], tmp_path, http_client=client, release_data=release)
+        assert not list((tmp_path / "cache" / "templates").iterdir())
+
+    def test_download_error_status(self, tmp_path):
+        """Test a non-200 answer surfaces as a RuntimeError with the status."""
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _request: httpx.Response(404)))
+        with pytest.raises(RuntimeError, match="404"):
+            _download_engine.run(_download_engine.download(client, "https://example.com/a.zip", tmp_path / "a.zip"))
+
+    def test_concurrency_limit(self):
+        """Test the engine never keeps more requests in flight than its limit."""
+        import threading
+        import time
+
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        class SlowClient:
+            def get(self, url, **_kwargs):
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight[1], in_flight[0])
+                time.sleep(0.05)
+                with lock:
+                    in_flight[0] -= 1
+                return url
+
+        engine = DownloadEngine(max_concurrency=2)
+        try:
+            client = SlowClient()
+            results = engine.gather([engine.get(client, f"u{i}") for i in range(6)])
+        finally:
+            engine.close()
+        assert results == [f"u{i}" for i in range(6)]
+        assert in_flight[1] == 2
+
+    def test_shared_client_uses_async_counterpart(self):
+        """Test the pooled sync client is swapped for an AsyncClient that shutdown closes."""
+        close_http_clients()
+        shared = _get_http_client()
+
+        async def resolve():
+            return _download_engine._async_client_for(shared)
+
+        async_client = _download_engine.run(resolve())
+        assert isinstance(async_client, httpx.AsyncClient)
+        close_http_clients()
+        assert async_client.is_closed
+
+
+class TestReleaseSources:
+    """Tests for configurable release sources with failover."""
+
+    @staticmethod
+    def _zip_bytes():
+        import io
+        import zipfile
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr(".refactor/templates/test.md", "test")
+            zf.writestr(".claude/commands/refactor.test.md", "cmd")
+        return buffer.getvalue()
+
+    def _mirror_dir(self, root, with_index=True):
+        import hashlib
+
+        root.mkdir(parents=True, exist_ok=True)
+        content = self._zip_bytes()
+        name = "refactor-kit-template-claude-v2.0.0.zip"
+        (root / "v2.0.0").mkdir(exist_ok=True)
+        (root / "v2.0.0" / name).write_bytes(content)
+        (root / "SHA256SUMS").write_text(f"{hashlib.sha256(content).hexdigest()}  {name}\n")
+        if with_index:
+            release = {
+                "tag_name": "v2.0.0",
+                "assets": [
+                    {"name": name, "size": len(content), "browser_download_url": f"v2.0.0/{name}"},
+                    {"name": "SHA256SUMS", "size": 1},
+                ],
+            }
+            (root / "latest.json").write_text(json.dumps(release))
+        else:
+            (root / name).write_bytes(content)
+        return content
+
+    @pytest.fixture
+    def mirror_server(self, tmp_path):
+        """Serve a mirror directory over HTTP on localhost, recording request headers."""
+        import functools
+        import http.server
+        import threading
+
+        root = tmp_path / "mirror"
+        self._mirror_dir(root)
+        seen_headers = []
+
+        class Handler(http.server.SimpleHTTPRequestHandler):
+            def do_GET(self):
+                seen_headers.append(dict(self.headers))
+                super().do_GET()
+
+            def log_message(self, *_args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(root)))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_address[1]}/", seen_headers
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def _closed_port_url():
+        import socket
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        return f"http://127.0.0.1:{port}/"
+
+    def test_parse_release_source(self):
+        """Test each spec form maps to the right source kind."""
+        assert parse_release_source("github").repo == "sasaron/refactor-kit"
+        assert parse_release_source("github:acme/templates").repo == "acme/templates"
+        assert parse_release_source("cache").kind == "cache"
+        assert parse_release_source("https://mirror.example/refactor").kind == "mirror"
+        assert parse_release_source("file:///srv/mirror").kind == "mirror"
+        with pytest.raises(ValueError, match="Unknown release source"):
+            parse_release_source("ftp://nope")
+
+    def test_incomplete_source_cannot_be_constructed(self):
+        """Test a source that does not implement every lookup is rejected when built, not during failover."""
+
+        class LatestOnly(ReleaseSource):
+            async def latest_release(self, http_client, *, debug, github_token):  # noqa: ARG002
+                return {}
+
+        with pytest.raises(TypeError, match="release"):
+            LatestOnly("partial")
+
+    def test_configured_sources_env_overrides_config(self, tmp_path, monkeypatch):
+        """Test the env variable wins over the config file, which wins over the default."""
+        assert [s.spec for s in configured_release_sources()] == ["github"]
+
+        config = tmp_path / "config.json"
+        config.write_text(json.dumps({"release_sources": ["https://mirror.example", "github"]}))
+        monkeypatch.setenv("REFACTOR_CONFIG", str(config))
+        assert [s.spec for s in configured_release_sources()] == ["https://mirror.example", "github"]
+
+        monkeypatch.setenv("REFACTOR_RELEASE_SOURCES", "cache, github")
+        assert [s.spec for s in configured_release_sources()] == ["cache", "github"]
+
+    def test_failover_to_local_http_mirror(self, mirror_server):
+        """Test an unreachable source is skipped and the local HTTP mirror answers, with stats for both."""
+        url, _headers = mirror_server
+        dead = self._closed_port_url()
+        sources = [parse_release_source(dead), parse_release_source(url)]
+
+        release = fetch_latest_release(_get_http_client(), sources=sources)
+
+        assert release["tag_name"] == "v2.0.0"
+        assert release["source"] == url
+        assert release["assets"][0]["browser_download_url"] == f"{url}v2.0.0/refactor-kit-template-claude-v2.0.0.zip"
+        stats = read_source_stats()
+        assert stats[dead]["failures"] == 1
+        assert stats[url]["failures"] == 0
+        assert stats[url]["avg_ms"] is not None
+
+    def test_all_sources_failing(self):
+        """Test every source error is reported when none answers."""
+        dead = self._closed_port_url()
+        with pytest.raises(RuntimeError, match=r"127\.0\.0\.1"):
+            fetch_latest_release(
+                _get_http_client(), sources=[parse_release_source(dead), parse_release_source("cache")]
+            )
+
+    def test_download_from_http_mirror(self, mirror_server, tmp_path):
+        """Test archives download and verify from the mirror without sending the GitHub token."""
+        url, headers = mirror_server
+        release = fetch_latest_release(_get_http_client(), sources=[parse_release_source(url)])
+
+        zip_path, meta = download_template_from_github(
+            "claude",
+            tmp_path,
+            verbose=False,
+            show_progress=False,
+            http_client=_get_http_client(),
+            github_token="secret-token",
+            release_data=release,
+        )
+
+        assert meta["verified"] is True
+        assert meta["source"] == url
+        assert zip_path.read_bytes() == self._zip_bytes()
+        assert not any("Authorization" in h for h in headers)
+
+    def test_file_directory_without_index(self, tmp_path):
+        """Test a plain directory of archives works as a file:// mirror."""
+        mirror = tmp_path / "mirror"
+        self._mirror_dir(mirror, with_index=False)
+        release = fetch_latest_release(None, sources=[parse_release_source(mirror.as_uri())])
+        assert release["tag_name"] == "v2.0.0"
+
+        zip_path, meta = download_template_from_github(
+            "claude", tmp_path / "out", verbose=False, show_progress=False, http_client=None, release_data=release
+        )
+        assert meta["verified"] is True
+        assert zip_path.read_bytes() == self._zip_bytes()
+
+    def test_cache_source_serves_downloaded_release(self, tmp_path):
+        """Test the cache source offers releases whose archives were downloaded before."""
+        mirror = tmp_path / "mirror"
+        self._mirror_dir(mirror)
+        release = fetch_latest_release(None, sources=[parse_release_source(mirror.as_uri())])
+        download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=None, release_data=release
+        )
+
+        cached_release = fetch_latest_release(None, sources=[parse_release_source("cache")])
+        assert cached_release["tag_name"] == "v2.0.0"
+        zip_path, meta = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=None, release_data=cached_release
+        )
+        assert meta["cached"] is True
+        assert zip_path.read_bytes() == self._zip_bytes()
+
+    def test_sources_command(self, monkeypatch):
+        """Test the sources command lists sources in priority order."""
+        monkeypatch.setenv("REFACTOR_RELEASE_SOURCES", "https://mirror.example,github")
+        result = runner.invoke(app, ["sources"])
+        assert result.exit_code == 0
+        assert result.stdout.index("https://mirror.example") < result.stdout.index("github")
+
+
+class TestPinnedRelease:
+    """Tests for --release pinning and the persisted tag -> asset index."""
+
+    def test_normalize_release_tag(self):
+        """Test bare versions gain the v prefix used by release tags."""
+        assert normalize_release_tag("1.2.3") == "v1.2.3"
+        assert normalize_release_tag(" v1.2.3 ") == "v1.2.3"
+        assert normalize_release_tag("nightly") == "nightly"
+
+    def test_github_source_uses_tags_endpoint(self):
+        """Test a pinned GitHub lookup goes to /releases/tags/<tag> and is added to the index."""
+        seen = []
+
+        def handler(request):
+            seen.append(request.url.path)
+            return httpx.Response(200, json={"tag_name": "v1.2.3", "assets": [{"name": "a.zip", "size": 3}]})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        release = fetch_release("1.2.3", client, sources=[parse_release_source("github")])
+
+        assert seen == ["/repos/sasaron/refactor-kit/releases/tags/v1.2.3"]
+        assert release["source"] == "github"
+        assert read_release_index()["v1.2.3"]["assets"] == [{"name": "a.zip", "size": 3}]
+
+    def test_indexed_tag_needs_no_lookup(self):
+        """Test a tag already in the index resolves without asking any source."""
+        release = {"tag_name": "v1.0.0", "assets": [{"name": "a.zip", "size": 3, "browser_download_url": "u"}]}
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _request: httpx.Response(200, json=release)))
+        fetch_latest_release(client, sources=[parse_release_source("github")])
+
+        failing = httpx.AsyncClient(transport=httpx.MockTransport(lambda _request: httpx.Response(500)))
+        pinned = fetch_release("v1.0.0", failing, sources=[parse_release_source("github")])
+        assert pinned["indexed"] is True
+        assert pinned["assets"][0]["browser_download_url"] == "u"
+        with pytest.raises(RuntimeError):
+            fetch_release("v1.0.0", failing, sources=[parse_release_source("github")], use_index=False)
+
+    def test_pinned_cached_release_makes_no_request(self, tmp_path):
+        """Test a pinned release that was downloaded before is served from the cache with no request."""
+        mirror = tmp_path / "mirror"
+        content = TestReleaseSources()._mirror_dir(mirror)
+        release = fetch_release("v2.0.0", None, sources=[parse_release_source(mirror.as_uri())])
+        download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=None, release_data=release
+        )
+
+        def fail(request):
+            raise AssertionError(f"unexpected request to {request.url}")
+
+        offline = httpx.AsyncClient(transport=httpx.MockTransport(fail))
+        pinned = fetch_release("v2.0.0", offline, sources=[parse_release_source("github")])
+        zip_path, meta = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=offline, release_data=pinned
+        )
+        assert meta["cached"] is True
+        assert zip_path.read_bytes() == content
+
+    def test_directory_source_pins_tag(self, tmp_path):
+        """Test a file:// directory without latest.json serves the archives of the requested tag only."""
+        for tag in ("v1.0.0", "v2.0.0"):
+            (tmp_path / f"refactor-kit-template-claude-{tag}.zip").write_bytes(b"zip")
+        source = parse_release_source(tmp_path.as_uri())
+
+        assert fetch_release("v1.0.0", None, sources=[source])["tag_name"] == "v1.0.0"
+        with pytest.raises(RuntimeError, match=r"v3\.0\.0"):
+            fetch_release("v3.0.0", None, sources=[source])
+
+    def test_pinned_bundled_version_skips_network(self):
+        """Test pinning the bundled version renders the bundled templates without any lookup."""
+        with patch("refactor_cli.fetch_release") as fetch:
+            release = _select_template_release(
+                "auto",
+                verbose=False,
+                tracker=None,
+                http_client=None,
+                debug=False,
+                github_token=None,
+                release_tag=__version__,
+            )
+        assert release is None
+        fetch.assert_not_called()
+
+    def test_pinned_release_conflicts_with_bundled_source(self):
+        """Test --template-source bundled with another pinned release is an error."""
+        with pytest.raises(typer.Exit):
+            _select_template_release(
+                "bundled",
+                verbose=False,
+                tracker=None,
+                http_client=None,
+                debug=False,
+                github_token=None,
+                release_tag="v0.0.1",
+            )
+
+
+class TestRateBudget:
+    """Tests for the GitHub API budget shared by concurrent CLI runs."""
+
+    @staticmethod
+    def _headers(remaining, reset, limit=60):
+        return httpx.Headers(
+            {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(reset)}
+        )
+
+    def test_seeded_from_headers_and_decremented(self):
+        """Test observed headers seed the budget and each reservation takes one call."""
+        import time
+
+        reset = int(time.time()) + 3600
+        observe_github_rate_limit(None, self._headers(40, reset))
+        assert reserve_github_api_call(None, max_wait=0) == 0
+        assert read_rate_budget()["anonymous"] == {
+            "limit": 60,
+            "remaining": 39,
+            "reset": reset,
+            "last_call": read_rate_budget()["anonymous"]["last_call"],
+        }
+
+    def test_in_flight_calls_are_not_forgotten(self):
+        """Test a response from the same window cannot raise the locally decremented count."""
+        import time
+
+        reset = int(time.time()) + 3600
+        observe_github_rate_limit(None, self._headers(40, reset))
+        reserve_github_api_call(None, max_wait=0)
+        reserve_github_api_call(None, max_wait=0)
+        observe_github_rate_limit(None, self._headers(39, reset))
+        assert read_rate_budget()["anonymous"]["remaining"] == 38
+        observe_github_rate_limit(None, self._headers(60, reset + 3600))
+        assert read_rate_budget()["anonymous"]["remaining"] == 60
+
+    def test_tokens_have_separate_budgets(self):
+        """Test calls with a token do not draw from the anonymous budget."""
+        import time
+
+        observe_github_rate_limit(None, self._headers(0, int(time.time()) + 3600))
+        assert reserve_github_api_call("ghp_example", max_wait=0) == 0
+        with pytest.raises(RuntimeError, match="budget"):
+            reserve_github_api_call(None, max_wait=0)
+
+    def test_exhausted_budget_waits_for_reset(self, monkeypatch):
+        """Test a run queues until the window resets instead of calling the API."""
+        import time
+
+        clock = [1_000_000.0]
+        monkeypatch.setattr(time, "time", lambda: clock[0])
+        observe_github_rate_limit(None, self._headers(0, 1_000_012))
+        sleeps = []
+
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        waited = reserve_github_api_call(None, max_wait=60, sleep=fake_sleep)
+        assert waited == pytest.approx(13)
+        assert all(step <= 5 for step in sleeps)
+
+    def test_low_budget_is_paced(self, monkeypatch):
+        """Test calls near the limit are spaced evenly over the rest of the window."""
+        import time
+
+        clock = [1_000_000.0]
+        monkeypatch.setattr(time, "time", lambda: clock[0])
+        observe_github_rate_limit(None, self._headers(5, 1_000_100))
+        sleeps = []
+
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        # The observed response counts as the last call: 5 calls left over 100s means one every 20s
+        reserve_github_api_call(None, max_wait=60, sleep=fake_sleep)
+        reserve_github_api_call(None, max_wait=60, sleep=fake_sleep)
+        assert sum(sleeps) == pytest.approx(40)
+
+    def test_wait_beyond_limit_fails_fast(self):
+        """Test a wait longer than the allowed maximum fails without sleeping."""
+        import time
+
+        observe_github_rate_limit(None, self._headers(0, int(time.time()) + 3600))
+        with pytest.raises(RuntimeError, match="exhausted"):
+            reserve_github_api_call(None, max_wait=30, sleep=lambda _s: pytest.fail("slept"))
+
+    def test_concurrent_reservations_never_overdraw(self):
+        """Test concurrent reservations under the file lock grant exactly the remaining calls."""
+        import threading
+        import time
+
+        # 250 of 1000 left: 50 calls until pacing starts at 200, which max_wait=0 refuses
+        observe_github_rate_limit(None, self._headers(250, int(time.time()) + 3600, limit=1000))
+        granted = []
+
+        def worker():
+            for _ in range(20):
+                try:
+                    reserve_github_api_call(None, max_wait=0)
+                except RuntimeError:
+                    continue
+                granted.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(granted) == 50
+        assert read_rate_budget()["anonymous"]["remaining"] == 200
+
+    def test_github_source_respects_budget(self, monkeypatch):
+        """Test a lookup after GitHub reported an exhausted limit is not sent."""
+        import time
+
+        monkeypatch.setenv("REFACTOR_RATE_LIMIT_MAX_WAIT", "0")
+        reset = int(time.time()) + 3600
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(200, json={"tag_name": "v1.0.0", "assets": []}, headers=self._headers(0, reset))
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        fetch_latest_release(client, sources=[parse_release_source("github")])
+        with pytest.raises(RuntimeError, match="exhausted"):
+            fetch_latest_release(client, sources=[parse_release_source("github")])
+        assert len(calls) == 1
+
+
+class TestTemplateBundle:
+    """Tests for exporting and importing offline template bundles."""
+
+    @staticmethod
+    def _export(tmp_path):
+        mirror = tmp_path / "mirror"
+        content = TestReleaseSources()._mirror_dir(mirror)
+        release = fetch_release("v2.0.0", None, sources=[parse_release_source(mirror.as_uri())])
+        bundle = tmp_path / "bundle.zip"
+        manifest = export_template_bundle(bundle, release, ["claude"])
+        return bundle, manifest, content
+
+    def test_export_is_self_describing(self, tmp_path):
+        """Test the bundle lists the release, each agent's archive and its checksum."""
+        import hashlib
+        import zipfile
+
+        bundle, manifest, content = self._export(tmp_path)
+        name = "refactor-kit-template-claude-v2.0.0.zip"
+        sha = hashlib.sha256(content).hexdigest()
+
+        assert manifest["tag_name"] == "v2.0.0"
+        assert manifest["agents"] == {"claude": name}
+        assert manifest["assets"] == [{"name": name, "size": len(content), "sha256": sha, "verified": True}]
+        with zipfile.ZipFile(bundle) as zf:
+            assert json.loads(zf.read("bundle.json")) == manifest
+            assert zf.read("SHA256SUMS").decode() == f"{sha}  {name}\n"
+            assert zf.read(f"assets/{name}") == content
+            assert zf.getinfo(f"assets/{name}").compress_type == zipfile.ZIP_STORED
+
+    def test_import_resolves_offline(self, tmp_path, monkeypatch):
+        """Test an imported bundle serves a pinned init on a fresh machine without any request."""
+        bundle, _, content = self._export(tmp_path)
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "fresh-cache"))
+        monkeypatch.setenv("REFACTOR_STATE_DIR", str(tmp_path / "fresh-state"))
+
+        import_template_bundle(bundle)
+
+        def fail(request):
+            raise AssertionError(f"unexpected request to {request.url}")
+
+        offline = httpx.AsyncClient(transport=httpx.MockTransport(fail))
+        release = fetch_release("v2.0.0", offline, sources=[parse_release_source("github")])
+        zip_path, meta = download_template_from_github(
+            "claude", tmp_path, verbose=False, show_progress=False, http_client=offline, release_data=release
+        )
+        assert meta["cached"] is True
+        assert zip_path.read_bytes() == content
+        assert fetch_latest_release(offline, sources=[parse_release_source("cache")])["tag_name"] == "v2.0.0"
+
+    def test_import_rejects_tampered_archive(self, tmp_path, monkeypatch):
+        """Test an archive that does not match bundle.json is not added to the cache."""
+        import zipfile
+
+        bundle, _, _ = self._export(tmp_path)
+        tampered = tmp_path / "tampered.zip"
+        with zipfile.ZipFile(bundle) as src, zipfile.ZipFile(tampered, "w") as dst:
+            for info in src.infolist():
+                data = src.read(info)
+                dst.writestr(info, b"tampered" if info.filename.startswith("assets/") else data)
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "fresh-cache"))
+
+        with pytest.raises(ValueError, match="SHA-256"):
+            import_template_bundle(tampered)
+        assert not list((tmp_path / "fresh-cache" / "templates").glob("*.zip"))
+
+    @pytest.mark.parametrize(
+        ("change", "message"),
+        [
+            ({"sha256": "../../escaped"}, "invalid SHA-256"),
+            ({"name": "../../escaped.zip"}, "invalid asset name"),
+            ({"size": "big"}, "invalid size"),
+            ({"size": None}, "invalid size"),
+        ],
+    )
+    def test_import_rejects_hostile_manifest(self, tmp_path, monkeypatch, change, message):
+        """Test bundle.json values that would become paths outside the cache are rejected up front."""
+        import zipfile
+
+        bundle, manifest, _ = self._export(tmp_path)
+        hostile = tmp_path / "hostile.zip"
+        manifest = {**manifest, "assets": [{**manifest["assets"][0], **change}]}
+        with zipfile.ZipFile(bundle) as src, zipfile.ZipFile(hostile, "w") as dst:
+            for info in src.infolist():
+                dst.writestr(info, json.dumps(manifest) if info.filename == "bundle.json" else src.read(info))
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache" / "deep"))
+
+        with pytest.raises(ValueError, match=message):
+            import_template_bundle(hostile)
+        assert not list(tmp_path.rglob("escaped*"))
+
+    @pytest.mark.parametrize(
+        "manifest",
+        [[], {"format": 1}, {"format": 1, "tag_name": "v1"}, {"format": 1, "tag_name": "v1", "assets": [{}]}],
+    )
+    def test_import_rejects_malformed_manifest(self, tmp_path, manifest):
+        """Test a manifest missing required keys raises ValueError rather than KeyError."""
+        import zipfile
+
+        bundle = tmp_path / "bad.zip"
+        with zipfile.ZipFile(bundle, "w") as zf:
+            zf.writestr("bundle.json", json.dumps(manifest))
+        with pytest.raises(ValueError, match=r"invalid bundle\.json"):
+            import_template_bundle(bundle)
+
+    def test_import_command_prefers_cache_source(self, tmp_path):
+        """Test bundle import puts the cache source first so plain inits resolve locally."""
+        bundle, _, _ = self._export(tmp_path)
+        result = runner.invoke(app, ["bundle", "import", str(bundle)])
+
+        assert result.exit_code == 0, result.stdout
+        assert "Imported" in result.stdout
+        assert [source.spec for source in configured_release_sources()] == ["cache", "github"]
+
+    def test_import_command_rejects_non_bundle(self, tmp_path):
+        """Test importing a ZIP without bundle.json fails cleanly."""
+        import zipfile
+
+        not_bundle = tmp_path / "other.zip"
+        with zipfile.ZipFile(not_bundle, "w") as zf:
+            zf.writestr("readme.txt", "hi")
+        result = runner.invoke(app, ["bundle", "import", str(not_bundle), "--keep-sources"])
+        assert result.exit_code == 1
+        assert "not a template bundle" in result.stdout
+
+
+class TestBundledTemplates:
+    """Tests for rendering agent layouts from the templates bundled with the CLI."""
+
+    class _OfflineClient:
+        def get(self, url, **_kwargs):
+            raise httpx.ConnectError(f"offline: {url}")
+
+    @staticmethod
+    def _release_client(tag):
+        class MockResponse:
+            status_code = 200
+
+            def __init__(self):
+                self.headers = {}
+
+            def json(self):
+                return {"tag_name": tag, "assets": []}
+
+        class MockClient:
+            def get(self, _url, **_kwargs):
+                return MockResponse()
+
+        return MockClient()
+
+    @pytest.mark.parametrize("agent_key", list(AGENT_CONFIG.keys()))
+    def test_render_agent_package_layout(self, tmp_path, agent_key):
+        """Test the rendered layout matches the release packages for every agent."""
+        templates_root = Path(__file__).parent.parent / "templates"
+        written = render_agent_package(agent_key, tmp_path)
+
+        for sub in ("memory", "templates", "refactorings"):
+            assert (tmp_path / ".refactor" / sub).is_dir()
+        for template in templates_root.glob("*.md"):
+            assert (tmp_path / ".refactor" / "templates" / template.name).read_text() == template.read_text()
+        commands_dir = tmp_path / AGENT_CONFIG[agent_key]["folder"]
+        for command in (templates_root / "commands").glob("*.md"):
+            assert (commands_dir / f"refactor.{command.name}").read_text() == command.read_text()
+        assert len(written) == len(list(templates_root.glob("*.md"))) + len(
+            list((templates_root / "commands").glob("*.md"))
+        )
+
+    def test_render_agent_package_unknown_agent(self, tmp_path):
+        """Test rendering an unknown agent raises ValueError."""
+        with pytest.raises(ValueError, match="Unknown AI assistant"):
+            render_agent_package("unknown", tmp_path)
+
+    def test_parse_version_tag(self):
+        """Test version tag parsing."""
+        assert _parse_version_tag("v1.2.3") == (1, 2, 3)
+        assert _parse_version_tag("0.0.0-dev") == (0, 0, 0)
+        assert _parse_version_tag("latest") is None
+
+    def test_select_bundled_needs_no_network(self):
+        """Test the bundled source never contacts the network."""
+        assert (
+            _select_template_release(
+                "bundled",
+                verbose=False,
+                tracker=None,
+                http_client=self._OfflineClient(),
+                debug=False,
+                github_token=None,
+            )
+            is None
+        )
+
+    def test_select_auto_downloads_newer_release(self):
+        """Test auto uses the release when it is newer than the bundled templates."""
+        with patch("refactor_cli.__version__", "1.0.0"):
+            release = _select_template_release(
+                "auto",
+                verbose=False,
+                tracker=None,
+                http_client=self._release_client("v1.1.0"),
+                debug=False,
+                github_token=None,
+            )
+        assert release["tag_name"] == "v1.1.0"
+
+    def test_select_auto_prefers_current_bundled(self):
+        """Test auto uses bundled templates when they are as new as the latest release."""
+        tracker = StepTracker("Test")
+        with patch("refactor_cli.__version__", "1.1.0"):
+            release = _select_template_release(
+                "auto",
+                verbose=False,
+                tracker=tracker,
+                http_client=self._release_client("v1.1.0"),
+                debug=False,
+                github_token=None,
+            )
+        assert release is None
+        assert "bundled templates v1.1.0" in tracker.steps[0]["detail"]
+
+    def test_select_auto_falls_back_when_offline(self):
+        """Test auto falls back to bundled templates when the lookup fails."""
+        assert (
+            _select_template_release(
+                "auto", verbose=False, tracker=None, http_client=self._OfflineClient(), debug=False, github_token=None
+            )
+            is None
+        )
+
+    def test_select_release_fails_when_offline(self):
+        """Test the release source reports lookup failures."""
+        import typer
+
+        with pytest.raises(typer.Exit):
+            _select_template_release(
+                "release",
+                verbose=False,
+                tracker=None,
+                http_client=self._OfflineClient(),
+                debug=False,
+                github_token=None,
+            )
+
+    def test_download_and_extract_bundled_new_project(self, tmp_path):
+        """Test scaffolding a new project from bundled templates."""
+        tracker = StepTracker("Test")
+        project = tmp_path / "proj"
+        download_and_extract_template(
+            project,
+            "gemini",
+            verbose=False,
+            tracker=tracker,
+            template_source="bundled",
+            http_client=self._OfflineClient(),
+        )
+        assert (project / ".gemini" / "commands" / "refactor.analyze.md").exists()
+        assert (project / ".refactor" / "templates" / "analyze-template.md").exists()
+        statuses = {step["key"]: step["status"] for step in tracker.steps}
+        assert statuses["download"] == "skipped"
+        assert statuses["extract"] == "done"
+
+    def test_download_and_extract_bundled_merges_here(self, tmp_path):
+        """Test bundled templates merge into an existing directory."""
+        (tmp_path / "README.md").write_text("mine")
+        download_and_extract_template(tmp_path, "claude", True, verbose=False, template_source="bundled")
+        assert (tmp_path / "README.md").read_text() == "mine"
+        assert (tmp_path / ".claude" / "commands" / "refactor.plan.md").exists()
+
+    def test_init_invalid_template_source(self, tmp_path):
+        """Test init rejects unknown template sources."""
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(
+                app, ["init", "--here", "--ai", "claude", "--template-source", "ftp", "--ignore-agent-tools"]
+            )
+        assert result.exit_code == 1
+        assert "Invalid template source" in result.stdout
+
+
+class TestExtractZip:
+    """Tests for the parallel, path-checked ZIP extractor."""
+
+    @staticmethod
+    def _zip(tmp_path, entries):
+        import zipfile
+
+        path = tmp_path / "archive.zip"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in entries.items():
+                zf.writestr(name, data)
+        return path
+
+    def test_extracts_files_and_directories(self, tmp_path):
+        """Test every member is written, including empty directories."""
+        import zipfile
+
+        entries = {f"pkg/mod{i}.py": f"value = {i}\n" * 100 for i in range(20)}
+        entries["empty/"] = ""
+        dest = tmp_path / "out"
+        with zipfile.ZipFile(self._zip(tmp_path, entries)) as zf:
+            written = extract_zip(zf, dest, max_workers=4)
+
+        assert len(written) == 20
+        assert (dest / "empty").is_dir()
+        for name, data in entries.items():
+            if not name.endswith("/"):
+                assert (dest / name).read_text() == data
+
+    def test_large_member_streamed(self, tmp_path):
+        """Test a member larger than the copy chunk is written intact."""
+        import os
+        import zipfile
+
+        payload = os.urandom(3 * 1024 * 1024 + 17)
+        with zipfile.ZipFile(self._zip(tmp_path, {"big.bin": payload, "small.txt": "x"})) as zf:
+            extract_zip(zf, tmp_path / "out")
+        assert (tmp_path / "out" / "big.bin").read_bytes() == payload
+
+    @pytest.mark.parametrize("name", ["../evil.txt", "a/../../evil.txt", "/abs/evil.txt", "C:\\evil.txt"])
+    def test_zip_slip_rejected(self, tmp_path, name):
+        """Test member names escaping the destination are rejected before anything is written."""
+        import zipfile
+
+        dest = tmp_path / "out"
+        with (
+            zipfile.ZipFile(self._zip(tmp_path, {"ok.txt": "ok", name: "evil"})) as zf,
+            pytest.raises(ValueError, match="Unsafe path"),
+        ):
+            extract_zip(zf, dest)
+        assert not dest.exists()
+        assert not (tmp_path / "evil.txt").exists()
+
+    def test_select_filters_members(self, tmp_path):
+        """Test only selected members are extracted."""
+        import zipfile
+
+        entries = {"keep/a.txt": "a", "skip/b.txt": "b"}
+        with zipfile.ZipFile(self._zip(tmp_path, entries)) as zf:
+            extract_zip(zf, tmp_path / "out", select=lambda name: name.startswith("keep/"))
+        assert (tmp_path / "out" / "keep" / "a.txt").exists()
+        assert not (tmp_path / "out" / "skip").exists()
+
+    def test_unsafe_archive_fails_init_extraction(self, tmp_path):
+        """Test download_and_extract_template refuses an archive with a traversal path."""
+        import io
+        import zipfile
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr(".refactor/templates/a.md", "a")
+            zf.writestr("../escape.md", "x")
+        client = TestTemplateIntegrity._client(buffer.getvalue())
+
+        with patch("pathlib.Path.cwd", return_value=tmp_path), pytest.raises(typer.Exit):
+            download_and_extract_template(tmp_path / "proj", "claude", verbose=False, http_client=client)
+        assert not (tmp_path / "escape.md").exists()
+        assert not (tmp_path / "proj").exists()
+
+
+COMBINED_ARCHIVE_ENTRIES = {
+    ".refactor/": "",
+    ".refactor/templates/plan.md": "# Plan",
+    ".claude/": "",
+    ".claude/commands/": "",
+    ".claude/commands/refactor.analyze.md": "# Claude",
+    ".gemini/commands/refactor.analyze.md": "# Gemini",
+    ".github/": "",
+    ".github/agents/refactor.analyze.md": "# Copilot",
+    ".cursor/commands/refactor.analyze.md": "# Cursor",
+}
+
+
+class TestCombinedArchive:
+    """Tests for the combined all-agents template archive."""
+
+    @staticmethod
+    def _zip_bytes():
+        import io
+        import zipfile
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in COMBINED_ARCHIVE_ENTRIES.items():
+                zf.writestr(name, data)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _release(payload):
+        import hashlib
+
+        return {
+            "tag_name": "v1.0.0",
+            "assets": [
+                {
+                    "name": "refactor-kit-template-all-v1.0.0.zip",
+                    "browser_download_url": "https://example.com/all.zip",
+                    "size": len(payload),
+                    "digest": f"sha256:{hashlib.sha256(payload).hexdigest()}",
+                }
+            ],
+        }
+
+    def test_member_filter(self):
+        """Test the filter keeps the shared tree and the selected agents only."""
+        select = template_member_filter(["claude", "copilot"])
+        kept = [name for name in COMBINED_ARCHIVE_ENTRIES if select(name)]
+        assert kept == [
+            ".refactor/",
+            ".refactor/templates/plan.md",
+            ".claude/",
+            ".claude/commands/",
+            ".claude/commands/refactor.analyze.md",
+            ".github/",
+            ".github/agents/refactor.analyze.md",
+        ]
+        assert not template_member_filter(["gemini"])(".github/")
+        assert template_member_filter(["gemini"])("./.refactor/templates/plan.md")
+
+    def test_unselected_members_are_not_read(self, tmp_path):
+        """Test only the selected members' data is opened; the rest is known from the central directory."""
+        import io
+        import zipfile
+
+        opened = []
+        with zipfile.ZipFile(io.BytesIO(self._zip_bytes())) as zf:
+            original_open = zf.open
+
+            def tracking_open(info, *args, **kwargs):
+                opened.append(info.filename)
+                return original_open(info, *args, **kwargs)
+
+            zf.open = tracking_open
+            extract_zip(zf, tmp_path, select=template_member_filter(["gemini"]))
+
+        assert sorted(opened) == [".gemini/commands/refactor.analyze.md", ".refactor/templates/plan.md"]
+        assert not (tmp_path / ".claude").exists()
+        assert not (tmp_path / ".github").exists()
+
+    def test_find_template_asset_prefers_agent_archive(self):
+        """Test the per-agent asset wins and the combined archive is the fallback."""
+        assets = [
+            {"name": "refactor-kit-template-all-v1.0.0.zip"},
+            {"name": "refactor-kit-template-claude-v1.0.0.zip"},
+        ]
+        assert _find_template_asset(assets, "claude")["name"] == "refactor-kit-template-claude-v1.0.0.zip"
+        assert _find_template_asset(assets, "gemini")["name"] == "refactor-kit-template-all-v1.0.0.zip"
+        assert _find_template_asset(assets[1:], "gemini") is None
+
+    def test_init_from_combined_archive(self, tmp_path):
+        """Test a new project extracted from the combined archive holds only its agent's commands."""
+        payload = self._zip_bytes()
+        client = httpx.Client(transport=httpx.MockTransport(lambda _request: httpx.Response(200, content=payload)))
+        project = tmp_path / "proj"
+
+        with (
+            patch("pathlib.Path.cwd", return_value=tmp_path),
+            patch("refactor_cli.fetch_latest_release", return_value=self._release(payload)),
+        ):
+            download_and_extract_template(project, "claude", verbose=False, http_client=client)
+
+        assert (project / ".refactor" / "templates" / "plan.md").read_text() == "# Plan"
+        assert (project / ".claude" / "commands" / "refactor.analyze.md").exists()
+        assert not (project / ".gemini").exists()
+        assert not (project / ".github").exists()
+        assert read_install_manifest(project)["files"].keys() == {
+            ".refactor/templates/plan.md",
+            ".claude/commands/refactor.analyze.md",
+        }
+
+    def test_several_agents_share_one_download(self, tmp_path):
+        """Test several agents are served by a single download of the combined archive."""
+        payload = self._zip_bytes()
+        requests = []
+
+        def handler(request):
+            requests.append(request.url.path)
+            return httpx.Response(200, content=payload)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        results = download_release_assets(
+            ["claude", "gemini"], tmp_path, http_client=client, release_data=self._release(payload)
+        )
+
+        assert requests == ["/all.zip"]
+        assert results["claude"] == results["gemini"]
+        assert results["claude"][1]["verified"] is True
+
+
+class TestLinkMode:
+    """Tests for placing template files by copy, reflink or hardlink from the shared template tree."""
+
+    def test_place_file_copy_is_private_and_writable(self, tmp_path):
+        """Test a copy gets its own inode and is writable even when the source is read-only."""
+        src = tmp_path / "src.md"
+        src.write_text("template")
+        src.chmod(0o444)
+        dst = tmp_path / "dst.md"
+
+        assert place_file(src, dst, "copy") == "copy"
+        assert dst.read_text() == "template"
+        assert dst.stat().st_ino != src.stat().st_ino
+        assert dst.stat().st_mode & 0o200
+
+    def test_place_file_hardlink_shares_inode(self, tmp_path):
+        """Test hardlink mode links to the source instead of copying bytes."""
+        src = tmp_path / "src.md"
+        src.write_text("template")
+        dst = tmp_path / "dst.md"
+        dst.write_text("old")
+
+        assert place_file(src, dst, "hardlink") == "hardlink"
+        assert dst.stat().st_ino == src.stat().st_ino
+
+    def test_place_file_replaces_hardlink_without_writing_through(self, tmp_path):
+        """Test overwriting a hardlinked destination leaves the shared source untouched."""
+        shared = tmp_path / "shared.md"
+        shared.write_text("shared")
+        dst = tmp_path / "dst.md"
+        place_file(shared, dst, "hardlink")
+        update = tmp_path / "update.md"
+        update.write_text("update")
+
+        place_file(update, dst, "copy")
+        assert dst.read_text() == "update"
+        assert shared.read_text() == "shared"
+
+    def test_reflink_modes(self, tmp_path):
+        """Test reflink fails when the filesystem cannot clone while auto falls back to a copy."""
+        src = tmp_path / "src.md"
+        src.write_text("template")
+
+        with patch("refactor_cli._clone_file", return_value=False):
+            with pytest.raises(OSError, match="reflinks"):
+                place_file(src, tmp_path / "strict.md", "reflink")
+            assert not (tmp_path / "strict.md").exists()
+            assert place_file(src, tmp_path / "auto.md", "auto") == "copy"
+        assert (tmp_path / "auto.md").read_text() == "template"
+        with pytest.raises(ValueError, match="Unknown link mode"):
+            place_file(src, tmp_path / "bad.md", "symlink")
+        assert set(LINK_MODES) == {"copy", "reflink", "hardlink", "auto"}
+
+    def test_bundled_projects_share_one_template_copy(self, tmp_path, monkeypatch):
+        """Test hardlinked projects point at the same read-only files in the shared template tree."""
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            for name in ("svc-a", "svc-b"):
+                download_and_extract_template(
+                    tmp_path / name, "claude", verbose=False, template_source="bundled", link_mode="hardlink"
+                )
+
+        command = Path(".claude", "commands", "refactor.analyze.md")
+        a, b = (tmp_path / "svc-a" / command).stat(), (tmp_path / "svc-b" / command).stat()
+        assert a.st_ino == b.st_ino
+        assert a.st_nlink >= 3
+        assert not a.st_mode & 0o222
+        trees = list((tmp_path / "cache" / "trees").iterdir())
+        assert len(trees) == 1
+        assert read_install_manifest(tmp_path / "svc-a")["files"] == read_install_manifest(tmp_path / "svc-b")["files"]
+
+    def test_release_archive_linked_from_shared_tree(self, tmp_path):
+        """Test a cached release archive is extracted once and linked into each project."""
+        import hashlib
+
+        zip_content = TestTemplateIntegrity._zip_bytes()
+        digest = f"sha256:{hashlib.sha256(zip_content).hexdigest()}"
+
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            for name in ("svc-a", "svc-b"):
+                client = TestTemplateIntegrity._client(zip_content, digest=digest)
+                download_and_extract_template(
+                    tmp_path / name, "claude", verbose=False, http_client=client, link_mode="hardlink"
+                )
+
+        template = Path(".refactor", "templates", "test.md")
+        assert (tmp_path / "svc-a" / template).stat().st_ino == (tmp_path / "svc-b" / template).stat().st_ino
+        assert (
+            read_install_manifest(tmp_path / "svc-a")["files"][template.as_posix()]
+            == hashlib.sha256(b"# Test").hexdigest()
+        )
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX execute bits")
+    def test_hardlinked_scripts_do_not_change_shared_tree_modes(self, tmp_path, monkeypatch):
+        """Test init's script chmod leaves the shared tree, and so every other linked project, alone."""
+        import hashlib
+        import io
+        import zipfile
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr(".refactor/scripts/bash/setup.sh", "#!/bin/sh\necho setup\n")
+            zf.writestr(".claude/commands/refactor.analyze.md", "# Analyze")
+        zip_content = buffer.getvalue()
+        digest = f"sha256:{hashlib.sha256(zip_content).hexdigest()}"
+        monkeypatch.setenv("REFACTOR_CACHE_DIR", str(tmp_path / "cache"))
+
+        script = Path(".refactor", "scripts", "bash", "setup.sh")
+        shared_modes = []
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            for name in ("svc-a", "svc-b"):
+                client = TestTemplateIntegrity._client(zip_content, digest=digest)
+                download_and_extract_template(
+                    tmp_path / name, "claude", verbose=False, http_client=client, link_mode="hardlink"
+                )
+                shared = next((tmp_path / "cache" / "trees").rglob("setup.sh"))
+                shared_modes.append(shared.stat().st_mode)
+                ensure_executable_scripts(tmp_path / name)
+                assert shared.stat().st_mode == shared_modes[0]
+
+        a, b = (tmp_path / "svc-a" / script).stat(), (tmp_path / "svc-b" / script).stat()
+        assert a.st_ino == b.st_ino == shared.stat().st_ino
+        assert a.st_mode & 0o111
+        assert not a.st_mode & 0o222
+
+    def test_ensure_executable_scripts_unshares_hardlink(self, tmp_path):
+        """Test a script hardlinked to a tree without execute bits gets a private copy before chmod."""
+        shared = tmp_path / "shared.sh"
+        shared.write_text("#!/bin/sh\n")
+        shared.chmod(0o444)
+        script = tmp_path / ".refactor" / "scripts" / "setup.sh"
+        script.parent.mkdir(parents=True)
+        place_file(shared, script, "hardlink")
+
+        ensure_executable_scripts(tmp_path)
+        assert script.stat().st_mode & 0o100
+        assert script.stat().st_ino != shared.stat().st_ino
+        assert shared.stat().st_mode & 0o777 == 0o444
+
+    def test_settings_merge_unshares_hardlink(self, tmp_path):
+        """Test merging .vscode/settings.json into a hardlinked file does not modify the other link."""
+        shared = tmp_path / "shared.json"
+        shared.write_text('{"a": 1}')
+        dest = tmp_path / ".vscode" / "settings.json"
+        dest.parent.mkdir()
+        place_file(shared, dest, "hardlink")
+        incoming = tmp_path / "incoming.json"
+        incoming.write_text('{"b": 2}')
+
+        handle_vscode_settings(incoming, dest, Path(".vscode/settings.json"))
+        assert json.loads(dest.read_text()) == {"a": 1, "b": 2}
+        assert json.loads(shared.read_text()) == {"a": 1}
+
+    def test_init_invalid_link_mode(self, tmp_path):
+        """Test init rejects an unknown --link-mode."""
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(
+                app, ["init", "--here", "--ai", "claude", "--link-mode", "symlink", "--ignore-agent-tools"]
+            )
+        assert result.exit_code == 1
+        assert "Invalid link mode" in result.stdout
+
+
+class TestInstallManifest:
+    """Tests for the installed-files manifest written by init."""
+
+    def test_bundled_init_writes_manifest(self, tmp_path):
+        """Test a bundled scaffold records every rendered file with its hash."""
+        import hashlib
+
+        project = tmp_path / "proj"
+        download_and_extract_template(project, "claude", verbose=False, template_source="bundled")
+
+        manifest = read_install_manifest(project)
+        assert manifest["agent"] == "claude"
+        assert manifest["source"] == "bundled"
+        command = ".claude/commands/refactor.analyze.md"
+        assert manifest["files"][command] == hashlib.sha256((project / command).read_bytes()).hexdigest()
+        assert ".refactor/manifest.json" not in manifest["files"]
+
+    def test_here_manifest_excludes_user_files(self, tmp_path):
+        """Test merging into an existing directory only records template files."""
+        (tmp_path / "app.py").write_text("print('hi')")
+        download_and_extract_template(tmp_path, "claude", True, verbose=False, template_source="bundled")
+
+        files = read_install_manifest(tmp_path)["files"]
+        assert "app.py" not in files
+        assert ".refactor/templates/plan-template.md" in files
+
+    def test_release_init_records_archive_digest(self, tmp_path):
+        """Test a release install records the release tag and archive digest."""
+        import io
+        import zipfile
+
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w") as zf:
+            zf.writestr(".refactor/templates/a.md", "a")
+            zf.writestr(".claude/commands/refactor.a.md", "a")
+        zip_content = zip_buffer.getvalue()
+        client = TestTemplateIntegrity._client(zip_content)
+
+        project = tmp_path / "proj"
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            download_and_extract_template(project, "claude", verbose=False, http_client=client)
+
+        manifest = read_install_manifest(project)
+        assert manifest["release"] == "v1.0.0"
+        assert manifest["source"] == "release"
+        assert len(manifest["archive_sha256"]) == 64
+        assert set(manifest["files"]) == {".refactor/templates/a.md", ".claude/commands/refactor.a.md"}
+
+    def test_read_install_manifest_missing_or_invalid(self, tmp_path):
+        """Test unreadable manifests are reported as None."""
+        assert read_install_manifest(tmp_path) is None
+        (tmp_path / ".refactor").mkdir()
+        (tmp_path / ".refactor" / "manifest.json").write_text("{not json")
+        assert read_install_manifest(tmp_path) is None
+
+
+class TestUpgradePlan:
+    """Tests for manifest-driven upgrade planning."""
+
+    @staticmethod
+    def _sha(text):
+        import hashlib
+
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _setup(self, tmp_path):
+        project = tmp_path / "project"
+        new = tmp_path / "new"
+        base = tmp_path / "base"
+        for root in (project, new, base):
+            (root / "t").mkdir(parents=True)
+
+        (base / "t" / "untouched.md").write_text("v1")
+        (project / "t" / "untouched.md").write_text("v1")
+        (new / "t" / "untouched.md").write_text("v2")
+
+        base_text = "line1\nline2\nline3\nline4\nline5\n"
+        (base / "t" / "edited.md").write_text(base_text)
+        (project / "t" / "edited.md").write_text("line1 local\nline2\nline3\nline4\nline5\n")
+        (new / "t" / "edited.md").write_text("line1\nline2\nline3\nline4\nline5 upstream\n")
+
+        (base / "t" / "conflict.md").write_text("same\n")
+        (project / "t" / "conflict.md").write_text("local\n")
+        (new / "t" / "conflict.md").write_text("upstream\n")
+
+        (base / "t" / "dropped.md").write_text("old")
+        (project / "t" / "dropped.md").write_text("old")
+
+        (base / "t" / "deleted.md").write_text("d1")
+        (new / "t" / "deleted.md").write_text("d2")
+
+        (new / "t" / "added.md").write_text("added")
+
+        manifest = {
+            "release": "v1.0.0",
+            "files": {
+                "t/untouched.md": self._sha("v1"),
+                "t/edited.md": self._sha(base_text),
+                "t/conflict.md": self._sha("same\n"),
+                "t/dropped.md": self._sha("old"),
+                "t/deleted.md": self._sha("d1"),
+            },
+        }
+        return project, new, base, manifest
+
+    def test_upgrade_plan_actions(self, tmp_path):
+        """Test each file is classified according to the manifest and the local state."""
+        project, new, base, manifest = self._setup(tmp_path)
+        plan = build_upgrade_plan(new, project, manifest, base)
+        actions = {e["path"].as_posix(): e["action"] for e in plan}
+
+        assert actions["t/untouched.md"] == "update"
+        assert actions["t/edited.md"] == "merged"
+        assert actions["t/conflict.md"] == "kept"
+        assert actions["t/dropped.md"] == "removed"
+        assert actions["t/deleted.md"] == "kept"
+        assert actions["t/added.md"] == "new"
+
+    def test_upgrade_plan_without_base_keeps_modified(self, tmp_path):
+        """Test modified files are kept when the previous template is unavailable."""
+        project, new, _base, manifest = self._setup(tmp_path)
+        plan = build_upgrade_plan(new, project, manifest)
+        entry = next(e for e in plan if e["path"].as_posix() == "t/edited.md")
+        assert entry["action"] == "kept"
+        assert entry["detail"] == "locally modified"
+
+    def test_upgrade_plan_force_overwrites(self, tmp_path):
+        """Test force turns locally modified files into updates."""
+        project, new, base, manifest = self._setup(tmp_path)
+        plan = build_upgrade_plan(new, project, manifest, base, force=True)
+        entry = next(e for e in plan if e["path"].as_posix() == "t/conflict.md")
+        assert entry["action"] == "update"
+
+    def test_apply_upgrade_plan(self, tmp_path):
+        """Test applying an upgrade plan writes, merges and removes files."""
+        project, new, base, manifest = self._setup(tmp_path)
+        apply_merge_plan(build_upgrade_plan(new, project, manifest, base), project)
+
+        assert (project / "t" / "untouched.md").read_text() == "v2"
+        assert (project / "t" / "edited.md").read_text() == "line1 local\nline2\nline3\nline4\nline5 upstream\n"
+        assert (project / "t" / "conflict.md").read_text() == "local\n"
+        assert not (project / "t" / "dropped.md").exists()
+        assert not (project / "t" / "deleted.md").exists()
+        assert (project / "t" / "added.md").read_text() == "added"
+
+    def test_kept_files_keep_their_recorded_hash(self, tmp_path):
+        """Test the new manifest records kept files against the release they are still based on."""
+        project, new, base, manifest = self._setup(tmp_path)
+        plan = build_upgrade_plan(new, project, manifest, base)
+        files = _manifest_files_from_plan(plan, manifest)
+
+        assert files["t/conflict.md"] == manifest["files"]["t/conflict.md"]
+        assert files["t/deleted.md"] == manifest["files"]["t/deleted.md"]
+        assert files["t/untouched.md"] == self._sha("v2")
+        assert files["t/edited.md"] == self._sha("line1\nline2\nline3\nline4\nline5 upstream\n")
+
+    def test_upgrade_plan_merges_kept_files_against_their_own_base(self, tmp_path):
+        """Test a file kept by an earlier upgrade is merged against the older template it came from."""
+        project, new, base, manifest = self._setup(tmp_path)
+        older = tmp_path / "older"
+        (older / "t").mkdir(parents=True)
+        (older / "t" / "conflict.md").write_text("a\nb\nc\nd\ne\n")
+        (base / "t" / "conflict.md").write_text("a\nb\nc v2\nd\ne\n")
+        (project / "t" / "conflict.md").write_text("a local\nb\nc\nd\ne\n")
+        (new / "t" / "conflict.md").write_text("a\nb\nc v2\nd\ne v3\n")
+        manifest["files"]["t/conflict.md"] = self._sha("a\nb\nc\nd\ne\n")
+
+        plan = build_upgrade_plan(new, project, manifest, base, base_dirs={"t/conflict.md": older})
+        apply_merge_plan(plan, project)
+
+        entry = next(e for e in plan if e["path"].as_posix() == "t/conflict.md")
+        assert entry["action"] == "merged"
+        assert (project / "t" / "conflict.md").read_text() == "a local\nb\nc v2\nd\ne v3\n"
+
+
+class TestUpgradeCommand:
+    """Tests for the upgrade command."""
+
+    def test_upgrade_without_manifest_fails(self, tmp_path):
+        """Test upgrade refuses to run outside a Refactor Kit project."""
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(app, ["upgrade", "--template-source", "bundled"])
+        assert result.exit_code == 1
+        assert "Not a Refactor Kit Project" in result.stdout
+
+    def test_upgrade_already_up_to_date(self, tmp_path):
+        """Test upgrade stops when the installed release is current."""
+        write_install_manifest(tmp_path, {}, agent="claude", release="v9.9.9", source="release")
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = runner.invoke(app, ["upgrade", "--template-source", "bundled"])
+        assert result.exit_code == 0
+        assert "Already up to date" in result.stdout
+
+    def test_upgrade_from_bundled_templates(self, tmp_path):
+        """Test upgrading applies unmodified files, keeps modified ones and rewrites the manifest."""
+        with patch("refactor_cli.__version__", "0.1.0"):
+            download_and_extract_template(tmp_path, "claude", True, verbose=False, template_source="bundled")
+        command = tmp_path / ".claude" / "commands" / "refactor.plan.md"
+        command.write_text("my own plan command")
+        template = tmp_path / ".refactor" / "templates" / "plan-template.md"
+        template.write_text("stale")
+        manifest = read_install_manifest(tmp_path)
+        manifest["files"][".refactor/templates/plan-template.md"] = TestUpgradePlan._sha("stale")
+        write_install_manifest(tmp_path, manifest["files"], agent="claude", release="v0.1.0", source="bundled")
+
+        with (
+            patch("pathlib.Path.cwd", return_value=tmp_path),
+            patch("refactor_cli.__version__", "0.2.0"),
+        ):
+            result = runner.invoke(app, ["upgrade", "--template-source", "bundled"])
+
+        assert result.exit_code == 0, result.stdout
+        assert "Upgraded to v0.2.0" in result.stdout
+        assert command.read_text() == "my own plan command"
+        templates_root = Path(__file__).parent.parent / "templates"
+        assert template.read_text() == (templates_root / "plan-template.md").read_text()
+        upgraded = read_install_manifest(tmp_path)
+        assert upgraded["release"] == "v0.2.0"
+        command_key = ".claude/commands/refactor.plan.md"
+        assert upgraded["files"][command_key] == manifest["files"][command_key]
+        assert upgraded["bases"] == {command_key: {"release": "v0.1.0", "source": "bundled", "archive_sha256": None}}
+
+    def test_upgrade_dry_run_writes_nothing(self, tmp_path):
+        """Test upgrade --dry-run leaves files and manifest untouched."""
+        write_install_manifest(
+            tmp_path, {"t.md": TestUpgradePlan._sha("x")}, agent="claude", release="v0.0.1", source="release"
+        )
+        with (
+            patch("pathlib.Path.cwd", return_value=tmp_path),
+            patch("refactor_cli.__version__", "0.2.0"),
+        ):
+            result = runner.invoke(app, ["upgrade", "--template-source", "bundled", "--dry-run"])
+
+        assert result.exit_code == 0
+        assert "Dry run complete" in result.stdout
+        assert not (tmp_path / ".claude").exists()
+        assert read_install_manifest(tmp_path)["release"] == "v0.0.1"
+
+
+class TestDownloadAndExtractTemplate:
+    """Tests for download_and_extract_template function."""
+
+    def test_extract_to_new_project(self, tmp_path):
+        """Test extracting template to new project directory."""
+        import io
+        import zipfile
+
+        # Create a mock ZIP with template structure
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(".refactor/memory/.gitkeep", "")
+            zf.writestr(".refactor/templates/test.md", "# Test")
+            zf.writestr(".claude/commands/refactor.start.md", "# Start")
+        zip_content = zip_buffer.getvalue()
+
+        mock_release_response = {
+            "tag_name": "v1.0.0",
+            "assets": [
+                {
+                    "name": "refactor-kit-template-claude-v1.0.0.zip",
+                    "browser_download_url": "https://example.com/download.zip",
+                    "size": len(zip_content),
+                }
+            ],
+        }
+
+        class MockResponse:
+            status_code = 200
+
+            def __init__(self):
+                self.headers = {"content-length": str(len(zip_content))}
+
+            def json(self):
+                return mock_release_response
+
+            def iter_bytes(self, chunk_size=8192):  # noqa: ARG002
+                yield zip_content
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+        class MockClient:
+            def get(self, _url, **_kwargs):
+                return MockResponse()
+
+            def stream(self, _method, _url, **_kwargs):
+                return MockResponse()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+        project_path = tmp_path / "new-project"
+
+        with patch("pathlib.Path.cwd", return_value=tmp_path):
+            result = download_and_extract_template(
+                project_path,
+                "claude",
+                is_current_dir=False,
+                verbose=False,
+                http_client=MockClient(),
+            )
+
+        assert result == project_path
+        assert (project_path / ".refactor" / "memory").exists()
+        assert (project_path / ".refactor" / "templates" / "test.md").exists()
+        assert (project_path / ".claude" / "commands" / "refactor.start.md").exists()
+
+    def test_extract_to_current_dir_merges(self, tmp_path):
+        """Test extracting template to current directory merges with existing files."""
+        import io
+        import zipfile
+
+        # Create existing file in tmp_path
+        existing_file = tmp_path / "existing.txt"
+        existing_file.write_text("existing content")
+
+        # Create a mock ZIP with template structure
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(".refactor/memory/.gitkeep", "")
+            zf.writestr("new-file.txt", "new content")
+        zip_content = zip_buffer.getvalue()
+
+        mock_release_response = {
+            "tag_name": "v1.0.0",
+            "assets": [
+                {
+                    "name": "refactor-kit-template-claude-v1.0.0.zip",
+                    "browser_download_url": "https://example.com/download.zip",
+                    "size": len(zip_content),
+                }
+            ],
         }
 
         class MockResponse:
@@ -1820,3 +4102,187 @@ class TestDownloadAndExtractTemplate:
 
         # Directory should not exist after failed download
         assert not project_path.exists()
+
+
+class TestAnalyzeCommand:
+    """Tests for the analyze command."""
+
+    def test_analyze_json(self, tmp_path):
+        """Test analyze reports metrics of every module, most complex first."""
+        (tmp_path / "simple.py").write_text("import branchy\n")
+        (tmp_path / "branchy.py").write_text("def f(x):\n    if x:\n        return 1\n    return 0\n")
+
+        result = runner.invoke(app, ["analyze", str(tmp_path), "--json"])
+
+        assert result.exit_code == 0
+        report = json_result(result.stdout)["modules"]
+        assert [entry["module"] for entry in report] == ["branchy", "simple"]
+        assert report[0]["complexity"] == 2
+        assert report[0]["fan_in"] == 1
+
+    def test_serve_stdio(self, tmp_path):
+        """Test serve answers JSON-RPC on stdin and keeps stdout for responses only."""
+        (tmp_path / "mod.py").write_text("import os\n")
+        requests = [
+            {"jsonrpc": "2.0", "id": 1, "method": "deps", "params": {"target": "mod.py"}},
+            {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+        ]
+
+        result = runner.invoke(app, ["serve", str(tmp_path)], input="".join(json.dumps(r) + "\n" for r in requests))
+
+        assert result.exit_code == 0
+        responses = [json.loads(line) for line in result.stdout.splitlines()]
+        assert responses[0]["result"]["module"] == "mod"
+        assert responses[1]["result"] == "bye"
+        assert "Indexed 1 modules" in result.stderr
+
+    def test_context_pack(self, tmp_path):
+        """Test context prints a Markdown pack within the budget."""
+        (tmp_path / "lib.py").write_text("def helper(x):\n    return x * 2\n")
+        (tmp_path / "app.py").write_text("from lib import helper\n\n\ndef run():\n    return helper(1)\n")
+
+        result = runner.invoke(app, ["context", "lib.py", "--root", str(tmp_path), "--budget", "300"])
+
+        assert result.exit_code == 0
+        assert result.stdout.startswith("# Context: lib (`lib.py`)")
+        assert "`app.py:3-5` `helper`" in result.stdout
+        assert "/300 tokens" in result.stderr
+
+        missing = runner.invoke(app, ["context", "nope.py", "--root", str(tmp_path)])
+        assert missing.exit_code == 1
+
+    def test_analyze_since(self, tmp_path, monkeypatch):
+        """Test analyze --since reports only changed modules, as deltas."""
+        import shutil
+        import subprocess
+
+        if shutil.which("git") is None:
+            pytest.skip("git not installed")
+        monkeypatch.setenv("GIT_AUTHOR_NAME", "t")
+        monkeypatch.setenv("GIT_AUTHOR_EMAIL", "t@t")
+        monkeypatch.setenv("GIT_COMMITTER_NAME", "t")
+        monkeypatch.setenv("GIT_COMMITTER_EMAIL", "t@t")
+        (tmp_path / "a.py").write_text("def f():\n    return 1\n")
+        (tmp_path / "b.py").write_text("x = 1\n")
+        for args in (["init", "-q"], ["add", "."], ["commit", "-qm", "base"]):
+            subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)  # noqa: S603
+        (tmp_path / "a.py").write_text("def f(x):\n    if x:\n        return 1\n    return 2\n")
+
+        result = runner.invoke(app, ["analyze", str(tmp_path), "--since", "HEAD", "--json"])
+
+        assert result.exit_code == 0, result.stdout
+        report = json_result(result.stdout)
+        assert [(m["module"], m["status"], m["delta"]["complexity"]) for m in report["modules"]] == [
+            ("a", "modified", 1)
+        ]
+
+        bad = runner.invoke(app, ["analyze", str(tmp_path), "--since", "missing-ref"])
+        assert bad.exit_code == 1
+
+    def test_analyze_profile(self, tmp_path):
+        """Test analyze --profile samples a Python command and ranks its hot, complex functions."""
+        (tmp_path / "work.py").write_text(
+            "import time\n\n\ndef busy(n):\n    end = time.perf_counter() + n\n"
+            "    while time.perf_counter() < end:\n        if n > 1 or n < 0:\n            break\n\n\n"
+            "busy(0.2)\n"
+        )
+
+        result = runner.invoke(
+            app,
+            [
+                "analyze",
+                str(tmp_path),
+                "--profile",
+                "work.py",
+                "--interval",
+                "0.001",
+                "--python",
+                sys.executable,
+                "--json",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        report = json_result(result.stdout)
+        top = report["functions"][0]
+        assert (top["module"], top["function"], top["complexity"]) == ("work", "busy", 4)
+        assert top["self_pct"] > 50
+
+        failing = runner.invoke(app, ["analyze", str(tmp_path), "--profile", "no_such_command_xyz", "--json"])
+        assert failing.exit_code == 1
+
+    def test_analyze_import_cost(self, tmp_path):
+        """Test analyze --import-cost measures a real import under the given interpreter."""
+        (tmp_path / "app.py").write_text("import json\n\n\ndef dump(x):\n    return json.dumps(x)\n")
+
+        result = runner.invoke(
+            app, ["analyze", str(tmp_path), "--import-cost", "app", "--python", sys.executable, "--json"]
+        )
+
+        assert result.exit_code == 0, result.output
+        report = json_result(result.stdout)
+        assert report["imports"][0]["module"] == "app"
+        assert "json" in {entry["module"] for entry in report["imports"]}
+
+        missing = runner.invoke(app, ["analyze", str(tmp_path), "--import-cost", "nope", "--python", sys.executable])
+        assert missing.exit_code == 1
+        assert "No module named" in missing.stdout
+
+    def test_analyze_smells(self, tmp_path):
+        """Test analyze --smells lists findings worst first and validates --severity."""
+        (tmp_path / "a.py").write_text(
+            "async def f():\n    open('x')\n\n\ndef g(s):\n    t = ''\n    for c in s:\n        t += c\n"
+        )
+
+        result = runner.invoke(app, ["analyze", str(tmp_path), "--smells", "--json"])
+
+        assert result.exit_code == 0, result.output
+        assert [(f["rule"], f["severity"]) for f in json_result(result.stdout)["smells"]] == [
+            ("blocking-io-in-async", "high"),
+            ("string-concat-in-loop", "medium"),
+        ]
+        high = runner.invoke(app, ["analyze", str(tmp_path), "--smells", "--severity", "high", "--json"])
+        assert len(json_result(high.stdout)["smells"]) == 1
+        bad = runner.invoke(app, ["analyze", str(tmp_path), "--smells", "--severity", "urgent"])
+        assert bad.exit_code == 1
+
+    def test_analyze_dead_code(self, tmp_path):
+        """Test analyze --dead-code lists unused definitions surest first and validates --confidence."""
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg/__init__.py").write_text("from .a import used\n")
+        (tmp_path / "pkg/a.py").write_text("def used():\n    pass\n\n\n@register\ndef hooked():\n    pass\n")
+        (tmp_path / "pkg/b.py").write_text("def f():\n    pass\n")
+
+        result = runner.invoke(app, ["analyze", str(tmp_path), "--dead-code", "--json"])
+
+        assert result.exit_code == 0, result.output
+        assert [(f["name"], f["kind"], f["confidence"]) for f in json_result(result.stdout)["dead_code"]] == [
+            ("pkg.b", "module", "high"),
+            ("hooked", "function", "low"),
+        ]
+        sure = runner.invoke(app, ["analyze", str(tmp_path), "--dead-code", "--confidence", "high", "--json"])
+        assert len(json_result(sure.stdout)["dead_code"]) == 1
+        bad = runner.invoke(app, ["analyze", str(tmp_path), "--dead-code", "--confidence", "maybe"])
+        assert bad.exit_code == 1
+
+    def test_analyze_rules(self, tmp_path):
+        """Test analyze --rules reports configured thresholds and per-rule timings, warning about bad config."""
+        (tmp_path / "a.py").write_text("def f(a, b):\n    return a.b.c.d.e.f\n")
+        (tmp_path / "pyproject.toml").write_text(
+            "[tool.refactor.smells]\ndisable = ['n-plus-one']\n\n"
+            "[tool.refactor.smells.long-parameter-list]\nmax_params = 1\n\n[tool.refactor.smells.typo]\n"
+        )
+
+        result = runner.invoke(app, ["analyze", str(tmp_path), "--rules", "--json"])
+
+        assert result.exit_code == 0, result.output
+        rules = {rule["name"]: rule for rule in json_result(result.stdout)["rules"]}
+        assert "n-plus-one" not in rules
+        assert rules["long-parameter-list"]["options"] == {"max_params": 1}
+        assert rules["message-chains"]["calls"] > 0
+        assert "typo" in result.stderr
+        smells = runner.invoke(app, ["analyze", str(tmp_path), "--smells", "--json"])
+        assert sorted(f["rule"] for f in json_result(smells.stdout)["smells"]) == [
+            "long-parameter-list",
+            "message-chains",
+        ]
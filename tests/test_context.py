@@ -0,0 +1,117 @@
+"""Tests for the token-budgeted context packer."""
+
+import ast
+import sys
+from pathlib import Path
+
+import pytest
+from test_analysis import make_project, touch
+
+# Add the src directory to the path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from refactor_cli.analysis import ProjectIndex
+from refactor_cli.context import collect_snippets, context_pack, estimate_tokens, signature
+
+SHOP = {
+    "src/shop/__init__.py": "",
+    "src/shop/pricing.py": (
+        '"""Prices."""\n\nRATE = 2\n\n\n'
+        "def total(items):\n"
+        '    """Sum the line totals.\n\n    Longer explanation.\n    """\n'
+        "    return sum(price * qty for price, qty in items) * RATE\n\n\n"
+        "def unused(x):\n"
+        "    return x\n"
+    ),
+    "src/shop/cart.py": (
+        "from shop import pricing\nfrom shop.pricing import total\n\n\n"
+        "def checkout(items):\n"
+        "    if not items:\n"
+        "        return 0\n"
+        "    return total(items)\n\n\n"
+        "def rate():\n"
+        "    return pricing.RATE\n"
+    ),
+    "tests/test_cart.py": (
+        "from shop.cart import checkout\n\n\n"
+        "def test_empty():\n    assert checkout([]) == 0\n\n\n"
+        "def test_unrelated():\n    assert True\n"
+    ),
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ProjectIndex(make_project(tmp_path, SHOP))
+    index.refresh()
+    return index
+
+
+class TestContextHelpers:
+    """Tests for token estimation and signature stubs."""
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens("def foo(bar):") == 6
+        assert estimate_tokens("a_very_long_identifier") == 4
+        assert estimate_tokens("") == 0
+
+    def test_signature_keeps_first_docstring_line(self):
+        node = ast.parse(SHOP["src/shop/pricing.py"]).body[2]
+        assert signature(node) == 'def total(items):\n    """Sum the line totals."""\n    ...'
+
+    def test_signature_of_class_lists_public_methods(self):
+        node = ast.parse(
+            "class A:\n    def __init__(self, x): pass\n    def run(self): pass\n    def _hide(self): pass\n"
+        )
+        assert (
+            signature(node.body[0])
+            == "class A:\n\n    def __init__(self, x):\n        ...\n\n    def run(self):\n        ..."
+        )
+
+
+class TestContextPack:
+    """Tests for ranking, packing and caching."""
+
+    def test_snippet_kinds(self, index):
+        """Test a module's pack draws on its code, dependency signatures, call sites and tests."""
+        kinds = {(s["kind"], s["label"]) for s in collect_snippets(index, "shop.cart")}
+        assert ("dependency", "total") in kinds
+        assert ("test", "test_empty") in kinds
+        assert ("test", "test_unrelated") not in kinds
+        assert ("target", "checkout") in kinds
+
+        call_sites = [s for s in collect_snippets(index, "shop.pricing") if s["kind"] == "call_site"]
+        assert [s["label"] for s in call_sites] == ["RATE, total"]
+
+    def test_large_budget_takes_whole_target(self, index):
+        pack = context_pack(index, "src/shop/cart.py", 5000)
+        assert "def rate():" in pack["markdown"]
+        assert "## Dependency signatures" in pack["markdown"]
+        assert "## Tests" in pack["markdown"]
+        assert pack["markdown"].count("def checkout") == 1
+        assert pack["omitted"] == 0
+
+    @pytest.mark.parametrize("budget", [60, 120, 200, 400])
+    def test_pack_fits_budget(self, index, budget):
+        """Test the rendered pack never exceeds the budget and most-used code goes in first."""
+        pack = context_pack(index, "shop.pricing", budget)
+        assert pack["tokens"] == estimate_tokens(pack["markdown"])
+        assert pack["tokens"] <= budget
+        if "def unused" in pack["markdown"]:
+            assert "def total" in pack["markdown"]
+
+    def test_cache_is_reused_until_a_related_file_changes(self, index, tmp_path):
+        cache = tmp_path / "cache"
+        assert context_pack(index, "shop.pricing", 500, cache_dir=cache)["cached"] is False
+        assert context_pack(index, "shop.pricing", 500, cache_dir=cache)["cached"] is True
+        assert context_pack(index, "shop.pricing", 600, cache_dir=cache)["cached"] is False
+
+        touch(tmp_path / "src/shop/cart.py", SHOP["src/shop/cart.py"] + "\n\ndef more():\n    return total([])\n")
+        index.refresh()
+        assert context_pack(index, "shop.pricing", 500, cache_dir=cache)["cached"] is False
+
+    def test_invalid_requests(self, index):
+        with pytest.raises(ValueError, match="positive"):
+            context_pack(index, "shop.cart", 0)
+        with pytest.raises(KeyError):
+            context_pack(index, "shop.missing", 100)
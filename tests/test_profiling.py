@@ -0,0 +1,195 @@
+"""Tests for the sampling profiler and the profile loaders."""
+
+import cProfile
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from test_analysis import make_project
+
+# Add the src directory to the path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from refactor_cli.analysis import (
+    ProjectIndex,
+    function_table,
+    import_cost_report,
+    name_uses,
+    profile_report,
+)
+from refactor_cli.profiling import Sampler, load_profile, load_speedscope, parse_importtime
+
+SPEEDSCOPE = {
+    "shared": {
+        "frames": [
+            {"name": "main", "file": "app.py", "line": 1},
+            {"name": "work", "file": "app.py", "line": 5},
+        ]
+    },
+    "profiles": [
+        {"type": "sampled", "unit": "milliseconds", "samples": [[0, 1], [0, 1], [0]], "weights": [10, 20, 5]},
+        {
+            "type": "evented",
+            "unit": "seconds",
+            "startValue": 0,
+            "events": [
+                {"type": "O", "frame": 0, "at": 0},
+                {"type": "O", "frame": 1, "at": 1},
+                {"type": "C", "frame": 1, "at": 3},
+                {"type": "C", "frame": 0, "at": 4},
+            ],
+        },
+    ],
+}
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestLoaders:
+    """Tests for reading speedscope and pstats files."""
+
+    def test_speedscope_sampled_and_evented(self, tmp_path):
+        path = tmp_path / "profile.json"
+        path.write_text(json.dumps(SPEEDSCOPE))
+        functions = load_speedscope(path)
+        assert functions[("app.py", 5, "work")] == pytest.approx({"self": 2.03, "cumulative": 2.03})
+        assert functions[("app.py", 1, "main")] == pytest.approx({"self": 2.005, "cumulative": 4.035})
+
+    def test_pstats(self, tmp_path):
+        profiler = cProfile.Profile()
+        profiler.runcall(_spin, 0.01)
+        profiler.dump_stats(tmp_path / "run.prof")
+
+        functions = load_profile(tmp_path / "run.prof")
+        (times,) = (t for (_, _, name), t in functions.items() if name == "_spin")
+        assert times["cumulative"] >= times["self"] > 0
+
+    def test_unreadable_files(self, tmp_path):
+        (tmp_path / "bad.json").write_text("{}")
+        (tmp_path / "bad.prof").write_bytes(b"\x00garbage")
+        with pytest.raises(ValueError, match="speedscope"):
+            load_profile(tmp_path / "bad.json")
+        with pytest.raises(ValueError, match="pstats"):
+            load_profile(tmp_path / "bad.prof")
+
+
+def test_sampler_records_the_running_function():
+    sampler = Sampler(interval=0.001)
+    sampler.start()
+    _spin(0.1)
+    sampler.stop()
+
+    assert sampler.samples > 10
+    profile = sampler.speedscope("spin")
+    path_frames = profile["shared"]["frames"]
+    hottest = max(
+        zip(profile["profiles"][0]["samples"], profile["profiles"][0]["weights"], strict=True), key=lambda s: s[1]
+    )
+    assert path_frames[hottest[0][-1]]["name"] == "_spin"
+
+
+class TestProfileReport:
+    """Tests for joining profiles with static metrics."""
+
+    def test_function_table_uses_qualified_names(self):
+        import ast
+
+        tree = ast.parse(
+            "class A:\n    @staticmethod\n    def run(x):\n        def inner():\n            pass\n"
+            "        return x if x else 0\n"
+        )
+        table = function_table(tree)
+        assert table[2] == table[3] == ("A.run", 2)
+        assert table[4] == ("A.run.<locals>.inner", 1)
+
+    def test_hot_and_complex_ranks_first(self, tmp_path):
+        """Test complexity lifts a function above a slightly hotter simple one, and outside code is not ranked."""
+        source = "def simple():\n    pass\n\n\ndef branchy(x):\n    if x:\n        return 1\n    return 2 if x else 3\n"
+        index = ProjectIndex(make_project(tmp_path, {"src/pkg/mod.py": source}))
+        index.refresh()
+        functions = {
+            (str(tmp_path / "src/pkg/mod.py"), 1, "simple"): {"self": 4.0, "cumulative": 4.0},
+            ("src/pkg/mod.py", 5, "branchy"): {"self": 3.0, "cumulative": 3.0},
+            ("/usr/lib/python3/json/decoder.py", 10, "decode"): {"self": 3.0, "cumulative": 3.0},
+            ("~", 0, "<built-in method time.sleep>"): {"self": 0.0, "cumulative": 0.0},
+        }
+
+        report = profile_report(index, functions)
+
+        assert [(f["function"], f["complexity"], f["score"]) for f in report["functions"]] == [
+            ("branchy", 3, 90.0),
+            ("simple", 1, 40.0),
+        ]
+        assert report["project_pct"] == 70.0
+        (module,) = report["modules"]
+        assert (module["module"], module["self_s"], module["cumulative_s"]) == ("pkg.mod", 7.0, 4.0)
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+refactor-import-cost
+import time:      9000 |       9000 |     heavy.core
+import time:       500 |       9500 |   heavy
+import time:       300 |        300 |   pkg.util
+import time:       200 |      10000 | pkg.app
+"""
+
+APP = (
+    "import heavy\nfrom pkg import util\n\n\n"
+    "def render(x):\n    return heavy.draw(x)\n\n\n"
+    "class View:\n    size = util.SIZE\n"
+)
+
+
+class TestImportCost:
+    """Tests for import-time parsing and lazy-import candidates."""
+
+    def test_parse_importtime_nests_children(self):
+        roots = parse_importtime(IMPORTTIME.partition("refactor-import-cost")[2])
+        (app,) = roots
+        assert app["module"] == "pkg.app"
+        assert [c["module"] for c in app["children"]] == ["heavy", "pkg.util"]
+        assert app["children"][0]["children"][0] == {
+            "module": "heavy.core",
+            "self_us": 9000,
+            "cumulative_us": 9000,
+            "children": [],
+        }
+
+    def test_name_uses_separates_import_time_code(self):
+        import ast
+
+        tree = ast.parse(APP + "\n\ndef late(y=util.DEFAULT):\n    return y\n")
+        assert name_uses(tree, {"heavy"}) == ({"render"}, False)
+        assert name_uses(tree, {"util"}) == (set(), True)
+
+    def test_lazy_candidates(self, tmp_path):
+        """Test a heavy import used in one function is a candidate and one used at import time is not."""
+        index = ProjectIndex(make_project(tmp_path, {"src/pkg/__init__.py": "", "src/pkg/app.py": APP}))
+        index.refresh()
+        roots = parse_importtime(IMPORTTIME.partition("refactor-import-cost")[2])
+
+        report = import_cost_report(index, "pkg.app", roots)
+
+        assert report["total_us"] == 10000
+        assert [(e["module"], e["importer"]) for e in report["imports"][:2]] == [
+            ("pkg.app", None),
+            ("heavy", "pkg.app"),
+        ]
+        (candidate,) = report["lazy_candidates"]
+        assert candidate == {
+            "importer": "pkg.app",
+            "path": "src/pkg/app.py",
+            "line": 1,
+            "module": "heavy",
+            "cumulative_us": 9500,
+            "share_pct": 95.0,
+            "used_in": ["render"],
+        }
@@ -0,0 +1,156 @@
+"""Tests for the JSON-RPC analysis server."""
+
+import io
+import json
+import socket
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from test_analysis import PROJECT, make_project, touch
+
+from refactor_cli.analysis import ProjectIndex
+from refactor_cli.server import (
+    INTERNAL_ERROR,
+    INVALID_PARAMS,
+    METHOD_NOT_FOUND,
+    PARSE_ERROR,
+    AnalysisServer,
+    serve_stdio,
+    serve_unix_socket,
+)
+
+
+@pytest.fixture
+def server(tmp_path):
+    index = ProjectIndex(make_project(tmp_path))
+    index.refresh()
+    return AnalysisServer(index)
+
+
+def call(server, method, params=None, request_id=1):
+    request = {"jsonrpc": "2.0", "id": request_id, "method": method}
+    if params is not None:
+        request["params"] = params
+    return json.loads(server.handle_line(json.dumps(request)))
+
+
+class TestAnalysisServer:
+    """Tests for request dispatch."""
+
+    def test_queries(self, server):
+        assert call(server, "ping")["result"] == "pong"
+        assert call(server, "deps", {"target": "shop.cart"})["result"]["imports"] == ["shop.pricing"]
+        assert call(server, "affected-tests", {"targets": ["src/shop/pricing.py"]})["result"] == ["tests/test_cart.py"]
+        assert len(call(server, "analyze")["result"]) == len(PROJECT)
+        pack = call(server, "context", {"target": "shop.pricing", "budget": 400})["result"]
+        assert pack["markdown"].startswith("# Context: shop.pricing")
+        assert pack["tokens"] <= 400
+        stats = call(server, "stats")["result"]
+        assert stats["modules"] == len(PROJECT)
+        assert stats["latency"]["deps"]["calls"] == 1
+
+    def test_refresh_picks_up_file_changes(self, server, tmp_path):
+        """Test the refresh method re-parses edited files so later queries see them."""
+        assert call(server, "affected_tests", {"targets": ["shop.pricing"]})["result"] == ["tests/test_cart.py"]
+        touch(tmp_path / "src/shop/cart.py", "def checkout(items):\n    return 0\n")
+        assert call(server, "refresh")["result"] == ["src/shop/cart.py"]
+        assert call(server, "affected_tests", {"targets": ["shop.pricing"]})["result"] == []
+
+    def test_queries_do_not_walk_the_tree(self, server):
+        """Test queries are answered from memory without rescanning the project."""
+        with patch.object(server.index, "refresh", side_effect=AssertionError("rescanned")):
+            assert call(server, "deps", {"target": "shop.cart"})["result"]["imports"] == ["shop.pricing"]
+
+    def test_background_rescan_picks_up_file_changes(self, tmp_path):
+        """Test the watcher thread re-parses edited files without any request."""
+        index = ProjectIndex(make_project(tmp_path))
+        index.refresh()
+        generation = index.generation
+        server = AnalysisServer(index, rescan_interval=0.01)
+        thread = server.watch()
+        touch(tmp_path / "src/shop/cart.py", "def checkout(items):\n    return 0\n")
+        deadline = time.monotonic() + 5
+        while index.generation == generation and time.monotonic() < deadline:
+            time.sleep(0.01)
+        server.shutdown()
+        thread.join(timeout=5)
+
+        assert index.generation == generation + 1
+        assert call(server, "affected_tests", {"targets": ["shop.pricing"]})["result"] == []
+        assert not thread.is_alive()
+
+    def test_errors(self, server):
+        assert call(server, "nope")["error"]["code"] == METHOD_NOT_FOUND
+        assert call(server, "deps", {"target": "missing"})["error"]["code"] == INVALID_PARAMS
+        assert call(server, "deps", {"wrong": 1})["error"]["code"] == INVALID_PARAMS
+        assert json.loads(server.handle_line("{not json"))["error"]["code"] == PARSE_ERROR
+
+    def test_handler_bugs_are_internal_errors(self, server):
+        """Test a KeyError or TypeError raised inside a method is not reported as bad params."""
+        server._methods["deps"] = lambda target: {}[target]
+        server._methods["hotspots"] = lambda: 1 + None
+        assert call(server, "deps", {"target": "shop.cart"})["error"]["code"] == INTERNAL_ERROR
+        assert call(server, "hotspots")["error"]["code"] == INTERNAL_ERROR
+        assert call(server, "hotspots", [1])["error"]["code"] == INVALID_PARAMS
+
+    @pytest.mark.parametrize("params", ["shop.cart", 3, None, True])
+    def test_params_must_be_object_or_array(self, server, params):
+        """Test scalar params are rejected instead of being splatted into the method."""
+        request = {"jsonrpc": "2.0", "id": 1, "method": "deps", "params": params}
+        error = json.loads(server.handle_line(json.dumps(request)))["error"]
+        assert error["code"] == INVALID_PARAMS
+        assert "object or an array" in error["message"]
+
+    def test_notifications_and_batches(self, server):
+        assert server.handle_line(json.dumps({"jsonrpc": "2.0", "method": "ping"})) is None
+        assert server.handle_line(json.dumps({"jsonrpc": "2.0", "method": "nope"})) is None
+        assert server.handle_line(json.dumps({"jsonrpc": "2.0", "method": "deps", "params": {"wrong": 1}})) is None
+        batch = [{"jsonrpc": "2.0", "id": i, "method": "ping"} for i in (1, 2)]
+        assert [r["id"] for r in json.loads(server.handle_line(json.dumps(batch)))] == [1, 2]
+        assert server.handle_line(json.dumps([{"jsonrpc": "2.0", "method": "nope"}])) is None
+
+    def test_warm_queries_reuse_the_index(self, server):
+        """Test a warm query re-parses nothing and its latency is recorded."""
+        generation = server.index.generation
+        for _ in range(3):
+            call(server, "deps", {"target": "shop.cart"})
+        assert server.index.refresh() == []
+        assert server.index.generation == generation
+        latency = server.stats()["latency"]["deps"]
+        assert latency["calls"] == 3
+        assert 0 <= latency["max_ms"] <= latency["total_ms"]
+
+    def test_serve_stdio_until_shutdown(self, server):
+        requests = [
+            {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+            {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+            {"jsonrpc": "2.0", "id": 3, "method": "ping"},
+        ]
+        stdout = io.StringIO()
+        serve_stdio(server, io.StringIO("\n".join(json.dumps(r) for r in requests) + "\n"), stdout)
+        assert [json.loads(line)["id"] for line in stdout.getvalue().splitlines()] == [1, 2]
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="Unix sockets only")
+    def test_serve_unix_socket(self, server, tmp_path):
+        path = tmp_path / "serve.sock"
+        thread = threading.Thread(target=serve_unix_socket, args=(server, path), daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.stat().st_mode & 0o777 == 0o600
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(path))
+            stream = client.makefile("rwb")
+            for request_id, method in ((1, "ping"), (2, "shutdown")):
+                stream.write(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method}).encode() + b"\n")
+                stream.flush()
+                assert json.loads(stream.readline())["id"] == request_id
+
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert not path.exists()
@@ -0,0 +1,335 @@
+"""Tests for the single-pass scanner and the performance smell rules."""
+
+import ast
+import sys
+import textwrap
+from pathlib import Path
+from typing import ClassVar
+
+import pytest
+from test_analysis import make_project
+
+# Add the src directory to the path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from refactor_cli import smells
+from refactor_cli.analysis import ProjectIndex, function_complexity
+from refactor_cli.smells import Rule, Scanner, configure_rules, rank, scan_module
+
+
+def smells_of(source, rule=None):
+    source = textwrap.dedent(source)
+    found = scan_module(ast.parse(source), source)[1]
+    return [(f["rule"], f["line"], f["severity"]) for f in found if rule in {None, f["rule"]}]
+
+
+class TestScanner:
+    """Tests for the metrics computed during the scan."""
+
+    def test_metrics_match_per_function_complexity(self):
+        source = textwrap.dedent(
+            """
+            class A:
+                def f(self, xs):
+                    def g(y):
+                        return y if y else 0
+                    return [g(x) for x in xs if x and x > 1]
+
+            async def h():
+                while True:
+                    try:
+                        pass
+                    except ValueError:
+                        break
+            """
+        )
+        tree = ast.parse(source)
+        metrics, smells = Scanner().scan(tree, source)
+        functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        assert metrics["functions"] == 3
+        assert metrics["classes"] == 1
+        assert metrics["complexity"] == sum(function_complexity(n) for n in functions)
+        assert metrics["max_complexity"] == max(function_complexity(n) for n in functions)
+        assert smells == []
+
+
+class TestPerformanceRules:
+    """Tests for each performance detector, with a near miss that must stay quiet."""
+
+    def test_list_membership_in_loop(self):
+        assert smells_of(
+            """
+            ALLOWED = ["a", "b"]
+
+            def f(items, other):
+                seen = []
+                for item in items:
+                    if item not in seen:
+                        seen.append(item)
+                    if item in ALLOWED:
+                        pass
+                    if item in other:
+                        pass
+                found = set(seen)
+                seen, rest = found, None
+                return [x for x in items if x in seen]
+            """
+        ) == [("list-membership-in-loop", 7, "high"), ("list-membership-in-loop", 9, "high")]
+
+    def test_string_concat_in_loop(self):
+        assert smells_of(
+            """
+            def f(parts):
+                out = ""
+                total = 0
+                for part in parts:
+                    out += part
+                    total += len(part)
+                    out = out + ","
+                return out
+            """
+        ) == [("string-concat-in-loop", 6, "medium"), ("string-concat-in-loop", 8, "medium")]
+
+    def test_regex_compiled_per_call(self):
+        assert smells_of(
+            """
+            import re as regex
+            WORD = regex.compile(r"\\w+")
+
+            def f(text, pattern):
+                regex.compile(pattern)
+                for line in text:
+                    regex.search(r"\\d", line)
+                return regex.compile(r"\\s+").split(text)
+            """
+        ) == [("regex-compiled-per-call", 8, "low"), ("regex-compiled-per-call", 9, "medium")]
+
+    def test_blocking_io_in_async(self):
+        assert smells_of(
+            """
+            import time
+            from requests import get
+
+            async def handler(url):
+                time.sleep(1)
+                data = get(url)
+                with open("x") as f:
+                    pass
+
+                def sync_helper():
+                    time.sleep(1)
+                return await other(url)
+
+            def plain():
+                time.sleep(1)
+            """
+        ) == [
+            ("blocking-io-in-async", 6, "high"),
+            ("blocking-io-in-async", 7, "high"),
+            ("blocking-io-in-async", 8, "high"),
+        ]
+
+    def test_attribute_lookup_in_loop(self):
+        assert smells_of(
+            """
+            def f(self, rows):
+                for row in self.data.rows:
+                    self.cache.store.put(row.key.value)
+                    self.cache.store.put(row)
+            """
+        ) == [("attribute-lookup-in-loop", 4, "low")]
+
+    def test_n_plus_one(self):
+        assert smells_of(
+            """
+            import requests
+
+            def f(ids, cursor, session):
+                users = User.objects.filter(id__in=ids)
+                for i in ids:
+                    requests.get(f"/users/{i}")
+                    cursor.execute("select 1 where id = ?", (i,))
+                    User.objects.get(id=i)
+                    session.post("/x")
+                    cache.get(i)
+            """,
+            "n-plus-one",
+        ) == [
+            ("n-plus-one", 7, "high"),
+            ("n-plus-one", 8, "high"),
+            ("n-plus-one", 9, "high"),
+            ("n-plus-one", 10, "high"),
+        ]
+
+
+def test_index_ranks_smells_by_severity(tmp_path):
+    project = {
+        "a.py": "def f(s):\n    out = ''\n    for c in s:\n        out += c\n    return out\n",
+        "b.py": "def g(xs):\n    seen = []\n    for x in xs:\n        if x in seen:\n            pass\n",
+    }
+    index = ProjectIndex(make_project(tmp_path, project))
+    index.refresh()
+
+    assert [(f["path"], f["severity"]) for f in index.smells()] == [("b.py", "high"), ("a.py", "medium")]
+    assert [f["path"] for f in index.smells(severity="high")] == ["b.py"]
+    assert (
+        rank([{"severity": "low", "line": 1, "rule": "r"}, {"severity": "high", "line": 9, "rule": "r"}])[0]["line"]
+        == 9
+    )
+    with pytest.raises(ValueError, match="urgent"):
+        index.smells(severity="urgent")
+
+
+class TestDesignRules:
+    """Tests for the Bloater, Object-Orientation Abuser and Coupler rules of the analyze template."""
+
+    def test_long_method_and_parameter_list(self):
+        body = "".join(f"    x{i} = {i}\n" for i in range(21))
+        source = f'def f(self, a, b, c):\n    """Doc."""\n{body}\n\ndef g(a, b, c, d, e, f, g):\n    pass\n'
+        assert smells_of(source) == [
+            ("long-method", 1, "medium"),
+            ("long-parameter-list", 26, "medium"),
+        ]
+
+    def test_large_class_escalates_far_past_the_limit(self):
+        body = "".join(f"    x{i} = {i}\n" for i in range(401))
+        assert smells_of(f"class A:\n{body}", "large-class") == [("large-class", 1, "high")]
+
+    def test_switch_statements(self):
+        chain = "".join(f"    {'if' if i == 0 else 'elif'} kind == {i}:\n        return {i}\n" for i in range(4))
+        mixed = chain.replace("kind == 3", "other == 3")
+        assert smells_of(f"def f(kind, other):\n{chain}\n\ndef g(kind, other):\n{mixed}") == [
+            ("switch-statements", 2, "low")
+        ]
+
+    def test_message_chains(self):
+        assert smells_of(
+            """
+            def f(self, order):
+                order.customer.address.city.name.upper()
+                self.a.b.c.d
+                return order.items[0].product.vendor.name
+            """,
+            "message-chains",
+        ) == [("message-chains", 3, "low")]
+
+    def test_middle_man(self):
+        assert smells_of(
+            """
+            class Proxy:
+                def __init__(self, inner):
+                    self.inner = inner
+
+                def a(self):
+                    return self.inner.a()
+
+                def b(self, x):
+                    self.inner.b(x)
+
+                def c(self):
+                    return 1
+            """,
+            "middle-man",
+        ) == [("middle-man", 2, "low")]
+
+
+class LoudRule(Rule):
+    name = "loud"
+    category = "plugins"
+    severity = "low"
+    node_types = (ast.Call,)
+    defaults: ClassVar[dict] = {"word": "print"}
+
+    def visit(self, node, _scope):
+        if isinstance(node.func, ast.Name) and node.func.id == self.options["word"]:
+            yield node, "loud call"
+
+
+class HalfRule(Rule):
+    name = "half"
+    node_types = (ast.Call,)
+
+
+class FakeEntryPoint:
+    def __init__(self, name, loaded):
+        self.name = name
+        self.loaded = loaded
+
+    def load(self):
+        if isinstance(self.loaded, Exception):
+            raise self.loaded
+        return self.loaded
+
+
+class TestRuleFramework:
+    """Tests for configuration, plugins and per-rule timing."""
+
+    def test_configuration_sets_thresholds_and_disables_rules(self):
+        rules, warnings = configure_rules(
+            {
+                "disable": ["n-plus-one"],
+                "long-method": {"max_lines": 50, "severity": "high"},
+                "large-class": {"max_linez": 1},
+                "no-such-rule": {},
+            },
+            plugins=False,
+        )
+        by_name = {rule.name: rule for rule in rules}
+        assert "n-plus-one" not in by_name
+        assert (by_name["long-method"].options, by_name["long-method"].severity) == ({"max_lines": 50}, "high")
+        assert by_name["large-class"].options == {"max_lines": 200}
+        assert sorted(warnings) == [
+            "Unknown smell rule in configuration: no-such-rule",
+            "large-class: unknown option(s) max_linez; using the defaults",
+        ]
+
+    def test_plugins_are_loaded_from_entry_points(self, monkeypatch):
+        monkeypatch.setattr(
+            smells,
+            "entry_points",
+            lambda **_kwargs: [
+                FakeEntryPoint("loud", [LoudRule]),
+                FakeEntryPoint("broken", ImportError("no module named x")),
+                FakeEntryPoint("bogus", object),
+                FakeEntryPoint("half", HalfRule),
+            ],
+        )
+        rules, warnings = configure_rules({"loud": {"word": "shout"}})
+        (loud,) = (rule for rule in rules if rule.name == "loud")
+        assert loud.options == {"word": "shout"}
+        assert "half" not in {rule.name for rule in rules}
+        assert len(warnings) == 3
+        assert "Rule plugin half: HalfRule does not implement visit" in warnings
+        assert configure_rules({"plugins": False})[0][-1].name != "loud"
+
+        source = "shout('hi')\nprint('x')\n"
+        _, found = Scanner(rules).scan(ast.parse(source), source)
+        assert [(f["rule"], f["line"], f["category"]) for f in found] == [("loud", 1, "plugins")]
+
+    def test_one_pass_with_per_rule_timings(self):
+        source = "def f(xs):\n    for x in xs:\n        print(x.a.b)\n"
+        scanner = Scanner([LoudRule(), LoudRule(word="len")])
+        scanner.rules[1].name = "quiet"
+        scanner._timings = {"loud": [0, 0], "quiet": [0, 0]}
+        scanner.scan(ast.parse(source), source)
+        scanner.scan(ast.parse(source), source)
+
+        stats = scanner.stats()
+        assert stats["files"] == 2
+        assert stats["rules"]["loud"]["calls"] == stats["rules"]["quiet"]["calls"] == 2
+
+    def test_project_configuration_and_cache_invalidation(self, tmp_path):
+        """Test pyproject thresholds apply and changing them rescans instead of reusing persisted smells."""
+        body = "".join(f"    x{i} = {i}\n" for i in range(25))
+        make_project(tmp_path / "repo", {"a.py": f"def f():\n{body}"})
+        cache_file = tmp_path / "index.json"
+        first = ProjectIndex(tmp_path / "repo", cache_file=cache_file)
+        first.refresh()
+        first.save()
+        assert [f["rule"] for f in first.smells()] == ["long-method"]
+
+        (tmp_path / "repo/pyproject.toml").write_text("[tool.refactor.smells.long-method]\nmax_lines = 30\n")
+        second = ProjectIndex(tmp_path / "repo", cache_file=cache_file)
+        assert second.refresh() == ["a.py"]
+        assert second.smells() == []
+        assert second.rules()[0]["options"] == {"max_lines": 30}